@@ -8,6 +8,12 @@
 - financial_metrics: Calculate ROI, CAGR, IRR, NPV, risk metrics
 - portfolio_optimizer: Modern Portfolio Theory optimization
 - investment_comparison: Compare and rank investments
+- background: Periodic jobs inside the API process
+- cache: Process-wide values loaded from the database with a TTL
+- market_data: Background quote refresher and persisted price cache
+- price_store: Daily close history and bulk mark-to-market revaluation
+- benchmarks: Daily benchmark index levels and period returns
+- fx: Daily exchange rates and vectorized currency conversion
 
 Example:
     from lib.financial_metrics import FinancialMetricsEngine, CashFlow
@@ -50,6 +56,47 @@
     create_return_focused_comparator,
 )
 
+from .background import BackgroundLoop
+from .cache import TTLCache
+
+from .market_data import (
+    MarketDataRefresher,
+    Quote,
+    QuoteSource,
+    QuoteStore,
+    StubQuoteSource,
+    build_market_payload,
+    read_market_data,
+)
+
+from .price_store import (
+    PriceBar,
+    RevaluationJob,
+    StubPriceSource,
+    ingest_prices,
+    normalize_symbol,
+    parse_price_csv,
+    price_series,
+    revalue_investments,
+)
+
+from .benchmarks import (
+    BenchmarkRefresher,
+    BenchmarkSet,
+    CumulativeIndex,
+    compare_with_benchmarks,
+    get_benchmarks,
+    refresh_benchmarks,
+)
+
+from .fx import (
+    REPORTING_CURRENCY,
+    ConvertedSeriesCache,
+    FXRateTable,
+    get_fx_rates,
+    refresh_fx_rates,
+)
+
 __all__ = [
     # Financial Metrics
     "FinancialMetricsEngine",
@@ -82,4 +129,42 @@
     "quick_compare",
     "create_risk_averse_comparator",
     "create_return_focused_comparator",
+    
+    # Background Jobs
+    "BackgroundLoop",
+    "TTLCache",
+    
+    # Market Data
+    "MarketDataRefresher",
+    "Quote",
+    "QuoteSource",
+    "QuoteStore",
+    "StubQuoteSource",
+    "build_market_payload",
+    "read_market_data",
+    
+    # Price Store
+    "PriceBar",
+    "RevaluationJob",
+    "StubPriceSource",
+    "ingest_prices",
+    "normalize_symbol",
+    "parse_price_csv",
+    "price_series",
+    "revalue_investments",
+    
+    # Benchmarks
+    "BenchmarkRefresher",
+    "BenchmarkSet",
+    "CumulativeIndex",
+    "compare_with_benchmarks",
+    "get_benchmarks",
+    "refresh_benchmarks",
+    
+    # FX
+    "REPORTING_CURRENCY",
+    "ConvertedSeriesCache",
+    "FXRateTable",
+    "get_fx_rates",
+    "refresh_fx_rates",
 ]
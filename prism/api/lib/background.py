@@ -0,0 +1,53 @@
+"""
+===============================================================================
+BACKGROUND - Periodic jobs inside the API process
+===============================================================================
+A BackgroundLoop calls run_once() every interval_seconds, plus 0-10% jitter
+so replicas drift apart, from start() (API lifespan) until stop() (shutdown).
+A failing round is logged and the next one runs on schedule. Jobs that must
+run on one replica at a time take their own advisory lock in run_once().
+"""
+import asyncio
+import random
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+
+class BackgroundLoop(ABC):
+    """run_once() on a jittered interval in its own asyncio task."""
+    name = "background-loop"  # asyncio task name
+    log_prefix = "Background"
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def run_once(self) -> Any:
+        pass
+
+    def report(self, result: Any):
+        """Log the result of a successful round; silent by default."""
+
+    async def run(self):
+        while True:
+            try:
+                self.report(await self.run_once())
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"[{self.log_prefix}] Run failed: {exc}")
+            await asyncio.sleep(self.interval_seconds * random.uniform(1.0, 1.1))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name=self.name)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,339 @@
+"""
+===============================================================================
+BENCHMARKS - Daily benchmark index levels and period returns
+===============================================================================
+CDI, Selic, IPCA and the S&P 500 (total return) are kept as daily index
+levels in price_history under BENCHMARK_SYMBOLS. The Banco Central series use
+the reserved BENCH: prefix, so an investment symbol can never collide with
+them. refresh_benchmarks() chains the rates published by the Banco Central
+(SGS) into levels and pulls the S&P 500 index from Yahoo; BenchmarkRefresher
+runs it every BENCHMARK_REFRESH_SECONDS in the background.
+
+get_benchmarks() preloads every series into a CumulativeIndex: one float per
+calendar day, forward-filled over weekends and holidays. A period return is
+then levels[end] / levels[start] - 1, an O(1) lookup that numpy vectorizes
+over all investments at once (compare_with_benchmarks). Days outside the
+stored history are extrapolated with the constant BENCHMARK_RATES, so an
+empty table gives the previous flat-rate comparison.
+"""
+import asyncio
+import calendar
+import math
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .background import BackgroundLoop
+from .cache import TTLCache
+from .financial_metrics import BENCHMARK_RATES, InvestmentMetrics
+from .price_store import PriceBar, fetch_yahoo_history, ingest_prices
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+BENCHMARK_HISTORY_START = date.fromisoformat(os.getenv("BENCHMARK_HISTORY_START", "2000-01-01"))
+BENCHMARK_CACHE_SECONDS = float(os.getenv("BENCHMARK_CACHE_SECONDS", "3600"))
+BENCHMARK_REFRESH_ENABLED = os.getenv("BENCHMARK_REFRESH_ENABLED", "true").lower() == "true"
+BENCHMARK_REFRESH_SECONDS = float(os.getenv("BENCHMARK_REFRESH_SECONDS", "21600"))  # SGS publishes daily
+
+BENCHMARK_PREFIX = "BENCH:"  # Reserved for series that are not tradable symbols
+
+# Benchmark name -> price_history symbol
+BENCHMARK_SYMBOLS = {
+    "cdi_br": BENCHMARK_PREFIX + "CDI",
+    "selic_br": BENCHMARK_PREFIX + "SELIC",
+    "inflation_br": BENCHMARK_PREFIX + "IPCA",
+    "sp500": "^SP500TR",  # The Yahoo index itself; the same series if held
+}
+
+# Annual rate used outside the stored history
+FALLBACK_RATES = {
+    "cdi_br": BENCHMARK_RATES["cdi_br"],
+    "selic_br": BENCHMARK_RATES["selic_br"],
+    "inflation_br": BENCHMARK_RATES["inflation_br"],
+    "sp500": BENCHMARK_RATES["sp500_historical"],
+}
+
+# SGS series code and periodicity of the published rate (percent per period)
+SGS_SERIES = {
+    BENCHMARK_SYMBOLS["cdi_br"]: (12, "daily"),
+    BENCHMARK_SYMBOLS["selic_br"]: (11, "daily"),
+    BENCHMARK_SYMBOLS["inflation_br"]: (433, "monthly"),
+}
+SGS_URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{code}/dados"
+SGS_MAX_DAYS = 3650  # SGS rejects daily queries longer than ten years
+
+BASE_LEVEL = 1000.0  # Level of a series on its first stored day
+DAYS_PER_YEAR = 365.25
+MIN_YEARS = 0.01  # Same floor analyze_investment uses for CAGR
+
+
+# =============================================================================
+# CUMULATIVE INDEX
+# =============================================================================
+
+class CumulativeIndex:
+    """Index level for every calendar day from `origin` to `origin + len(levels) - 1`."""
+
+    def __init__(self, origin: date, levels: np.ndarray,
+                 first_observed: Optional[date] = None, last_observed: Optional[date] = None):
+        self.origin = origin
+        self.levels = levels
+        self.first_observed = first_observed
+        self.last_observed = last_observed
+        self._origin64 = np.datetime64(origin, "D")
+
+    @classmethod
+    def build(cls, points: Sequence[Tuple[date, float]], annual_rate: float,
+              origin: date, last: date) -> "CumulativeIndex":
+        """
+        Levels from sorted (date, level) observations. Days between observations
+        keep the previous level; days before the first or after the last grow
+        at `annual_rate`.
+        """
+        days = np.arange((last - origin).days + 1)
+        slope = math.log1p(annual_rate) / DAYS_PER_YEAR
+        if not points:
+            return cls(origin, np.exp(days * slope))
+
+        offsets = np.array([(d - origin).days for d, _ in points])
+        log_levels = np.log(np.array([level for _, level in points], dtype=float))
+        pos = np.searchsorted(offsets, days, side="right") - 1
+        before = pos < 0
+        pos = np.maximum(pos, 0)
+        log_index = np.where(
+            before,
+            log_levels[0] - slope * (offsets[0] - days),
+            log_levels[pos] + slope * np.maximum(days - offsets[-1], 0),
+        )
+        return cls(origin, np.exp(log_index), points[0][0], points[-1][0])
+
+    def _positions(self, days: Iterable) -> np.ndarray:
+        offsets = (np.asarray(days, dtype="datetime64[D]") - self._origin64).astype(np.int64)
+        return np.clip(offsets, 0, len(self.levels) - 1)
+
+    def period_returns(self, starts: Iterable, ends: Iterable) -> np.ndarray:
+        """Total return between each (start, end) pair, as a fraction."""
+        return self.levels[self._positions(ends)] / self.levels[self._positions(starts)] - 1
+
+    def period_return(self, start: date, end: date) -> float:
+        return float(self.period_returns([start], [end])[0])
+
+    def annualized_returns(self, starts: Iterable, ends: Iterable) -> np.ndarray:
+        """Period returns compounded to a yearly rate, as fractions."""
+        starts = np.asarray(starts, dtype="datetime64[D]")
+        ends = np.asarray(ends, dtype="datetime64[D]")
+        years = np.maximum((ends - starts).astype(np.int64) / DAYS_PER_YEAR, MIN_YEARS)
+        return (1 + self.period_returns(starts, ends)) ** (1 / years) - 1
+
+
+class BenchmarkSet:
+    """One CumulativeIndex per benchmark name."""
+
+    def __init__(self, indexes: Dict[str, CumulativeIndex]):
+        self.indexes = indexes
+
+    @classmethod
+    def from_series(cls, series: Dict[str, List[Tuple[date, float]]],
+                    origin: date = BENCHMARK_HISTORY_START, last: Optional[date] = None) -> "BenchmarkSet":
+        """`series` maps benchmark names to sorted (date, level) points; missing names use the flat rate."""
+        last = last or date.today() + timedelta(days=1)
+        return cls({
+            name: CumulativeIndex.build(series.get(name, []), rate, origin, last)
+            for name, rate in FALLBACK_RATES.items()
+        })
+
+    def annualized_returns(self, name: str, starts: Iterable, ends: Iterable) -> np.ndarray:
+        return self.indexes[name].annualized_returns(starts, ends)
+
+    def coverage(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "symbol": BENCHMARK_SYMBOLS[name],
+                "first_date": index.first_observed.isoformat() if index.first_observed else None,
+                "last_date": index.last_observed.isoformat() if index.last_observed else None,
+            }
+            for name, index in self.indexes.items()
+        }
+
+
+def compare_with_benchmarks(metrics: Sequence[InvestmentMetrics], benchmarks: BenchmarkSet) -> None:
+    """
+    Replace the flat-rate vs_cdi, vs_sp500 and vs_inflation of every metrics
+    object with comparisons against the benchmarks over its own holding period.
+    """
+    if not metrics:
+        return
+    ends = np.array([m.calculation_date for m in metrics], dtype="datetime64[D]")
+    starts = ends - np.array([m.holding_period_days for m in metrics], dtype="timedelta64[D]")
+    cdi = benchmarks.annualized_returns("cdi_br", starts, ends) * 100
+    sp500 = benchmarks.annualized_returns("sp500", starts, ends) * 100
+    inflation = benchmarks.annualized_returns("inflation_br", starts, ends)
+    inflation_period = benchmarks.indexes["inflation_br"].period_returns(starts, ends) * 100
+
+    for i, m in enumerate(metrics):
+        m.vs_cdi = float(m.cagr - cdi[i]) if m.cagr else None
+        m.vs_sp500 = float(m.cagr - sp500[i]) if m.cagr else None
+        if m.years_held > 0:
+            m.vs_inflation = float(((1 + m.cagr / 100) / (1 + inflation[i]) - 1) * 100)
+        else:
+            m.vs_inflation = float(m.simple_roi - inflation_period[i])
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+async def load_benchmarks(session) -> BenchmarkSet:
+    """Read every benchmark series from price_history in one query."""
+    from sqlalchemy import select
+    from models import PriceHistory
+
+    names = {symbol: name for name, symbol in BENCHMARK_SYMBOLS.items()}
+    result = await session.execute(
+        select(PriceHistory.symbol, PriceHistory.price_date, PriceHistory.close)
+        .where(PriceHistory.symbol.in_(names), PriceHistory.price_date >= BENCHMARK_HISTORY_START)
+        .order_by(PriceHistory.symbol, PriceHistory.price_date)
+    )
+    series: Dict[str, List[Tuple[date, float]]] = {}
+    for symbol, price_date, close in result.all():
+        series.setdefault(names[symbol], []).append((price_date, float(close)))
+    return BenchmarkSet.from_series(series)
+
+
+_cache: TTLCache[BenchmarkSet] = TTLCache(load_benchmarks, BENCHMARK_CACHE_SECONDS)
+
+
+async def get_benchmarks(session, max_age_seconds: float = BENCHMARK_CACHE_SECONDS) -> BenchmarkSet:
+    """Process-wide BenchmarkSet, reloaded when older than max_age_seconds."""
+    return await _cache.get(session, max_age_seconds)
+
+
+def invalidate_benchmarks():
+    _cache.invalidate()
+
+
+# =============================================================================
+# REFRESH
+# =============================================================================
+
+def chain_rates(symbol: str, rates: Iterable[Tuple[date, float]], base_level: float,
+                periodicity: str = "daily") -> List[PriceBar]:
+    """
+    Index levels from percent-per-period rates. A daily rate lands on its own
+    day, a monthly rate on the last day of its month.
+    """
+    bars = []
+    level = base_level
+    for day, pct in rates:
+        level *= 1 + pct / 100
+        if periodicity == "monthly":
+            day = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+        bars.append(PriceBar(symbol, day, round(level, 6), source="bcb"))
+    return bars
+
+
+async def fetch_sgs_rates(client, code: int, start: date, end: date) -> List[Tuple[date, float]]:
+    """(date, percent) pairs of an SGS series, in SGS_MAX_DAYS chunks."""
+    rates = []
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=SGS_MAX_DAYS - 1))
+        response = await client.get(SGS_URL.format(code=code), params={
+            "formato": "json",
+            "dataInicial": chunk_start.strftime("%d/%m/%Y"),
+            "dataFinal": chunk_end.strftime("%d/%m/%Y"),
+        })
+        if response.status_code != 404:  # SGS answers 404 for a range without data
+            response.raise_for_status()
+            for row in response.json():
+                rates.append((datetime.strptime(row["data"], "%d/%m/%Y").date(), float(row["valor"])))
+        chunk_start = chunk_end + timedelta(days=1)
+    return rates
+
+
+async def benchmark_tails(session) -> Dict[str, Tuple[date, float]]:
+    """(first missing day, level to chain from) per benchmark name."""
+    from sqlalchemy import select
+    from models import PriceHistory
+
+    tails = {}
+    for name, symbol in BENCHMARK_SYMBOLS.items():
+        last = (await session.execute(
+            select(PriceHistory.price_date, PriceHistory.close)
+            .where(PriceHistory.symbol == symbol)
+            .order_by(PriceHistory.price_date.desc())
+            .limit(1)
+        )).first()
+        tails[name] = (last.price_date + timedelta(days=1), float(last.close)) if last else (
+            BENCHMARK_HISTORY_START, BASE_LEVEL
+        )
+    return tails
+
+
+async def fetch_benchmark_bars(tails: Dict[str, Tuple[date, float]], end: date) -> Dict[str, List[PriceBar]]:
+    """New bars per benchmark name from each tail up to `end`. A failing source is logged and gets none."""
+    import httpx
+
+    bars = {}
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        for name, (start, base) in tails.items():
+            symbol = BENCHMARK_SYMBOLS[name]
+            bars[name] = []
+            if start > end:
+                continue
+            try:
+                if symbol in SGS_SERIES:
+                    code, periodicity = SGS_SERIES[symbol]
+                    rates = await fetch_sgs_rates(client, code, start, end)
+                    bars[name] = chain_rates(symbol, rates, base, periodicity)
+                else:
+                    bars[name] = await asyncio.to_thread(fetch_yahoo_history, symbol, start, end, currency="USD")
+            except Exception as exc:
+                print(f"[Benchmarks] {symbol} refresh failed: {exc}")
+    return bars
+
+
+async def refresh_benchmarks(session, end: Optional[date] = None) -> Dict[str, int]:
+    """
+    Append the days after each series' last stored level, up to `end`
+    (default today). Returns the bars written per benchmark name; the caller
+    commits and invalidates the cache.
+    """
+    bars = await fetch_benchmark_bars(await benchmark_tails(session), end or date.today())
+    return {name: await ingest_prices(session, series) for name, series in bars.items()}
+
+
+class BenchmarkRefresher(BackgroundLoop):
+    """
+    refresh_benchmarks every BENCHMARK_REFRESH_SECONDS; start() from the API
+    lifespan. The tails are read and the bars written in two short sessions,
+    with the fetches in between. Writes are idempotent upserts chained from
+    the stored level, so replicas refreshing together write the same rows.
+    """
+    name = "benchmark-refresher"
+    log_prefix = "Benchmarks"
+
+    def __init__(self, session_factory, interval_seconds: float = BENCHMARK_REFRESH_SECONDS):
+        super().__init__(interval_seconds)
+        self.session_factory = session_factory
+
+    async def run_once(self, end: Optional[date] = None) -> Dict[str, int]:
+        async with self.session_factory() as session:
+            tails = await benchmark_tails(session)
+        bars = await fetch_benchmark_bars(tails, end or date.today())
+        if not any(bars.values()):
+            return {}
+        async with self.session_factory() as session:
+            async with session.begin():
+                written = {name: await ingest_prices(session, series) for name, series in bars.items()}
+        invalidate_benchmarks()
+        return written
+
+    def report(self, written: Dict[str, int]):
+        if any(written.values()):
+            print(f"[Benchmarks] Wrote {sum(written.values())} benchmark levels")
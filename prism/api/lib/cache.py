@@ -0,0 +1,34 @@
+"""
+===============================================================================
+CACHE - Process-wide values loaded from the database with a TTL
+===============================================================================
+Benchmark levels and exchange rates are read into memory once and shared by
+every request until they are older than their TTL, or until a write
+invalidates them.
+"""
+import time
+from typing import Any, Awaitable, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class TTLCache(Generic[T]):
+    """One value from `loader(session)`, reloaded when older than max_age_seconds."""
+
+    def __init__(self, loader: Callable[[Any], Awaitable[T]], max_age_seconds: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.loader = loader
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self._value: Optional[T] = None
+        self._loaded_at = 0.0
+
+    async def get(self, session, max_age_seconds: Optional[float] = None) -> T:
+        max_age = self.max_age_seconds if max_age_seconds is None else max_age_seconds
+        if self._value is None or self.clock() - self._loaded_at > max_age:
+            self._value = await self.loader(session)
+            self._loaded_at = self.clock()
+        return self._value
+
+    def invalidate(self):
+        self._value = None
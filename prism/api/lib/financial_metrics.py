@@ -94,6 +94,7 @@ class InvestmentMetrics:
     
     # Metadata
     calculation_date: date = field(default_factory=date.today)
+    currency: str = "BRL"  # Currency of every amount above
     
     def to_dict(self) -> Dict:
         """Convert metrics to dictionary for JSON serialization."""
@@ -101,6 +102,7 @@ def to_dict(self) -> Dict:
             "investment_id": str(self.investment_id),
             "name": self.name,
             "category": self.category,
+            "currency": self.currency,
             "basic": {
                 "total_invested": round(self.total_invested, 2),
                 "current_value": round(self.current_value, 2),
@@ -153,9 +155,12 @@ class PortfolioMetrics:
     best_performer: Optional[Dict]
     worst_performer: Optional[Dict]
     
+    currency: Optional[str] = None
+    
     def to_dict(self) -> Dict:
         return {
             "summary": {
+                "currency": self.currency,
                 "total_value": round(self.total_value, 2),
                 "total_invested": round(self.total_invested, 2),
                 "total_absolute_return": round(self.total_absolute_return, 2),
@@ -415,7 +420,7 @@ def analyze_investment(
             purchase_date: Date of purchase
             cash_flows: Optional list of additional cash flows (rent, dividends, etc.)
             valuation_history: Optional list of (date, value) tuples for risk analysis
-            currency: Currency code (default: BRL)
+            currency: Currency of purchase_price, current_value and the history (default: BRL)
         
         Returns:
             InvestmentMetrics object with all calculated metrics
@@ -507,6 +512,7 @@ def analyze_investment(
             vs_sp500=(cagr - BENCHMARK_RATES["sp500_historical"] * 100) if cagr else None,
             years_held=years_held,
             holding_period_days=holding_period_days,
+            currency=currency,
         )
     
     def calculate_portfolio_metrics(
@@ -537,6 +543,11 @@ def calculate_portfolio_metrics(
                 worst_performer=None,
             )
         
+        # Amounts in different currencies cannot be summed; convert them first (lib/fx.py)
+        currencies = {m.currency for m in investments_metrics}
+        if len(currencies) > 1:
+            raise ValueError(f"Metrics are in different currencies: {', '.join(sorted(currencies))}")
+        
         # Basic aggregates
         total_value = sum(m.current_value for m in investments_metrics)
         total_invested = sum(m.total_invested for m in investments_metrics)
@@ -589,6 +600,7 @@ def calculate_portfolio_metrics(
             category_allocation=category_allocation,
             best_performer=best_performer,
             worst_performer=worst_performer,
+            currency=currencies.pop(),
         )
 
 
@@ -0,0 +1,311 @@
+"""
+===============================================================================
+FX - Daily exchange rates and vectorized currency conversion
+===============================================================================
+Daily rates live in price_history as USD<CCY> closes (units of CCY per US
+dollar). USDCLP arrives with the market-data refresher; the others come
+from refresh_fx_rates() (Yahoo "<CCY>=X") or a CSV import.
+
+get_fx_rates() preloads them into an FXRateTable: a day x currency matrix of
+units per USD, forward-filled over weekends and holidays. Converting a whole
+valuation series is then one gather from the matrix and a multiply. A
+currency with no stored rates uses FX_FALLBACK_RATES and is listed in
+FXRateTable.estimated, so responses can say the total is approximate.
+
+convert() raises ValueError for a currency the table has no column for.
+Portfolio totals use convert_known() instead: values in such a currency are
+left out and reported per currency, with the fallback-rate currencies that
+were actually used, so one odd holding cannot fail the whole dashboard.
+
+ConvertedSeriesCache keeps converted valuation series per (investment,
+currency) until the rate table is reloaded or any row of the series changes.
+"""
+import asyncio
+import itertools
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .cache import TTLCache
+from .price_store import fetch_yahoo_history, ingest_prices
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+REPORTING_CURRENCY = os.getenv("REPORTING_CURRENCY", "BRL").upper()
+FX_CURRENCIES = [c.strip().upper() for c in os.getenv("FX_CURRENCIES", "BRL,CLP,EUR").split(",") if c.strip()]
+FX_HISTORY_START = date.fromisoformat(os.getenv("FX_HISTORY_START", "2000-01-01"))
+FX_CACHE_SECONDS = float(os.getenv("FX_CACHE_SECONDS", "3600"))
+FX_SERIES_CACHE_SIZE = int(os.getenv("FX_SERIES_CACHE_SIZE", "2048"))
+
+DEFAULT_CURRENCY = "BRL"  # Column default of purchase_currency and valuation currency
+
+# Units per USD used only while a currency has no stored rate
+FX_FALLBACK_RATES = {
+    "BRL": 5.0,
+    "CLP": 935.0,
+    "EUR": 0.92,
+}
+
+_generations = itertools.count(1)
+
+
+def fx_symbol(currency: str) -> str:
+    """price_history symbol holding the CCY-per-USD rate."""
+    return f"USD{currency}"
+
+
+# =============================================================================
+# RATE TABLE
+# =============================================================================
+
+@dataclass
+class PartialConversion:
+    """convert_known() result: NaN where a value had no rate."""
+    values: np.ndarray
+    unconverted: Dict[str, float]  # Original-currency sum of the NaN values, per currency
+    estimated: List[str]  # Currencies used that were converted at FX_FALLBACK_RATES
+
+    def total(self) -> float:
+        return float(np.nansum(self.values))
+
+    def flags(self, *related: "PartialConversion") -> Dict:
+        """
+        Response fields that qualify a converted total; `related` conversions
+        of the same holdings (e.g. purchase prices) add their estimated currencies.
+        """
+        estimated = sorted(set(self.estimated).union(*(r.estimated for r in related)))
+        return {
+            "fx_estimated": estimated,
+            "fx_unconverted": {c: round(v, 2) for c, v in self.unconverted.items()},
+            "total_is_estimated": bool(estimated or self.unconverted),
+        }
+
+
+class FXRateTable:
+    """Units of each currency per USD for every calendar day from `origin`."""
+
+    def __init__(self, origin: date, currencies: Sequence[str], matrix: np.ndarray,
+                 estimated: Iterable[str] = (), last_observed: Optional[date] = None):
+        self.origin = origin
+        self.currencies = list(currencies)
+        self.matrix = matrix
+        self.estimated = sorted(estimated)
+        self.last_observed = last_observed
+        self.generation = next(_generations)  # Keys ConvertedSeriesCache entries
+        self._columns = {c: i for i, c in enumerate(self.currencies)}
+        self._origin64 = np.datetime64(origin, "D")
+
+    @classmethod
+    def build(cls, series: Dict[str, List[Tuple[date, float]]], origin: date = FX_HISTORY_START,
+              last: Optional[date] = None, currencies: Optional[Sequence[str]] = None) -> "FXRateTable":
+        """
+        Matrix from sorted (date, units per USD) points per currency. Days
+        before a currency's first rate use that first rate; a currency with
+        neither rates nor a fallback is left out.
+        """
+        last = last or date.today() + timedelta(days=1)
+        wanted = [c for c in (currencies or FX_CURRENCIES) if c != "USD"]
+        currencies = ["USD"] + [c for c in wanted if series.get(c) or c in FX_FALLBACK_RATES]
+        days = np.arange((last - origin).days + 1)
+        matrix = np.ones((len(days), len(currencies)))
+        estimated = []
+        last_observed = None
+        for col, currency in enumerate(currencies[1:], start=1):
+            points = series.get(currency)
+            if not points:
+                matrix[:, col] = FX_FALLBACK_RATES[currency]
+                estimated.append(currency)
+                continue
+            offsets = np.array([(d - origin).days for d, _ in points])
+            rates = np.array([rate for _, rate in points], dtype=float)
+            matrix[:, col] = rates[np.maximum(np.searchsorted(offsets, days, side="right") - 1, 0)]
+            last_observed = max(last_observed or points[-1][0], points[-1][0])
+        return cls(origin, currencies, matrix, estimated, last_observed)
+
+    def _rows(self, days) -> np.ndarray:
+        offsets = (np.asarray(days, dtype="datetime64[D]") - self._origin64).astype(np.int64)
+        return np.clip(offsets, 0, len(self.matrix) - 1)
+
+    def has_rate(self, currency: Optional[str]) -> bool:
+        return (currency or DEFAULT_CURRENCY).upper() in self._columns
+
+    def _column(self, currency: Optional[str]) -> int:
+        currency = (currency or DEFAULT_CURRENCY).upper()
+        if currency not in self._columns:
+            raise ValueError(f"No exchange rate for {currency}; add it to FX_CURRENCIES")
+        return self._columns[currency]
+
+    def _columns_for(self, currencies: Union[str, None, Sequence[Optional[str]]], size: int) -> np.ndarray:
+        if currencies is None or isinstance(currencies, str):
+            return np.full(size, self._column(currencies))
+        unique, inverse = np.unique(np.array([c or DEFAULT_CURRENCY for c in currencies], dtype=str),
+                                    return_inverse=True)
+        return np.array([self._column(c) for c in unique], dtype=np.int64)[inverse]
+
+    def convert(self, values, from_currencies, to_currencies, days) -> np.ndarray:
+        """
+        Convert values on the given days. Each of `from_currencies` and
+        `to_currencies` is one currency or one per value; `days` is one date
+        per value.
+        """
+        values = np.asarray(values, dtype=float)
+        rows = self._rows(days)
+        source = self.matrix[rows, self._columns_for(from_currencies, len(values))]
+        target = self.matrix[rows, self._columns_for(to_currencies, len(values))]
+        return values * target / source
+
+    def convert_known(self, values, from_currencies: Sequence[Optional[str]], to_currency: str,
+                      days, skip: Optional[Sequence[bool]] = None) -> PartialConversion:
+        """
+        convert() for one target currency, without failing on source
+        currencies the table has no rates for: their values come back as NaN
+        and are summed per currency in `unconverted`. Values flagged in
+        `skip` (e.g. a holding whose history cannot be converted) are
+        treated the same way.
+        """
+        values = np.asarray(values, dtype=float)
+        codes = [(c or DEFAULT_CURRENCY).upper() for c in from_currencies]
+        known = np.array([c in self._columns for c in codes], dtype=bool)
+        if skip is not None:
+            known &= ~np.asarray(skip, dtype=bool)
+        converted = np.full(len(values), np.nan)
+        if known.any():
+            converted[known] = self.convert(
+                values[known], [c for c, ok in zip(codes, known) if ok], to_currency,
+                np.asarray(days, dtype="datetime64[D]")[known],
+            )
+        unconverted: Dict[str, float] = {}
+        for code, value, ok in zip(codes, values.tolist(), known.tolist()):
+            if not ok:
+                unconverted[code] = unconverted.get(code, 0.0) + value
+        used = {c for c, ok in zip(codes, known) if ok} | {to_currency.upper()}
+        return PartialConversion(converted, unconverted, sorted(used & set(self.estimated)))
+
+    def convert_value(self, value: float, from_currency: Optional[str], to_currency: str, day: date) -> float:
+        if (from_currency or DEFAULT_CURRENCY).upper() == to_currency.upper():
+            return value
+        return float(self.convert([value], from_currency, to_currency, [day])[0])
+
+    def rates(self, day: date, base: str = "USD") -> Dict[str, float]:
+        """Units of each currency per one `base` on `day`."""
+        row = self.matrix[self._rows([day])[0]]
+        return {c: float(row[i] / row[self._column(base)]) for c, i in self._columns.items()}
+
+
+class ConvertedSeriesCache:
+    """LRU of converted valuation series keyed by (investment_id, currency)."""
+
+    def __init__(self, max_entries: int = FX_SERIES_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[Tuple, List[Tuple[date, float]]]]" = OrderedDict()
+
+    def get(self, investment_id, currency: str, rows: Sequence[Tuple[date, float, Optional[str]]],
+            table: FXRateTable) -> List[Tuple[date, float]]:
+        """
+        (date, value) pairs of `rows` (date, value, currency) in `currency`.
+        Reused while the table and every row of the series are unchanged
+        (hashing the rows is far cheaper than converting them).
+        """
+        key = (investment_id, currency)
+        fingerprint = (table.generation, len(rows), hash(tuple(tuple(r) for r in rows)))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        days = [r[0] for r in rows]
+        values = table.convert([r[1] for r in rows], [r[2] for r in rows], currency, days) if rows else []
+        converted = list(zip(days, [float(v) for v in values]))
+        self._entries[key] = (fingerprint, converted)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return converted
+
+    def clear(self):
+        self._entries.clear()
+
+
+converted_series = ConvertedSeriesCache()
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+async def load_fx_rates(session) -> FXRateTable:
+    """Read every configured USD<CCY> series from price_history in one query."""
+    from sqlalchemy import select
+    from models import PriceHistory
+
+    currencies = {fx_symbol(c): c for c in FX_CURRENCIES if c != "USD"}
+    result = await session.execute(
+        select(PriceHistory.symbol, PriceHistory.price_date, PriceHistory.close)
+        .where(PriceHistory.symbol.in_(currencies), PriceHistory.price_date >= FX_HISTORY_START)
+        .order_by(PriceHistory.symbol, PriceHistory.price_date)
+    )
+    series: Dict[str, List[Tuple[date, float]]] = {}
+    for symbol, price_date, close in result.all():
+        series.setdefault(currencies[symbol], []).append((price_date, float(close)))
+    return FXRateTable.build(series)
+
+
+_cache: TTLCache[FXRateTable] = TTLCache(load_fx_rates, FX_CACHE_SECONDS)
+
+
+async def get_fx_rates(session, max_age_seconds: float = FX_CACHE_SECONDS) -> FXRateTable:
+    """Process-wide FXRateTable, reloaded when older than max_age_seconds."""
+    return await _cache.get(session, max_age_seconds)
+
+
+def invalidate_fx_rates():
+    _cache.invalidate()
+    converted_series.clear()
+
+
+# =============================================================================
+# REFRESH
+# =============================================================================
+
+async def refresh_fx_rates(session, end: Optional[date] = None) -> Dict[str, int]:
+    """
+    Fill each currency's gaps before its first and after its last stored rate,
+    from FX_HISTORY_START to `end` (default today), from Yahoo. A failing
+    currency is logged and skipped. Returns the bars written per currency; the
+    caller commits and invalidates the cache.
+    """
+    from sqlalchemy import func, select
+    from models import PriceHistory
+
+    end = end or date.today()
+    written = {}
+    for currency in FX_CURRENCIES:
+        if currency == "USD":
+            continue
+        symbol = fx_symbol(currency)
+        first, last = (await session.execute(
+            select(func.min(PriceHistory.price_date), func.max(PriceHistory.price_date))
+            .where(PriceHistory.symbol == symbol)
+        )).one()
+        gaps = [(FX_HISTORY_START, end)] if first is None else [
+            (FX_HISTORY_START, first - timedelta(days=1)),
+            (last + timedelta(days=1), end),
+        ]
+        bars = []
+        try:
+            for start, stop in gaps:
+                if start <= stop:
+                    bars += await asyncio.to_thread(
+                        fetch_yahoo_history, f"{currency}=X", start, stop, symbol=symbol, currency=currency
+                    )
+        except Exception as exc:
+            print(f"[FX] {symbol} refresh failed: {exc}")
+        written[currency] = await ingest_prices(session, bars)
+    return written
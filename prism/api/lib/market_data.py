@@ -0,0 +1,484 @@
+"""
+===============================================================================
+MARKET DATA - Background quote refresher and persisted price cache
+===============================================================================
+Quotes are fetched off the request path. MarketDataRefresher polls the quote
+sources every MARKET_DATA_REFRESH_SECONDS and writes the latest quote per
+symbol to the market_quotes table plus a Redis snapshot; the dashboard
+endpoint only reads that snapshot.
+
+- one API replica refreshes per interval: the age of the newest stored
+  quote decides whether to fetch, and the fetched quotes are saved under
+  pg_try_advisory_xact_lock after re-checking that age, so no lock or
+  transaction is held across the network calls
+- a symbol the sources fail to return keeps its last stored quote, so a
+  Yahoo throttle shows older prices instead of no prices
+- build_market_payload() reports stale_as_of when a quote is older than
+  MARKET_DATA_STALE_SECONDS
+- StubQuoteSource serves fixed prices for tests and offline development
+  (MARKET_DATA_SOURCE=stub)
+"""
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from .background import BackgroundLoop
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MARKET_DATA_REFRESH_ENABLED = os.getenv("MARKET_DATA_REFRESH_ENABLED", "true").lower() == "true"
+MARKET_DATA_REFRESH_SECONDS = float(os.getenv("MARKET_DATA_REFRESH_SECONDS", "300"))
+MARKET_DATA_STALE_SECONDS = float(os.getenv("MARKET_DATA_STALE_SECONDS", "900"))
+MARKET_DATA_SOURCE = os.getenv("MARKET_DATA_SOURCE", "live")  # live | stub
+
+MARKET_QUOTES_REDIS_KEY = "market_quotes:v1"
+MARKET_DATA_LOCK_ID = 0x4D4B54  # "MKT", advisory lock key for the refresher
+QUOTE_AGE_SQL = "SELECT EXTRACT(EPOCH FROM NOW() - MAX(fetched_at)) FROM market_quotes"
+
+USD_CLP = "USDCLP"
+YAHOO_SYMBOLS = ["GC=F", "SI=F", "^IXIC", "CL=F", "HG=F", "ALB"]
+MARKET_SYMBOLS = YAHOO_SYMBOLS + [USD_CLP]
+
+GRAMS_PER_TROY_OUNCE = 31.1034768
+KG_PER_POUND = 0.453592
+
+_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/125.0.0.0 Safari/537.36"
+)
+
+
+# =============================================================================
+# DATA CLASSES
+# =============================================================================
+
+@dataclass
+class Quote:
+    """Latest price of one symbol."""
+    symbol: str
+    price: float
+    previous_close: Optional[float]
+    source: str
+    fetched_at: datetime
+    currency: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "symbol": self.symbol,
+            "price": self.price,
+            "previous_close": self.previous_close,
+            "source": self.source,
+            "fetched_at": self.fetched_at.isoformat(),
+            "currency": self.currency,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Quote":
+        return cls(
+            symbol=data["symbol"],
+            price=float(data["price"]),
+            previous_close=float(data["previous_close"]) if data.get("previous_close") is not None else None,
+            source=data["source"],
+            fetched_at=datetime.fromisoformat(data["fetched_at"]),
+            currency=data.get("currency"),
+        )
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# =============================================================================
+# QUOTE SOURCES
+# =============================================================================
+
+class QuoteSource(ABC):
+    """Fetches quotes for the symbols it knows; missing symbols are left out."""
+    name = "base"
+
+    @abstractmethod
+    async def fetch(self, symbols: List[str]) -> Dict[str, Quote]:
+        pass
+
+
+class YahooQuoteSource(QuoteSource):
+    """yfinance (run in a thread), falling back to the raw chart API over httpx."""
+    name = "yahoo"
+
+    async def fetch(self, symbols: List[str]) -> Dict[str, Quote]:
+        symbols = [s for s in symbols if s in YAHOO_SYMBOLS]
+        if not symbols:
+            return {}
+        try:
+            quotes = await asyncio.to_thread(self._fetch_yfinance, symbols)
+            if quotes:
+                return quotes
+        except Exception as exc:
+            print(f"[Yahoo] yfinance failed: {exc}")
+        print("[Yahoo] Falling back to httpx...")
+        return await self._fetch_httpx(symbols)
+
+    def _fetch_yfinance(self, symbols: List[str]) -> Dict[str, Quote]:
+        import yfinance as yf
+
+        quotes = {}
+        tickers = yf.Tickers(" ".join(symbols))
+        for sym in symbols:
+            try:
+                info = tickers.tickers[sym].fast_info
+                price = getattr(info, "last_price", None)
+                prev = getattr(info, "previous_close", None)
+                if price is not None:
+                    quotes[sym] = Quote(sym, float(price), float(prev) if prev else None,
+                                        self.name, _now(), getattr(info, "currency", None))
+            except Exception as exc:
+                print(f"[yfinance] Error for {sym}: {exc}")
+        return quotes
+
+    async def _fetch_httpx(self, symbols: List[str]) -> Dict[str, Quote]:
+        import httpx
+        from urllib.parse import quote
+
+        quotes = {}
+        try:
+            async with httpx.AsyncClient(
+                timeout=12.0, follow_redirects=True, headers={"User-Agent": _USER_AGENT}
+            ) as client:
+                try:
+                    await client.get("https://fc.yahoo.com")  # Session cookies
+                except httpx.HTTPError:
+                    pass
+
+                async def fetch_one(sym: str) -> Optional[Quote]:
+                    try:
+                        url = (f"https://query2.finance.yahoo.com/v8/finance/chart/"
+                               f"{quote(sym, safe='')}?interval=1d&range=2d")
+                        resp = await client.get(url)
+                        if resp.status_code != 200:
+                            return None
+                        meta = resp.json().get("chart", {}).get("result", [{}])[0].get("meta", {})
+                        price = meta.get("regularMarketPrice")
+                        if not price:
+                            return None
+                        prev = meta.get("chartPreviousClose") or meta.get("previousClose")
+                        return Quote(sym, float(price), float(prev) if prev else None,
+                                     self.name, _now(), meta.get("currency"))
+                    except Exception as exc:
+                        print(f"[Yahoo httpx] Error {sym}: {exc}")
+                        return None
+
+                for result in await asyncio.gather(*[fetch_one(s) for s in symbols]):
+                    if result is not None:
+                        quotes[result.symbol] = result
+        except Exception as exc:
+            print(f"[Yahoo httpx] Session error: {exc}")
+        return quotes
+
+
+class MindicadorSource(QuoteSource):
+    """USD/CLP observed rate from mindicador.cl."""
+    name = "mindicador"
+
+    async def fetch(self, symbols: List[str]) -> Dict[str, Quote]:
+        if USD_CLP not in symbols:
+            return {}
+        import httpx
+
+        try:
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                response = await client.get("https://mindicador.cl/api/dolar")
+                if response.status_code == 200:
+                    serie = response.json().get("serie", [])
+                    if serie and serie[0].get("valor"):
+                        prev = serie[1].get("valor") if len(serie) > 1 else None
+                        return {USD_CLP: Quote(USD_CLP, float(serie[0]["valor"]),
+                                               float(prev) if prev else None, self.name, _now(), "CLP")}
+        except Exception as exc:
+            print(f"[Mindicador] Error: {exc}")
+        return {}
+
+
+STUB_PRICES = {
+    "GC=F": (2350.0, 2340.0),
+    "SI=F": (29.5, 29.1),
+    "^IXIC": (17800.0, 17650.0),
+    "CL=F": (78.2, 77.9),
+    "HG=F": (4.5, 4.45),
+    "ALB": (98.0, 97.0),
+    USD_CLP: (935.0, 930.0),
+}
+STUB_CURRENCIES = {USD_CLP: "CLP"}  # Everything else is quoted in USD
+
+
+class StubQuoteSource(QuoteSource):
+    """Fixed prices in `currencies[symbol]` (else USD), no network. `failing` symbols are never returned."""
+    name = "stub"
+
+    def __init__(self, prices: Optional[Dict[str, tuple]] = None, failing: Iterable[str] = (),
+                 currencies: Optional[Dict[str, str]] = None):
+        self.prices = dict(STUB_PRICES if prices is None else prices)
+        self.failing = set(failing)
+        self.currencies = dict(STUB_CURRENCIES if currencies is None else currencies)
+        self.calls = 0
+
+    async def fetch(self, symbols: List[str]) -> Dict[str, Quote]:
+        self.calls += 1
+        return {
+            sym: Quote(sym, price, prev, self.name, _now(), self.currencies.get(sym, "USD"))
+            for sym, (price, prev) in self.prices.items()
+            if sym in symbols and sym not in self.failing
+        }
+
+
+def default_sources() -> List[QuoteSource]:
+    if MARKET_DATA_SOURCE == "stub":
+        return [StubQuoteSource()]
+    return [YahooQuoteSource(), MindicadorSource()]
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class QuoteStore:
+    """market_quotes rows (durable) plus a Redis snapshot (what the endpoint reads)."""
+
+    def __init__(self, session_factory, redis=None):
+        self.session_factory = session_factory
+        self.redis = redis  # Async client, decode_responses=True
+
+    async def refresh_due(self, min_age_seconds: float) -> bool:
+        """Whether the newest stored quote is at least min_age_seconds old. Takes no lock."""
+        from sqlalchemy import text
+
+        async with self.session_factory() as session:
+            age = (await session.execute(text(QUOTE_AGE_SQL))).scalar()
+        return age is None or float(age) >= min_age_seconds
+
+    @asynccontextmanager
+    async def refresh_slot(self, min_age_seconds: float) -> AsyncIterator[Optional[object]]:
+        """
+        Short transaction holding the refresher lock, for saving quotes that
+        were already fetched; yields None if another replica holds it or
+        refreshed less than min_age_seconds ago.
+        """
+        from sqlalchemy import text
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                locked = (await session.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {"lock_id": MARKET_DATA_LOCK_ID}
+                )).scalar()
+                age = None
+                if locked:
+                    age = (await session.execute(text(QUOTE_AGE_SQL))).scalar()
+                if not locked or (age is not None and float(age) < min_age_seconds):
+                    yield None
+                else:
+                    yield session
+
+    async def save(self, session, quotes: Dict[str, Quote]):
+        """Upsert quotes, and today's price_history bar, inside the refresh transaction."""
+        if not quotes:
+            return
+        from sqlalchemy.dialects.postgresql import insert
+        from models import MarketQuote
+        from lib.price_store import PriceBar, ingest_prices
+
+        stmt = insert(MarketQuote).values([
+            {
+                "symbol": q.symbol,
+                "price": q.price,
+                "previous_close": q.previous_close,
+                "currency": q.currency,
+                "source": q.source,
+                "fetched_at": q.fetched_at,
+            }
+            for q in quotes.values()
+        ])
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[MarketQuote.symbol],
+            set_={col: stmt.excluded[col] for col in ("price", "previous_close", "currency", "source", "fetched_at")},
+        ))
+        await ingest_prices(session, [
+            PriceBar(q.symbol, q.fetched_at.date(), q.price, q.currency, q.source) for q in quotes.values()
+        ])
+
+    async def load_from_db(self) -> Dict[str, Quote]:
+        from sqlalchemy import select
+        from models import MarketQuote
+
+        async with self.session_factory() as session:
+            rows = (await session.execute(select(MarketQuote))).scalars().all()
+        return {
+            row.symbol: Quote(
+                row.symbol,
+                float(row.price),
+                float(row.previous_close) if row.previous_close is not None else None,
+                row.source,
+                row.fetched_at,
+                row.currency,
+            )
+            for row in rows
+        }
+
+    async def publish(self, quotes: Dict[str, Quote]):
+        """Replace the Redis snapshot with the full set of stored quotes."""
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(MARKET_QUOTES_REDIS_KEY, json.dumps([q.to_dict() for q in quotes.values()]))
+        except Exception as exc:
+            print(f"[MarketData] Redis snapshot write failed: {exc}")
+
+    async def load(self) -> Dict[str, Quote]:
+        """Redis snapshot; on a miss the table, which then refills the snapshot."""
+        if self.redis is not None:
+            try:
+                blob = await self.redis.get(MARKET_QUOTES_REDIS_KEY)
+                if blob:
+                    return {d["symbol"]: Quote.from_dict(d) for d in json.loads(blob)}
+            except Exception as exc:
+                print(f"[MarketData] Redis snapshot read failed: {exc}")
+        quotes = await self.load_from_db()
+        if quotes:
+            await self.publish(quotes)
+        return quotes
+
+
+# =============================================================================
+# REFRESHER
+# =============================================================================
+
+class MarketDataRefresher(BackgroundLoop):
+    """Polls the quote sources on its own schedule; start() from the API lifespan."""
+    name = "market-data-refresher"
+    log_prefix = "MarketData"
+
+    def __init__(
+        self,
+        store: QuoteStore,
+        sources: Optional[List[QuoteSource]] = None,
+        symbols: Optional[List[str]] = None,
+        interval_seconds: float = MARKET_DATA_REFRESH_SECONDS,
+    ):
+        super().__init__(interval_seconds)
+        self.store = store
+        self.sources = sources if sources is not None else default_sources()
+        self.symbols = symbols or MARKET_SYMBOLS
+
+    async def fetch(self) -> Dict[str, Quote]:
+        """Quotes from every source; a failing source contributes nothing."""
+        results = await asyncio.gather(*[s.fetch(self.symbols) for s in self.sources], return_exceptions=True)
+        quotes: Dict[str, Quote] = {}
+        for source, result in zip(self.sources, results):
+            if isinstance(result, Exception):
+                print(f"[MarketData] {source.name} failed: {result}")
+                continue
+            for sym, q in result.items():
+                quotes.setdefault(sym, q)
+        return quotes
+
+    async def refresh_once(self) -> Optional[Dict[str, Quote]]:
+        """
+        Fetch when the stored quotes are due, then save them if this replica
+        wins the slot. Returns the fetched quotes, or None if skipped or
+        another replica saved first.
+        """
+        # Slightly under the interval, so jittered replicas don't skip a round
+        min_age = self.interval_seconds * 0.8
+        if not await self.store.refresh_due(min_age):
+            return None
+        quotes = await self.fetch()
+        missing = sorted(set(self.symbols) - set(quotes))
+        if missing:
+            print(f"[MarketData] No quote for {', '.join(missing)}; keeping the stored ones")
+        async with self.store.refresh_slot(min_age) as session:
+            if session is None:
+                return None
+            await self.store.save(session, quotes)
+        await self.store.publish(await self.store.load_from_db())
+        return quotes
+
+    async def run_once(self) -> Optional[Dict[str, Quote]]:
+        return await self.refresh_once()
+
+
+_store: Optional[QuoteStore] = None
+
+
+def get_quote_store() -> QuoteStore:
+    """Store bound to the API's async engine and Redis."""
+    global _store
+    if _store is None:
+        from database import AsyncSessionLocal, get_async_redis
+        _store = QuoteStore(AsyncSessionLocal, get_async_redis())
+    return _store
+
+
+# =============================================================================
+# DASHBOARD PAYLOAD
+# =============================================================================
+
+def build_market_payload(
+    quotes: Dict[str, Quote],
+    now: Optional[datetime] = None,
+    stale_seconds: float = MARKET_DATA_STALE_SECONDS,
+) -> Dict:
+    """
+    The /dashboard/market-data response from stored quotes. as_of is the
+    newest quote time; stale_as_of is the oldest quote time when any quote is
+    older than stale_seconds (None when everything is fresh).
+    """
+    now = now or _now()
+
+    def price(sym: str) -> Optional[float]:
+        q = quotes.get(sym)
+        return q.price if q else None
+
+    usd_rate = price(USD_CLP)
+    gold_usd_oz = price("GC=F")
+    silver_usd_oz = price("SI=F")
+    copper_usd_lb = price("HG=F")
+
+    nasdaq = quotes.get("^IXIC")
+    nasdaq_change_pct = None
+    if nasdaq and nasdaq.previous_close:
+        nasdaq_change_pct = round((nasdaq.price - nasdaq.previous_close) / nasdaq.previous_close * 100, 2)
+
+    gold_clp_per_gram = gold_usd_oz * usd_rate / GRAMS_PER_TROY_OUNCE if usd_rate and gold_usd_oz else None
+    silver_clp_per_gram = silver_usd_oz * usd_rate / GRAMS_PER_TROY_OUNCE if usd_rate and silver_usd_oz else None
+
+    times = [q.fetched_at for q in quotes.values()]
+    oldest = min(times) if times else None
+    stale = oldest is not None and now - oldest > timedelta(seconds=stale_seconds)
+
+    return {
+        "usd_clp_rate": usd_rate,
+        "gold_clp_per_gram": round(gold_clp_per_gram, 2) if gold_clp_per_gram else None,
+        "silver_clp_per_gram": round(silver_clp_per_gram, 2) if silver_clp_per_gram else None,
+        "gold_usd_per_oz": gold_usd_oz,
+        "silver_usd_per_oz": silver_usd_oz,
+        "nasdaq_price": nasdaq.price if nasdaq else None,
+        "nasdaq_change_pct": nasdaq_change_pct,
+        "oil_usd_bbl": price("CL=F"),
+        "copper_usd_lb": copper_usd_lb,
+        "copper_usd_kg": round(copper_usd_lb / KG_PER_POUND, 2) if copper_usd_lb else None,
+        "lithium_proxy_usd": price("ALB"),
+        "as_of": max(times).isoformat() if times else None,
+        "stale_as_of": oldest.isoformat() if stale else None,
+    }
+
+
+async def read_market_data(store: Optional[QuoteStore] = None) -> Dict:
+    """Dashboard market data from the persisted cache; never calls a quote source."""
+    return build_market_payload(await (store or get_quote_store()).load())
@@ -0,0 +1,317 @@
+"""
+===============================================================================
+PRICE STORE - Daily close history and bulk mark-to-market revaluation
+===============================================================================
+Closes per (symbol, date) live in price_history. They arrive from CSV
+imports, from the market-data refresher (today's bar, updated through the
+day) or from StubPriceSource for tests and offline development.
+
+Symbols are stored trimmed and upper-case (normalize_symbol), on price bars
+and on investments alike, so "gc=f" and "GC=F" name the same series.
+
+Investments with a symbol and quantity are revalued in bulk: one DELETE and
+one INSERT of ValuationHistory rows (method "mark_to_market") per run over a
+date window, so reruns and backfills are idempotent and manual valuations
+are never touched. This gives the analytics endpoints dense histories
+without hand-entered valuations. A bar without a currency is never used
+for a valuation: guessing the holding's currency would silently mislabel
+a USD close as BRL.
+"""
+import csv
+import io
+import os
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .background import BackgroundLoop
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+REVALUATION_ENABLED = os.getenv("REVALUATION_ENABLED", "true").lower() == "true"
+REVALUATION_INTERVAL_SECONDS = float(os.getenv("REVALUATION_INTERVAL_SECONDS", "3600"))
+REVALUATION_LOOKBACK_DAYS = int(os.getenv("REVALUATION_LOOKBACK_DAYS", "7"))  # Window rewritten per run
+
+REVALUATION_METHOD = "mark_to_market"
+REVALUATION_LOCK_ID = 0x524556  # "REV", advisory lock key for the revaluation job
+PRICE_INGEST_BATCH_ROWS = 1000
+
+
+# =============================================================================
+# DATA CLASSES
+# =============================================================================
+
+@dataclass(frozen=True)
+class PriceBar:
+    """Close of one symbol on one day."""
+    symbol: str
+    price_date: date
+    close: float
+    currency: Optional[str] = None
+    source: str = "csv"
+
+
+def normalize_symbol(symbol: Optional[str]) -> Optional[str]:
+    """Trimmed, upper-case symbol; None when empty."""
+    symbol = (symbol or "").strip().upper()
+    return symbol or None
+
+
+# =============================================================================
+# SOURCES
+# =============================================================================
+
+def parse_price_csv(text: str, symbol: Optional[str] = None, source: str = "csv",
+                    currency: Optional[str] = None) -> List[PriceBar]:
+    """
+    Bars from CSV with columns symbol,date,close[,currency] (case-insensitive).
+    Single-symbol exports without a symbol column (e.g. Yahoo's Date,...,Close)
+    need `symbol`; rows without a currency get `currency`. Rows with an empty
+    or "null" close are skipped.
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    if reader.fieldnames is None:
+        return []
+    columns = {name.strip().lower(): name for name in reader.fieldnames}
+    missing = [c for c in ("date", "close") if c not in columns]
+    if "symbol" not in columns and not symbol:
+        missing.append("symbol")
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+
+    bars = []
+    for line, row in enumerate(reader, start=2):
+        close = (row.get(columns["close"]) or "").strip()
+        if not close or close.lower() == "null":
+            continue
+        row_symbol = (row.get(columns["symbol"]) or "").strip() if "symbol" in columns else ""
+        row_currency = (row.get(columns["currency"]) or "").strip() if "currency" in columns else ""
+        try:
+            bars.append(PriceBar(
+                symbol=normalize_symbol(row_symbol or symbol),
+                price_date=date.fromisoformat(row[columns["date"]].strip()[:10]),
+                close=float(close),
+                currency=(row_currency or currency or "").upper() or None,
+                source=source,
+            ))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"CSV line {line}: {e}")
+    return bars
+
+
+class StubPriceSource:
+    """Deterministic daily random walk per symbol (weekdays only), no network.
+    Bars are in `currencies[symbol]`, else USD."""
+
+    def __init__(self, start_prices: Optional[Dict[str, float]] = None, volatility: float = 0.01,
+                 currencies: Optional[Dict[str, str]] = None):
+        self.start_prices = start_prices or {}
+        self.volatility = volatility
+        self.currencies = currencies or {}
+
+    def history(self, symbol: str, start: date, end: date) -> List[PriceBar]:
+        rng = random.Random(symbol)  # Same symbol, same series
+        price = self.start_prices.get(symbol, 100.0)
+        currency = self.currencies.get(symbol, "USD")
+        bars = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                bars.append(PriceBar(symbol, day, round(price, 6), currency, "stub"))
+                price *= 1 + rng.gauss(0, self.volatility)
+            day += timedelta(days=1)
+        return bars
+
+
+def fetch_yahoo_history(ticker: str, start: date, end: date, symbol: Optional[str] = None,
+                        currency: Optional[str] = None) -> List[PriceBar]:
+    """Daily closes of a Yahoo ticker, stored as `symbol` (blocking; run in a thread)."""
+    import yfinance as yf
+
+    frame = yf.Ticker(ticker).history(start=start.isoformat(), end=(end + timedelta(days=1)).isoformat())
+    return [
+        PriceBar(symbol or ticker, ts.date(), round(float(close), 6), currency, "yahoo")
+        for ts, close in frame["Close"].dropna().items()
+    ]
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+async def ingest_prices(session, bars: Iterable[PriceBar]) -> int:
+    """Upsert bars in batches of PRICE_INGEST_BATCH_ROWS; returns the rows written."""
+    from sqlalchemy.dialects.postgresql import insert
+    from models import PriceHistory
+
+    # ON CONFLICT cannot touch one row twice per statement; the last bar wins
+    latest: Dict[Tuple[str, date], PriceBar] = {}
+    for bar in bars:
+        latest[(normalize_symbol(bar.symbol), bar.price_date)] = bar
+    rows = [
+        {"symbol": symbol, "price_date": b.price_date, "close": b.close, "currency": b.currency, "source": b.source}
+        for (symbol, _), b in latest.items()
+    ]
+    for start in range(0, len(rows), PRICE_INGEST_BATCH_ROWS):
+        stmt = insert(PriceHistory).values(rows[start:start + PRICE_INGEST_BATCH_ROWS])
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[PriceHistory.symbol, PriceHistory.price_date],
+            set_={col: stmt.excluded[col] for col in ("close", "currency", "source")},
+        ))
+    return len(rows)
+
+
+async def price_series(session, symbol: str, start: Optional[date] = None,
+                       end: Optional[date] = None) -> List[Tuple[date, float]]:
+    """(date, close) pairs for a symbol, oldest first."""
+    from sqlalchemy import select
+    from models import PriceHistory
+
+    query = select(PriceHistory.price_date, PriceHistory.close).where(PriceHistory.symbol == normalize_symbol(symbol))
+    if start:
+        query = query.where(PriceHistory.price_date >= start)
+    if end:
+        query = query.where(PriceHistory.price_date <= end)
+    result = await session.execute(query.order_by(PriceHistory.price_date))
+    return [(d, float(close)) for d, close in result.all()]
+
+
+# =============================================================================
+# REVALUATION
+# =============================================================================
+
+def build_valuation_rows(holdings: Iterable, bars: Iterable) -> List[Dict]:
+    """
+    ValuationHistory rows for every (holding, bar) pair with the holding's
+    symbol (compared normalized). Holdings need id, symbol, quantity; bars
+    need symbol, price_date, close, currency, source. Bars without a
+    currency are skipped.
+    """
+    by_symbol: Dict[str, List] = {}
+    for bar in bars:
+        if bar.currency:
+            by_symbol.setdefault(normalize_symbol(bar.symbol), []).append(bar)
+    rows = []
+    for holding in holdings:
+        symbol = normalize_symbol(holding.symbol)
+        quantity = Decimal(str(holding.quantity))
+        for bar in by_symbol.get(symbol, []):
+            close = Decimal(str(bar.close))
+            rows.append({
+                "investment_id": holding.id,
+                "valuation_date": bar.price_date,
+                "value": (quantity * close).quantize(Decimal("0.01")),
+                "currency": bar.currency,
+                "valuation_method": REVALUATION_METHOD,
+                "valuer_name": bar.source,
+                "notes": f"{quantity.normalize():f} x {symbol} @ {close.normalize():f}",
+                "created_by": "revaluation",
+            })
+    return rows
+
+
+async def revalue_investments(session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Rewrite mark-to-market valuations of every priced active investment for
+    each price date in [start, end] (default: the last REVALUATION_LOOKBACK_DAYS
+    days). The newest value, converted to the purchase currency, also becomes
+    current_value. Returns the number of valuation rows written.
+    """
+    from sqlalchemy import delete, insert, select, text, update
+    from models import Investment, InvestmentStatus, PriceHistory, ValuationHistory
+    from lib.fx import get_fx_rates
+
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=REVALUATION_LOOKBACK_DAYS)
+
+    # Serialize with the background job and other replicas (released at commit)
+    await session.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": REVALUATION_LOCK_ID})
+
+    holdings = (await session.execute(
+        select(Investment.id, Investment.symbol, Investment.quantity, Investment.purchase_currency)
+        .where(
+            Investment.status == InvestmentStatus.ACTIVE,
+            Investment.symbol.is_not(None),
+            Investment.quantity.is_not(None),
+        )
+    )).all()
+    if not holdings:
+        return 0
+    bars = (await session.execute(
+        select(PriceHistory)
+        .where(
+            PriceHistory.symbol.in_({normalize_symbol(h.symbol) for h in holdings}),
+            PriceHistory.price_date.between(start, end),
+        )
+        .order_by(PriceHistory.price_date)
+    )).scalars().all()
+    unpriced = sorted({bar.symbol for bar in bars if not bar.currency})
+    if unpriced:
+        print(f"[Revaluation] Skipping closes without a currency for {', '.join(unpriced)}; re-import them with one")
+
+    rows = build_valuation_rows(holdings, bars)
+    await session.execute(
+        delete(ValuationHistory).where(
+            ValuationHistory.investment_id.in_([h.id for h in holdings]),
+            ValuationHistory.valuation_method == REVALUATION_METHOD,
+            ValuationHistory.valuation_date.between(start, end),
+        )
+    )
+    if not rows:
+        return 0
+    await session.execute(insert(ValuationHistory), rows)
+
+    # Rows are date-ordered, so the last one per investment is the newest;
+    # current_value is kept in the purchase currency
+    currencies = {h.id: h.purchase_currency for h in holdings}
+    latest = list({row["investment_id"]: row for row in rows}.values())
+    fx = await get_fx_rates(session)
+    try:
+        values = fx.convert(
+            [float(row["value"]) for row in latest], [row["currency"] for row in latest],
+            [currencies[row["investment_id"]] for row in latest], [row["valuation_date"] for row in latest],
+        )
+    except ValueError as exc:
+        print(f"[Revaluation] current_value not updated: {exc}")
+        return len(rows)
+    await session.execute(update(Investment), [
+        {
+            "id": row["investment_id"],
+            "current_value": Decimal(str(value)).quantize(Decimal("0.01")),
+            "last_valuation_date": row["valuation_date"],
+        }
+        for row, value in zip(latest, values.tolist())
+    ])
+    return len(rows)
+
+
+class RevaluationJob(BackgroundLoop):
+    """Runs revalue_investments every REVALUATION_INTERVAL_SECONDS; start() from the API lifespan."""
+    name = "revaluation-job"
+    log_prefix = "Revaluation"
+
+    def __init__(self, session_factory, interval_seconds: float = REVALUATION_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.session_factory = session_factory
+
+    async def run_once(self, start: Optional[date] = None, end: Optional[date] = None) -> Optional[int]:
+        """Revalue unless another replica is already doing it (returns None then)."""
+        from sqlalchemy import text
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                locked = (await session.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {"lock_id": REVALUATION_LOCK_ID}
+                )).scalar()
+                if not locked:
+                    return None
+                return await revalue_investments(session, start, end)
+
+    def report(self, written: Optional[int]):
+        if written:
+            print(f"[Revaluation] Wrote {written} mark-to-market valuations")
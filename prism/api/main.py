@@ -14,9 +14,12 @@
 
 # Import logging configuration first (configures structlog)
 from logging_config import get_logger, configure_logging
-from database import async_engine, Base, redis_client
+from database import async_engine, AsyncSessionLocal, Base, redis_client
 from routers import investments, files, analysis, dashboard, uploads, chat, health, analytics
 from middleware import MetricsMiddleware, LoggingMiddleware, CacheControlMiddleware
+from lib.market_data import MARKET_DATA_REFRESH_ENABLED, MarketDataRefresher, get_quote_store
+from lib.price_store import REVALUATION_ENABLED, RevaluationJob
+from lib.benchmarks import BENCHMARK_REFRESH_ENABLED, BenchmarkRefresher
 
 # Configure logging on startup
 configure_logging()
@@ -58,12 +61,39 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning("database_connection_failed", error=str(e), message="⚠️ Database connection failed")
     
+    # Market quotes are fetched in the background, never on the request path
+    refresher = None
+    if MARKET_DATA_REFRESH_ENABLED:
+        refresher = MarketDataRefresher(get_quote_store())
+        refresher.start()
+        logger.info("market_data_refresher_started", interval_seconds=refresher.interval_seconds)
+    
+    # Mark-to-market valuations for investments with a symbol and quantity
+    revaluation = None
+    if REVALUATION_ENABLED:
+        revaluation = RevaluationJob(AsyncSessionLocal)
+        revaluation.start()
+        logger.info("revaluation_job_started", interval_seconds=revaluation.interval_seconds)
+    
+    # CDI/Selic/IPCA/S&P 500 levels for the analytics comparisons
+    benchmark_refresher = None
+    if BENCHMARK_REFRESH_ENABLED:
+        benchmark_refresher = BenchmarkRefresher(AsyncSessionLocal)
+        benchmark_refresher.start()
+        logger.info("benchmark_refresher_started", interval_seconds=benchmark_refresher.interval_seconds)
+    
     logger.info("api_started", message="✅ NEXUS API ready")
     
     yield
     
     # Shutdown
     logger.info("api_shutting_down", message="🛑 Shutting down API...")
+    if refresher:
+        await refresher.stop()
+    if revaluation:
+        await revaluation.stop()
+    if benchmark_refresher:
+        await benchmark_refresher.stop()
     await async_engine.dispose()
     logger.info("api_shutdown_complete", message="✅ API shutdown complete")
 
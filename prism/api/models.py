@@ -135,6 +135,7 @@ class FileRegistry(Base):
         Index('idx_file_registry_status', 'status'),
         Index('idx_file_registry_investment', 'investment_id'),
         Index('idx_file_registry_uploaded_at', uploaded_at.desc()),
+        Index('idx_file_registry_file_hash', 'file_hash'),
     )
 
 
@@ -172,7 +173,7 @@ class ProcessingJob(Base):
     # Relationships
     file = relationship("FileRegistry", back_populates="processing_jobs")
     investment = relationship("Investment", back_populates="processing_jobs")
-    result = relationship("AnalysisResult", back_populates="job", foreign_keys=[result_id], uselist=False)
+    result = relationship("AnalysisResult", foreign_keys=[result_id], uselist=False)
     
     __table_args__ = (
         Index('idx_processing_jobs_status', 'status', 'priority', created_at.desc()),
@@ -196,6 +197,7 @@ class AnalysisResult(Base):
     
     analysis_type = Column(String(50), nullable=False)
     model_version = Column(String(100), nullable=True)
+    provider = Column(String(50), nullable=True)
     
     raw_text = Column(Text, nullable=True)
     structured_data = Column(JSON, default=dict)
@@ -214,7 +216,7 @@ class AnalysisResult(Base):
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     
     # Relationships
-    job = relationship("ProcessingJob", back_populates="result", foreign_keys=[job_id])
+    job = relationship("ProcessingJob", foreign_keys=[job_id])
     file = relationship("FileRegistry", back_populates="analysis_results")
     investment = relationship("Investment", back_populates="analysis_results")
     
@@ -254,6 +256,10 @@ class Investment(Base):
     land_area_hectares = Column(Numeric(10, 4), nullable=True)
     zoning_type = Column(String(100), nullable=True)
     
+    # Market-priced holdings (stocks, gold, crypto): valued at symbol close * quantity
+    symbol = Column(String(32), nullable=True)
+    quantity = Column(Numeric(24, 8), nullable=True)
+    
     ownership_percentage = Column(Numeric(5, 2), default=100.00)
     co_owners = Column(ARRAY(String), default=list)
     
@@ -277,6 +283,7 @@ class Investment(Base):
         Index('idx_investments_category', 'category'),
         Index('idx_investments_status', 'status'),
         Index('idx_investments_location', 'state', 'city'),
+        Index('idx_investments_symbol', 'symbol'),
     )
 
 
@@ -373,3 +380,41 @@ class ActivityLog(Base):
         Index('idx_activity_entity', 'entity_type', 'entity_id'),
         Index('idx_activity_time', performed_at.desc()),
     )
+
+
+# =============================================================================
+# MARKET QUOTES
+# =============================================================================
+
+class MarketQuote(Base):
+    """Latest quote per symbol, written by the market-data refresher."""
+    __tablename__ = "market_quotes"
+    
+    symbol = Column(String(32), primary_key=True)  # Yahoo symbol, or USDCLP
+    price = Column(Numeric(18, 6), nullable=False)
+    previous_close = Column(Numeric(18, 6), nullable=True)
+    currency = Column(String(3), nullable=True)
+    source = Column(String(50), nullable=False)  # yahoo, mindicador, stub
+    
+    fetched_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_market_quotes_fetched_at', 'fetched_at'),
+    )
+
+
+# =============================================================================
+# PRICE HISTORY
+# =============================================================================
+
+class PriceHistory(Base):
+    """Daily close per symbol (CSV imports, stub source, market-data refresher)."""
+    __tablename__ = "price_history"
+    
+    symbol = Column(String(32), primary_key=True)
+    price_date = Column(Date, primary_key=True)
+    close = Column(Numeric(18, 6), nullable=False)
+    currency = Column(String(3), nullable=True)
+    source = Column(String(50), nullable=False)  # csv, stub, yahoo, mindicador
+    
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -4,10 +4,13 @@
 ===============================================================================
 """
 import sys
+from pathlib import Path
 
 # Add paths for imports
 sys.path.insert(0, '/home/hinoki/HinokiDEV/Investments/prism/api')
 sys.path.insert(0, '/home/hinoki/HinokiDEV/Investments/prism/shared')
+# prism/shared next to this checkout (mounted at /shared in containers)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "shared"))
 
 # Import database
 from database import get_async_db, redis_client
@@ -170,10 +170,21 @@ async def cancel_job(
 
 @router.get("/queue/stats")
 async def get_queue_stats(
+    window_hours: int = Query(24, ge=1, le=720),
     db: AsyncSession = Depends(get_async_db)
 ):
-    """Get statistics about the processing queue."""
-    from sqlalchemy import func
+    """
+    Get statistics about the processing queue.
+    
+    Includes queue-wait percentiles (queued -> started_at; a retry is queued
+    from its scheduled_at) per job type and priority class over the last
+    `window_hours`, to verify that priority aging and fair-share limits keep
+    every class moving.
+    """
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import func, or_
+    
+    Job = db_models.ProcessingJob
     
     # Count by status
     result = await db.execute(
@@ -189,8 +200,51 @@ async def get_queue_stats(
     )
     type_counts = {job_type.value: count for job_type, count in result.all()}
     
+    # Queue wait percentiles per class. Like the worker's QUEUED_SINCE_SQL, a
+    # retry waits from scheduled_at (end of its backoff), not from created_at
+    queued_since = func.coalesce(Job.scheduled_at, Job.created_at)
+    wait_seconds = func.extract("epoch", Job.started_at - queued_since)
+    since = datetime.now(timezone.utc) - timedelta(hours=window_hours)
+    result = await db.execute(
+        select(
+            Job.job_type,
+            Job.priority,
+            func.count(Job.id),
+            func.percentile_cont(0.5).within_group(wait_seconds),
+            func.percentile_cont(0.99).within_group(wait_seconds),
+        )
+        .where(Job.started_at.isnot(None), Job.started_at >= since)
+        .group_by(Job.job_type, Job.priority)
+        .order_by(Job.priority, Job.job_type)
+    )
+    queue_wait = [
+        {
+            "job_type": job_type.value,
+            "priority": priority,
+            "samples": samples,
+            "p50_seconds": round(float(p50), 2) if p50 is not None else None,
+            "p99_seconds": round(float(p99), 2) if p99 is not None else None,
+        }
+        for job_type, priority, samples, p50, p99 in result.all()
+    ]
+    
+    # Oldest job still waiting; retries still in backoff are not waiting yet
+    result = await db.execute(
+        select(func.min(queued_since)).where(
+            Job.status == db_models.JobStatus.QUEUED,
+            or_(Job.scheduled_at.is_(None), Job.scheduled_at <= func.now()),
+        )
+    )
+    oldest_queued = result.scalar()
+    
     return {
         "by_status": status_counts,
         "by_type": type_counts,
-        "total": sum(status_counts.values())
+        "total": sum(status_counts.values()),
+        "queue_wait": queue_wait,
+        "queue_wait_window_hours": window_hours,
+        "oldest_queued_age_seconds": (
+            round((datetime.now(timezone.utc) - oldest_queued).total_seconds(), 1)
+            if oldest_queued else None
+        ),
     }
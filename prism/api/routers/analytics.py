@@ -5,11 +5,12 @@
 Provides comprehensive financial analysis, portfolio optimization, and 
 investment comparison capabilities.
 """
-from typing import List, Optional
+import math
+from typing import Dict, List, Optional, Tuple
 from datetime import date
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -18,9 +19,106 @@
 from lib.financial_metrics import FinancialMetricsEngine, CashFlow
 from lib.portfolio_optimizer import PortfolioOptimizer, AssetReturn, create_asset_from_valuations
 from lib.investment_comparison import InvestmentComparator, quick_compare
+from lib.price_store import ingest_prices, parse_price_csv, revalue_investments
+from lib.benchmarks import compare_with_benchmarks, get_benchmarks, invalidate_benchmarks, refresh_benchmarks
+from lib.fx import (
+    REPORTING_CURRENCY,
+    PartialConversion,
+    converted_series,
+    get_fx_rates,
+    invalidate_fx_rates,
+    refresh_fx_rates,
+)
 
 router = APIRouter(prefix="/api/v1/analytics", tags=["Analytics"])
 
+CURRENCY_QUERY = Query(None, min_length=3, max_length=3, description="Reporting currency (default: REPORTING_CURRENCY)")
+
+
+async def _load_valuations(db: AsyncSession, investment_ids: List) -> Dict:
+    """(date, value, currency) rows per investment, oldest first, in one query."""
+    result = await db.execute(
+        select(
+            ValuationHistory.investment_id,
+            ValuationHistory.valuation_date,
+            ValuationHistory.value,
+            ValuationHistory.currency,
+        )
+        .where(ValuationHistory.investment_id.in_(investment_ids))
+        .order_by(ValuationHistory.investment_id, ValuationHistory.valuation_date)
+    )
+    histories = {}
+    for inv_id, valuation_date, value, currency in result.all():
+        histories.setdefault(inv_id, []).append((valuation_date, float(value), currency))
+    return histories
+
+
+def _convert_holdings(investments: List[Investment], histories: Dict, fx,
+                      currency: str) -> Tuple[PartialConversion, PartialConversion]:
+    """
+    Current values and purchase prices of `investments` in `currency`, for
+    aggregate endpoints. A holding whose purchase currency, or the currency
+    of any of its valuations, has no rate is NaN in both and summed in
+    fx_unconverted, so one odd holding cannot fail the whole portfolio.
+    """
+    today = date.today()
+    currencies = [inv.purchase_currency for inv in investments]
+    skip = [not all(fx.has_rate(c) for _, _, c in histories.get(inv.id, [])) for inv in investments]
+    try:
+        values = fx.convert_known(
+            [float(inv.current_value) if inv.current_value else 0.0 for inv in investments], currencies, currency,
+            [inv.last_valuation_date or today for inv in investments], skip=skip,
+        )
+        invested = fx.convert_known(
+            [float(inv.purchase_price) if inv.purchase_price else 0.0 for inv in investments], currencies, currency,
+            [inv.purchase_date or today for inv in investments], skip=skip,
+        )
+    except ValueError as e:  # No rate for the reporting currency itself
+        raise HTTPException(status_code=400, detail=str(e))
+    return values, invested
+
+
+def _fx_report(investments: List[Investment], values: PartialConversion, *related: PartialConversion) -> Dict:
+    """Response fields for an aggregate: the FX flags and the holdings left out."""
+    return {
+        **values.flags(*related),
+        "unconverted_investments": [
+            str(inv.id) for inv, value in zip(investments, values.values.tolist()) if math.isnan(value)
+        ],
+    }
+
+
+def _converted(investments: List[Investment], values: PartialConversion) -> List[Investment]:
+    return [inv for inv, value in zip(investments, values.values.tolist()) if not math.isnan(value)]
+
+
+def _analyze(engine: FinancialMetricsEngine, inv: Investment, valuations: List, fx, currency: str):
+    """analyze_investment with the purchase, current value and history converted to `currency`."""
+    purchase_currency = inv.purchase_currency or "BRL"
+    purchase_date = inv.purchase_date or date.today()
+    try:
+        purchase_price = fx.convert_value(
+            float(inv.purchase_price) if inv.purchase_price else 0.0, purchase_currency, currency, purchase_date
+        )
+        current_value = fx.convert_value(
+            float(inv.current_value) if inv.current_value else 0.0, purchase_currency, currency,
+            inv.last_valuation_date or date.today(),
+        )
+        valuation_history = converted_series.get(inv.id, currency, valuations, fx) if valuations else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return engine.analyze_investment(
+        investment_id=str(inv.id),
+        name=inv.name,
+        category=inv.category.value if inv.category else "unknown",
+        purchase_price=purchase_price,
+        current_value=current_value,
+        purchase_date=purchase_date,
+        valuation_history=valuation_history,
+        currency=currency,
+    )
+
 
 # =============================================================================
 # INVESTMENT METRICS ENDPOINTS
@@ -30,11 +128,14 @@
 async def get_investment_metrics(
     investment_id: str,
     include_valuations: bool = Query(True, description="Include valuation history in risk analysis"),
+    currency: Optional[str] = CURRENCY_QUERY,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get comprehensive financial metrics for a single investment.
     
+    Amounts are in `currency` (default: the investment's purchase currency).
+    
     Returns:
     - Basic metrics: ROI, absolute return
     - Time-weighted: CAGR, annualized ROI
@@ -52,32 +153,16 @@ async def get_investment_metrics(
         raise HTTPException(status_code=404, detail="Investment not found")
     
     # Fetch valuation history for risk analysis
-    valuation_history = None
+    valuations = []
     if include_valuations:
-        valuations_result = await db.execute(
-            select(ValuationHistory)
-            .where(ValuationHistory.investment_id == investment_id)
-            .order_by(ValuationHistory.valuation_date)
-        )
-        valuations = valuations_result.scalars().all()
-        if valuations:
-            valuation_history = [
-                (v.valuation_date, float(v.value)) for v in valuations
-            ]
+        valuations = (await _load_valuations(db, [investment.id])).get(investment.id, [])
     
     # Calculate metrics
     engine = FinancialMetricsEngine()
+    fx = await get_fx_rates(db)
     
-    metrics = engine.analyze_investment(
-        investment_id=str(investment.id),
-        name=investment.name,
-        category=investment.category.value if investment.category else "unknown",
-        purchase_price=float(investment.purchase_price) if investment.purchase_price else 0.0,
-        current_value=float(investment.current_value) if investment.current_value else 0.0,
-        purchase_date=investment.purchase_date or date.today(),
-        valuation_history=valuation_history,
-        currency=investment.purchase_currency or "BRL",
-    )
+    metrics = _analyze(engine, investment, valuations, fx, (currency or investment.purchase_currency or "BRL").upper())
+    compare_with_benchmarks([metrics], await get_benchmarks(db))
     
     return {
         "success": True,
@@ -88,49 +173,41 @@ async def get_investment_metrics(
 @router.post("/investments/batch-metrics")
 async def get_batch_investment_metrics(
     investment_ids: List[str],
+    currency: Optional[str] = CURRENCY_QUERY,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get financial metrics for multiple investments in one request.
     
-    This is useful for the portfolio overview page.
+    This is useful for the portfolio overview page. Amounts are in `currency`.
     """
     results = []
     engine = FinancialMetricsEngine()
+    currency = (currency or REPORTING_CURRENCY).upper()
     
+    investments = []
     for inv_id in investment_ids:
         result = await db.execute(
             select(Investment).where(Investment.id == inv_id)
         )
         investment = result.scalar_one_or_none()
-        
         if investment:
-            # Get valuations
-            valuations_result = await db.execute(
-                select(ValuationHistory)
-                .where(ValuationHistory.investment_id == inv_id)
-                .order_by(ValuationHistory.valuation_date)
-            )
-            valuations = valuations_result.scalars().all()
-            valuation_history = [
-                (v.valuation_date, float(v.value)) for v in valuations
-            ] if valuations else None
-            
-            metrics = engine.analyze_investment(
-                investment_id=str(investment.id),
-                name=investment.name,
-                category=investment.category.value if investment.category else "unknown",
-                purchase_price=float(investment.purchase_price) if investment.purchase_price else 0.0,
-                current_value=float(investment.current_value) if investment.current_value else 0.0,
-                purchase_date=investment.purchase_date or date.today(),
-                valuation_history=valuation_history,
-            )
-            results.append(metrics.to_dict())
+            investments.append(investment)
+    
+    histories = await _load_valuations(db, [inv.id for inv in investments])
+    fx = await get_fx_rates(db)
+    values, invested = _convert_holdings(investments, histories, fx, currency)
+    for investment in _converted(investments, values):
+        results.append(_analyze(engine, investment, histories.get(investment.id, []), fx, currency))
+    
+    compare_with_benchmarks(results, await get_benchmarks(db))
+    results = [m.to_dict() for m in results]
     
     return {
         "success": True,
         "count": len(results),
-        "data": results
+        "data": results,
+        **_fx_report(investments, values, invested),
     }
 
 
@@ -142,11 +219,15 @@ async def get_batch_investment_metrics(
 async def get_portfolio_summary(
     category: Optional[str] = Query(None, description="Filter by category"),
     status: Optional[str] = Query("active", description="Filter by status"),
+    currency: Optional[str] = CURRENCY_QUERY,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get complete portfolio summary with mathematical analysis.
     
+    Every investment is converted to `currency` before aggregating; those
+    without an exchange rate are left out and listed in unconverted_investments.
+    
     Returns:
     - Total portfolio value and returns
     - Weighted average metrics
@@ -180,30 +261,15 @@ async def get_portfolio_summary(
     
     # Calculate metrics for each investment
     engine = FinancialMetricsEngine()
-    all_metrics = []
+    histories = await _load_valuations(db, [inv.id for inv in investments])
+    fx = await get_fx_rates(db)
+    currency = (currency or REPORTING_CURRENCY).upper()
+    values, invested = _convert_holdings(investments, histories, fx, currency)
+    all_metrics = [
+        _analyze(engine, inv, histories.get(inv.id, []), fx, currency) for inv in _converted(investments, values)
+    ]
     
-    for inv in investments:
-        # Get valuations
-        valuations_result = await db.execute(
-            select(ValuationHistory)
-            .where(ValuationHistory.investment_id == inv.id)
-            .order_by(ValuationHistory.valuation_date)
-        )
-        valuations = valuations_result.scalars().all()
-        valuation_history = [
-            (v.valuation_date, float(v.value)) for v in valuations
-        ] if valuations else None
-        
-        metrics = engine.analyze_investment(
-            investment_id=str(inv.id),
-            name=inv.name,
-            category=inv.category.value if inv.category else "unknown",
-            purchase_price=float(inv.purchase_price) if inv.purchase_price else 0.0,
-            current_value=float(inv.current_value) if inv.current_value else 0.0,
-            purchase_date=inv.purchase_date or date.today(),
-            valuation_history=valuation_history,
-        )
-        all_metrics.append(metrics)
+    compare_with_benchmarks(all_metrics, await get_benchmarks(db))
     
     # Calculate portfolio-level metrics
     portfolio_metrics = engine.calculate_portfolio_metrics(all_metrics)
@@ -212,19 +278,24 @@ async def get_portfolio_summary(
         "success": True,
         "data": {
             **portfolio_metrics.to_dict(),
-            "investment_count": len(investments),
+            "investment_count": len(all_metrics),
             "investments": [m.to_dict() for m in all_metrics],
+            **_fx_report(investments, values, invested),
         }
     }
 
 
 @router.get("/portfolio/optimization")
 async def get_portfolio_optimization(
+    currency: Optional[str] = CURRENCY_QUERY,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get portfolio optimization recommendations using Modern Portfolio Theory.
     
+    Histories and current values are converted to `currency` first;
+    investments without an exchange rate are left out.
+    
     Returns:
     - Efficient frontier data points
     - Maximum Sharpe ratio portfolio
@@ -250,25 +321,26 @@ async def get_portfolio_optimization(
     current_values = {}
     total_value = 0.0
     
-    for inv in investments:
-        # Get valuation history
-        valuations_result = await db.execute(
-            select(ValuationHistory)
-            .where(ValuationHistory.investment_id == inv.id)
-            .order_by(ValuationHistory.valuation_date)
-        )
-        valuations = valuations_result.scalars().all()
+    # One query for every history (mark-to-market revaluation makes them long)
+    histories = await _load_valuations(db, [inv.id for inv in investments])
+    fx = await get_fx_rates(db)
+    currency = (currency or REPORTING_CURRENCY).upper()
+    values, _ = _convert_holdings(investments, histories, fx, currency)
+    fx_report = _fx_report(investments, values)
+    
+    for inv, current_val in zip(investments, values.values.tolist()):
+        valuations = histories.get(inv.id, [])
         
-        if len(valuations) >= 3:  # Need at least 3 data points
+        if len(valuations) >= 3 and not math.isnan(current_val):  # Need at least 3 data points
+            converted = converted_series.get(inv.id, currency, valuations, fx)
             asset_ret = create_asset_from_valuations(
                 investment_id=str(inv.id),
                 name=inv.name,
                 category=inv.category.value if inv.category else "unknown",
-                valuations=[(v.valuation_date, float(v.value)) for v in valuations]
+                valuations=converted
             )
             asset_returns.append(asset_ret)
             
-            current_val = float(inv.current_value) if inv.current_value else 0.0
             current_values[str(inv.id)] = current_val
             total_value += current_val
     
@@ -277,6 +349,7 @@ async def get_portfolio_optimization(
             "success": False,
             "error": "Insufficient valuation history for optimization. Need at least 2 investments with 3+ valuations each.",
             "data": None,
+            **fx_report,
         }
     
     # Run optimization
@@ -290,13 +363,15 @@ async def get_portfolio_optimization(
         
         return {
             "success": True,
-            "data": optimization_result.to_dict()
+            "data": optimization_result.to_dict(),
+            **fx_report,
         }
     except Exception as e:
         return {
             "success": False,
             "error": f"Optimization failed: {str(e)}",
             "data": None,
+            **fx_report,
         }
 
 
@@ -309,11 +384,15 @@ async def compare_investments(
     investment_ids: List[str],
     risk_profile: str = Query("balanced", description="Risk profile: conservative, balanced, aggressive"),
     include_scenarios: bool = Query(True, description="Include scenario analysis"),
+    currency: Optional[str] = CURRENCY_QUERY,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
     Compare multiple investments side-by-side with rankings and recommendations.
     
+    Amounts are converted to `currency` so values and returns are comparable;
+    investments without an exchange rate are left out.
+    
     Returns:
     - Composite scores and rankings
     - Side-by-side metric comparison
@@ -342,47 +421,38 @@ async def compare_investments(
     all_metrics = []
     investment_data = []
     
-    for inv in investments:
-        # Get valuations
-        valuations_result = await db.execute(
-            select(ValuationHistory)
-            .where(ValuationHistory.investment_id == inv.id)
-            .order_by(ValuationHistory.valuation_date)
-        )
-        valuations = valuations_result.scalars().all()
-        valuation_history = [
-            (v.valuation_date, float(v.value)) for v in valuations
-        ] if valuations else None
-        
-        metrics = engine.analyze_investment(
-            investment_id=str(inv.id),
-            name=inv.name,
-            category=inv.category.value if inv.category else "unknown",
-            purchase_price=float(inv.purchase_price) if inv.purchase_price else 0.0,
-            current_value=float(inv.current_value) if inv.current_value else 0.0,
-            purchase_date=inv.purchase_date or date.today(),
-            valuation_history=valuation_history,
-        )
-        all_metrics.append(metrics.to_dict())
+    histories = await _load_valuations(db, [inv.id for inv in investments])
+    fx = await get_fx_rates(db)
+    currency = (currency or REPORTING_CURRENCY).upper()
+    values, invested = _convert_holdings(investments, histories, fx, currency)
+    for inv in _converted(investments, values):
+        metrics = _analyze(engine, inv, histories.get(inv.id, []), fx, currency)
+        all_metrics.append(metrics)
         investment_data.append({
             "id": str(inv.id),
             "name": inv.name,
             "category": inv.category.value if inv.category else "unknown",
-            "current_value": float(inv.current_value) if inv.current_value else 0.0,
-            "purchase_price": float(inv.purchase_price) if inv.purchase_price else 0.0,
+            "current_value": metrics.current_value,
+            "purchase_price": metrics.total_invested,
         })
     
+    if len(all_metrics) < 2:
+        raise HTTPException(status_code=400, detail="At least 2 investments with exchange rates required")
+    
+    compare_with_benchmarks(all_metrics, await get_benchmarks(db))
+    
     # Compare using comparator
     comparator = InvestmentComparator()
     comparison_result = comparator.compare_investments(
         investments=investment_data,
-        metrics_list=all_metrics,
+        metrics_list=[m.to_dict() for m in all_metrics],
         run_scenarios=include_scenarios
     )
     
     return {
         "success": True,
-        "data": comparison_result.to_dict()
+        "data": comparison_result.to_dict(),
+        **_fx_report(investments, values, invested),
     }
 
 
@@ -390,6 +460,7 @@ async def compare_investments(
 async def compare_all_investments(
     category: Optional[str] = Query(None, description="Filter by category"),
     limit: int = Query(10, ge=2, le=50, description="Maximum number of investments to compare"),
+    currency: Optional[str] = CURRENCY_QUERY,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
@@ -417,45 +488,42 @@ async def compare_all_investments(
     all_metrics = []
     investment_data = []
     
-    for inv in investments:
-        valuations_result = await db.execute(
-            select(ValuationHistory)
-            .where(ValuationHistory.investment_id == inv.id)
-            .order_by(ValuationHistory.valuation_date)
-        )
-        valuations = valuations_result.scalars().all()
-        valuation_history = [
-            (v.valuation_date, float(v.value)) for v in valuations
-        ] if valuations else None
-        
-        metrics = engine.analyze_investment(
-            investment_id=str(inv.id),
-            name=inv.name,
-            category=inv.category.value if inv.category else "unknown",
-            purchase_price=float(inv.purchase_price) if inv.purchase_price else 0.0,
-            current_value=float(inv.current_value) if inv.current_value else 0.0,
-            purchase_date=inv.purchase_date or date.today(),
-            valuation_history=valuation_history,
-        )
-        all_metrics.append(metrics.to_dict())
+    histories = await _load_valuations(db, [inv.id for inv in investments])
+    fx = await get_fx_rates(db)
+    currency = (currency or REPORTING_CURRENCY).upper()
+    values, invested = _convert_holdings(investments, histories, fx, currency)
+    for inv in _converted(investments, values):
+        metrics = _analyze(engine, inv, histories.get(inv.id, []), fx, currency)
+        all_metrics.append(metrics)
         investment_data.append({
             "id": str(inv.id),
             "name": inv.name,
             "category": inv.category.value if inv.category else "unknown",
-            "current_value": float(inv.current_value) if inv.current_value else 0.0,
-            "purchase_price": float(inv.purchase_price) if inv.purchase_price else 0.0,
+            "current_value": metrics.current_value,
+            "purchase_price": metrics.total_invested,
         })
     
+    if len(all_metrics) < 2:
+        return {
+            "success": False,
+            "error": "At least 2 investments with exchange rates required for comparison",
+            "data": None,
+            **_fx_report(investments, values, invested),
+        }
+    
+    compare_with_benchmarks(all_metrics, await get_benchmarks(db))
+    
     comparator = InvestmentComparator()
     comparison_result = comparator.compare_investments(
         investments=investment_data,
-        metrics_list=all_metrics,
+        metrics_list=[m.to_dict() for m in all_metrics],
         run_scenarios=True
     )
     
     return {
         "success": True,
-        "data": comparison_result.to_dict()
+        "data": comparison_result.to_dict(),
+        **_fx_report(investments, values, invested),
     }
 
 
@@ -468,6 +536,7 @@ async def run_scenario_analysis(
     investment_ids: List[str],
     scenario_type: str = Query("market_crash", description="Scenario: market_crash, correction, boom, inflation"),
     custom_impact: Optional[float] = Query(None, description="Custom impact percentage (overrides scenario_type)"),
+    currency: Optional[str] = CURRENCY_QUERY,
     db: AsyncSession = Depends(get_async_db)
 ):
     """
@@ -479,7 +548,8 @@ async def run_scenario_analysis(
     - boom: +30% impact
     - inflation: -5% real impact
     
-    Returns projected values and portfolio impact.
+    Returns projected values and portfolio impact. Investments without an
+    exchange rate are left out of both.
     """
     # Define scenario impacts
     scenario_impacts = {
@@ -501,20 +571,21 @@ async def run_scenario_analysis(
         if inv:
             investments.append(inv)
     
+    # Convert every investment to the reporting currency in one pass
+    fx = await get_fx_rates(db)
+    currency = (currency or REPORTING_CURRENCY).upper()
+    currents, purchases = _convert_holdings(investments, {}, fx, currency)
+    
     # Calculate current totals
-    total_current = sum(
-        float(inv.current_value) if inv.current_value else 0.0
-        for inv in investments
-    )
+    total_current = currents.total()
     
     # Calculate projections
     projections = []
     total_projected = 0.0
     
-    for inv in investments:
-        current = float(inv.current_value) if inv.current_value else 0.0
-        purchase = float(inv.purchase_price) if inv.purchase_price else 0.0
-        
+    for inv, current, purchase in zip(investments, currents.values.tolist(), purchases.values.tolist()):
+        if math.isnan(current):  # No exchange rate; listed in unconverted_investments
+            continue
         projected_value = current * (1 + impact_pct / 100)
         total_projected += projected_value
         
@@ -538,21 +609,83 @@ async def run_scenario_analysis(
         "success": True,
         "data": {
             "scenario": scenario_type,
+            "currency": currency,
             "impact_pct": impact_pct,
             "portfolio_impact": round(portfolio_impact, 2),
             "total_current": round(total_current, 2),
             "total_projected": round(total_projected, 2),
             "projections": projections,
+            **_fx_report(investments, currents, purchases),
         }
     }
 
 
+# =============================================================================
+# PRICE HISTORY ENDPOINTS
+# =============================================================================
+
+@router.post("/prices/import")
+async def import_prices(
+    file: UploadFile = File(..., description="CSV with symbol,date,close[,currency]"),
+    symbol: Optional[str] = Query(None, description="Symbol for single-symbol exports without a symbol column"),
+    currency: Optional[str] = Query(None, max_length=3, description="Currency of rows without a currency column"),
+    revalue: bool = Query(True, description="Rewrite mark-to-market valuations over the imported dates"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Bulk-load daily closes into the price history (upsert by symbol and date).
+    
+    With revalue, investments holding the imported symbols get valuation
+    rows for every imported date in the same transaction. Closes without a
+    currency are stored but not used for valuations.
+    """
+    try:
+        bars = parse_price_csv((await file.read()).decode("utf-8"), symbol=symbol, currency=currency)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid price CSV: {e}")
+    if not bars:
+        raise HTTPException(status_code=400, detail="Price CSV has no rows")
+    
+    rows = await ingest_prices(db, bars)
+    valuations = 0
+    if revalue:
+        dates = [bar.price_date for bar in bars]
+        valuations = await revalue_investments(db, min(dates), max(dates))
+    await db.commit()
+    invalidate_benchmarks()  # The file may carry benchmark or USD<CCY> series
+    invalidate_fx_rates()
+    
+    return {
+        "success": True,
+        "data": {
+            "prices_written": rows,
+            "symbols": sorted({bar.symbol for bar in bars}),
+            "symbols_without_currency": sorted({bar.symbol for bar in bars if not bar.currency}),
+            "valuations_written": valuations,
+        }
+    }
+
+
+@router.post("/revalue")
+async def revalue_portfolio(
+    start_date: Optional[date] = Query(None, description="First date to revalue (default: lookback window)"),
+    end_date: Optional[date] = Query(None, description="Last date to revalue (default: today)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Rewrite mark-to-market valuations of priced investments from the price history."""
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date is after end_date")
+    written = await revalue_investments(db, start_date, end_date)
+    await db.commit()
+    return {"success": True, "data": {"valuations_written": written}}
+
+
 # =============================================================================
 # BENCHMARK DATA ENDPOINT
 # =============================================================================
 
 @router.get("/benchmarks")
-async def get_benchmark_rates():
+async def get_benchmark_rates(db: AsyncSession = Depends(get_async_db)):
     """
     Get current benchmark rates used for comparative analysis.
     
@@ -562,9 +695,11 @@ async def get_benchmark_rates():
     - Selic rate (Brazil policy rate)
     - S&P 500 historical average
     - US Treasury 10-year
+    - Coverage of the daily benchmark series (outside it the rates above apply)
     """
     from lib.financial_metrics import BENCHMARK_RATES
     
+    benchmarks = await get_benchmarks(db)
     return {
         "success": True,
         "data": {
@@ -582,6 +717,54 @@ async def get_benchmark_rates():
                 "selic_br": "Brazil Selic policy rate",
                 "sp500_historical": "S&P 500 historical average return",
                 "treasury_10y_us": "US 10-year Treasury yield",
-            }
+            },
+            "series": benchmarks.coverage(),
+        }
+    }
+
+
+@router.post("/benchmarks/refresh")
+async def refresh_benchmark_series(db: AsyncSession = Depends(get_async_db)):
+    """Append the latest CDI, Selic, IPCA and S&P 500 levels to the benchmark series."""
+    written = await refresh_benchmarks(db)
+    await db.commit()
+    invalidate_benchmarks()
+    return {"success": True, "data": {"bars_written": written}}
+
+
+# =============================================================================
+# EXCHANGE RATE ENDPOINTS
+# =============================================================================
+
+@router.get("/fx/rates")
+async def get_fx_rate_table(
+    on: Optional[date] = Query(None, description="Date of the rates (default: today)"),
+    base: str = Query("USD", min_length=3, max_length=3, description="Units of each currency per one base"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Exchange rates used to convert investments to the reporting currency."""
+    fx = await get_fx_rates(db)
+    try:
+        rates = fx.rates(on or date.today(), base.upper())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "data": {
+            "date": (on or date.today()).isoformat(),
+            "base": base.upper(),
+            "rates": rates,
+            "reporting_currency": REPORTING_CURRENCY,
+            "last_observed": fx.last_observed.isoformat() if fx.last_observed else None,
+            "estimated": fx.estimated,
         }
     }
+
+
+@router.post("/fx/refresh")
+async def refresh_fx_rate_table(db: AsyncSession = Depends(get_async_db)):
+    """Fill gaps in the daily USD<CCY> rate series from Yahoo."""
+    written = await refresh_fx_rates(db)
+    await db.commit()
+    invalidate_fx_rates()
+    return {"success": True, "data": {"bars_written": written}}
@@ -23,6 +23,7 @@
 Optional:
   CHAT_MODEL          - Override default model (e.g., "gpt-4o", "claude-3-5-sonnet")
   CHAT_API_URL        - Custom API endpoint (for proxies or self-hosted)
+  AI_RATE_LIMITS      - Shared RPM/TPM budgets, same as the worker (see shared/rate_limiter.py)
 
 The router auto-detects which provider to use based on available API keys.
 ===============================================================================
@@ -38,7 +39,8 @@
 from sqlalchemy import select, desc
 from pydantic import BaseModel
 
-from routers._imports import db_models, get_async_db, get_storage_service
+from routers._imports import db_models, get_async_db, get_storage_service, redis_client
+from rate_limiter import RateLimitTimeoutError, bucket_provider, estimate_tokens, get_rate_limiter
 
 router = APIRouter()
 storage = None
@@ -279,6 +281,15 @@ def detect_provider() -> tuple[str, dict]:
     )
 
 
+def get_chat_base_url(config: dict) -> Optional[str]:
+    """API endpoint for the detected provider."""
+    return (
+        os.getenv("CHAT_API_URL") or  # User override
+        os.getenv(config["api_url_var"], "") or  # Provider-specific
+        config["default_url"]  # Default
+    )
+
+
 def get_chat_client():
     """
     Get the appropriate AI client based on configured provider.
@@ -290,11 +301,7 @@ def get_chat_client():
         from openai import AsyncOpenAI
         
         api_key = os.getenv(config["api_key_var"]) or os.getenv("AI_API_KEY")
-        base_url = (
-            os.getenv("CHAT_API_URL") or  # User override
-            os.getenv(config["api_url_var"], "") or  # Provider-specific
-            config["default_url"]  # Default
-        )
+        base_url = get_chat_base_url(config)
         
         client_kwargs = {"api_key": api_key}
         if base_url:
@@ -323,6 +330,20 @@ def get_chat_model() -> str:
     return config["default_model"]
 
 
+async def reserve_chat_tokens(messages: List[dict], model: str, max_tokens: int):
+    """
+    Wait for room in the provider's shared RPM/TPM budget (the same Redis
+    buckets the worker draws from). Settle the reservation with the usage.
+    """
+    provider, config = detect_provider()
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return await get_rate_limiter(redis_client).acquire_async(
+        bucket_provider(provider, get_chat_base_url(config)),
+        model,
+        estimate_tokens(chars, max_output_tokens=max_tokens),
+    )
+
+
 # =============================================================================
 # STREAMING RESPONSE GENERATOR
 # =============================================================================
@@ -334,22 +355,30 @@ async def generate_chat_stream(
     """Generate streaming chat response."""
     try:
         client = get_chat_client()
-        
-        stream = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            stream=True,
-            temperature=0.7,
-            max_tokens=4096,
-        )
-        
-        async for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                data = json.dumps({
-                    "type": "content",
-                    "content": chunk.choices[0].delta.content
-                })
-                yield f"data: {data}\n\n"
+        reservation = await reserve_chat_tokens(messages, model, 4096)
+        tokens_used = 0  # A failed call gives its reservation back
+        try:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                temperature=0.7,
+                max_tokens=4096,
+            )
+            tokens_used = None  # Keep the estimate unless the stream reports usage
+            
+            async for chunk in stream:
+                # Providers that report usage on streams send it on the last chunk
+                if getattr(chunk, "usage", None):
+                    tokens_used = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    data = json.dumps({
+                        "type": "content",
+                        "content": chunk.choices[0].delta.content
+                    })
+                    yield f"data: {data}\n\n"
+        finally:
+            await get_rate_limiter().settle_async(reservation, tokens_used)
         
         # Send done signal
         yield f"data: {json.dumps({'type': 'done'})}\n\n"
@@ -402,13 +431,18 @@ async def chat(
         # Get AI response
         client = get_chat_client()
         model = request.model or get_chat_model()
-        
-        response = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=4096,
-        )
+        reservation = await reserve_chat_tokens(messages, model, 4096)
+        tokens_used = 0  # A failed call gives its reservation back
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=4096,
+            )
+            tokens_used = response.usage.total_tokens if response.usage else None
+        finally:
+            await get_rate_limiter().settle_async(reservation, tokens_used)
         
         assistant_message = response.choices[0].message.content
         
@@ -425,6 +459,11 @@ async def chat(
             model=model
         )
         
+    except RateLimitTimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Chat busy: {str(e)}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -3,198 +3,40 @@
 DASHBOARD ROUTER - Statistics and overview endpoints
 ===============================================================================
 """
+import math
+from datetime import date
 from decimal import Decimal
-from typing import Dict, Optional
-import asyncio
 
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
-import httpx
 
 from routers._imports import db_models, schemas, get_async_db
 from middleware import cache_response, invalidate_dashboard_cache
+from lib.fx import REPORTING_CURRENCY, get_fx_rates
+from lib.market_data import read_market_data
 
 
 router = APIRouter()
 
 
-# =============================================================================
-# MARKET DATA HELPERS
-# =============================================================================
-
-import yfinance as yf
-
-
-def _yf_fetch_prices(symbols: list[str]) -> dict[str, Optional[dict]]:
-    """
-    Synchronous helper — fetch price info via yfinance for a list of symbols.
-    Returns {symbol: {"regularMarketPrice": ..., "chartPreviousClose": ...} | None}.
-    """
-    results: dict[str, Optional[dict]] = {s: None for s in symbols}
-    try:
-        tickers = yf.Tickers(" ".join(symbols))
-        for sym in symbols:
-            try:
-                info = tickers.tickers[sym].fast_info
-                price = getattr(info, "last_price", None)
-                prev = getattr(info, "previous_close", None)
-                if price is not None:
-                    results[sym] = {
-                        "regularMarketPrice": float(price),
-                        "chartPreviousClose": float(prev) if prev else None,
-                    }
-            except Exception as exc:
-                print(f"[yfinance] Error for {sym}: {exc}")
-    except Exception as exc:
-        print(f"[yfinance] Batch error: {exc}")
-    return results
-
-
-async def _fetch_yahoo_data(symbols: list[str]) -> dict[str, Optional[dict]]:
-    """
-    Fetch Yahoo Finance data — uses yfinance (run in thread) as primary,
-    falls back to raw httpx if yfinance fails.
-    """
-    # Primary: yfinance (handles cookies/auth internally)
-    try:
-        result = await asyncio.to_thread(_yf_fetch_prices, symbols)
-        # Check if we got at least some data
-        if any(v is not None for v in result.values()):
-            return result
-    except Exception as exc:
-        print(f"[Yahoo] yfinance failed: {exc}")
-
-    # Fallback: raw httpx with session cookies
-    print("[Yahoo] Falling back to httpx...")
-    _UA = (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/125.0.0.0 Safari/537.36"
-    )
-    results: dict[str, Optional[dict]] = {s: None for s in symbols}
-    try:
-        async with httpx.AsyncClient(
-            timeout=12.0, follow_redirects=True, headers={"User-Agent": _UA}
-        ) as client:
-            try:
-                await client.get("https://fc.yahoo.com")
-            except httpx.HTTPError:
-                pass
-
-            async def _fetch_one(sym: str) -> tuple[str, Optional[dict]]:
-                try:
-                    from urllib.parse import quote
-                    encoded = quote(sym, safe="")
-                    url = f"https://query2.finance.yahoo.com/v8/finance/chart/{encoded}?interval=1d&range=2d"
-                    resp = await client.get(url)
-                    if resp.status_code == 200:
-                        data = resp.json()
-                        meta = data.get("chart", {}).get("result", [{}])[0].get("meta", {})
-                        return sym, meta if meta else None
-                except Exception as exc:
-                    print(f"[Yahoo httpx] Error {sym}: {exc}")
-                return sym, None
-
-            fetched = await asyncio.gather(*[_fetch_one(s) for s in symbols])
-            for sym, meta in fetched:
-                results[sym] = meta
-    except Exception as exc:
-        print(f"[Yahoo httpx] Session error: {exc}")
-    return results
-
-
-def _price_from_meta(meta: Optional[dict]) -> Optional[float]:
-    """Extract regularMarketPrice from a meta dict."""
-    if meta:
-        p = meta.get("regularMarketPrice")
-        return float(p) if p else None
-    return None
-
-
-async def fetch_usd_clp_rate() -> Optional[float]:
-    """Fetch USD/CLP rate from Mindicador."""
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get("https://mindicador.cl/api/dolar")
-            if response.status_code == 200:
-                data = response.json()
-                serie = data.get("serie", [])
-                if serie:
-                    return float(serie[0].get("valor", 0))
-    except Exception:
-        pass
-    return None
+# Amounts are converted at the rate of the day they refer to: a current value
+# at its valuation date, a purchase price at its purchase date (today if unset)
+def _rate_day(day, today: date) -> date:
+    if day is None:
+        return today
+    return day.date() if hasattr(day, "date") else day
 
 
 @router.get("/market-data")
-@cache_response(expire_seconds=300)  # Cache market data for 5 minutes
 async def get_market_data():
     """
     Get current market data: metals, indices, commodities.
     
-    Fetches from Yahoo Finance via server-side proxy (avoids CORS issues).
-    Uses a single session with cookies so Yahoo doesn't block us.
+    Served from the quotes persisted by the background refresher
+    (lib/market_data.py); stale_as_of is set when they are out of date.
     """
-    # 1) Fetch USD/CLP rate and all Yahoo symbols in parallel
-    yahoo_symbols = ["GC=F", "SI=F", "^IXIC", "CL=F", "HG=F", "ALB"]
-    
-    usd_rate, yahoo_data = await asyncio.gather(
-        fetch_usd_clp_rate(),
-        _fetch_yahoo_data(yahoo_symbols),
-        return_exceptions=True,
-    )
-    
-    if isinstance(usd_rate, Exception):
-        usd_rate = None
-    if isinstance(yahoo_data, Exception):
-        yahoo_data = {s: None for s in yahoo_symbols}
-    
-    # 2) Extract prices
-    gold_usd_oz   = _price_from_meta(yahoo_data.get("GC=F"))
-    silver_usd_oz = _price_from_meta(yahoo_data.get("SI=F"))
-    oil_usd       = _price_from_meta(yahoo_data.get("CL=F"))
-    nasdaq_meta   = yahoo_data.get("^IXIC")
-    copper_usd_lb = _price_from_meta(yahoo_data.get("HG=F"))
-    lithium_usd   = _price_from_meta(yahoo_data.get("ALB"))
-    
-    # 3) Convert metals to CLP per gram (1 troy ounce = 31.1034768 grams)
-    grams_per_ounce = 31.1034768
-    gold_clp_per_gram = None
-    silver_clp_per_gram = None
-    
-    if usd_rate and gold_usd_oz:
-        gold_clp_per_gram = (gold_usd_oz * usd_rate) / grams_per_ounce
-    if usd_rate and silver_usd_oz:
-        silver_clp_per_gram = (silver_usd_oz * usd_rate) / grams_per_ounce
-    
-    # 4) NASDAQ — need meta for change %
-    nasdaq_price = None
-    nasdaq_change_pct = None
-    if isinstance(nasdaq_meta, dict):
-        nasdaq_price = nasdaq_meta.get("regularMarketPrice")
-        prev = nasdaq_meta.get("chartPreviousClose") or nasdaq_meta.get("previousClose")
-        if nasdaq_price and prev:
-            nasdaq_change_pct = round(((nasdaq_price - prev) / prev) * 100, 2)
-    
-    # 5) Copper kg conversion (1 lb = 0.453592 kg)
-    copper_usd_kg = None
-    if copper_usd_lb:
-        copper_usd_kg = round(copper_usd_lb / 0.453592, 2)
-    
-    return {
-        "usd_clp_rate": usd_rate,
-        "gold_clp_per_gram": round(gold_clp_per_gram, 2) if gold_clp_per_gram else None,
-        "silver_clp_per_gram": round(silver_clp_per_gram, 2) if silver_clp_per_gram else None,
-        "gold_usd_per_oz": gold_usd_oz,
-        "silver_usd_per_oz": silver_usd_oz,
-        "nasdaq_price": nasdaq_price,
-        "nasdaq_change_pct": nasdaq_change_pct,
-        "oil_usd_bbl": oil_usd,
-        "copper_usd_lb": copper_usd_lb,
-        "copper_usd_kg": copper_usd_kg,
-        "lithium_proxy_usd": lithium_usd,
-    }
+    return await read_market_data()
 
 
 @router.get("/stats", response_model=dict)
@@ -208,17 +50,31 @@ async def get_dashboard_stats(
     result = await db.execute(select(func.count(db_models.Investment.id)))
     total_investments = result.scalar()
     
-    # Total value
+    # Total value and total invested, converted to the reporting currency
+    # (current value at its valuation date, purchase price at purchase date)
     result = await db.execute(
-        select(func.coalesce(func.sum(db_models.Investment.current_value), Decimal(0)))
+        select(
+            db_models.Investment.current_value,
+            db_models.Investment.purchase_price,
+            db_models.Investment.purchase_currency,
+            db_models.Investment.last_valuation_date,
+            db_models.Investment.purchase_date,
+        )
     )
-    total_value = result.scalar()
-    
-    # Total invested (purchase price)
-    result = await db.execute(
-        select(func.coalesce(func.sum(db_models.Investment.purchase_price), Decimal(0)))
+    rows = result.all()
+    fx = await get_fx_rates(db)
+    today = date.today()
+    currencies = [r.purchase_currency for r in rows]
+    values = fx.convert_known(
+        [float(r.current_value or 0) for r in rows], currencies, REPORTING_CURRENCY,
+        [_rate_day(r.last_valuation_date, today) for r in rows],
     )
-    total_invested = result.scalar()
+    invested = fx.convert_known(
+        [float(r.purchase_price or 0) for r in rows], currencies, REPORTING_CURRENCY,
+        [_rate_day(r.purchase_date, today) for r in rows],
+    )
+    total_value = values.total()
+    total_invested = invested.total()
     
     # Calculate total return
     total_return = total_value - total_invested if total_invested else Decimal(0)
@@ -269,6 +125,8 @@ async def get_dashboard_stats(
     
     return {
         "total_investments": total_investments,
+        "currency": REPORTING_CURRENCY,
+        **values.flags(invested),  # Investments without a rate are left out of both totals
         "total_value": float(total_value) if total_value else 0,
         "total_invested": float(total_invested) if total_invested else 0,
         "total_return": float(total_return) if total_return else 0,
@@ -303,20 +161,41 @@ async def get_dashboard_stats(
 async def get_category_breakdown(
     db: AsyncSession = Depends(get_async_db)
 ):
-    """Get investment breakdown by category with values."""
+    """Get investment breakdown by category with values in the reporting currency."""
     result = await db.execute(
         select(
             db_models.Investment.category,
+            db_models.Investment.purchase_currency,
+            db_models.Investment.last_valuation_date,
             func.count(db_models.Investment.id),
             func.coalesce(func.sum(db_models.Investment.current_value), Decimal(0))
         )
-        .group_by(db_models.Investment.category)
+        .group_by(
+            db_models.Investment.category,
+            db_models.Investment.purchase_currency,
+            db_models.Investment.last_valuation_date,
+        )
     )
     
+    # Same rule as /stats: each value at the rate of its valuation date
+    groups = result.all()
+    fx = await get_fx_rates(db)
+    today = date.today()
+    converted = fx.convert_known(
+        [float(value) for *_, value in groups], [g.purchase_currency for g in groups], REPORTING_CURRENCY,
+        [_rate_day(g.last_valuation_date, today) for g in groups],
+    )
+    by_category = {}
+    for (category, _, _, count, _), value in zip(groups, converted.values.tolist()):
+        total_count, total = by_category.get(category, (0, Decimal(0)))
+        if math.isnan(value):  # No rate; reported in fx_unconverted
+            value = 0.0
+        by_category[category] = (total_count + count, total + Decimal(str(round(value, 2))))
+    
     breakdown = []
     total_value = Decimal(0)
     
-    rows = result.all()
+    rows = [(category, count, value) for category, (count, value) in by_category.items()]
     for category, count, value in rows:
         total_value += value
     
@@ -331,7 +210,9 @@ async def get_category_breakdown(
     
     return {
         "breakdown": breakdown,
-        "total_value": float(total_value)
+        "total_value": float(total_value),
+        "currency": REPORTING_CURRENCY,
+        **converted.flags(),
     }
 
 
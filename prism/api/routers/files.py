@@ -124,9 +124,18 @@ async def delete_file(
             detail="File not found"
         )
     
-    # Delete from storage
+    # Delete from storage, unless a deduplicated upload still shares the object
     if delete_from_storage:
-        get_storage().delete_file(file_entry.storage_key)
+        shared = await db.execute(
+            select(db_models.FileRegistry.id)
+            .where(
+                db_models.FileRegistry.storage_key == file_entry.storage_key,
+                db_models.FileRegistry.id != file_entry.id,
+            )
+            .limit(1)
+        )
+        if shared.first() is None:
+            get_storage().delete_file(file_entry.storage_key)
     
     # Delete from database
     await db.delete(file_entry)
@@ -145,9 +154,17 @@ async def reanalyze_file(
     job_type: str = "document_analysis",
     db: AsyncSession = Depends(get_async_db)
 ):
-    """Queue a file for re-analysis."""
+    """
+    Queue a file for re-analysis.
+    
+    Repeated clicks coalesce: while a job of the same type for this file is
+    queued or running, that job is returned instead of queueing another.
+    """
+    # Row lock serializes concurrent reanalyze requests for the same file
     result = await db.execute(
-        select(db_models.FileRegistry).where(db_models.FileRegistry.id == file_id)
+        select(db_models.FileRegistry)
+        .where(db_models.FileRegistry.id == file_id)
+        .with_for_update()
     )
     file_entry = result.scalar_one_or_none()
     
@@ -157,6 +174,25 @@ async def reanalyze_file(
             detail="File not found"
         )
     
+    pending = await db.execute(
+        select(db_models.ProcessingJob)
+        .where(
+            db_models.ProcessingJob.file_id == file_id,
+            db_models.ProcessingJob.job_type == db_models.JobType(job_type),
+            db_models.ProcessingJob.status.in_([db_models.JobStatus.QUEUED, db_models.JobStatus.RUNNING]),
+        )
+        .order_by(db_models.ProcessingJob.created_at)
+        .limit(1)
+    )
+    existing_job = pending.scalar_one_or_none()
+    if existing_job:
+        await db.rollback()  # Release the row lock
+        return {
+            "message": f"File already has a {existing_job.status.value} analysis job",
+            "job_id": existing_job.id,
+            "already_queued": True
+        }
+    
     # Create processing job
     job = db_models.ProcessingJob(
         job_type=db_models.JobType(job_type),
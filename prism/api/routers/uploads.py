@@ -5,12 +5,16 @@
 Phone → Gets pre-signed URL → Uploads directly to R2/S3 → Confirms upload → Creates job
 ===============================================================================
 """
-from typing import Optional
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select
 
 from routers._imports import db_models, schemas, get_async_db, redis_client, get_storage_service
 
@@ -18,6 +22,15 @@
 router = APIRouter()
 storage = None
 
+# Files up to this size are hashed inline on confirm; larger ones are
+# hashed by the worker with ranged reads before analysis.
+CONFIRM_HASH_MAX_BYTES = int(os.getenv("CONFIRM_HASH_MAX_BYTES", str(25 * 1024 * 1024)))
+
+# Redis hash the worker publishes: analysis_type -> JSON list of
+# [provider, model, prompt_fp] its result cache accepts
+# (worker result_cache.RESULT_IDENTITIES_KEY)
+RESULT_IDENTITIES_KEY = "ai_analysis:identities"
+
 
 def get_storage():
     """Get storage service (lazy initialization)."""
@@ -27,67 +40,207 @@ def get_storage():
     return storage
 
 
-@router.post("/request-url", response_model=schemas.UploadUrlResponse)
-async def request_upload_url(
-    request: schemas.UploadUrlRequest,
-    db: AsyncSession = Depends(get_async_db)
-):
+async def _find_stored_file(
+    db: AsyncSession,
+    sha256: Optional[str],
+    size_bytes: Optional[int],
+) -> Optional[db_models.FileRegistry]:
     """
-    Request a pre-signed URL for direct upload from phone.
+    Find a confirmed upload with the client-declared hash and size.
     
-    1. Creates database entry for the file
-    2. Generates pre-signed URL
-    3. Phone uploads directly to storage
-    4. Phone calls /confirm-upload to complete
+    Both must be given and match, so a mistyped or partial hash can't
+    resolve to an unrelated file.
     """
-    # Generate storage key
-    storage_key = get_storage().generate_storage_key(
-        original_filename=request.filename,
-        investment_id=str(request.investment_id) if request.investment_id else None,
-        prefix="uploads"
+    if not sha256 or size_bytes is None:
+        return None
+    result = await db.execute(
+        select(db_models.FileRegistry)
+        .where(
+            db_models.FileRegistry.file_hash == sha256.lower(),
+            db_models.FileRegistry.file_size_bytes == size_bytes,
+            db_models.FileRegistry.status.in_([
+                db_models.FileStatus.COMPLETED,
+                db_models.FileStatus.PROCESSING,
+            ]),
+        )
+        .order_by(db_models.FileRegistry.uploaded_at)
+        .limit(1)
     )
+    return result.scalar_one_or_none()
+
+
+async def _register_stored_copy(
+    db: AsyncSession,
+    existing: db_models.FileRegistry,
+    request: schemas.UploadUrlRequest,
+) -> db_models.FileRegistry:
+    """
+    New registry entry for a duplicate upload, sharing the stored object.
     
-    # Create file registry entry
+    The entry carries this upload's filename, investment and metadata, so
+    confirming it never touches the original owner's row.
+    """
     file_entry = db_models.FileRegistry(
         original_filename=request.filename,
-        storage_key=storage_key,
-        storage_bucket=get_storage().bucket,
+        storage_key=existing.storage_key,
+        storage_bucket=existing.storage_bucket,
+        file_size_bytes=existing.file_size_bytes,
+        file_hash=existing.file_hash,
         mime_type=request.content_type,
         source_device=request.source_device,
         investment_id=request.investment_id,
-        metadata=request.metadata,
+        custom_metadata=request.metadata,
         status=db_models.FileStatus.PENDING
     )
-    
     db.add(file_entry)
     await db.commit()
     await db.refresh(file_entry)
+    return file_entry
+
+
+def _already_stored_response(file_entry: db_models.FileRegistry) -> schemas.UploadUrlResponse:
+    """Response for a duplicate upload: no presigned URL, a new file_id on the stored object."""
+    return schemas.UploadUrlResponse(
+        upload_url=None,
+        file_id=file_entry.id,
+        storage_key=file_entry.storage_key,
+        expires_in_seconds=0,
+        already_stored=True
+    )
+
+
+async def _hash_on_confirm(file_entry: db_models.FileRegistry):
+    """Compute file_hash (streaming SHA-256) for small uploads on confirm."""
+    if file_entry.file_hash or file_entry.file_size_bytes is None:
+        return
+    if file_entry.file_size_bytes > CONFIRM_HASH_MAX_BYTES:
+        return
+    try:
+        file_entry.file_hash = await asyncio.to_thread(
+            get_storage().compute_sha256, file_entry.storage_key
+        )
+    except Exception as e:
+        # The worker hashes anything left without a hash
+        print(f"Warning: Failed to hash upload {file_entry.id}: {e}")
+
+
+def _result_identities(analysis_type: str) -> List[Tuple[str, str, str]]:
+    """(provider, model, prompt_fp) triples the worker accepts for a type; [] if unknown."""
+    try:
+        raw = redis_client.hget(RESULT_IDENTITIES_KEY, analysis_type)
+    except Exception as e:
+        print(f"Warning: Failed to read result identities from Redis: {e}")
+        return []
+    return [tuple(identity) for identity in json.loads(raw)] if raw else []
+
+
+async def _link_existing_analysis(
+    db: AsyncSession,
+    file_entry: db_models.FileRegistry,
+    job_type: db_models.JobType,
+    investment_id: Optional[UUID],
+) -> Optional[db_models.ProcessingJob]:
+    """
+    Link an upload to the analysis of an identical file instead of queueing.
     
-    # Generate pre-signed URL
-    upload_url = get_storage().generate_upload_url(
-        storage_key=storage_key,
-        content_type=request.content_type,
-        expires_in=300  # 5 minutes
+    If this file (e.g. a deduplicated upload) was already analyzed, its
+    existing job is returned. Otherwise the newest analysis with the same
+    content hash and type, made with a provider, model and prompt the
+    worker's result cache would accept, is copied onto this file and
+    recorded as a completed job. Returns None if there is none (the worker
+    then decides). Only flushes; the caller commits.
+    """
+    own = await db.execute(
+        select(db_models.ProcessingJob)
+        .join(db_models.AnalysisResult, db_models.ProcessingJob.result_id == db_models.AnalysisResult.id)
+        .where(
+            db_models.ProcessingJob.file_id == file_entry.id,
+            db_models.AnalysisResult.analysis_type == job_type.value,
+        )
+        .order_by(db_models.ProcessingJob.completed_at.desc())
+        .limit(1)
     )
+    existing_job = own.scalar_one_or_none()
+    if existing_job:
+        return existing_job
     
-    return schemas.UploadUrlResponse(
-        upload_url=upload_url,
+    if not file_entry.file_hash:
+        return None
+    identities = _result_identities(job_type.value)
+    if not identities:
+        return None
+    
+    result = await db.execute(
+        select(db_models.AnalysisResult)
+        .join(db_models.FileRegistry, db_models.AnalysisResult.file_id == db_models.FileRegistry.id)
+        .where(
+            db_models.FileRegistry.file_hash == file_entry.file_hash,
+            db_models.FileRegistry.id != file_entry.id,
+            db_models.AnalysisResult.analysis_type == job_type.value,
+            or_(*(
+                and_(
+                    db_models.AnalysisResult.provider == provider,
+                    db_models.AnalysisResult.model_version == model,
+                    db_models.AnalysisResult.quality_flags.any(f"prompt:{prompt_fp}"),
+                )
+                for provider, model, prompt_fp in identities
+            )),
+        )
+        .order_by(db_models.AnalysisResult.created_at.desc())
+        .limit(1)
+    )
+    source = result.scalar_one_or_none()
+    if not source:
+        return None
+    
+    now = datetime.now(timezone.utc)
+    job = db_models.ProcessingJob(
+        job_type=job_type,
         file_id=file_entry.id,
-        storage_key=storage_key,
-        expires_in_seconds=300
+        investment_id=investment_id,
+        priority=5,
+        status=db_models.JobStatus.COMPLETED,
+        started_at=now,
+        completed_at=now,
     )
+    db.add(job)
+    await db.flush()
+    
+    analysis = db_models.AnalysisResult(
+        job_id=job.id,
+        file_id=file_entry.id,
+        investment_id=investment_id,
+        analysis_type=source.analysis_type,
+        model_version=source.model_version,
+        provider=source.provider,
+        raw_text=source.raw_text,
+        structured_data=source.structured_data,
+        summary=source.summary,
+        extracted_entities=source.extracted_entities,
+        extracted_dates=source.extracted_dates,
+        extracted_amounts=source.extracted_amounts,
+        confidence_score=source.confidence_score,
+        quality_flags=list(source.quality_flags or []) + [f"deduplicated:{source.id}"],
+        processing_time_ms=0,
+        tokens_used=0,
+    )
+    db.add(analysis)
+    await db.flush()
+    
+    job.result_id = analysis.id
+    file_entry.processed_at = now
+    await db.flush()
+    return job
 
 
-@router.post("/confirm", response_model=dict)
-async def confirm_upload(
+async def _confirm_file(
+    db: AsyncSession,
     request: schemas.ConfirmUploadRequest,
-    db: AsyncSession = Depends(get_async_db)
-):
+) -> Tuple[dict, Optional[str]]:
     """
-    Confirm upload completion and optionally queue for analysis.
-    
-    Phone calls this after uploading file to storage.
-    Creates processing job if requested.
+    Confirm one upload: mark it completed, create its document and link or
+    queue its analysis. Only flushes; returns the response fields and the id
+    of a queued job to announce once the caller has committed.
     """
     # Get file entry
     result = await db.execute(
@@ -112,22 +265,35 @@ async def confirm_upload(
             detail=f"File not found in storage. Please upload the file first. Error: {str(e)}"
         )
     
+    # A confirmed file keeps its owner; a duplicate upload gets its own entry
+    if (
+        file_entry.status == db_models.FileStatus.COMPLETED
+        and file_entry.investment_id
+        and request.investment_id
+        and request.investment_id != file_entry.investment_id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="File is already confirmed for another investment; request a new upload URL"
+        )
+    
+    await _hash_on_confirm(file_entry)
+    
     # Update file status
     file_entry.status = db_models.FileStatus.COMPLETED
     file_entry.investment_id = request.investment_id or file_entry.investment_id
     
-    await db.commit()
-    
     response = {
-        "message": "Upload confirmed",
         "file_id": str(file_entry.id),
         "status": "completed",
-        "file_size_bytes": file_entry.file_size_bytes
+        "file_size_bytes": file_entry.file_size_bytes,
+        "file_hash": file_entry.file_hash
     }
     
-    # Create document if investment is specified
-    document = None
-    if request.document_type and request.investment_id:
+    # Create document if investment is specified (once per file)
+    if file_entry.document_id:
+        response["document_id"] = str(file_entry.document_id)
+    elif request.document_type and request.investment_id:
         document = db_models.Document(
             investment_id=request.investment_id,
             file_id=file_entry.id,
@@ -135,43 +301,126 @@ async def confirm_upload(
             title=file_entry.original_filename
         )
         db.add(document)
-        await db.commit()
-        await db.refresh(document)
+        await db.flush()
         
         # Link document to file registry
         file_entry.document_id = document.id
-        await db.commit()
         
         response["document_created"] = True
         response["document_id"] = str(document.id)
     
-    # Queue for analysis if requested
-    if request.request_analysis:
-        job = db_models.ProcessingJob(
-            job_type=request.analysis_type or db_models.JobType.DOCUMENT_ANALYSIS,
-            file_id=file_entry.id,
-            investment_id=request.investment_id,
-            priority=5,
-            status=db_models.JobStatus.QUEUED
-        )
-        db.add(job)
-        await db.commit()
-        await db.refresh(job)
-        
-        response["analysis_queued"] = True
-        response["job_id"] = str(job.id)
-        
-        # Publish to Redis for worker notification
-        try:
-            redis_client.publish(
-                "jobs:new",
-                str(job.id)
-            )
-        except Exception as e:
-            # Log but don't fail if Redis is unavailable
-            print(f"Warning: Failed to publish to Redis: {e}")
+    if not request.request_analysis:
+        return response, None
+    
+    # Queue for analysis (identical files reuse the existing analysis)
+    job_type = request.analysis_type or db_models.JobType.DOCUMENT_ANALYSIS
+    linked_job = await _link_existing_analysis(db, file_entry, job_type, request.investment_id)
+    if linked_job:
+        response["analysis_linked"] = True
+        response["job_id"] = str(linked_job.id)
+        response["result_id"] = str(linked_job.result_id)
+        return response, None
+    
+    job = db_models.ProcessingJob(
+        job_type=job_type,
+        file_id=file_entry.id,
+        investment_id=request.investment_id,
+        priority=5,
+        status=db_models.JobStatus.QUEUED
+    )
+    db.add(job)
+    await db.flush()
+    
+    response["analysis_queued"] = True
+    response["job_id"] = str(job.id)
+    return response, str(job.id)
+
+
+def _announce_job(job_id: str):
+    """Publish a committed job to Redis for worker notification."""
+    try:
+        redis_client.publish("jobs:new", job_id)
+    except Exception as e:
+        # Log but don't fail if Redis is unavailable
+        print(f"Warning: Failed to publish to Redis: {e}")
+
+
+@router.post("/request-url", response_model=schemas.UploadUrlResponse)
+async def request_upload_url(
+    request: schemas.UploadUrlRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Request a pre-signed URL for direct upload from phone.
+    
+    1. Creates database entry for the file
+    2. Generates pre-signed URL
+    3. Phone uploads directly to storage
+    4. Phone calls /confirm-upload to complete
+    
+    If the client sends sha256 and size_bytes of a file that is already
+    stored, no URL is issued: the response has already_stored=True and a
+    new file_id on the stored object, which can be confirmed directly.
+    """
+    existing = await _find_stored_file(db, request.sha256, request.size_bytes)
+    if existing:
+        return _already_stored_response(await _register_stored_copy(db, existing, request))
+    
+    # Generate storage key
+    storage_key = get_storage().generate_storage_key(
+        original_filename=request.filename,
+        investment_id=str(request.investment_id) if request.investment_id else None,
+        prefix="uploads"
+    )
+    
+    # Create file registry entry
+    file_entry = db_models.FileRegistry(
+        original_filename=request.filename,
+        storage_key=storage_key,
+        storage_bucket=get_storage().bucket,
+        mime_type=request.content_type,
+        source_device=request.source_device,
+        investment_id=request.investment_id,
+        custom_metadata=request.metadata,
+        status=db_models.FileStatus.PENDING
+    )
+    
+    db.add(file_entry)
+    await db.commit()
+    await db.refresh(file_entry)
+    
+    # Generate pre-signed URL
+    upload_url = get_storage().generate_upload_url(
+        storage_key=storage_key,
+        content_type=request.content_type,
+        expires_in=300  # 5 minutes
+    )
+    
+    return schemas.UploadUrlResponse(
+        upload_url=upload_url,
+        file_id=file_entry.id,
+        storage_key=storage_key,
+        expires_in_seconds=300
+    )
+
+
+@router.post("/confirm", response_model=dict)
+async def confirm_upload(
+    request: schemas.ConfirmUploadRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Confirm upload completion and optionally queue for analysis.
+    
+    Phone calls this after uploading file to storage.
+    Creates processing job if requested.
+    """
+    response, queued_job_id = await _confirm_file(db, request)
+    await db.commit()
+    if queued_job_id:
+        _announce_job(queued_job_id)
     
-    return response
+    return {"message": "Upload confirmed", **response}
 
 
 @router.get("/status/{file_id}", response_model=schemas.FileRegistryResponse)
@@ -203,11 +452,17 @@ async def request_upload_urls_batch(
     Request multiple pre-signed URLs for batch upload.
     
     This is useful when uploading multiple files at once from the phone.
-    Returns a list of upload URLs in the same order as the requests.
+    Returns a list of upload URLs in the same order as the requests;
+    already-stored files are answered as in /request-url.
     """
     responses = []
     
     for request in requests:
+        existing = await _find_stored_file(db, request.sha256, request.size_bytes)
+        if existing:
+            responses.append(_already_stored_response(await _register_stored_copy(db, existing, request)))
+            continue
+        
         # Generate storage key
         storage_key = get_storage().generate_storage_key(
             original_filename=request.filename,
@@ -223,7 +478,7 @@ async def request_upload_urls_batch(
             mime_type=request.content_type,
             source_device=request.source_device,
             investment_id=request.investment_id,
-            metadata=request.metadata,
+            custom_metadata=request.metadata,
             status=db_models.FileStatus.PENDING
         )
         
@@ -257,100 +512,37 @@ async def confirm_uploads_batch(
     Confirm multiple uploads at once.
     
     This is useful for batch confirmation after uploading multiple files.
+    Each file is confirmed in its own savepoint, so a failing file is
+    reported without undoing the others; everything commits once at the end.
     """
     responses = []
+    queued_job_ids = []
     
     for request in requests:
         try:
-            # Get file entry
-            result = await db.execute(
-                select(db_models.FileRegistry).where(db_models.FileRegistry.id == request.file_id)
-            )
-            file_entry = result.scalar_one_or_none()
-            
-            if not file_entry:
-                responses.append({
-                    "file_id": str(request.file_id),
-                    "status": "error",
-                    "error": "File not found"
-                })
-                continue
-            
-            # Verify file exists in storage and get metadata
-            try:
-                file_metadata = get_storage().get_file_metadata(file_entry.storage_key)
-                file_entry.file_size_bytes = file_metadata.get('size')
-            except Exception as e:
-                responses.append({
-                    "file_id": str(request.file_id),
-                    "status": "error",
-                    "error": f"File not found in storage: {str(e)}"
-                })
-                continue
-            
-            # Update file status
-            file_entry.status = db_models.FileStatus.COMPLETED
-            file_entry.investment_id = request.investment_id or file_entry.investment_id
-            
-            await db.commit()
-            
-            response = {
-                "file_id": str(file_entry.id),
-                "status": "completed",
-                "file_size_bytes": file_entry.file_size_bytes
-            }
-            
-            # Create document if investment is specified
-            if request.document_type and request.investment_id:
-                document = db_models.Document(
-                    investment_id=request.investment_id,
-                    file_id=file_entry.id,
-                    document_type=request.document_type,
-                    title=file_entry.original_filename
-                )
-                db.add(document)
-                await db.commit()
-                await db.refresh(document)
-                
-                # Link document to file registry
-                file_entry.document_id = document.id
-                await db.commit()
-                
-                response["document_created"] = True
-                response["document_id"] = str(document.id)
-            
-            # Queue for analysis if requested
-            if request.request_analysis:
-                job = db_models.ProcessingJob(
-                    job_type=request.analysis_type or db_models.JobType.DOCUMENT_ANALYSIS,
-                    file_id=file_entry.id,
-                    investment_id=request.investment_id,
-                    priority=5,
-                    status=db_models.JobStatus.QUEUED
-                )
-                db.add(job)
-                await db.commit()
-                await db.refresh(job)
-                
-                response["analysis_queued"] = True
-                response["job_id"] = str(job.id)
-                
-                # Publish to Redis for worker notification
-                try:
-                    redis_client.publish(
-                        "jobs:new",
-                        str(job.id)
-                    )
-                except Exception as e:
-                    print(f"Warning: Failed to publish to Redis: {e}")
-            
-            responses.append(response)
-            
+            async with db.begin_nested():
+                response, queued_job_id = await _confirm_file(db, request)
+        except HTTPException as e:
+            responses.append({
+                "file_id": str(request.file_id),
+                "status": "error",
+                "error": e.detail
+            })
+            continue
         except Exception as e:
             responses.append({
                 "file_id": str(request.file_id),
                 "status": "error",
                 "error": str(e)
             })
+            continue
+        
+        responses.append(response)
+        if queued_job_id:
+            queued_job_ids.append(queued_job_id)
+    
+    await db.commit()
+    for job_id in queued_job_ids:
+        _announce_job(job_id)
     
     return responses
@@ -188,6 +188,20 @@ def upload_file(
         except ClientError as e:
             raise Exception(f"Failed to upload file: {e}")
     
+    def compute_sha256(self, storage_key: str, chunk_size: int = 1024 * 1024) -> str:
+        """
+        SHA-256 of a stored object, streamed in chunks.
+        Memory use is bounded by chunk_size regardless of object size.
+        """
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=storage_key)
+            digest = hashlib.sha256()
+            for chunk in response['Body'].iter_chunks(chunk_size):
+                digest.update(chunk)
+            return digest.hexdigest()
+        except ClientError as e:
+            raise Exception(f"Failed to hash file: {e}")
+    
     def download_file(self, storage_key: str) -> Tuple[bytes, str]:
         """Download a file to memory."""
         try:
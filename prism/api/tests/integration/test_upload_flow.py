@@ -170,3 +170,160 @@ async def test_get_queue_stats(self, client):
         data = response.json()
         # Verify expected fields exist
         assert any(key in data for key in ["queued", "running", "completed", "failed", "pending"])
+
+
+class TestUploadDedup:
+    """Test client-declared hash dedup on request-url and confirm."""
+    
+    FILE_HASH = "ab" * 32
+    
+    async def _stored_file(self, db_session, **fields):
+        """A confirmed upload of FILE_HASH owned by a new investment."""
+        from models import FileRegistry, FileStatus, Investment, InvestmentCategory
+        import uuid
+        
+        owner = Investment(id=uuid.uuid4(), name="Owner", category=InvestmentCategory.LAND)
+        db_session.add(owner)
+        file = FileRegistry(
+            id=uuid.uuid4(),
+            original_filename="deed.pdf",
+            storage_key="uploads/deed.pdf",
+            storage_bucket="test-bucket",
+            file_size_bytes=1024,
+            file_hash=self.FILE_HASH,
+            mime_type="application/pdf",
+            status=FileStatus.COMPLETED,
+            investment_id=owner.id,
+            **fields,
+        )
+        db_session.add(file)
+        await db_session.commit()
+        return file
+    
+    async def _investment(self, db_session):
+        from models import Investment, InvestmentCategory
+        import uuid
+        
+        investment = Investment(id=uuid.uuid4(), name="Other", category=InvestmentCategory.LAND)
+        db_session.add(investment)
+        await db_session.commit()
+        return investment
+    
+    def _storage(self):
+        storage = MagicMock()
+        storage.bucket = "test-bucket"
+        storage.get_file_metadata.return_value = {"size": 1024}
+        return storage
+    
+    @pytest.mark.asyncio
+    async def test_duplicate_gets_own_entry_and_keeps_owner(self, async_client, db_session):
+        """A dedup hit is confirmed on a new entry; the original row is untouched."""
+        from models import FileRegistry
+        import uuid
+        
+        stored = await self._stored_file(db_session)
+        other = await self._investment(db_session)
+        
+        with patch("routers.uploads.get_storage", return_value=self._storage()):
+            response = await async_client.post("/api/v1/uploads/request-url", json={
+                "filename": "copy.pdf",
+                "content_type": "application/pdf",
+                "investment_id": str(other.id),
+                "metadata": {"page": "2"},
+                "sha256": self.FILE_HASH,
+                "size_bytes": 1024,
+            })
+            data = response.json()
+            assert data["already_stored"] is True
+            assert data["upload_url"] is None
+            assert data["storage_key"] == stored.storage_key
+            assert data["file_id"] != str(stored.id)
+            
+            confirm = await async_client.post("/api/v1/uploads/confirm", json={
+                "file_id": data["file_id"],
+                "investment_id": str(other.id),
+                "document_type": "other",
+                "request_analysis": False,
+            })
+        assert confirm.status_code == 200
+        
+        await db_session.refresh(stored)
+        copy = await db_session.get(FileRegistry, uuid.UUID(data["file_id"]))
+        assert stored.investment_id != other.id
+        assert stored.document_id is None
+        assert copy.investment_id == other.id
+        assert copy.original_filename == "copy.pdf"
+        assert copy.custom_metadata == {"page": "2"}
+        assert copy.file_hash == self.FILE_HASH
+    
+    @pytest.mark.asyncio
+    async def test_size_mismatch_issues_upload_url(self, async_client, db_session):
+        """Hash and size must both match to skip the upload."""
+        await self._stored_file(db_session)
+        storage = self._storage()
+        storage.generate_upload_url.return_value = "https://test-bucket/put"
+        storage.generate_storage_key.return_value = "uploads/new.pdf"
+        
+        with patch("routers.uploads.get_storage", return_value=storage):
+            response = await async_client.post("/api/v1/uploads/request-url", json={
+                "filename": "new.pdf",
+                "content_type": "application/pdf",
+                "sha256": self.FILE_HASH,
+                "size_bytes": 2048,
+            })
+        data = response.json()
+        assert data["already_stored"] is False
+        assert data["upload_url"] == "https://test-bucket/put"
+    
+    @pytest.mark.asyncio
+    async def test_confirm_refuses_reassigning_confirmed_file(self, async_client, db_session):
+        """Confirming another investment's file by id is a conflict."""
+        stored = await self._stored_file(db_session)
+        other = await self._investment(db_session)
+        
+        with patch("routers.uploads.get_storage", return_value=self._storage()):
+            response = await async_client.post("/api/v1/uploads/confirm", json={
+                "file_id": str(stored.id),
+                "investment_id": str(other.id),
+                "request_analysis": False,
+            })
+        assert response.status_code == 409
+    
+    @pytest.mark.asyncio
+    async def test_confirm_links_analysis_with_matching_identity(self, async_client, db_session):
+        """An identical file's analysis is reused only under a published cache identity."""
+        from models import AnalysisResult
+        import json
+        
+        stored = await self._stored_file(db_session)
+        db_session.add(AnalysisResult(
+            file_id=stored.id,
+            analysis_type="document_analysis",
+            provider="openai",
+            model_version="gpt-4o",
+            summary="Deed",
+            quality_flags=["tier:ai", "prompt:0123456789abcdef"],
+        ))
+        await db_session.commit()
+        
+        async def confirm_copy(identities):
+            redis = MagicMock()
+            redis.hget.return_value = json.dumps(identities)
+            with patch("routers.uploads.get_storage", return_value=self._storage()), \
+                 patch("routers.uploads.redis_client", redis):
+                requested = await async_client.post("/api/v1/uploads/request-url", json={
+                    "filename": "copy.pdf",
+                    "content_type": "application/pdf",
+                    "sha256": self.FILE_HASH,
+                    "size_bytes": 1024,
+                })
+                return (await async_client.post("/api/v1/uploads/confirm", json={
+                    "file_id": requested.json()["file_id"],
+                    "request_analysis": True,
+                })).json()
+        
+        stale = await confirm_copy([["openai", "gpt-4o", "fedcba9876543210"]])
+        assert stale.get("analysis_queued") is True
+        
+        linked = await confirm_copy([["openai", "gpt-4o", "0123456789abcdef"]])
+        assert linked.get("analysis_linked") is True
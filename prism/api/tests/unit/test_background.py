@@ -0,0 +1,50 @@
+"""
+===============================================================================
+UNIT TESTS - Background Loop
+===============================================================================
+Tests for the shared periodic-job loop.
+"""
+import asyncio
+
+import pytest
+
+from lib.background import BackgroundLoop
+
+
+class FlakyJob(BackgroundLoop):
+    """Fails its first round, then counts rounds."""
+    name = "flaky-job"
+    log_prefix = "Flaky"
+
+    def __init__(self):
+        super().__init__(interval_seconds=0.01)
+        self.rounds = 0
+        self.reported = []
+
+    async def run_once(self):
+        self.rounds += 1
+        if self.rounds == 1:
+            raise ConnectionError("source down")
+        return self.rounds
+
+    def report(self, result):
+        self.reported.append(result)
+
+
+class TestBackgroundLoop:
+    """Test scheduling, error handling and shutdown."""
+
+    @pytest.mark.asyncio
+    async def test_failed_round_does_not_stop_the_loop(self):
+        job = FlakyJob()
+        job.start()
+        job.start()  # Idempotent
+        while len(job.reported) < 2:
+            await asyncio.sleep(0.01)
+        await job.stop()
+        assert job._task is None
+        assert job.reported[:2] == [2, 3]
+
+    def test_run_once_is_abstract(self):
+        with pytest.raises(TypeError):
+            BackgroundLoop(1.0)
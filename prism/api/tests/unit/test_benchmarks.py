@@ -0,0 +1,138 @@
+"""
+===============================================================================
+UNIT TESTS - Benchmarks
+===============================================================================
+Tests for the cumulative benchmark index and batch comparisons.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from lib.benchmarks import (
+    BENCHMARK_SYMBOLS,
+    FALLBACK_RATES,
+    BenchmarkRefresher,
+    SGS_SERIES,
+    BenchmarkSet,
+    CumulativeIndex,
+    chain_rates,
+    compare_with_benchmarks,
+)
+from lib import benchmarks as benchmarks_module
+from lib.financial_metrics import FinancialMetricsEngine
+from lib.price_store import PriceBar
+
+ORIGIN = date(2020, 1, 1)
+LAST = date(2024, 12, 31)
+
+
+class TestCumulativeIndex:
+    """Test index construction and lookups."""
+
+    def test_ratio_lookup_and_forward_fill(self):
+        index = CumulativeIndex.build(
+            [(date(2024, 1, 5), 100.0), (date(2024, 1, 8), 110.0)], 0.10, ORIGIN, LAST
+        )
+        assert index.period_return(date(2024, 1, 5), date(2024, 1, 7)) == pytest.approx(0.0)  # Weekend
+        assert index.period_return(date(2024, 1, 5), date(2024, 1, 8)) == pytest.approx(0.10)
+
+    def test_constant_rate_outside_history(self):
+        index = CumulativeIndex.build([(date(2022, 1, 1), 100.0)], 0.10, ORIGIN, LAST)
+        assert index.annualized_returns([date(2020, 1, 1)], [date(2022, 1, 1)])[0] == pytest.approx(0.10)
+        assert index.annualized_returns([date(2022, 1, 1)], [date(2024, 1, 1)])[0] == pytest.approx(0.10)
+
+        # Without stored history the index is the old flat-rate comparison
+        flat = CumulativeIndex.build([], 0.05, ORIGIN, LAST)
+        assert flat.annualized_returns([date(2021, 3, 1)], [date(2023, 3, 1)])[0] == pytest.approx(0.05)
+
+    def test_vectorized_matches_scalar(self):
+        index = CumulativeIndex.build(
+            [(ORIGIN + timedelta(days=i), 100.0 * 1.001 ** i) for i in range(0, 1500, 3)], 0.10, ORIGIN, LAST
+        )
+        starts = [date(2020, 3, 1), date(2021, 6, 15), date(2023, 1, 2)]
+        ends = [date(2024, 1, 1)] * 3
+        batch = index.period_returns(starts, ends)
+        assert np.allclose(batch, [index.period_return(s, e) for s, e in zip(starts, ends)])
+
+    def test_chain_rates(self):
+        cdi, ipca = BENCHMARK_SYMBOLS["cdi_br"], BENCHMARK_SYMBOLS["inflation_br"]
+        bars = chain_rates(cdi, [(date(2024, 1, 2), 1.0), (date(2024, 1, 3), 1.0)], 1000.0)
+        assert [b.close for b in bars] == [1010.0, 1020.1]
+        assert {b.symbol for b in bars} == {"BENCH:CDI"}
+        monthly = chain_rates(ipca, [(date(2024, 2, 1), 0.5)], 1000.0, "monthly")
+        assert monthly[0].price_date == date(2024, 2, 29)
+
+    def test_bcb_series_use_reserved_symbols(self):
+        assert set(SGS_SERIES) == {"BENCH:CDI", "BENCH:SELIC", "BENCH:IPCA"}
+        assert all(len(symbol) <= 32 for symbol in BENCHMARK_SYMBOLS.values())  # price_history.symbol
+
+
+class TestCompareWithBenchmarks:
+    """Test batch comparisons against the series."""
+
+    def _metrics(self, purchase_date, purchase_price=100.0, current_value=150.0):
+        return FinancialMetricsEngine().analyze_investment(
+            investment_id="1", name="Gold", category="gold",
+            purchase_price=purchase_price, current_value=current_value, purchase_date=purchase_date,
+        )
+
+    def test_flat_series_matches_constant_rates(self):
+        metrics = self._metrics(date.today() - timedelta(days=800))
+        expected = (metrics.vs_cdi, metrics.vs_sp500, metrics.vs_inflation)
+        compare_with_benchmarks([metrics], BenchmarkSet.from_series({}))
+        assert (metrics.vs_cdi, metrics.vs_sp500, metrics.vs_inflation) == pytest.approx(expected)
+
+    def test_uses_holding_period_returns(self):
+        start = date.today() - timedelta(days=730)
+        series = {"cdi_br": [(start, 100.0), (date.today(), 121.0)]}  # 10% a year over the holding
+        benchmarks = BenchmarkSet.from_series(series, origin=start - timedelta(days=10))
+        recent, old = self._metrics(start), self._metrics(start - timedelta(days=400))
+        compare_with_benchmarks([recent, old], benchmarks)
+
+        years = 730 / 365.25
+        assert recent.vs_cdi == pytest.approx(recent.cagr - (1.21 ** (1 / years) - 1) * 100)
+        assert old.vs_cdi != pytest.approx(old.cagr - FALLBACK_RATES["cdi_br"] * 100)
+
+
+class FakeSession:
+    def __init__(self, log):
+        self.log = log
+
+    async def __aenter__(self):
+        self.log.append("open")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.log.append("close")
+
+    def begin(self):
+        return self
+
+
+class TestBenchmarkRefresher:
+    """Test the background refresh round."""
+
+    @pytest.mark.asyncio
+    async def test_fetches_outside_any_session(self, monkeypatch):
+        log, written = [], []
+
+        async def tails(session):
+            return {"cdi_br": (date(2024, 1, 2), 1000.0), "sp500": (date(2024, 1, 3), 1.0)}
+
+        async def fetch(tails, end):
+            log.append("fetch")
+            return {"cdi_br": chain_rates("BENCH:CDI", [(date(2024, 1, 2), 1.0)], tails["cdi_br"][1]), "sp500": []}
+
+        async def ingest(session, bars):
+            written.extend(bars)
+            return len(bars)
+
+        monkeypatch.setattr(benchmarks_module, "benchmark_tails", tails)
+        monkeypatch.setattr(benchmarks_module, "fetch_benchmark_bars", fetch)
+        monkeypatch.setattr(benchmarks_module, "ingest_prices", ingest)
+        refresher = BenchmarkRefresher(lambda: FakeSession(log), interval_seconds=60)
+
+        assert await refresher.run_once(end=date(2024, 1, 3)) == {"cdi_br": 1, "sp500": 0}
+        assert log[:3] == ["open", "close", "fetch"]
+        assert written == [PriceBar("BENCH:CDI", date(2024, 1, 2), 1010.0, source="bcb")]
@@ -0,0 +1,33 @@
+"""
+===============================================================================
+UNIT TESTS - TTL Cache
+===============================================================================
+Tests for the process-wide loaded values shared by benchmarks and FX.
+"""
+import pytest
+
+from lib.cache import TTLCache
+
+
+class TestTTLCache:
+    """Test reloads by age and invalidation."""
+
+    @pytest.mark.asyncio
+    async def test_reload_after_ttl_and_invalidate(self):
+        now = [0.0]
+        loads = []
+
+        async def loader(session):
+            loads.append(session)
+            return len(loads)
+
+        cache = TTLCache(loader, max_age_seconds=60, clock=lambda: now[0])
+        assert await cache.get("s1") == 1
+        now[0] = 30
+        assert await cache.get("s2") == 1
+        assert await cache.get("s2", max_age_seconds=10) == 2  # Caller's tighter bound
+        now[0] = 100
+        assert await cache.get("s3") == 3
+        cache.invalidate()
+        assert await cache.get("s4") == 4
+        assert loads == ["s1", "s2", "s3", "s4"]
@@ -0,0 +1,124 @@
+"""
+===============================================================================
+UNIT TESTS - FX
+===============================================================================
+Tests for the exchange-rate matrix, conversions and the converted-series cache.
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from lib.financial_metrics import FinancialMetricsEngine
+from lib.fx import FX_FALLBACK_RATES, ConvertedSeriesCache, FXRateTable
+
+ORIGIN = date(2024, 1, 1)
+LAST = date(2024, 12, 31)
+
+
+def _table():
+    series = {
+        "BRL": [(date(2024, 1, 2), 5.0), (date(2024, 1, 5), 4.9)],  # Friday
+        "CLP": [(date(2024, 1, 2), 900.0)],
+    }
+    return FXRateTable.build(series, ORIGIN, LAST, currencies=["BRL", "CLP", "EUR"])
+
+
+class TestFXRateTable:
+    """Test rate lookups and conversions."""
+
+    def test_forward_and_back_fill(self):
+        table = _table()
+        assert table.rates(date(2024, 1, 1))["BRL"] == 5.0  # Before the first rate
+        assert table.rates(date(2024, 1, 7))["BRL"] == 4.9  # Weekend keeps Friday's rate
+        assert table.rates(date(2024, 1, 7), base="BRL")["CLP"] == pytest.approx(900.0 / 4.9)
+
+    def test_vectorized_mixed_currencies(self):
+        table = _table()
+        converted = table.convert(
+            [100.0, 9000.0, 50.0], ["USD", "CLP", "BRL"], "BRL",
+            [date(2024, 1, 2), date(2024, 1, 2), date(2024, 1, 5)],
+        )
+        assert converted.tolist() == pytest.approx([500.0, 50.0, 50.0])
+
+    def test_per_value_targets(self):
+        converted = _table().convert([10.0, 10.0], "USD", ["BRL", "CLP"], [date(2024, 1, 2)] * 2)
+        assert converted.tolist() == pytest.approx([50.0, 9000.0])
+
+    def test_fallback_rates_are_flagged(self):
+        table = _table()
+        assert table.estimated == ["EUR"]
+        assert table.rates(date(2024, 6, 1))["EUR"] == FX_FALLBACK_RATES["EUR"]
+
+    def test_unknown_currency(self):
+        table = _table()
+        with pytest.raises(ValueError, match="ARS"):
+            table.convert_value(1.0, "ARS", "BRL", date(2024, 1, 2))
+
+        # Totals convert what has rates and report the rest
+        result = table.convert_known([100.0, 50.0, 30.0], ["USD", "ARS", "ars"], "BRL", [date(2024, 1, 2)] * 3)
+        assert result.values[0] == pytest.approx(500.0) and np.isnan(result.values[1:]).all()
+        assert result.total() == pytest.approx(500.0)
+        assert result.flags() == {"fx_estimated": [], "fx_unconverted": {"ARS": 80.0}, "total_is_estimated": True}
+        skipped = table.convert_known([100.0, 20.0], ["USD", "USD"], "BRL", [date(2024, 1, 2)] * 2, skip=[False, True])
+        assert skipped.total() == pytest.approx(500.0) and skipped.unconverted == {"USD": 20.0}
+
+    def test_fallback_totals_are_flagged(self):
+        table = _table()
+        assert table.convert_known([1.0], ["USD"], "BRL", [date(2024, 1, 2)]).flags()["total_is_estimated"] is False
+        result = table.convert_known([1.0, 1.0], ["USD", "EUR"], "BRL", [date(2024, 1, 2)] * 2)
+        assert result.estimated == ["EUR"] and result.flags()["total_is_estimated"] is True
+        usd_only = table.convert_known([1.0], ["USD"], "BRL", [date(2024, 1, 2)])
+        assert usd_only.flags(result)["fx_estimated"] == ["EUR"]
+        assert table.convert_known([], [], "BRL", []).total() == 0.0
+
+    def test_same_currency_is_untouched(self):
+        assert _table().convert_value(123.45, None, "BRL", date(2024, 1, 2)) == 123.45
+
+
+class TestConvertedSeriesCache:
+    """Test per (investment, currency) caching."""
+
+    def test_reuses_until_series_or_table_changes(self):
+        cache = ConvertedSeriesCache(max_entries=2)
+        table = _table()
+        rows = [(date(2024, 1, 2), 100.0, "USD"), (date(2024, 1, 5), 100.0, "USD")]
+        first = cache.get("inv-1", "BRL", rows, table)
+        assert first == [(date(2024, 1, 2), 500.0), (date(2024, 1, 5), pytest.approx(490.0))]
+        assert cache.get("inv-1", "BRL", list(rows), table) is first
+
+        rows.append((date(2024, 1, 8), 110.0, "USD"))
+        assert len(cache.get("inv-1", "BRL", rows, table)) == 3
+        assert cache.get("inv-1", "BRL", rows, _table()) is not first
+
+    def test_corrected_middle_row_is_reconverted(self):
+        cache = ConvertedSeriesCache(max_entries=2)
+        table = _table()
+        rows = [(date(2024, 1, 2), 100.0, "USD"), (date(2024, 1, 3), 100.0, "USD"), (date(2024, 1, 5), 100.0, "USD")]
+        first = cache.get("inv-1", "BRL", rows, table)
+        rows[1] = (date(2024, 1, 3), 120.0, "USD")
+        assert cache.get("inv-1", "BRL", rows, table)[1][1] == pytest.approx(600.0)
+        assert first[1][1] == pytest.approx(500.0)
+
+    def test_lru_bound(self):
+        cache = ConvertedSeriesCache(max_entries=2)
+        table = _table()
+        rows = [(date(2024, 1, 2), 1.0, "BRL")]
+        for inv_id in ("a", "b", "c"):
+            cache.get(inv_id, "USD", rows, table)
+        assert [key[0] for key in cache._entries] == ["b", "c"]
+
+
+class TestPortfolioCurrency:
+    """Test that aggregates refuse mixed currencies."""
+
+    def test_mixed_currencies_raise(self):
+        engine = FinancialMetricsEngine()
+        metrics = [
+            engine.analyze_investment("1", "Land", "land", 100.0, 120.0, date(2020, 1, 1), currency="BRL"),
+            engine.analyze_investment("2", "Lot", "land", 100.0, 120.0, date(2020, 1, 1), currency="CLP"),
+        ]
+        with pytest.raises(ValueError, match="different currencies"):
+            engine.calculate_portfolio_metrics(metrics)
+        metrics[1].currency = "BRL"
+        assert engine.calculate_portfolio_metrics(metrics).currency == "BRL"
@@ -0,0 +1,158 @@
+"""
+===============================================================================
+UNIT TESTS - Market Data Refresher
+===============================================================================
+Tests for the background quote refresher, persisted cache and payload.
+"""
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from lib.market_data import (
+    MARKET_SYMBOLS,
+    USD_CLP,
+    MarketDataRefresher,
+    Quote,
+    QuoteSource,
+    StubQuoteSource,
+    build_market_payload,
+    read_market_data,
+)
+from lib.price_store import PriceBar, build_valuation_rows
+
+
+class FakeStore:
+    """In-memory stand-in for QuoteStore (table + snapshot)."""
+
+    def __init__(self, slot_free=True, due=None):
+        self.slot_free = slot_free
+        self.due = slot_free if due is None else due
+        self.rows = {}
+        self.snapshot = None
+
+    async def refresh_due(self, min_age_seconds):
+        return self.due
+
+    @asynccontextmanager
+    async def refresh_slot(self, min_age_seconds):
+        yield "session" if self.slot_free else None
+
+    async def save(self, session, quotes):
+        self.rows.update(quotes)
+
+    async def load_from_db(self):
+        return dict(self.rows)
+
+    async def publish(self, quotes):
+        self.snapshot = dict(quotes)
+
+    async def load(self):
+        return dict(self.snapshot if self.snapshot is not None else self.rows)
+
+
+class BrokenSource(QuoteSource):
+    name = "broken"
+
+    async def fetch(self, symbols):
+        raise ConnectionError("429 Too Many Requests")
+
+
+def _quote(symbol, price, prev=None, age_seconds=0):
+    return Quote(symbol, price, prev, "stub", datetime.now(timezone.utc) - timedelta(seconds=age_seconds))
+
+
+class TestRefresher:
+    """Test refresh rounds against the stub source."""
+
+    @pytest.mark.asyncio
+    async def test_refresh_persists_and_publishes(self):
+        store = FakeStore()
+        refresher = MarketDataRefresher(store, sources=[StubQuoteSource()])
+        quotes = await refresher.refresh_once()
+        assert set(quotes) == set(MARKET_SYMBOLS)
+        assert set(store.snapshot) == set(MARKET_SYMBOLS)
+
+    @pytest.mark.asyncio
+    async def test_failed_symbols_keep_last_quote(self):
+        store = FakeStore()
+        store.rows["GC=F"] = _quote("GC=F", 2000.0, age_seconds=3600)
+        source = StubQuoteSource(failing={"GC=F"})
+        await MarketDataRefresher(store, sources=[source, BrokenSource()]).refresh_once()
+        assert store.snapshot["GC=F"].price == 2000.0
+        assert store.snapshot["SI=F"].source == "stub"
+
+    @pytest.mark.asyncio
+    async def test_skips_when_another_replica_refreshed(self):
+        source = StubQuoteSource()
+        refresher = MarketDataRefresher(FakeStore(slot_free=False), sources=[source])
+        assert await refresher.refresh_once() is None
+        assert source.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_fetches_before_taking_the_slot(self):
+        # Another replica saved while this one was fetching: nothing is written
+        store = FakeStore(slot_free=False, due=True)
+        source = StubQuoteSource()
+        assert await MarketDataRefresher(store, sources=[source]).refresh_once() is None
+        assert source.calls == 1
+        assert store.rows == {} and store.snapshot is None
+
+    @pytest.mark.asyncio
+    async def test_stub_quotes_produce_valuations(self):
+        quotes = await StubQuoteSource().fetch(["GC=F", USD_CLP])
+        assert quotes["GC=F"].currency == "USD"
+        assert quotes[USD_CLP].currency == "CLP"
+        # The bars QuoteStore.save() ingests
+        bars = [PriceBar(q.symbol, q.fetched_at.date(), q.price, q.currency, q.source) for q in quotes.values()]
+        holding = SimpleNamespace(id=uuid.uuid4(), symbol="gc=f", quantity=3)
+        rows = build_valuation_rows([holding], bars)
+        assert [(row["value"], row["currency"]) for row in rows] == [(Decimal("7050.00"), "USD")]
+
+    def test_quote_source_is_abstract(self):
+        with pytest.raises(TypeError):
+            QuoteSource()
+
+    @pytest.mark.asyncio
+    async def test_read_never_calls_sources(self):
+        store = FakeStore()
+        store.snapshot = {USD_CLP: _quote(USD_CLP, 950.0)}
+        data = await read_market_data(store)
+        assert data["usd_clp_rate"] == 950.0
+        assert data["gold_usd_per_oz"] is None
+
+
+class TestPayload:
+    """Test conversions and the staleness indicator."""
+
+    def test_conversions(self):
+        quotes = {
+            USD_CLP: _quote(USD_CLP, 900.0),
+            "GC=F": _quote("GC=F", 2000.0),
+            "^IXIC": _quote("^IXIC", 110.0, prev=100.0),
+            "HG=F": _quote("HG=F", 4.53592),
+        }
+        data = build_market_payload(quotes)
+        assert data["gold_clp_per_gram"] == round(2000.0 * 900.0 / 31.1034768, 2)
+        assert data["nasdaq_change_pct"] == 10.0
+        assert data["copper_usd_kg"] == 10.0
+        assert data["stale_as_of"] is None
+
+    def test_stale_as_of_is_oldest_quote(self):
+        now = datetime.now(timezone.utc)
+        old = _quote("GC=F", 2000.0, age_seconds=7200)
+        quotes = {"GC=F": old, "SI=F": _quote("SI=F", 30.0)}
+        data = build_market_payload(quotes, now=now, stale_seconds=900)
+        assert data["stale_as_of"] == old.fetched_at.isoformat()
+        assert data["as_of"] == quotes["SI=F"].fetched_at.isoformat()
+
+    def test_empty_cache(self):
+        data = build_market_payload({})
+        assert data["as_of"] is None and data["stale_as_of"] is None
+
+    def test_quote_round_trip(self):
+        quote = _quote("CL=F", 78.2, prev=77.9)
+        assert Quote.from_dict(quote.to_dict()) == quote
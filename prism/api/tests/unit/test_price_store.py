@@ -0,0 +1,117 @@
+"""
+===============================================================================
+UNIT TESTS - Price Store
+===============================================================================
+Tests for price CSV parsing, the stub source and valuation row building.
+"""
+import uuid
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from lib.price_store import (
+    REVALUATION_METHOD,
+    PriceBar,
+    StubPriceSource,
+    build_valuation_rows,
+    normalize_symbol,
+    parse_price_csv,
+)
+
+
+class TestParsePriceCsv:
+    """Test CSV ingestion formats."""
+
+    def test_multi_symbol(self):
+        bars = parse_price_csv(
+            "Symbol,Date,Close,Currency\n"
+            "gc=f,2024-01-02,2064.4,usd\n"
+            "BTC-USD,2024-01-02,45000,USD\n"
+        )
+        assert bars == [
+            PriceBar("GC=F", date(2024, 1, 2), 2064.4, "USD"),
+            PriceBar("BTC-USD", date(2024, 1, 2), 45000.0, "USD"),
+        ]
+
+    def test_yahoo_export_needs_symbol(self):
+        text = (
+            "Date,Open,High,Low,Close,Adj Close,Volume\n"
+            "2024-01-02,1,1,1,101.5,101.5,10\n"
+            "2024-01-03,null,null,null,null,null,null\n"
+        )
+        with pytest.raises(ValueError, match="symbol"):
+            parse_price_csv(text)
+        assert parse_price_csv(text, symbol="ALB") == [PriceBar("ALB", date(2024, 1, 2), 101.5)]
+        assert parse_price_csv(text, symbol=" alb ", currency="usd") == [
+            PriceBar("ALB", date(2024, 1, 2), 101.5, "USD")
+        ]
+
+    def test_bad_row_reports_line(self):
+        with pytest.raises(ValueError, match="line 3"):
+            parse_price_csv("symbol,date,close\nALB,2024-01-02,1\nALB,02/01/2024,2\n")
+
+
+class TestStubPriceSource:
+    """Test the offline price source."""
+
+    def test_weekdays_and_deterministic(self):
+        source = StubPriceSource({"GC=F": 2000.0})
+        bars = source.history("GC=F", date(2024, 1, 1), date(2024, 1, 14))
+        assert len(bars) == 10
+        assert all(bar.price_date.weekday() < 5 for bar in bars)
+        assert bars[0].close == 2000.0
+        assert bars == source.history("GC=F", date(2024, 1, 1), date(2024, 1, 14))
+
+    def test_bars_produce_valuations(self):
+        source = StubPriceSource({"GC=F": 2000.0}, currencies={"COPEC.SN": "CLP"})
+        holdings = [
+            SimpleNamespace(id=uuid.uuid4(), symbol="GC=F", quantity=2),
+            SimpleNamespace(id=uuid.uuid4(), symbol="COPEC.SN", quantity=10),
+        ]
+        bars = (source.history("GC=F", date(2024, 1, 1), date(2024, 1, 5))
+                + source.history("COPEC.SN", date(2024, 1, 1), date(2024, 1, 5)))
+        rows = build_valuation_rows(holdings, bars)
+        assert len(rows) == 10
+        assert {row["currency"] for row in rows if row["investment_id"] == holdings[0].id} == {"USD"}
+        assert {row["currency"] for row in rows if row["investment_id"] == holdings[1].id} == {"CLP"}
+        assert rows[0]["value"] == Decimal("4000.00")
+
+
+class TestValuationRows:
+    """Test mark-to-market row building."""
+
+    def test_rows_per_holding_and_date(self):
+        gold = SimpleNamespace(id=uuid.uuid4(), symbol="GC=F", quantity=Decimal("2.5"), purchase_currency="BRL")
+        btc = SimpleNamespace(id=uuid.uuid4(), symbol="BTC-USD", quantity=Decimal("0.1"), purchase_currency="USD")
+        bars = [
+            PriceBar("GC=F", date(2024, 1, 2), 2000.0, "USD", "csv"),
+            PriceBar("GC=F", date(2024, 1, 3), 2010.0, "USD", "csv"),
+            PriceBar("SI=F", date(2024, 1, 3), 23.0, "USD", "csv"),
+        ]
+        rows = build_valuation_rows([gold, btc], bars)
+        assert [(r["investment_id"], r["valuation_date"]) for r in rows] == [
+            (gold.id, date(2024, 1, 2)),
+            (gold.id, date(2024, 1, 3)),
+        ]
+        assert rows[1]["value"] == Decimal("5025.00")
+        assert rows[1]["currency"] == "USD"
+        assert rows[1]["valuation_method"] == REVALUATION_METHOD
+        assert rows[1]["notes"] == "2.5 x GC=F @ 2010"
+
+    def test_bars_without_currency_are_skipped(self):
+        vale = SimpleNamespace(id=uuid.uuid4(), symbol="VALE3.SA", quantity=100, purchase_currency="USD")
+        bars = [
+            PriceBar("VALE3.SA", date(2024, 1, 2), 65.1),
+            PriceBar("VALE3.SA", date(2024, 1, 3), 65.5, "BRL"),
+        ]
+        rows = build_valuation_rows([vale], bars)
+        assert [(r["valuation_date"], r["currency"]) for r in rows] == [(date(2024, 1, 3), "BRL")]
+        assert rows[0]["value"] == Decimal("6550.00")
+
+    def test_symbols_match_normalized(self):
+        gold = SimpleNamespace(id=uuid.uuid4(), symbol=" gc=f", quantity=1, purchase_currency="USD")
+        rows = build_valuation_rows([gold], [PriceBar("GC=F", date(2024, 1, 2), 2000.0, "USD")])
+        assert len(rows) == 1
+        assert normalize_symbol(" btc-usd ") == "BTC-USD" and normalize_symbol("  ") is None
@@ -67,6 +67,7 @@ CREATE INDEX idx_file_registry_status ON file_registry(status);
 CREATE INDEX idx_file_registry_investment ON file_registry(investment_id);
 CREATE INDEX idx_file_registry_uploaded_at ON file_registry(uploaded_at DESC);
 CREATE INDEX idx_file_registry_tags ON file_registry USING GIN(tags);
+CREATE INDEX idx_file_registry_file_hash ON file_registry(file_hash);
 
 -- -----------------------------------------------------------------------------
 -- PROCESSING JOBS (Layer 2: Coordination)
@@ -191,6 +192,10 @@ CREATE TABLE investments (
     land_area_hectares DECIMAL(10,4),
     zoning_type VARCHAR(100),                   -- residential, commercial, agricultural
     
+    -- Market-priced holdings (stocks, gold, crypto)
+    symbol VARCHAR(32),                         -- price_history symbol
+    quantity DECIMAL(24,8),                     -- units held
+    
     -- Ownership
     ownership_percentage DECIMAL(5,2) DEFAULT 100.00,
     co_owners TEXT[],
@@ -215,6 +220,7 @@ CREATE TABLE investments (
 CREATE INDEX idx_investments_category ON investments(category);
 CREATE INDEX idx_investments_status ON investments(status);
 CREATE INDEX idx_investments_location ON investments(state, city);
+CREATE INDEX idx_investments_symbol ON investments(symbol);
 CREATE INDEX idx_investments_tags ON investments USING GIN(tags);
 
 -- -----------------------------------------------------------------------------
@@ -307,6 +313,49 @@ CREATE TABLE activity_log (
 CREATE INDEX idx_activity_entity ON activity_log(entity_type, entity_id);
 CREATE INDEX idx_activity_time ON activity_log(performed_at DESC);
 
+-- -----------------------------------------------------------------------------
+-- PERIODIC TASK RUNS
+-- Last run of each worker maintenance task (one row per task)
+-- -----------------------------------------------------------------------------
+CREATE TABLE periodic_task_runs (
+    task_name VARCHAR(100) PRIMARY KEY,
+    last_started_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_finished_at TIMESTAMP WITH TIME ZONE,
+    last_status VARCHAR(20) NOT NULL DEFAULT 'running',  -- running, success, failure
+    last_duration_ms INTEGER,
+    last_error TEXT,
+    last_worker_id VARCHAR(100)
+);
+
+-- -----------------------------------------------------------------------------
+-- MARKET QUOTES
+-- Latest quote per symbol, written by the API market-data refresher
+-- -----------------------------------------------------------------------------
+CREATE TABLE market_quotes (
+    symbol VARCHAR(32) PRIMARY KEY,             -- Yahoo symbol, or USDCLP
+    price DECIMAL(18,6) NOT NULL,
+    previous_close DECIMAL(18,6),
+    currency VARCHAR(3),
+    source VARCHAR(50) NOT NULL,                -- yahoo, mindicador, stub
+    fetched_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX idx_market_quotes_fetched_at ON market_quotes(fetched_at);
+
+-- -----------------------------------------------------------------------------
+-- PRICE HISTORY
+-- Daily close per symbol, for mark-to-market revaluation
+-- -----------------------------------------------------------------------------
+CREATE TABLE price_history (
+    symbol VARCHAR(32) NOT NULL,
+    price_date DATE NOT NULL,
+    close DECIMAL(18,6) NOT NULL,
+    currency VARCHAR(3),
+    source VARCHAR(50) NOT NULL,                -- csv, stub, yahoo, mindicador
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (symbol, price_date)
+);
+
 -- -----------------------------------------------------------------------------
 -- UPDATE TIMESTAMP TRIGGER
 -- -----------------------------------------------------------------------------
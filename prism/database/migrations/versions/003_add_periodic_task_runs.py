@@ -0,0 +1,35 @@
+"""Add periodic task run log
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-01-03 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "003"
+down_revision: Union[str, None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Last run of each worker maintenance task (worker/periodic.py)
+    op.create_table(
+        'periodic_task_runs',
+        sa.Column('task_name', sa.String(100), primary_key=True),
+        sa.Column('last_started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_status', sa.String(20), nullable=False, server_default='running'),
+        sa.Column('last_duration_ms', sa.Integer(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('last_worker_id', sa.String(100), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('periodic_task_runs')
@@ -0,0 +1,36 @@
+"""Add market quotes
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-01-04 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "004"
+down_revision: Union[str, None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Latest quote per symbol, written by the API market-data refresher
+    op.create_table(
+        'market_quotes',
+        sa.Column('symbol', sa.String(32), primary_key=True),
+        sa.Column('price', sa.Numeric(18, 6), nullable=False),
+        sa.Column('previous_close', sa.Numeric(18, 6), nullable=True),
+        sa.Column('currency', sa.String(3), nullable=True),
+        sa.Column('source', sa.String(50), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('idx_market_quotes_fetched_at', 'market_quotes', ['fetched_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_market_quotes_fetched_at', table_name='market_quotes')
+    op.drop_table('market_quotes')
@@ -0,0 +1,42 @@
+"""Add price history and investment symbol/quantity
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Market-priced holdings: value = close(symbol) * quantity
+    op.add_column('investments', sa.Column('symbol', sa.String(32), nullable=True))
+    op.add_column('investments', sa.Column('quantity', sa.Numeric(24, 8), nullable=True))
+    op.create_index('idx_investments_symbol', 'investments', ['symbol'])
+    
+    # Daily close per symbol (primary key doubles as the series index)
+    op.create_table(
+        'price_history',
+        sa.Column('symbol', sa.String(32), primary_key=True),
+        sa.Column('price_date', sa.Date(), primary_key=True),
+        sa.Column('close', sa.Numeric(18, 6), nullable=False),
+        sa.Column('currency', sa.String(3), nullable=True),
+        sa.Column('source', sa.String(50), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('price_history')
+    op.drop_index('idx_investments_symbol', table_name='investments')
+    op.drop_column('investments', 'quantity')
+    op.drop_column('investments', 'symbol')
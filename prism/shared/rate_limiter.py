@@ -0,0 +1,320 @@
+"""
+===============================================================================
+AI RATE LIMITER - Cluster-wide token buckets per provider and model
+===============================================================================
+Every worker process and the API's chat router draw from the same Redis
+token buckets, so together they stay inside the provider's requests-per-
+minute (RPM) and tokens-per-minute (TPM) limits instead of each tripping
+429s on its own:
+
+- acquire(): reserve one request plus an estimated token count; if a
+  bucket is short, wait exactly until it has refilled enough
+- settle(): once the response's `usage` is known, refund the unused part
+  of the estimate (or charge the overrun)
+
+Limits come from AI_RATE_LIMITS, e.g.
+    AI_RATE_LIMITS=kimi=60/1000000,anthropic:claude-3-5-sonnet-20241022=50/40000
+"provider=RPM/TPM" shares one bucket across the provider's models,
+"provider:model=RPM/TPM" gives that model its own. Either side may be left
+empty ("kimi=60", "kimi=/1000000"). Unlisted providers are not limited.
+
+Buckets live in Redis and are updated atomically by Lua scripts using the
+Redis clock. If Redis is unreachable, each process falls back to its own
+in-memory buckets.
+===============================================================================
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+AI_RATE_LIMITS = os.getenv("AI_RATE_LIMITS", "")
+AI_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("AI_RATE_LIMIT_MAX_WAIT_SECONDS", "300"))
+
+CHARS_PER_TOKEN = 4  # Rough average for English/Spanish prose
+IMAGE_TOKEN_ESTIMATE = 1500  # A high-detail page image on most vision models
+MIN_WAIT_SECONDS = 0.01
+
+# Budgets belong to the account behind an endpoint: Kimi is reached through
+# the OpenAI-compatible client, so map known hosts back to their provider.
+PROVIDER_HOSTS = {
+    "api.moonshot.cn": "kimi",
+    "api.moonshot.ai": "kimi",
+    "api.openai.com": "openai",
+    "api.anthropic.com": "anthropic",
+}
+
+
+class RateLimitTimeoutError(TimeoutError):
+    """The bucket would not refill within the allowed wait. Retryable."""
+
+
+@dataclass(frozen=True)
+class Limit:
+    rpm: float = 0.0  # 0 = unlimited
+    tpm: float = 0.0
+
+
+@dataclass
+class Reservation:
+    key: Optional[str]
+    tokens: int
+    limit: Optional[Limit]
+    waited_seconds: float = 0.0
+
+
+def bucket_provider(provider: str, api_url: Optional[str] = None) -> str:
+    """Provider label for bucketing, resolved from the endpoint when known."""
+    host = urlparse(api_url or "").netloc.lower()
+    return PROVIDER_HOSTS.get(host, provider.lower())
+
+
+def estimate_tokens(text_chars: int = 0, images: int = 0, max_output_tokens: int = 0) -> int:
+    """Upper-ish estimate to reserve before a call; settle() corrects it."""
+    return text_chars // CHARS_PER_TOKEN + images * IMAGE_TOKEN_ESTIMATE + max_output_tokens
+
+
+def parse_limits(spec: str) -> Dict[str, Limit]:
+    """Parse "kimi=60/1000000,openai:gpt-4o=500/30000" into {key: Limit}."""
+    limits = {}
+    for entry in spec.split(","):
+        if "=" not in entry:
+            continue
+        key, _, value = entry.partition("=")
+        rpm, _, tpm = value.partition("/")
+        limits[key.strip().lower()] = Limit(rpm=float(rpm or 0), tpm=float(tpm or 0))
+    return limits
+
+
+# =============================================================================
+# BUCKET SCRIPTS
+# =============================================================================
+
+# Buckets hold up to one minute's budget and refill continuously.
+# KEYS: bucket hashes {level, ts}; capacities/rates are passed per call so
+# a config change takes effect without clearing Redis.
+_LUA_COMMON = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local function refill(key, capacity, rate)
+  local state = redis.call('HMGET', key, 'level', 'ts')
+  local level = tonumber(state[1]) or capacity
+  local ts = tonumber(state[2]) or now
+  return math.min(capacity, level + math.max(0, now - ts) * rate)
+end
+local function save(key, level, capacity, rate)
+  redis.call('HSET', key, 'level', tostring(level), 'ts', tostring(now))
+  redis.call('EXPIRE', key, math.ceil(capacity / rate) + 60)
+end
+"""
+
+# ARGV: rpm capacity, rpm rate/s, tpm capacity, tpm rate/s, tokens
+# Returns "0" when granted, else the seconds to wait (nothing is taken).
+_LUA_TAKE = _LUA_COMMON + """
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+  local capacity = tonumber(ARGV[i * 2 - 1])
+  local rate = tonumber(ARGV[i * 2])
+  if capacity > 0 then
+    local amount = 1
+    if i == 2 then amount = math.min(tonumber(ARGV[5]), capacity) end
+    local level = refill(KEYS[i], capacity, rate)
+    if level < amount then wait = math.max(wait, (amount - level) / rate) end
+    levels[i] = level - amount
+  end
+end
+if wait > 0 then return tostring(wait) end
+for i = 1, 2 do
+  if levels[i] then save(KEYS[i], levels[i], tonumber(ARGV[i * 2 - 1]), tonumber(ARGV[i * 2])) end
+end
+return '0'
+"""
+
+# ARGV: tpm capacity, tpm rate/s, delta (positive refunds, negative charges)
+_LUA_ADJUST = _LUA_COMMON + """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+save(KEYS[1], math.min(capacity, refill(KEYS[1], capacity, rate) + tonumber(ARGV[3])), capacity, rate)
+return '0'
+"""
+
+
+def _refill(state: Optional[Tuple[float, float]], now: float, capacity: float, rate: float) -> float:
+    """In-memory twin of the Lua refill()."""
+    if state is None:
+        return capacity
+    level, ts = state
+    return min(capacity, level + max(0.0, now - ts) * rate)
+
+
+# =============================================================================
+# LIMITER
+# =============================================================================
+
+class RateLimiter:
+    """
+    Token-bucket limiter shared through Redis.
+
+    `redis` is a synchronous client (either decode mode). Without one,
+    or while it is unreachable, buckets are kept in this process only.
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        limits: Optional[Dict[str, Limit]] = None,
+        max_wait_seconds: float = AI_RATE_LIMIT_MAX_WAIT_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.redis = redis
+        self.limits = parse_limits(AI_RATE_LIMITS) if limits is None else limits
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self._scripts = None
+        self._local: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, provider: str, model: str) -> Tuple[Optional[str], Optional[Limit]]:
+        """(bucket key, limit): a model-specific entry wins over the provider's."""
+        for key in (f"{provider}:{model}".lower(), provider.lower()):
+            if key in self.limits:
+                return key, self.limits[key]
+        return None, None
+
+    # -------------------------------------------------------------------------
+    # Public interface
+    # -------------------------------------------------------------------------
+
+    def acquire(self, provider: str, model: str, tokens: int) -> Reservation:
+        """Reserve one request and `tokens`, sleeping until the buckets allow it."""
+        key, limit = self.limit_for(provider, model)
+        reservation = Reservation(key=key, tokens=max(0, int(tokens)), limit=limit)
+        if limit is None:
+            return reservation
+        while True:
+            wait = self._take(reservation)
+            if wait <= 0:
+                return reservation
+            self._check_deadline(reservation, wait)
+            self.sleep(wait)
+            reservation.waited_seconds += wait
+
+    async def acquire_async(self, provider: str, model: str, tokens: int) -> Reservation:
+        """acquire() for event loops: waits with asyncio.sleep."""
+        key, limit = self.limit_for(provider, model)
+        reservation = Reservation(key=key, tokens=max(0, int(tokens)), limit=limit)
+        if limit is None:
+            return reservation
+        while True:
+            wait = await asyncio.to_thread(self._take, reservation)
+            if wait <= 0:
+                return reservation
+            self._check_deadline(reservation, wait)
+            await asyncio.sleep(wait)
+            reservation.waited_seconds += wait
+
+    def settle(self, reservation: Reservation, actual_tokens: Optional[int]):
+        """Replace the reserved estimate with the tokens the provider reported."""
+        limit = reservation.limit
+        if limit is None or not limit.tpm or actual_tokens is None:
+            return
+        delta = reservation.tokens - int(actual_tokens)
+        if delta:
+            self._adjust(reservation.key, limit, delta)
+
+    async def settle_async(self, reservation: Reservation, actual_tokens: Optional[int]):
+        """settle() for event loops: the Redis call runs in a thread."""
+        await asyncio.to_thread(self.settle, reservation, actual_tokens)
+
+    # -------------------------------------------------------------------------
+    # Buckets
+    # -------------------------------------------------------------------------
+
+    def _check_deadline(self, reservation: Reservation, wait: float):
+        if reservation.waited_seconds + wait > self.max_wait_seconds:
+            raise RateLimitTimeoutError(
+                f"AI rate limit for {reservation.key}: would wait "
+                f"{reservation.waited_seconds + wait:.0f}s (max {self.max_wait_seconds:.0f}s)"
+            )
+
+    def _bucket_keys(self, key: str) -> Tuple[str, str]:
+        return f"ratelimit:{key}:rpm", f"ratelimit:{key}:tpm"
+
+    def _script(self, name: str):
+        if self._scripts is None:
+            self._scripts = {
+                "take": self.redis.register_script(_LUA_TAKE),
+                "adjust": self.redis.register_script(_LUA_ADJUST),
+            }
+        return self._scripts[name]
+
+    def _take(self, reservation: Reservation) -> float:
+        """Take from both buckets if possible; else return seconds to wait."""
+        limit = reservation.limit
+        args = [limit.rpm, limit.rpm / 60.0, limit.tpm, limit.tpm / 60.0, reservation.tokens]
+        if self.redis is not None:
+            try:
+                wait = float(self._script("take")(keys=list(self._bucket_keys(reservation.key)), args=args))
+                return max(wait, MIN_WAIT_SECONDS) if wait > 0 else 0.0
+            except Exception as e:
+                print(f"   ⚠️ Rate limiter Redis unavailable, using local buckets: {e}")
+
+        with self._lock:
+            now = self.clock()
+            wait, levels = 0.0, {}
+            for bucket, capacity, amount in (
+                ("rpm", limit.rpm, 1),
+                ("tpm", limit.tpm, min(reservation.tokens, limit.tpm)),
+            ):
+                if capacity <= 0:
+                    continue
+                name = f"{reservation.key}:{bucket}"
+                rate = capacity / 60.0
+                level = _refill(self._local.get(name), now, capacity, rate)
+                if level < amount:
+                    wait = max(wait, (amount - level) / rate)
+                levels[name] = level - amount
+            if wait > 0:
+                return max(wait, MIN_WAIT_SECONDS)
+            for name, level in levels.items():
+                self._local[name] = (level, now)
+            return 0.0
+
+    def _adjust(self, key: str, limit: Limit, delta: int):
+        if self.redis is not None:
+            try:
+                self._script("adjust")(keys=[self._bucket_keys(key)[1]], args=[limit.tpm, limit.tpm / 60.0, delta])
+                return
+            except Exception as e:
+                print(f"   ⚠️ Rate limiter Redis unavailable, using local buckets: {e}")
+
+        with self._lock:
+            name = f"{key}:tpm"
+            now = self.clock()
+            level = _refill(self._local.get(name), now, limit.tpm, limit.tpm / 60.0)
+            self._local[name] = (min(limit.tpm, level + delta), now)
+
+
+# =============================================================================
+# SINGLETON
+# =============================================================================
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter(redis=None) -> RateLimiter:
+    """Process-wide limiter; the first caller's Redis client is used."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(redis)
+    return _limiter
@@ -214,19 +214,27 @@ class InvestmentBase(BaseModel):
     land_area_m2: Optional[Decimal] = None
     land_area_hectares: Optional[Decimal] = None
     zoning_type: Optional[str] = Field(None, max_length=100)
+    symbol: Optional[str] = Field(None, max_length=32)  # Price history symbol (e.g. GC=F, BTC-USD)
+    quantity: Optional[Decimal] = Field(None, ge=0)  # Units held, valued at symbol's close
     ownership_percentage: Decimal = Field(default=100.00, ge=0, le=100)
     co_owners: Optional[List[str]] = Field(default_factory=list)
     status: InvestmentStatus = InvestmentStatus.ACTIVE
     tags: Optional[List[str]] = Field(default_factory=list)
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
-    @field_validator('purchase_price', 'current_value', 'land_area_m2', 'land_area_hectares', mode='before')
+    @field_validator('purchase_price', 'current_value', 'land_area_m2', 'land_area_hectares', 'quantity', mode='before')
     @classmethod
     def empty_str_to_none(cls, v):
         if v == '' or v == 'null':
             return None
         return v
 
+    @field_validator('symbol')
+    @classmethod
+    def normalize_symbol(cls, v):
+        # Same form as price_history symbols
+        return v.strip().upper() or None if v else None
+
 
 class InvestmentCreate(InvestmentBase):
     pass
@@ -245,12 +253,19 @@ class InvestmentUpdate(BaseModel):
     land_area_m2: Optional[Decimal] = None
     land_area_hectares: Optional[Decimal] = None
     zoning_type: Optional[str] = Field(None, max_length=100)
+    symbol: Optional[str] = Field(None, max_length=32)
+    quantity: Optional[Decimal] = Field(None, ge=0)
     ownership_percentage: Optional[Decimal] = Field(None, ge=0, le=100)
     co_owners: Optional[List[str]] = None
     status: Optional[InvestmentStatus] = None
     tags: Optional[List[str]] = None
     metadata: Optional[Dict[str, Any]] = None
 
+    @field_validator('symbol')
+    @classmethod
+    def normalize_symbol(cls, v):
+        return v.strip().upper() or None if v else None
+
 
 class InvestmentResponse(InvestmentBase):
     id: UUID
@@ -320,13 +335,18 @@ class UploadUrlRequest(BaseModel):
     investment_id: Optional[UUID] = None
     source_device: Optional[str] = "phone"
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    # Client-computed content hash and size; when both match a stored file
+    # the upload is skipped
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")
+    size_bytes: Optional[int] = Field(None, ge=0)
 
 
 class UploadUrlResponse(BaseModel):
-    upload_url: str
+    upload_url: Optional[str] = None  # None when already_stored
     file_id: UUID
     storage_key: str
     expires_in_seconds: int = 300
+    already_stored: bool = False
 
 
 class ConfirmUploadRequest(BaseModel):
@@ -101,9 +101,25 @@ export const filesApi = {
   delete: (id: string) => api.delete(`/files/${id}`),
 }
 
+export interface UploadUrlResponse {
+  upload_url: string | null
+  file_id: string
+  storage_key: string
+  expires_in_seconds: number
+  already_stored: boolean
+}
+
+// SHA-256 of a file as hex, sent with upload requests so the API can skip duplicates.
+// undefined where WebCrypto is unavailable (non-HTTPS origins); the upload then proceeds normally.
+export async function sha256File(file: Blob): Promise<string | undefined> {
+  if (!globalThis.crypto?.subtle) return undefined
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer())
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('')
+}
+
 export const uploadsApi = {
-  requestUrl: (data: { filename: string; content_type: string; investment_id?: string; source_device?: string }) =>
-    api.post('/uploads/request-url', data).then(r => r.data),
+  requestUrl: (data: { filename: string; content_type: string; investment_id?: string; source_device?: string; sha256?: string; size_bytes?: number }) =>
+    api.post<UploadUrlResponse>('/uploads/request-url', data).then(r => r.data),
   confirm: (data: { file_id: string; investment_id?: string; document_type?: string; request_analysis?: boolean }) =>
     api.post('/uploads/confirm', data).then(r => r.data),
 }
@@ -15,7 +15,7 @@ import {
   Key,
   Cpu
 } from 'lucide-react'
-import { chatApi, uploadsApi } from '../lib/api'
+import { chatApi, sha256File, uploadsApi } from '../lib/api'
 
 // Types
 interface Message {
@@ -100,19 +100,23 @@ export default function Chat() {
         const uploadRequest = await uploadsApi.requestUrl({
           filename: file.name,
           content_type: file.type || 'application/octet-stream',
+          sha256: await sha256File(file),
+          size_bytes: file.size,
         })
 
-        // 2. Upload directly to storage
-        const uploadResponse = await fetch(uploadRequest.upload_url, {
-          method: 'PUT',
-          body: file,
-          headers: {
-            'Content-Type': file.type || 'application/octet-stream',
-          },
-        })
-
-        if (!uploadResponse.ok) {
-          throw new Error('Upload failed')
+        // 2. Upload directly to storage (skipped if the same file is already stored)
+        if (!uploadRequest.already_stored && uploadRequest.upload_url) {
+          const uploadResponse = await fetch(uploadRequest.upload_url, {
+            method: 'PUT',
+            body: file,
+            headers: {
+              'Content-Type': file.type || 'application/octet-stream',
+            },
+          })
+
+          if (!uploadResponse.ok) {
+            throw new Error('Upload failed')
+          }
         }
 
         // 3. Confirm upload
@@ -20,7 +20,7 @@ import {
   AlertTriangle,
   CheckCircle
 } from 'lucide-react'
-import { investmentsApi, uploadsApi } from '../lib/api'
+import { investmentsApi, sha256File, uploadsApi } from '../lib/api'
 import { formatCurrency, formatDate } from '../lib/utils'
 import {
   SAMPLE_CREDITS,
@@ -94,20 +94,24 @@ export default function InvestmentDetail() {
 
     setIsUploading(true)
     try {
-      const { upload_url, file_id } = await uploadsApi.requestUrl({
+      const { upload_url, file_id, already_stored } = await uploadsApi.requestUrl({
         filename: file.name,
         content_type: file.type,
         investment_id: id,
         source_device: 'web',
+        sha256: await sha256File(file),
+        size_bytes: file.size,
       })
 
-      const response = await fetch(upload_url, {
-        method: 'PUT',
-        body: file,
-        headers: { 'Content-Type': file.type },
-      })
+      if (!already_stored && upload_url) {
+        const response = await fetch(upload_url, {
+          method: 'PUT',
+          body: file,
+          headers: { 'Content-Type': file.type },
+        })
 
-      if (!response.ok) throw new Error('Upload failed')
+        if (!response.ok) throw new Error('Upload failed')
+      }
 
       await uploadsApi.confirm({
         file_id,
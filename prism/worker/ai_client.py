@@ -8,16 +8,89 @@
   - Anthropic Claude
   - Google Gemini
   - Ollama (local models)
+
+Every client has blocking methods and `*_async` twins. The async ones share
+one keep-alive httpx pool per event loop (HTTP/2 when `h2` is installed and
+the provider negotiates it), so one process can hold many calls in flight.
 ===============================================================================
 """
+import asyncio
 import base64
+import importlib.util
 import json
 import os
+import sys
 import time
+import weakref
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 from pathlib import Path
-from dataclasses import dataclass
+from urllib.parse import urlparse
+from dataclasses import dataclass, field
+
+import httpx
+
+from metrics import timed_stage
+from streaming import StreamingJSONBody, post_streaming_json, sha256_file, should_stream
+from image_preprocess import preprocess_image
+from pdf_pool import get_pdf_pool
+from provider_files import ProviderFileCache, provider_scope
+
+# Shared with the API (prism/shared, mounted at /shared in containers)
+sys.path.append(os.getenv("PRISM_SHARED_DIR", str(Path(__file__).resolve().parent.parent / "shared")))
+try:
+    from rate_limiter import RateLimiter, Reservation, bucket_provider, estimate_tokens
+except ImportError:
+    RateLimiter = None
+
+
+# Speech-to-text model for audio documents (OpenAI-compatible endpoints only)
+AI_TRANSCRIPTION_MODEL = os.getenv("AI_TRANSCRIPTION_MODEL", "whisper-1")
+# auto: only endpoints known to serve /audio/transcriptions (Kimi/Moonshot
+# doesn't); true: any OpenAI-compatible endpoint (e.g. a self-hosted Whisper)
+AI_TRANSCRIPTION_ENABLED = os.getenv("AI_TRANSCRIPTION_ENABLED", "auto").lower()
+TRANSCRIPTION_HOSTS = {"api.openai.com"}
+
+
+class MediaUnsupportedError(ValueError):
+    """The media cannot be processed here (no ffmpeg, no transcription). Not retryable."""
+
+
+# =============================================================================
+# ASYNC HTTP POOL
+# =============================================================================
+
+AI_HTTP2 = os.getenv("AI_HTTP2", "true").lower() == "true"
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "100"))
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "20"))
+AI_HTTP_TIMEOUT_SECONDS = float(os.getenv("AI_HTTP_TIMEOUT_SECONDS", "600"))  # Long generations
+
+# httpx.AsyncClient is tied to the loop it was first used on
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Keep-alive connection pool shared by every provider on this event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=AI_HTTP2 and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=AI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(AI_HTTP_TIMEOUT_SECONDS, connect=10.0),
+        )
+        _async_http_clients[loop] = client
+    return client
+
+
+async def close_async_http_client():
+    """Close this loop's pool (call before the loop shuts down)."""
+    client = _async_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
 
 
 # =============================================================================
@@ -34,9 +107,13 @@ class AnalysisResult:
     analysis_type: str
     provider: str
     processing_time_ms: Optional[int] = None
+    quality_flags: List[str] = field(default_factory=list)  # e.g. "tier:local", "tier:ai"
+    confidence_score: Optional[float] = None
+    input_tokens: Optional[int] = None  # Prompt tokens, cached ones included
+    cached_input_tokens: Optional[int] = None  # Served from the provider's prompt cache
     
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        data = {
             "raw_text": self.raw_text,
             "structured_data": self.structured_data,
             "tokens_used": self.tokens_used,
@@ -44,13 +121,79 @@ def to_dict(self) -> Dict[str, Any]:
             "analysis_type": self.analysis_type,
             "provider": self.provider,
             "processing_time_ms": self.processing_time_ms,
+            "quality_flags": list(self.quality_flags),
         }
+        if self.confidence_score is not None:
+            data["confidence_score"] = self.confidence_score
+        if self.input_tokens is not None:
+            data["input_tokens"] = self.input_tokens
+            data["cached_input_tokens"] = self.cached_input_tokens or 0
+        return data
+
+
+class TokenUsage(NamedTuple):
+    """Provider-reported usage; None where the provider did not say."""
+    total: Optional[int] = None
+    input: Optional[int] = None
+    cached_input: Optional[int] = None
+
+
+def _usage_field(usage: Any, name: str) -> Optional[int]:
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return value if isinstance(value, int) else None
+
+
+def openai_usage(usage: Any) -> TokenUsage:
+    """
+    Usage from an OpenAI-compatible response (SDK object or raw dict).
+    OpenAI reports cache hits in prompt_tokens_details.cached_tokens;
+    Moonshot reports them as a top-level cached_tokens.
+    """
+    if not usage:
+        return TokenUsage()
+    details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+    cached = _usage_field(details, "cached_tokens") if details else None
+    if cached is None:
+        cached = _usage_field(usage, "cached_tokens")
+    return TokenUsage(_usage_field(usage, "total_tokens"), _usage_field(usage, "prompt_tokens"), cached)
+
+
+def anthropic_usage(usage: Any) -> TokenUsage:
+    """
+    Usage from a Messages API response (SDK object or raw dict).
+    Anthropic's input_tokens excludes cache reads and writes, so they are
+    added back to give the full prompt size.
+    """
+    if not usage:
+        return TokenUsage()
+    cache_read = _usage_field(usage, "cache_read_input_tokens") or 0
+    prompt = (_usage_field(usage, "input_tokens") or 0) + cache_read + (
+        _usage_field(usage, "cache_creation_input_tokens") or 0
+    )
+    total = prompt + (_usage_field(usage, "output_tokens") or 0)
+    return TokenUsage(total or None, prompt, cache_read)
+
+
+def gemini_usage(usage: Any) -> TokenUsage:
+    """
+    Usage from a Gemini response's usage_metadata. Implicit and explicit
+    cache hits are reported in cached_content_token_count.
+    """
+    if not usage:
+        return TokenUsage()
+    return TokenUsage(
+        _usage_field(usage, "total_token_count"),
+        _usage_field(usage, "prompt_token_count"),
+        _usage_field(usage, "cached_content_token_count") or 0,
+    )
 
 
 # =============================================================================
 # PROMPTS LIBRARY
 # =============================================================================
 
+ANALYST_SYSTEM_PROMPT = "You are an expert investment document analyst. Extract structured information accurately."
+
 ANALYSIS_PROMPTS = {
     "document_analysis": """Analyze this investment document thoroughly. Extract:
 1. Document type and purpose
@@ -111,10 +254,14 @@ class BaseAIClient(ABC):
     """Abstract base class for all AI providers."""
     
     provider_name: str = "base"
+    supports_transcription: bool = False
     
     def __init__(self, model: Optional[str] = None, **kwargs):
         self.model = model or self._default_model()
         self._parse_structured = kwargs.get('parse_structured', True)
+        self.file_cache: Optional[ProviderFileCache] = kwargs.get('file_cache')
+        self.rate_limiter: Optional["RateLimiter"] = kwargs.get('rate_limiter')
+        self._async_client = None  # (httpx pool, SDK client) for *_async calls
     
     @abstractmethod
     def _default_model(self) -> str:
@@ -131,16 +278,120 @@ def analyze_document(
         """Analyze a document and return structured results."""
         pass
     
+    @abstractmethod
+    def analyze_text(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """Analyze already-extracted document text (e.g. one chunk of a PDF)."""
+        pass
+    
     @abstractmethod
     def summarize_document(self, text: str, max_length: int = 500) -> str:
         """Generate a summary of document content."""
         pass
     
+    def transcribe_audio(self, file_path: str) -> str:
+        """Speech-to-text for one audio chunk (see media.py)."""
+        raise MediaUnsupportedError(f"{self.provider_name} does not transcribe audio")
+    
+    async def analyze_document_async(
+        self,
+        file_path: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """
+        Async analyze_document(). Providers without a native async path
+        run the blocking call in the loop's default executor.
+        """
+        return await asyncio.to_thread(self.analyze_document, file_path, analysis_type, prompt)
+    
+    async def analyze_text_async(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """Async analyze_text(); see analyze_document_async()."""
+        return await asyncio.to_thread(self.analyze_text, text, analysis_type, prompt)
+    
     def _encode_image(self, image_path: str) -> str:
-        """Encode image to base64 for API."""
+        """
+        Encode image to base64 for API.
+        Only used for small files; large ones go through StreamingJSONBody.
+        """
         with open(image_path, "rb") as f:
             return base64.b64encode(f.read()).decode("utf-8")
     
+    def _prepare_image(self, file_path: str, mime_type: str):
+        """
+        Auto-orient, downscale and recompress an image for this provider.
+        Returns (path, mime_type); falls back to the original on failure.
+        """
+        try:
+            prepared = preprocess_image(file_path, mime_type, provider=self.provider_name)
+            if prepared.bytes_saved:
+                print(f"   🖼️  Image {prepared.outcome}: {prepared.original_bytes // 1024} KB -> {prepared.output_bytes // 1024} KB")
+            return prepared.path, prepared.mime_type
+        except Exception as e:
+            print(f"   ⚠️ Image preprocessing failed, sending original: {e}")
+            return file_path, mime_type
+    
+    def _reserve_tokens(self, content: Union[str, List[Dict[str, Any]]], max_tokens: int) -> Optional["Reservation"]:
+        """
+        Wait on the shared rate limiter for this provider/model.
+        `content` is the prompt (string or content blocks); non-text blocks
+        count as one image each. Returns a reservation for _settle_tokens().
+        """
+        if self.rate_limiter is None:
+            return None
+        return self.rate_limiter.acquire(*self._rate_limit_request(content, max_tokens))
+    
+    async def _reserve_tokens_async(
+        self, content: Union[str, List[Dict[str, Any]]], max_tokens: int
+    ) -> Optional["Reservation"]:
+        """_reserve_tokens() that waits without blocking the event loop."""
+        if self.rate_limiter is None:
+            return None
+        return await self.rate_limiter.acquire_async(*self._rate_limit_request(content, max_tokens))
+    
+    def _rate_limit_request(self, content: Union[str, List[Dict[str, Any]]], max_tokens: int):
+        """(bucket provider, model, estimated tokens) for the limiter."""
+        blocks = [{"type": "text", "text": content}] if isinstance(content, str) else content
+        chars = sum(len(b.get("text", "")) for b in blocks if b.get("type") == "text")
+        images = sum(1 for b in blocks if b.get("type") != "text")
+        provider = bucket_provider(self.provider_name, getattr(self, "api_url", None))
+        return provider, self.model, estimate_tokens(chars, images, max_tokens)
+    
+    def _settle_tokens(self, reservation: Optional["Reservation"], tokens_used: Optional[int]):
+        """Correct the reservation with the usage the provider reported (0 if the call failed)."""
+        if reservation is not None:
+            self.rate_limiter.settle(reservation, tokens_used)
+    
+    async def _settle_tokens_async(self, reservation: Optional["Reservation"], tokens_used: Optional[int]):
+        if reservation is not None:
+            await self.rate_limiter.settle_async(reservation, tokens_used)
+    
+    def _make_result(
+        self, raw_text: str, usage: TokenUsage, analysis_type: str, start_time: float
+    ) -> AnalysisResult:
+        """Parse a provider response into an AnalysisResult."""
+        structured_data = self._parse_structured_response(raw_text) if self._parse_structured else {"extracted_text": raw_text}
+        return AnalysisResult(
+            raw_text=raw_text,
+            structured_data=structured_data,
+            tokens_used=usage.total,
+            model=self.model,
+            analysis_type=analysis_type,
+            provider=self.provider_name,
+            processing_time_ms=int((time.time() - start_time) * 1000),
+            input_tokens=usage.input,
+            cached_input_tokens=usage.cached_input,
+        )
+    
     def _get_mime_type(self, file_path: str) -> str:
         """Get MIME type from file extension."""
         ext = Path(file_path).suffix.lower()
@@ -150,6 +401,8 @@ def _get_mime_type(self, file_path: str) -> str:
             '.png': 'image/png',
             '.gif': 'image/gif',
             '.webp': 'image/webp',
+            '.heic': 'image/heic',
+            '.heif': 'image/heif',
             '.pdf': 'application/pdf',
         }
         return mime_types.get(ext, 'application/octet-stream')
@@ -160,6 +413,16 @@ def _get_prompt(self, analysis_type: str, custom_prompt: Optional[str] = None) -
             return custom_prompt
         return ANALYSIS_PROMPTS.get(analysis_type, ANALYSIS_PROMPTS["document_analysis"])
     
+    def _static_prefix(self, analysis_type: str, custom_prompt: Optional[str] = None) -> str:
+        """
+        System instructions plus the analysis prompt. Identical for every
+        document of a type, so it goes first in each request where the
+        provider's prompt cache can match it; per-document content follows.
+        Its fingerprint is also part of the result-cache key.
+        """
+        return ANALYST_SYSTEM_PROMPT + "\n\n" + self._get_prompt(analysis_type, custom_prompt)
+    
+    @timed_stage("parse")
     def _parse_structured_response(self, text: str) -> Dict[str, Any]:
         """
         Extract structured data from AI response.
@@ -270,18 +533,81 @@ def analyze_document(
         prompt: Optional[str] = None
     ) -> AnalysisResult:
         """Analyze a document using OpenAI-compatible API."""
-        import time as time_module
-        start_time = time_module.time()
+        start_time = time.time()
+        content, messages, stream_file = self._build_document_messages(file_path, analysis_type, prompt)
         
+        # Call API
+        reservation = self._reserve_tokens(content, 4096)
+        tokens_used = 0  # A failed call gives its reservation back
+        try:
+            if stream_file:
+                raw_text, usage = self._create_streaming(messages, stream_file)
+            else:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.1,
+                    max_tokens=4096
+                )
+                raw_text = response.choices[0].message.content
+                usage = openai_usage(response.usage)
+            tokens_used = usage.total
+        finally:
+            self._settle_tokens(reservation, tokens_used)
+        return self._make_result(raw_text, usage, analysis_type, start_time)
+    
+    async def analyze_document_async(
+        self,
+        file_path: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """analyze_document() on the shared async connection pool."""
+        start_time = time.time()
+        # File reads, image preprocessing and provider extraction block
+        content, messages, stream_file = await asyncio.to_thread(
+            self._build_document_messages, file_path, analysis_type, prompt
+        )
+        
+        reservation = await self._reserve_tokens_async(content, 4096)
+        tokens_used = 0
+        try:
+            if stream_file:
+                raw_text, usage = await asyncio.to_thread(self._create_streaming, messages, stream_file)
+            else:
+                response = await self._get_async_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.1,
+                    max_tokens=4096
+                )
+                raw_text = response.choices[0].message.content
+                usage = openai_usage(response.usage)
+            tokens_used = usage.total
+        finally:
+            await self._settle_tokens_async(reservation, tokens_used)
+        return self._make_result(raw_text, usage, analysis_type, start_time)
+    
+    def _build_document_messages(self, file_path: str, analysis_type: str, prompt: Optional[str]):
+        """
+        Returns (all prompt blocks, messages, file to stream into the body or None).
+        The static prefix is the system message; only the document varies.
+        """
         mime_type = self._get_mime_type(file_path)
-        system_prompt = self._get_prompt(analysis_type, prompt)
+        system_prompt = self._static_prefix(analysis_type, prompt)
+        
+        stream_file = None
         
         # Prepare message content
         if mime_type.startswith('image/'):
-            # Image file - encode as base64
-            base64_image = self._encode_image(file_path)
+            # Image file - encode as base64 (streamed from disk when large)
+            file_path, mime_type = self._prepare_image(file_path, mime_type)
+            if should_stream(file_path):
+                stream_file = file_path
+                base64_image = StreamingJSONBody.PLACEHOLDER
+            else:
+                base64_image = self._encode_image(file_path)
             content = [
-                {"type": "text", "text": system_prompt},
                 {
                     "type": "image_url",
                     "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}
@@ -290,67 +616,170 @@ def analyze_document(
         elif mime_type == 'application/pdf':
             # PDF - Try to use file upload if supported (Kimi), else read text
             try:
-                with open(file_path, "rb") as f:
-                    file_object = self.client.files.create(file=f, purpose="file-extract")
-                file_content = self.client.files.content(file_id=file_object.id).text
-                content = [{"type": "text", "text": system_prompt + "\n\nDocument content:\n" + file_content}]
+                file_content = self._extract_via_provider(file_path)
+                content = [{"type": "text", "text": "Document content:\n" + file_content}]
             except Exception:
-                # Fallback: try PyPDF2 or just skip PDF content
-                try:
-                    import PyPDF2
-                    with open(file_path, "rb") as f:
-                        reader = PyPDF2.PdfReader(f)
-                        text = "\n".join(page.extract_text() or "" for page in reader.pages)
-                    content = [{"type": "text", "text": system_prompt + "\n\nDocument content:\n" + text}]
-                except ImportError:
-                    content = [{"type": "text", "text": system_prompt + "\n\n[PDF content extraction not available]"}]
+                # Fallback: local text layer, parsed in the isolated parser pool
+                text = "\n".join(get_pdf_pool().extract_pages(file_path))
+                content = [{"type": "text", "text": "Document content:\n" + text}]
         else:
             # Other files - read as text if possible
             try:
                 with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
                     text_content = f.read()
-                content = [{"type": "text", "text": system_prompt + "\n\nDocument content:\n" + text_content}]
+                content = [{"type": "text", "text": "Document content:\n" + text_content}]
             except:
                 raise ValueError(f"Unsupported file type: {mime_type}")
         
-        # Call API
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are an expert investment document analyst. Extract structured information accurately."},
-                {"role": "user", "content": content}
-            ],
-            temperature=0.1,
-            max_tokens=4096
-        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ]
+        return [{"type": "text", "text": system_prompt}] + content, messages, stream_file
+    
+    def analyze_text(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """Analyze extracted document text using OpenAI-compatible API."""
+        start_time = time.time()
+        messages = self._text_messages(text, analysis_type, prompt)
         
-        raw_text = response.choices[0].message.content
-        usage = response.usage
-        processing_time = int((time_module.time() - start_time) * 1000)
+        reservation = self._reserve_tokens(messages[0]["content"] + messages[1]["content"], 4096)
+        tokens_used = 0
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.1,
+                max_tokens=4096
+            )
+            usage = openai_usage(response.usage)
+            tokens_used = usage.total
+        finally:
+            self._settle_tokens(reservation, tokens_used)
+        return self._make_result(response.choices[0].message.content, usage, analysis_type, start_time)
+    
+    async def analyze_text_async(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """analyze_text() on the shared async connection pool."""
+        start_time = time.time()
+        messages = self._text_messages(text, analysis_type, prompt)
         
-        structured_data = self._parse_structured_response(raw_text) if self._parse_structured else {"extracted_text": raw_text}
+        reservation = await self._reserve_tokens_async(messages[0]["content"] + messages[1]["content"], 4096)
+        tokens_used = 0
+        try:
+            response = await self._get_async_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.1,
+                max_tokens=4096
+            )
+            usage = openai_usage(response.usage)
+            tokens_used = usage.total
+        finally:
+            await self._settle_tokens_async(reservation, tokens_used)
+        return self._make_result(response.choices[0].message.content, usage, analysis_type, start_time)
+    
+    def _text_messages(self, text: str, analysis_type: str, prompt: Optional[str]) -> List[Dict[str, Any]]:
+        return [
+            {"role": "system", "content": self._static_prefix(analysis_type, prompt)},
+            {"role": "user", "content": "Document content:\n" + text}
+        ]
+    
+    def _get_async_client(self):
+        """AsyncOpenAI bound to the current event loop's shared HTTP pool."""
+        http_client = get_async_http_client()
+        if self._async_client is None or self._async_client[0] is not http_client:
+            from openai import AsyncOpenAI
+            self._async_client = (
+                http_client,
+                AsyncOpenAI(api_key=self.api_key, base_url=self.api_url, http_client=http_client),
+            )
+        return self._async_client[1]
+    
+    def _extract_via_provider(self, file_path: str) -> str:
+        """
+        Server-side text extraction (Kimi file-extract).
+        The provider file ID and text are cached by file hash, so retries and
+        reanalysis skip both the upload and the extraction round-trips.
+        """
+        scope = provider_scope(self.provider_name, self.api_url)
+        file_hash = sha256_file(file_path) if self.file_cache else None
+        if file_hash:
+            cached = self.file_cache.get(scope, file_hash)
+            if cached:
+                print(f"   📎 Reusing provider file {cached['file_id']}")
+                return cached["text"]
         
-        return AnalysisResult(
-            raw_text=raw_text,
-            structured_data=structured_data,
-            tokens_used=usage.total_tokens if usage else None,
-            model=self.model,
-            analysis_type=analysis_type,
-            provider=self.provider_name,
-            processing_time_ms=processing_time
+        with open(file_path, "rb") as f:
+            file_object = self.client.files.create(file=f, purpose="file-extract")
+        file_content = self.client.files.content(file_id=file_object.id).text
+        if file_hash:
+            self.file_cache.set(scope, file_hash, file_object.id, file_content)
+        return file_content
+    
+    def _create_streaming(self, messages: List[Dict[str, Any]], stream_file: str):
+        """
+        Chat completion with the file's base64 streamed into the request body.
+        Returns (raw_text, TokenUsage).
+        """
+        body = StreamingJSONBody(
+            {"model": self.model, "messages": messages, "temperature": 0.1, "max_tokens": 4096},
+            stream_file,
+        )
+        data = post_streaming_json(
+            f"{self.api_url.rstrip('/')}/chat/completions",
+            {"Authorization": f"Bearer {self.api_key}"},
+            body,
         )
+        return data["choices"][0]["message"]["content"], openai_usage(data.get("usage"))
+    
+    @property
+    def supports_transcription(self) -> bool:
+        if not AI_TRANSCRIPTION_MODEL or AI_TRANSCRIPTION_ENABLED == "false":
+            return False
+        return AI_TRANSCRIPTION_ENABLED == "true" or urlparse(self.api_url).hostname in TRANSCRIPTION_HOSTS
+    
+    def transcribe_audio(self, file_path: str) -> str:
+        """Whisper-style /audio/transcriptions; the endpoint must serve it."""
+        from openai import NotFoundError
+        
+        if not self.supports_transcription:
+            raise MediaUnsupportedError(f"{self.api_url} is not enabled for transcription")
+        reservation = self._reserve_tokens("", 0)
+        try:
+            with open(file_path, "rb") as f:
+                transcript = self.client.audio.transcriptions.create(model=AI_TRANSCRIPTION_MODEL, file=f)
+        except NotFoundError as e:
+            raise MediaUnsupportedError(f"{self.api_url} does not serve /audio/transcriptions") from e
+        finally:
+            self._settle_tokens(reservation, None)
+        return transcript.text
     
     def summarize_document(self, text: str, max_length: int = 500) -> str:
         """Generate a summary of document content."""
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"Summarize this investment document in {max_length} characters or less. Focus on key financial terms, parties, and important details."},
-                {"role": "user", "content": text}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
+        reservation = self._reserve_tokens(text, 500)
+        tokens_used = 0
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": f"Summarize this investment document in {max_length} characters or less. Focus on key financial terms, parties, and important details."},
+                    {"role": "user", "content": text}
+                ],
+                temperature=0.3,
+                max_tokens=500
+            )
+            tokens_used = response.usage.total_tokens if response.usage else None
+        finally:
+            self._settle_tokens(reservation, tokens_used)
         return response.choices[0].message.content
 
 
@@ -391,15 +820,69 @@ def analyze_document(
         prompt: Optional[str] = None
     ) -> AnalysisResult:
         """Analyze a document using Claude API."""
-        import time as time_module
-        start_time = time_module.time()
+        start_time = time.time()
+        system, content, stream_file = self._build_document_content(file_path, analysis_type, prompt)
+        
+        # Call Claude API
+        reservation = self._reserve_tokens(system + content, 4096)
+        tokens_used = 0
+        try:
+            if stream_file:
+                raw_text, usage = self._create_streaming(system, content, stream_file)
+            else:
+                response = self.client.messages.create(
+                    model=self.model,
+                    max_tokens=4096,
+                    system=system,
+                    messages=[{"role": "user", "content": content}]
+                )
+                raw_text, usage = self._read_response(response)
+            tokens_used = usage.total
+        finally:
+            self._settle_tokens(reservation, tokens_used)
+        return self._make_result(raw_text, usage, analysis_type, start_time)
+    
+    async def analyze_document_async(
+        self,
+        file_path: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """analyze_document() on the shared async connection pool."""
+        start_time = time.time()
+        system, content, stream_file = await asyncio.to_thread(
+            self._build_document_content, file_path, analysis_type, prompt
+        )
         
+        reservation = await self._reserve_tokens_async(system + content, 4096)
+        tokens_used = 0
+        try:
+            if stream_file:
+                raw_text, usage = await asyncio.to_thread(self._create_streaming, system, content, stream_file)
+            else:
+                response = await self._get_async_client().messages.create(
+                    model=self.model,
+                    max_tokens=4096,
+                    system=system,
+                    messages=[{"role": "user", "content": content}]
+                )
+                raw_text, usage = self._read_response(response)
+            tokens_used = usage.total
+        finally:
+            await self._settle_tokens_async(reservation, tokens_used)
+        return self._make_result(raw_text, usage, analysis_type, start_time)
+    
+    def _build_document_content(self, file_path: str, analysis_type: str, prompt: Optional[str]):
+        """Returns (cached system blocks, user content blocks, file to stream into the body or None)."""
         mime_type = self._get_mime_type(file_path)
-        system_prompt = self._get_prompt(analysis_type, prompt)
+        
+        if mime_type.startswith('image/'):
+            file_path, mime_type = self._prepare_image(file_path, mime_type)
+        stream_file = file_path if should_stream(file_path) else None
         
         # Build message content
         if mime_type.startswith('image/'):
-            base64_image = self._encode_image(file_path)
+            base64_image = StreamingJSONBody.PLACEHOLDER if stream_file else self._encode_image(file_path)
             content = [
                 {
                     "type": "image",
@@ -408,12 +891,12 @@ def analyze_document(
                         "media_type": mime_type,
                         "data": base64_image
                     }
-                },
-                {"type": "text", "text": system_prompt}
+                }
             ]
         elif mime_type == 'application/pdf':
             # Claude supports PDF via base64
-            base64_pdf = self._encode_image(file_path)  # Same encoding works for PDFs
+            # Same encoding works for PDFs
+            base64_pdf = StreamingJSONBody.PLACEHOLDER if stream_file else self._encode_image(file_path)
             content = [
                 {
                     "type": "document",
@@ -422,48 +905,138 @@ def analyze_document(
                         "media_type": "application/pdf",
                         "data": base64_pdf
                     }
-                },
-                {"type": "text", "text": system_prompt}
+                }
             ]
         else:
+            stream_file = None
             try:
                 with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
                     text_content = f.read()
-                content = [{"type": "text", "text": system_prompt + "\n\nDocument content:\n" + text_content}]
+                content = [{"type": "text", "text": "Document content:\n" + text_content}]
             except:
                 raise ValueError(f"Unsupported file type: {mime_type}")
         
-        # Call Claude API
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=4096,
-            system="You are an expert investment document analyst. Extract structured information accurately.",
-            messages=[{"role": "user", "content": content}]
-        )
-        
-        raw_text = response.content[0].text if response.content else ""
-        processing_time = int((time_module.time() - start_time) * 1000)
+        return self._system_blocks(analysis_type, prompt), content, stream_file
+    
+    def analyze_text(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """Analyze extracted document text using Claude API."""
+        start_time = time.time()
+        system = self._system_blocks(analysis_type, prompt)
+        user_content = [{"type": "text", "text": "Document content:\n" + text}]
         
-        structured_data = self._parse_structured_response(raw_text) if self._parse_structured else {"extracted_text": raw_text}
+        reservation = self._reserve_tokens(system + user_content, 4096)
+        tokens_used = 0
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=4096,
+                system=system,
+                messages=[{"role": "user", "content": user_content}]
+            )
+            raw_text, usage = self._read_response(response)
+            tokens_used = usage.total
+        finally:
+            self._settle_tokens(reservation, tokens_used)
+        return self._make_result(raw_text, usage, analysis_type, start_time)
+    
+    async def analyze_text_async(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """analyze_text() on the shared async connection pool."""
+        start_time = time.time()
+        system = self._system_blocks(analysis_type, prompt)
+        user_content = [{"type": "text", "text": "Document content:\n" + text}]
         
-        return AnalysisResult(
-            raw_text=raw_text,
-            structured_data=structured_data,
-            tokens_used=response.usage.input_tokens + response.usage.output_tokens if response.usage else None,
-            model=self.model,
-            analysis_type=analysis_type,
-            provider=self.provider_name,
-            processing_time_ms=processing_time
+        reservation = await self._reserve_tokens_async(system + user_content, 4096)
+        tokens_used = 0
+        try:
+            response = await self._get_async_client().messages.create(
+                model=self.model,
+                max_tokens=4096,
+                system=system,
+                messages=[{"role": "user", "content": user_content}]
+            )
+            raw_text, usage = self._read_response(response)
+            tokens_used = usage.total
+        finally:
+            await self._settle_tokens_async(reservation, tokens_used)
+        return self._make_result(raw_text, usage, analysis_type, start_time)
+    
+    def _system_blocks(self, analysis_type: str, prompt: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        The static prefix as a cache breakpoint: later requests with the same
+        prefix read it from Anthropic's prompt cache (prefixes under the
+        model's minimum cacheable length are simply sent uncached).
+        """
+        return [{
+            "type": "text",
+            "text": self._static_prefix(analysis_type, prompt),
+            "cache_control": {"type": "ephemeral"},
+        }]
+    
+    @staticmethod
+    def _read_response(response):
+        """Returns (text, TokenUsage) from a Messages API response."""
+        raw_text = response.content[0].text if response.content else ""
+        return raw_text, anthropic_usage(response.usage)
+    
+    def _get_async_client(self):
+        """AsyncAnthropic bound to the current event loop's shared HTTP pool."""
+        http_client = get_async_http_client()
+        if self._async_client is None or self._async_client[0] is not http_client:
+            import anthropic
+            self._async_client = (
+                http_client,
+                anthropic.AsyncAnthropic(api_key=self.api_key, http_client=http_client),
+            )
+        return self._async_client[1]
+    
+    def _create_streaming(self, system: List[Dict[str, Any]], content: List[Dict[str, Any]], stream_file: str):
+        """
+        Messages API call with the file's base64 streamed into the request body.
+        Returns (raw_text, TokenUsage).
+        """
+        base_url = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
+        body = StreamingJSONBody(
+            {
+                "model": self.model,
+                "max_tokens": 4096,
+                "system": system,
+                "messages": [{"role": "user", "content": content}],
+            },
+            stream_file,
+        )
+        data = post_streaming_json(
+            f"{base_url.rstrip('/')}/v1/messages",
+            {"x-api-key": self.api_key, "anthropic-version": "2023-06-01"},
+            body,
         )
+        blocks = data.get("content") or []
+        raw_text = blocks[0].get("text", "") if blocks else ""
+        return raw_text, anthropic_usage(data.get("usage"))
     
     def summarize_document(self, text: str, max_length: int = 500) -> str:
         """Generate a summary of document content."""
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=500,
-            system=f"Summarize this investment document in {max_length} characters or less. Focus on key financial terms, parties, and important details.",
-            messages=[{"role": "user", "content": text}]
-        )
+        reservation = self._reserve_tokens(text, 500)
+        tokens_used = 0
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=500,
+                system=f"Summarize this investment document in {max_length} characters or less. Focus on key financial terms, parties, and important details.",
+                messages=[{"role": "user", "content": text}]
+            )
+            tokens_used = response.usage.input_tokens + response.usage.output_tokens if response.usage else None
+        finally:
+            self._settle_tokens(reservation, tokens_used)
         return response.content[0].text if response.content else ""
 
 
@@ -510,41 +1083,88 @@ def analyze_document(
         start_time = time_module.time()
         
         mime_type = self._get_mime_type(file_path)
-        system_prompt = self._get_prompt(analysis_type, prompt)
+        system_prompt = self._static_prefix(analysis_type, prompt)
         
         # Build content based on file type
         if mime_type.startswith('image/'):
             # Upload image file
-            file_obj = self.client.upload_file(file_path, mime_type=mime_type)
-            response = self._model_instance.generate_content([system_prompt, file_obj])
+            file_path, mime_type = self._prepare_image(file_path, mime_type)
+            contents = [system_prompt, self.client.upload_file(file_path, mime_type=mime_type)]
+            estimate = [{"type": "text", "text": system_prompt}, {"type": "file"}]
         elif mime_type == 'application/pdf':
             # Gemini supports PDF upload
-            file_obj = self.client.upload_file(file_path, mime_type="application/pdf")
-            response = self._model_instance.generate_content([system_prompt, file_obj])
+            contents = [system_prompt, self.client.upload_file(file_path, mime_type="application/pdf")]
+            estimate = [{"type": "text", "text": system_prompt}, {"type": "file"}]
         else:
             try:
                 with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
                     text_content = f.read()
-                response = self._model_instance.generate_content(system_prompt + "\n\nDocument content:\n" + text_content)
             except:
                 raise ValueError(f"Unsupported file type: {mime_type}")
+            contents = estimate = system_prompt + "\n\nDocument content:\n" + text_content
         
-        raw_text = response.text if hasattr(response, 'text') else str(response)
+        reservation = self._reserve_tokens(estimate, 4096)
+        tokens_used = 0
+        try:
+            response = self._model_instance.generate_content(contents)
+            raw_text = response.text if hasattr(response, 'text') else str(response)
+            
+            # Older SDKs report no usage; estimate from word counts then
+            usage = gemini_usage(getattr(response, "usage_metadata", None))
+            if usage.total is None:
+                usage = TokenUsage(len(raw_text.split()) + len(system_prompt.split()))
+            tokens_used = usage.total
+        finally:
+            self._settle_tokens(reservation, tokens_used)
         processing_time = int((time_module.time() - start_time) * 1000)
         
-        # Estimate tokens (Gemini doesn't return exact token counts)
-        tokens_used = len(raw_text.split()) + len(system_prompt.split())
+        structured_data = self._parse_structured_response(raw_text) if self._parse_structured else {"extracted_text": raw_text}
+        
+        return AnalysisResult(
+            raw_text=raw_text,
+            structured_data=structured_data,
+            tokens_used=usage.total,
+            model=self.model,
+            analysis_type=analysis_type,
+            provider=self.provider_name,
+            processing_time_ms=processing_time,
+            input_tokens=usage.input,
+            cached_input_tokens=usage.cached_input,
+        )
+    
+    def analyze_text(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        """Analyze extracted document text using Gemini API."""
+        start_time = time.time()
+        system_prompt = self._static_prefix(analysis_type, prompt)
         
+        reservation = self._reserve_tokens(system_prompt + "\n\nDocument content:\n" + text, 4096)
+        tokens_used = 0
+        try:
+            response = self._model_instance.generate_content(system_prompt + "\n\nDocument content:\n" + text)
+            raw_text = response.text if hasattr(response, 'text') else str(response)
+            usage = gemini_usage(getattr(response, "usage_metadata", None))
+            if usage.total is None:
+                usage = TokenUsage(len(raw_text.split()) + len(system_prompt.split()) + len(text.split()))
+            tokens_used = usage.total
+        finally:
+            self._settle_tokens(reservation, tokens_used)
         structured_data = self._parse_structured_response(raw_text) if self._parse_structured else {"extracted_text": raw_text}
         
         return AnalysisResult(
             raw_text=raw_text,
             structured_data=structured_data,
-            tokens_used=tokens_used,
+            tokens_used=usage.total,
             model=self.model,
             analysis_type=analysis_type,
             provider=self.provider_name,
-            processing_time_ms=processing_time
+            processing_time_ms=int((time.time() - start_time) * 1000),
+            input_tokens=usage.input,
+            cached_input_tokens=usage.cached_input,
         )
     
     def summarize_document(self, text: str, max_length: int = 500) -> str:
@@ -630,10 +1250,20 @@ def create_ai_client(
 
 
 def get_ai_client() -> BaseAIClient:
-    """Get or create the global AI client instance."""
+    """
+    Get or create the global AI client instance.
+    
+    With AI_PROVIDERS listing more than one provider (e.g. "kimi,anthropic"),
+    returns a ProviderRouter with failover across them, in that order.
+    """
     global _ai_instance
     if _ai_instance is None:
-        _ai_instance = create_ai_client()
+        providers = [p.strip().lower() for p in os.getenv("AI_PROVIDERS", "").split(",") if p.strip()]
+        if len(providers) > 1:
+            from provider_router import ProviderRouter
+            _ai_instance = ProviderRouter({p: create_ai_client(provider=p) for p in providers})
+        else:
+            _ai_instance = create_ai_client(provider=providers[0] if providers else None)
     return _ai_instance
 
 
@@ -0,0 +1,246 @@
+"""
+===============================================================================
+IMAGE PREPROCESSING - Shrink photos before vision calls
+===============================================================================
+Phone photos arrive as 12 MP JPEG/HEIC files, far above the resolution the
+vision models actually use. Before an image is sent to a provider it is:
+
+1. Auto-oriented from EXIF (so the model sees it upright)
+2. Downscaled to the provider's max useful dimension
+3. Recompressed as JPEG at a quality target
+
+Results are cached on disk by (file hash, max dimension, quality), so
+retries and re-analysis of the same photo skip the work. The periodic
+expire_image_cache task bounds the cache by age and total size.
+===============================================================================
+"""
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from metrics import record_image_preprocess, stage_timer
+from streaming import sha256_file
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Longest edge (px) beyond which each provider downsamples anyway
+PROVIDER_MAX_DIMENSION = {
+    "openai": 2048,
+    "anthropic": 1568,
+    "google": 3072,
+}
+DEFAULT_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_PREPROCESS_MIN_BYTES = int(os.getenv("IMAGE_PREPROCESS_MIN_BYTES", str(256 * 1024)))  # Skip tiny images
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_DIR = os.getenv(
+    "IMAGE_CACHE_DIR",
+    os.path.join(os.getenv("WORKER_TEMP_DIR", tempfile.gettempdir()), "image_cache"),
+)
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(1024 ** 3)))  # 1 GiB
+IMAGE_CACHE_TMP_MAX_AGE_SECONDS = 3600  # Temp files older than this were abandoned by a crash
+# Assumed uplink to the provider, used to estimate latency saved
+IMAGE_UPLINK_BYTES_PER_SEC = float(os.getenv("IMAGE_UPLINK_BYTES_PER_SEC", str(2 * 1024 * 1024)))
+
+# Formats the providers accept as-is
+PASSTHROUGH_MIME_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    HEIF_SUPPORTED = True
+except ImportError:
+    HEIF_SUPPORTED = False
+
+
+@dataclass
+class PreparedImage:
+    """Result of preprocessing: the file to send and what it saved."""
+    path: str
+    mime_type: str
+    original_bytes: int
+    output_bytes: int
+    outcome: str  # resized, recompressed, original, cached
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(self.original_bytes - self.output_bytes, 0)
+
+
+# =============================================================================
+# PREPROCESSING
+# =============================================================================
+
+def get_max_dimension(provider: Optional[str]) -> int:
+    """Max useful image dimension for a provider."""
+    env_override = os.getenv(f"IMAGE_MAX_DIMENSION_{(provider or '').upper()}")
+    if env_override:
+        return int(env_override)
+    return PROVIDER_MAX_DIMENSION.get(provider or "", DEFAULT_MAX_DIMENSION)
+
+
+def _to_rgb(image):
+    """Flatten alpha onto white and convert to RGB for JPEG output."""
+    from PIL import Image
+
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    return image.convert("RGB")
+
+
+def preprocess_image(
+    file_path: str,
+    mime_type: str,
+    provider: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+    quality: Optional[int] = None,
+) -> PreparedImage:
+    """
+    Auto-orient, downscale and recompress an image for a vision call.
+
+    Returns the original file untouched when preprocessing would not make it
+    smaller (and the format is one providers accept), so already-optimised
+    screenshots are never degraded.
+    """
+    provider = provider or "default"
+    original_bytes = os.path.getsize(file_path)
+
+    original = PreparedImage(file_path, mime_type, original_bytes, original_bytes, "original")
+    if not IMAGE_PREPROCESS_ENABLED:
+        return original
+    if original_bytes < IMAGE_PREPROCESS_MIN_BYTES and mime_type in PASSTHROUGH_MIME_TYPES:
+        _record(provider, original)
+        return original
+
+    max_dim = get_max_dimension(provider)
+    quality = quality or IMAGE_JPEG_QUALITY
+    cache_dir = cache_dir or IMAGE_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+
+    file_hash = sha256_file(file_path)
+    cached_path = os.path.join(cache_dir, f"{file_hash}_{max_dim}_q{quality}.jpg")
+    passthrough_marker = cached_path + ".orig"
+
+    # Cached decision: either a processed JPEG or "keep the original"
+    if os.path.exists(cached_path):
+        _touch(cached_path)  # Size eviction drops the least recently used entries
+        result = PreparedImage(cached_path, "image/jpeg", original_bytes, os.path.getsize(cached_path), "cached")
+        _record(provider, result)
+        return result
+    if os.path.exists(passthrough_marker) and mime_type in PASSTHROUGH_MIME_TYPES:
+        _touch(passthrough_marker)
+        _record(provider, original)
+        return original
+
+    from PIL import Image, ImageOps
+
+    with stage_timer("image_preprocess"):
+        with Image.open(file_path) as image:
+            if getattr(image, "is_animated", False):
+                # Flattening to one JPEG frame would lose content
+                _record(provider, original)
+                return original
+            rotated = image.getexif().get(0x0112, 1) != 1  # EXIF Orientation
+            resized = max(image.size) > max_dim
+            if resized and image.format == "JPEG":
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (still >= max_dim)
+                image.draft("RGB", (max_dim, max_dim))
+            oriented = ImageOps.exif_transpose(image) if rotated else image.copy()
+            if resized:
+                oriented.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+            # Unique per call: threads of the async worker share one pid
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=os.path.basename(cached_path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as tmp_file:
+                    _to_rgb(oriented).save(tmp_file, "JPEG", quality=quality, optimize=True, progressive=True)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    output_bytes = os.path.getsize(tmp_path)
+    must_convert = mime_type not in PASSTHROUGH_MIME_TYPES  # e.g. HEIC
+    if output_bytes >= original_bytes and not (resized or rotated or must_convert):
+        os.remove(tmp_path)
+        open(passthrough_marker, "w").close()
+        _record(provider, original)
+        return original
+
+    os.replace(tmp_path, cached_path)
+    result = PreparedImage(
+        cached_path, "image/jpeg", original_bytes, output_bytes,
+        "resized" if resized else "recompressed",
+    )
+    _record(provider, result)
+    return result
+
+
+def _touch(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def expire_image_cache(
+    cache_dir: Optional[str] = None,
+    ttl_seconds: float = IMAGE_CACHE_TTL_SECONDS,
+    max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+) -> int:
+    """
+    Remove cache entries unused for ttl_seconds and abandoned temp files,
+    then the least recently used entries until the cache fits max_bytes.
+    Returns the number of files removed.
+    """
+    cache_dir = cache_dir or IMAGE_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return 0
+    now = time.time()
+    removed = 0
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        try:
+            stat = entry.stat()
+            is_tmp = entry.name.endswith(".tmp")
+            max_age = IMAGE_CACHE_TMP_MAX_AGE_SECONDS if is_tmp else ttl_seconds
+            if stat.st_mtime < now - max_age:
+                os.remove(entry.path)
+                removed += 1
+            elif not is_tmp:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def _record(provider: str, result: PreparedImage):
+    """Emit bytes/latency-saved metrics for a prepared image."""
+    record_image_preprocess(
+        provider,
+        result.outcome,
+        result.bytes_saved,
+        result.bytes_saved / IMAGE_UPLINK_BYTES_PER_SEC,
+    )
@@ -0,0 +1,291 @@
+"""
+===============================================================================
+LOCAL EXTRACTION - Cheap first tier before the AI provider
+===============================================================================
+Many uploads don't need an LLM at all: PDFs with a good text layer, plain
+text and CSV exports, and receipts where the total and date can be found
+with regular expressions. This tier runs in milliseconds and returns a
+confidence score; the worker escalates to the AI tier when the score is
+below LOCAL_CONFIDENCE_THRESHOLD or the analysis type needs reasoning.
+
+Tier served is recorded in AnalysisResult.quality_flags ("tier:local" or
+"tier:ai").
+===============================================================================
+"""
+import csv
+import io
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai_client import AnalysisResult
+from pdf_pipeline import extract_pages, has_text_layer
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+LOCAL_TIER_ENABLED = os.getenv("LOCAL_TIER_ENABLED", "true").lower() == "true"
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_CONFIDENCE_THRESHOLD", "0.75"))
+LOCAL_MIN_TEXT_CHARS = 20
+
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".tsv", ".json"}
+
+LOCAL_MODEL_NAME = "local-extractor-v1"
+
+# =============================================================================
+# PATTERNS
+# =============================================================================
+
+CURRENCY_PATTERN = r"(R\$|US\$|CLP\$?|USD|EUR|BRL|CLP|€|£|\$)"
+NUMBER_PATTERN = r"(\d{1,3}(?:[.,\s]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)"
+AMOUNT_RE = re.compile(CURRENCY_PATTERN + r"\s*" + NUMBER_PATTERN)
+TOTAL_RE = re.compile(
+    r"(?:valor\s+total|total\s+a\s+pagar|monto\s+total|total\s+geral|grand\s+total|amount\s+due|total)"
+    r"\s*:?\s*" + CURRENCY_PATTERN + r"?\s*" + NUMBER_PATTERN,
+    re.IGNORECASE,
+)
+DATE_RES = [
+    re.compile(r"\b(\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4})\b"),
+    re.compile(r"\b(\d{4}-\d{1,2}-\d{1,2})\b"),
+    re.compile(
+        r"\b(\d{1,2}\s+(?:de\s+)?(?:jan|feb|fev|mar|abr|apr|may|mai|jun|jul|ago|aug|sep|set|oct|out|nov|dic|dez|dec)"
+        r"[a-zç]*\.?\s+(?:de\s+)?\d{4})\b",
+        re.IGNORECASE,
+    ),
+]
+# CNPJ (BR), CPF (BR), RUT (CL)
+TAX_ID_RE = re.compile(
+    r"\b(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}|\d{3}\.\d{3}\.\d{3}-\d{2}|\d{1,2}\.\d{3}\.\d{3}-[\dkK])\b"
+)
+
+CURRENCY_CODES = {
+    "R$": "BRL", "BRL": "BRL",
+    "US$": "USD", "USD": "USD",
+    "CLP": "CLP", "CLP$": "CLP",
+    "EUR": "EUR", "€": "EUR",
+    "£": "GBP",
+}
+
+
+@dataclass
+class LocalExtraction:
+    """Outcome of the local tier."""
+    text: str = ""
+    pages: Optional[List[str]] = None  # PDF text layer, reused by the AI tier
+    result: Optional[AnalysisResult] = None
+    confidence: float = 0.0
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def accepted(self) -> bool:
+        return self.result is not None and self.confidence >= LOCAL_CONFIDENCE_THRESHOLD
+
+
+# =============================================================================
+# PARSING HELPERS
+# =============================================================================
+
+def parse_amount(raw: str) -> Optional[float]:
+    """
+    Parse an amount written with either decimal convention.
+    "1.234,56" -> 1234.56, "1,234.56" -> 1234.56, "12.345" -> 12345.0
+    """
+    value = raw.replace(" ", "")
+    if not value:
+        return None
+    if "," in value and "." in value:
+        decimal_sep = "," if value.rfind(",") > value.rfind(".") else "."
+        thousands_sep = "." if decimal_sep == "," else ","
+        value = value.replace(thousands_sep, "").replace(decimal_sep, ".")
+    elif "," in value or "." in value:
+        sep = "," if "," in value else "."
+        head, _, tail = value.rpartition(sep)
+        if len(tail) == 3 and head:
+            value = value.replace(sep, "")  # thousands separator
+        else:
+            value = value.replace(sep, ".") if value.count(sep) == 1 else value.replace(sep, "")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def find_dates(text: str) -> List[str]:
+    """Dates in order of appearance, de-duplicated."""
+    found = []
+    for pattern in DATE_RES:
+        for match in pattern.finditer(text):
+            found.append((match.start(), match.group(1)))
+    return list(dict.fromkeys(d for _, d in sorted(found)))
+
+
+def find_amounts(text: str) -> List[str]:
+    """Currency amounts as written (e.g. "R$ 1.234,56"), de-duplicated."""
+    return list(dict.fromkeys(f"{m.group(1)} {m.group(2)}" for m in AMOUNT_RE.finditer(text)))
+
+
+def find_total(text: str) -> Optional[Dict[str, Any]]:
+    """The last "total"-labelled amount (receipts list subtotals first)."""
+    matches = list(TOTAL_RE.finditer(text))
+    for match in reversed(matches):
+        amount = parse_amount(match.group(2))
+        if amount is not None:
+            symbol = match.group(1)
+            return {
+                "amount": amount,
+                "currency": CURRENCY_CODES.get(symbol.upper() if symbol else "", None),
+                "raw": match.group(0).strip(),
+            }
+    return None
+
+
+# =============================================================================
+# TEXT SOURCES
+# =============================================================================
+
+def _read_text(file_path: str) -> str:
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def _is_text_file(file_path: str, mime_type: Optional[str]) -> bool:
+    mime_type = mime_type or ""
+    return (
+        mime_type.startswith("text/")
+        or mime_type in ("application/json", "application/csv")
+        or Path(file_path).suffix.lower() in TEXT_EXTENSIONS
+    )
+
+
+def _is_csv(file_path: str, mime_type: Optional[str]) -> bool:
+    return (mime_type or "") in ("text/csv", "application/csv", "text/tab-separated-values") or \
+        Path(file_path).suffix.lower() in (".csv", ".tsv")
+
+
+# =============================================================================
+# EXTRACTORS
+# =============================================================================
+
+def _extract_csv(text: str) -> Dict[str, Any]:
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = list(csv.reader(io.StringIO(text), dialect))
+    rows = [r for r in rows if any(cell.strip() for cell in r)]
+    header, body = (rows[0], rows[1:]) if rows else ([], [])
+    return {
+        "json_data": {
+            "columns": header,
+            "row_count": len(body),
+            "rows": [dict(zip(header, r)) for r in body[:500]],
+        },
+    }
+
+
+def _receipt_confidence(text: str, total, dates, amounts) -> Tuple[float, List[str]]:
+    score = 0.2
+    reasons = []
+    if total:
+        score += 0.4
+    else:
+        reasons.append("no_total")
+    if dates:
+        score += 0.2
+    else:
+        reasons.append("no_date")
+    if amounts:
+        score += 0.1
+    if TAX_ID_RE.search(text):
+        score += 0.1
+    return min(score, 1.0), reasons
+
+
+def run_local_tier(
+    file_path: str,
+    mime_type: Optional[str],
+    analysis_type: str,
+    pages: Optional[List[str]] = None,
+) -> LocalExtraction:
+    """
+    Try to answer a job without the AI provider.
+
+    Always returns a LocalExtraction; `accepted` tells the caller whether
+    the result is good enough to skip the AI tier. `pages` holds the PDF
+    text layer so the AI tier can reuse it.
+    """
+    start_time = time.time()
+    outcome = LocalExtraction()
+
+    is_pdf = (mime_type == "application/pdf") or Path(file_path).suffix.lower() == ".pdf"
+    is_csv = _is_csv(file_path, mime_type)
+
+    if is_pdf:
+        if pages is None:
+            try:
+                pages = extract_pages(file_path)
+            except Exception as e:
+                outcome.reasons.append(f"pdf_unreadable:{type(e).__name__}")
+                return outcome
+        outcome.pages = pages
+        if not has_text_layer(pages):
+            outcome.reasons.append("no_text_layer")
+            return outcome
+        outcome.text = "\n\n".join(pages)
+    elif _is_text_file(file_path, mime_type):
+        outcome.text = _read_text(file_path)
+    else:
+        outcome.reasons.append("binary_file")
+        return outcome
+
+    text = outcome.text
+    if len(text.strip()) < LOCAL_MIN_TEXT_CHARS:
+        outcome.reasons.append("too_little_text")
+        return outcome
+
+    dates = find_dates(text)
+    amounts = find_amounts(text)
+    structured: Dict[str, Any] = {"extracted_text": text}
+    if dates:
+        structured["dates_found"] = dates
+    if amounts:
+        structured["amounts_found"] = amounts
+
+    if analysis_type == "receipt_extraction":
+        total = find_total(text)
+        if total:
+            structured["json_data"] = {"total": total}
+        confidence, reasons = _receipt_confidence(text, total, dates, amounts)
+        outcome.reasons.extend(reasons)
+    elif analysis_type == "ocr":
+        # The text layer *is* the OCR output
+        confidence = 0.95
+    elif is_csv:
+        structured.update(_extract_csv(text))
+        structured["summary"] = (
+            f"CSV with {structured['json_data']['row_count']} rows and columns: "
+            + ", ".join(structured["json_data"]["columns"][:20])
+        )
+        confidence = 0.85
+    else:
+        # Summaries, land and contract analysis need the model
+        outcome.reasons.append(f"needs_model:{analysis_type}")
+        confidence = 0.0
+
+    outcome.confidence = round(confidence, 2)
+    outcome.result = AnalysisResult(
+        raw_text=text,
+        structured_data=structured,
+        tokens_used=0,
+        model=LOCAL_MODEL_NAME,
+        analysis_type=analysis_type,
+        provider="local",
+        processing_time_ms=int((time.time() - start_time) * 1000),
+        quality_flags=["tier:local"],
+        confidence_score=outcome.confidence,
+    )
+    return outcome
@@ -6,21 +6,61 @@
 Includes AI response caching to avoid re-analyzing identical files.
 ===============================================================================
 """
+import asyncio
 import json
 import os
+import random
 import signal
 import sys
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 from uuid import UUID
 
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
 from storage import get_storage
-from ai_client import get_ai_client, AnalysisResult
+from streaming import FileTooLargeError, check_size
+from ai_client import ANALYSIS_PROMPTS, RateLimiter, close_async_http_client, get_ai_client, AnalysisResult
+from pdf_pipeline import analyze_pdf_chunked
+from pdf_pool import get_pdf_pool
+from local_extraction import LOCAL_TIER_ENABLED, run_local_tier
+from media import MediaUnsupportedError, analyze_media, is_media
+from provider_files import ProviderFileCache
+from model_tiers import CHARS_PER_TOKEN, ModelTiers, TierDecision, choose_tier, count_pdf_pages
+from result_cache import (
+    AI_DISK_CACHE_ENABLED,
+    DiskCache,
+    ResultCache,
+    cache_key,
+    prompt_fingerprint,
+    publish_identities,
+)
+from single_flight import DONE, FAILED, SINGLE_FLIGHT_ENABLED, SingleFlight
+from periodic import PERIODIC_ENABLED, PeriodicScheduler, PostgresRunLog, maintenance_tasks
+from similarity import (
+    SIMILARITY_ENABLED,
+    NearDuplicate,
+    compute_signature,
+    find_near_duplicate,
+    index_signature,
+)
+from metrics import (
+    WORKER_JOBS_IN_FLIGHT,
+    WORKER_METRICS_PORT,
+    record_ai_request,
+    record_analysis_job,
+    record_cache_lookup,
+    record_model_tier,
+    record_queue_wait,
+    set_queue_depth,
+    stage_timer,
+    start_metrics_server,
+)
 
 
 # =============================================================================
@@ -33,12 +73,24 @@
 MAX_CONCURRENT = int(os.getenv("MAX_CONCURRENT_JOBS", "3"))
 WORKER_ID = os.getenv("HOSTNAME", f"worker-{os.getpid()}")
 AI_CACHE_TTL_DAYS = int(os.getenv("AI_CACHE_TTL_DAYS", "30"))  # Cache AI results for 30 days
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "15"))  # Base delay for retry backoff
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "3600"))  # Cap before jitter
+RETRY_JITTER_RATIO = float(os.getenv("RETRY_JITTER_RATIO", "0.25"))  # Up to +25% random jitter
+PRIORITY_AGING_SECONDS = float(os.getenv("PRIORITY_AGING_SECONDS", "120"))  # Wait per 1-step priority boost
+PRIORITY_AGING_MAX_BOOST = float(os.getenv("PRIORITY_AGING_MAX_BOOST", "4"))  # Max aging boost
+FAIR_SHARE_KEY = os.getenv("FAIR_SHARE_KEY", "investment")  # investment | uploader | none
+FAIR_SHARE_MAX_RUNNING = int(os.getenv("FAIR_SHARE_MAX_RUNNING", "2"))  # Running jobs per key (0 = unlimited)
+QUEUE_DEPTH_INTERVAL = int(os.getenv("QUEUE_DEPTH_INTERVAL", "15"))  # Seconds between queue depth samples
+WORKER_ASYNC = os.getenv("WORKER_ASYNC", "false").lower() == "true"  # asyncio job loop
+WORKER_ASYNC_CONCURRENCY = int(os.getenv("WORKER_ASYNC_CONCURRENCY", "32"))  # Jobs in flight per process
+WORKER_ASYNC_THREADS = int(os.getenv("WORKER_ASYNC_THREADS", "16"))  # Download/DB/local tier threads
 
 # =============================================================================
 # REDIS CONNECTION (for caching)
 # =============================================================================
 
 _redis_client = None
+_redis_binary_client = None
 
 def get_redis():
     """Get Redis client for caching."""
@@ -53,6 +105,19 @@ def get_redis():
     return _redis_client
 
 
+def get_binary_redis():
+    """Redis client returning bytes, for compressed cache values."""
+    global _redis_binary_client
+    if _redis_binary_client is None:
+        try:
+            import redis
+            _redis_binary_client = redis.from_url(REDIS_URL)
+        except Exception as e:
+            print(f"⚠️ Redis unavailable, caching disabled: {e}")
+            _redis_binary_client = None
+    return _redis_binary_client
+
+
 # =============================================================================
 # DATABASE CONNECTION
 # =============================================================================
@@ -63,49 +128,164 @@ def get_db_connection():
 
 
 # =============================================================================
-# AI RESPONSE CACHING
+# RETRY BACKOFF
 # =============================================================================
 
-def _get_cached_analysis(file_hash: str) -> Optional[dict]:
+# Backoff multipliers per error class. Rate limits and timeouts mean the
+# provider needs time to recover, so they back off hardest; parse errors are
+# usually deterministic and only get a short delay. Shutdown re-queues
+# immediately since the job itself did nothing wrong.
+RETRY_CLASS_MULTIPLIERS = {
+    "rate_limit": 4.0,
+    "timeout": 2.0,
+    "transient": 1.0,
+    "parse": 0.25,
+    "shutdown": 0.0,
+}
+
+# Error classes that fail the job immediately without retrying
+NON_RETRYABLE_CLASSES = {"permanent"}
+
+
+def classify_error(exc: BaseException) -> str:
     """
-    Check if a file has already been analyzed.
-    Returns cached result if found and not expired.
+    Classify a job failure for retry scheduling.
+    Returns one of: permanent, rate_limit, timeout, parse, transient.
     """
-    if not file_hash:
-        return None
-    
-    redis = get_redis()
-    if not redis:
-        return None
+    if isinstance(exc, (FileTooLargeError, MediaUnsupportedError)):
+        return "permanent"
+
+    name = type(exc).__name__.lower()
+    message = str(exc).lower()
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, "response", None), "status_code", None)
     
-    try:
-        cache_key = f"ai_analysis:{file_hash}"
-        cached = redis.get(cache_key)
-        if cached:
-            print(f"   💾 Found cached analysis for file hash: {file_hash[:16]}...")
-            return json.loads(cached)
-    except Exception as e:
-        print(f"   ⚠️ Cache check failed: {e}")
+    if status_code == 429 or "ratelimit" in name or "rate limit" in message or "429" in message:
+        return "rate_limit"
+    if isinstance(exc, TimeoutError) or "timeout" in name or "timed out" in message:
+        return "timeout"
+    if isinstance(exc, (ValueError, KeyError, IndexError)) or "pdfread" in name:
+        # Includes json.JSONDecodeError and UnicodeDecodeError (ValueError subclasses)
+        return "parse"
+    return "transient"
+
+
+def compute_retry_delay(retry_count: int, error_class: str = "transient") -> float:
+    """
+    Seconds to wait before a failed job becomes claimable again.
     
-    return None
+    Formula: base * class_multiplier * 2^retry_count (capped) + jitter
+    """
+    multiplier = RETRY_CLASS_MULTIPLIERS.get(error_class, 1.0)
+    if multiplier <= 0:
+        return 0.0
+    delay = min(RETRY_BASE_SECONDS * multiplier * (2 ** max(retry_count, 0)), RETRY_MAX_DELAY_SECONDS)
+    return delay + random.uniform(0, delay * RETRY_JITTER_RATIO)
+
+
+# =============================================================================
+# JOB SCHEDULING
+# =============================================================================
 
+# SQL expressions identifying the fair-share bucket of a job. Jobs without an
+# investment (or uploader) fall back to their own file so they never share a
+# bucket with unrelated work.
+FAIR_SHARE_KEY_SQL = {
+    "investment": "COALESCE(pj.investment_id::text, pj.file_id::text)",
+    "uploader": "COALESCE(fr.uploaded_by, pj.investment_id::text, pj.file_id::text)",
+}
 
-def _cache_analysis(file_hash: str, analysis_data: dict):
-    """Cache analysis result for future use."""
-    if not file_hash:
-        return
+
+# A retried job has been waiting since its backoff expired, not since it was
+# first created; otherwise backoff would count toward aging and queue wait.
+QUEUED_SINCE_SQL = "COALESCE(pj.scheduled_at, pj.created_at)"
+WAIT_SECONDS_SQL = f"EXTRACT(EPOCH FROM (NOW() - {QUEUED_SINCE_SQL}))"
+
+
+def build_claim_query(
+    share_key: str = None,
+    max_running: int = None,
+) -> str:
+    """
+    Build the job claim query.
     
-    redis = get_redis()
-    if not redis:
-        return
+    Ordering uses an aged priority so old low-priority jobs eventually
+    overtake fresh high-priority ones:
+        effective_priority = priority - LEAST(max_boost, wait_seconds / aging_seconds)
     
-    try:
-        cache_key = f"ai_analysis:{file_hash}"
-        ttl_seconds = AI_CACHE_TTL_DAYS * 24 * 60 * 60  # Convert days to seconds
-        redis.setex(cache_key, ttl_seconds, json.dumps(analysis_data, default=str))
-        print(f"   💾 Cached analysis result (TTL: {AI_CACHE_TTL_DAYS} days)")
-    except Exception as e:
-        print(f"   ⚠️ Cache write failed: {e}")
+    wait_seconds counts from scheduled_at for retries (see QUEUED_SINCE_SQL).
+    
+    When fair share is enabled, jobs whose key already has max_running jobs
+    running are skipped. The limit is soft: two workers claiming at the same
+    instant can each see the same running count.
+    
+    Parameters: aging_seconds, max_boost (and max_running when fair share is on).
+    """
+    share_key = FAIR_SHARE_KEY if share_key is None else share_key
+    max_running = FAIR_SHARE_MAX_RUNNING if max_running is None else max_running
+    key_sql = FAIR_SHARE_KEY_SQL.get(share_key)
+    fair_share = key_sql is not None and max_running > 0
+    
+    running_cte = ""
+    running_join = ""
+    running_filter = ""
+    if fair_share:
+        running_cte = f"""
+        WITH running AS (
+            SELECT {key_sql} AS share_key, COUNT(*) AS running_count
+            FROM processing_jobs pj
+            JOIN file_registry fr ON pj.file_id = fr.id
+            WHERE pj.status = 'running'
+            GROUP BY 1
+        )"""
+        running_join = f"LEFT JOIN running r ON r.share_key = {key_sql}"
+        running_filter = "AND COALESCE(r.running_count, 0) < %(max_running)s"
+    
+    return f"""{running_cte}
+        SELECT 
+            pj.id, pj.job_type, pj.file_id, pj.investment_id,
+            pj.priority, pj.parameters, pj.retry_count, pj.max_retries,
+            pj.created_at,
+            {WAIT_SECONDS_SQL} AS queue_wait_seconds,
+            fr.storage_key, fr.storage_bucket, fr.original_filename,
+            fr.mime_type, fr.file_hash, fr.file_size_bytes, i.name as investment_name, i.category as investment_category,
+            pj.priority - LEAST(
+                %(max_boost)s,
+                {WAIT_SECONDS_SQL} / %(aging_seconds)s
+            ) AS effective_priority
+        FROM processing_jobs pj
+        JOIN file_registry fr ON pj.file_id = fr.id
+        LEFT JOIN investments i ON pj.investment_id = i.id
+        {running_join}
+        WHERE pj.status = 'queued'
+          AND (pj.scheduled_at IS NULL OR pj.scheduled_at <= NOW())
+          {running_filter}
+        ORDER BY effective_priority ASC, pj.created_at ASC
+        FOR UPDATE OF pj SKIP LOCKED
+        LIMIT 1
+    """
+
+
+# =============================================================================
+# AI RESPONSE CACHING
+# =============================================================================
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Redis + local disk result cache (tier 3, Postgres, is _link_existing_analysis)."""
+    global _result_cache
+    if _result_cache is None:
+        disk = None
+        if AI_DISK_CACHE_ENABLED:
+            try:
+                disk = DiskCache()
+            except OSError as e:
+                print(f"⚠️ Disk cache unavailable: {e}")
+        _result_cache = ResultCache(get_binary_redis(), disk)
+    return _result_cache
 
 
 def _get_file_hash(file_id: str) -> Optional[str]:
@@ -123,52 +303,203 @@ def _get_file_hash(file_id: str) -> Optional[str]:
         conn.close()
 
 
+def _set_file_hash(file_id: str, file_hash: str):
+    """Store a computed content hash (only if none was recorded meanwhile)."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE file_registry SET file_hash = %s WHERE id = %s AND file_hash IS NULL",
+                (file_hash, file_id)
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+
+# Copies the newest analysis matching {where} onto the job's file; the
+# source id is recorded as "<flag>:<id>" after any extra flags.
+COPY_ANALYSIS_SQL = """
+    INSERT INTO analysis_results (
+        job_id, file_id, investment_id, analysis_type, model_version,
+        provider, raw_text, structured_data, summary, extracted_entities,
+        extracted_dates, extracted_amounts, confidence_score,
+        quality_flags, processing_time_ms, tokens_used
+    )
+    SELECT
+        %(job_id)s, %(file_id)s, %(investment_id)s, ar.analysis_type, ar.model_version,
+        ar.provider, ar.raw_text, ar.structured_data, ar.summary, ar.extracted_entities,
+        ar.extracted_dates, ar.extracted_amounts, ar.confidence_score,
+        array_append(
+            array_cat(COALESCE(ar.quality_flags, '{{}}'), %(extra_flags)s::text[]),
+            %(flag)s || ':' || ar.id::text
+        ),
+        0, 0
+    FROM analysis_results ar
+    JOIN file_registry fr ON ar.file_id = fr.id
+    WHERE {where}
+      AND ar.analysis_type = %(analysis_type)s
+      AND ar.file_id <> %(file_id)s
+    ORDER BY ar.created_at DESC
+    LIMIT 1
+    RETURNING id
+"""
+
+
+def _copy_analysis(job: dict, where: str, params: dict, flag: str, extra_flags=None) -> Optional[str]:
+    """Copy an earlier analysis onto this job's file. Returns the new result id."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(COPY_ANALYSIS_SQL.format(where=where), {
+                "job_id": job["id"],
+                "file_id": job["file_id"],
+                "investment_id": job["investment_id"],
+                "analysis_type": job["job_type"],
+                "flag": flag,
+                "extra_flags": list(extra_flags or []),
+                **params,
+            })
+            row = cur.fetchone()
+            conn.commit()
+            return str(row["id"]) if row else None
+    finally:
+        conn.close()
+
+
+# Same provider, model and prompt as the result-cache key
+RESULT_VERSION_SQL = (
+    "ar.provider = %(provider)s AND ar.model_version = %(model)s "
+    "AND %(prompt_flag)s = ANY(ar.quality_flags)"
+)
+
+
+def _version_params(provider: str, model: str, prompt_fp: str) -> dict:
+    return {"provider": provider, "model": model, "prompt_flag": f"prompt:{prompt_fp}"}
+
+
+def _link_existing_analysis(job: dict, file_hash: str, provider: str, model: str, prompt_fp: str) -> Optional[str]:
+    """
+    Reuse a stored analysis of an identical file made with the same
+    provider, model and prompt, flagged "deduplicated:<source id>".
+    Returns the new result id, or None if there is none.
+    """
+    return _copy_analysis(
+        job,
+        "fr.file_hash = %(file_hash)s AND " + RESULT_VERSION_SQL,
+        {"file_hash": file_hash, **_version_params(provider, model, prompt_fp)},
+        "deduplicated",
+    )
+
+
+def _link_near_duplicate(job: dict, match: NearDuplicate, provider: str, model: str, prompt_fp: str) -> Optional[str]:
+    """
+    Reuse the analysis of a near-duplicate file made with the same provider,
+    model and prompt, flagged "near_duplicate".
+    """
+    return _copy_analysis(
+        job,
+        "fr.id = %(source_file_id)s AND " + RESULT_VERSION_SQL,
+        {"source_file_id": match.file_id, **_version_params(provider, model, prompt_fp)},
+        "near_duplicate_of",
+        extra_flags=["near_duplicate", f"similarity:{match.similarity:.2f}"],
+    )
+
+
 # =============================================================================
 # JOB PROCESSING
 # =============================================================================
 
+@dataclass
+class JobContext:
+    """State carried between the stages of one job."""
+    job: dict
+    analysis_type: str
+    prompt_fp: str
+    file_hash: Optional[str] = None
+    result_key: Optional[str] = None
+    local_path: Optional[str] = None
+    local: Any = None
+    signature: Any = None
+    near_dup: Optional[NearDuplicate] = None
+    flight_token: Optional[str] = None  # Set while this job leads its single flight
+    start_time: float = field(default_factory=time.time)
+
+
 class Worker:
     """Main worker class for processing analysis jobs."""
     
     def __init__(self):
         self.storage = get_storage()
         self.ai = get_ai_client()
+        self.ai.file_cache = ProviderFileCache(get_binary_redis())
+        get_pdf_pool().redis = get_binary_redis()
+        if RateLimiter is not None:
+            self.ai.rate_limiter = RateLimiter(get_redis())
+        self.tiers = ModelTiers(self.ai)
+        self.flights = SingleFlight(get_redis())
+        self.scheduler = PeriodicScheduler(
+            maintenance_tasks(get_db_connection, self.storage, get_result_cache().disk),
+            PostgresRunLog(get_db_connection, WORKER_ID),
+        ) if PERIODIC_ENABLED else None
         self.running = True
         self.current_job: Optional[dict] = None
+        self.active_jobs: Dict[str, dict] = {}  # In flight on the asyncio loop
         
         # Setup signal handlers
         signal.signal(signal.SIGTERM, self._signal_handler)
         signal.signal(signal.SIGINT, self._signal_handler)
     
     def _signal_handler(self, signum, frame):
-        """Handle shutdown signals gracefully."""
-        print(f"\n⚠️ Received signal {signum}, shutting down...")
-        self.running = False
+        """
+        Stop claiming jobs and let the ones in flight finish (drain).
         
-        # If processing a job, mark it as failed
-        if self.current_job:
-            self._fail_job(self.current_job["id"], "Worker shutdown during processing")
+        They are not re-queued here: they are still running, and another
+        worker would run them a second time. Jobs of a worker killed before
+        it drains are re-queued by reap_stale_jobs.
+        """
+        in_flight = len(self.active_jobs) + (1 if self.current_job else 0)
+        print(f"\n⚠️ Received signal {signum}, shutting down after {in_flight} in-flight job(s)...")
+        self.running = False
+    
+    def _prompt_fp(self, analysis_type: str) -> str:
+        """Prompt part of the result-cache key."""
+        return prompt_fingerprint(self.ai._static_prefix(analysis_type))
+    
+    def _cache_identities(self):
+        """(provider, model) of every model tier; any of them may have produced a reusable result."""
+        return [(ai.provider_name, ai.model) for ai in self.tiers.clients()]
+    
+    def _publish_result_identities(self):
+        """Publish the cache identities so the API links uploads with the same rule."""
+        try:
+            publish_identities(get_redis(), {
+                analysis_type: [(provider, model, self._prompt_fp(analysis_type))
+                                for provider, model in self._cache_identities()]
+                for analysis_type in ANALYSIS_PROMPTS
+            })
+        except Exception as e:
+            print(f"⚠️ Failed to publish result identities: {e}")
     
     def _claim_job(self) -> Optional[dict]:
         """Claim the next available job from the queue."""
+        with stage_timer("claim"):
+            job = self._claim_job_locked()
+        if job:
+            record_queue_wait(job["job_type"], float(job.get("queue_wait_seconds") or 0))
+        return job
+    
+    def _claim_job_locked(self) -> Optional[dict]:
+        """Claim a job row with SELECT ... FOR UPDATE SKIP LOCKED."""
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
                 # Use SELECT FOR UPDATE SKIP LOCKED for concurrent workers
-                cur.execute("""
-                    SELECT 
-                        pj.id, pj.job_type, pj.file_id, pj.investment_id,
-                        pj.priority, pj.parameters, pj.retry_count, pj.max_retries,
-                        fr.storage_key, fr.storage_bucket, fr.original_filename,
-                        fr.mime_type, fr.file_hash, i.name as investment_name, i.category as investment_category
-                    FROM processing_jobs pj
-                    JOIN file_registry fr ON pj.file_id = fr.id
-                    LEFT JOIN investments i ON pj.investment_id = i.id
-                    WHERE pj.status = 'queued'
-                    ORDER BY pj.priority ASC, pj.created_at ASC
-                    FOR UPDATE SKIP LOCKED
-                    LIMIT 1
-                """)
+                cur.execute(build_claim_query(), {
+                    "aging_seconds": max(PRIORITY_AGING_SECONDS, 1.0),
+                    "max_boost": PRIORITY_AGING_MAX_BOOST,
+                    "max_running": FAIR_SHARE_MAX_RUNNING,
+                })
                 
                 job = cur.fetchone()
                 
@@ -215,8 +546,11 @@ def _complete_job(self, job_id: str, result_id: str):
         finally:
             conn.close()
     
-    def _fail_job(self, job_id: str, error_message: str):
-        """Mark a job as failed or retry."""
+    def _fail_job(self, job_id: str, error_message: str, error_class: str = "transient"):
+        """
+        Mark a job as failed or schedule a retry.
+        Retries are delayed with exponential backoff via scheduled_at.
+        """
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
@@ -228,16 +562,20 @@ def _fail_job(self, job_id: str, error_message: str):
                 """, (job_id,))
                 
                 row = cur.fetchone()
-                if row and row["retry_count"] < row["max_retries"]:
-                    # Re-queue for retry
+                retryable = error_class not in NON_RETRYABLE_CLASSES
+                if row and retryable and row["retry_count"] < row["max_retries"]:
+                    # Re-queue for retry once the backoff delay has passed
+                    delay = compute_retry_delay(row["retry_count"], error_class)
                     cur.execute("""
                         UPDATE processing_jobs
                         SET status = 'queued',
                             worker_id = NULL,
                             started_at = NULL,
-                            error_message = %s
+                            error_message = %s,
+                            scheduled_at = NOW() + (%s * INTERVAL '1 second')
                         WHERE id = %s
-                    """, (error_message, job_id))
+                    """, (f"[{error_class}] {error_message}", delay, job_id))
+                    print(f"   ⏱️  Retry scheduled in {delay:.0f}s ({error_class})")
                 else:
                     # Mark as failed
                     cur.execute("""
@@ -246,7 +584,7 @@ def _fail_job(self, job_id: str, error_message: str):
                             completed_at = NOW(),
                             error_message = %s
                         WHERE id = %s
-                    """, (error_message, job_id))
+                    """, (f"[{error_class}] {error_message}", job_id))
                     
                     # Update file registry
                     cur.execute("""
@@ -327,11 +665,171 @@ def _determine_analysis_type(self, job: dict) -> str:
         
         return "document_analysis"
     
+    def _select_tier(self, job: dict, local_path: str, analysis_type: str, local=None):
+        """Model tier for this job from its type, pages and estimated tokens."""
+        page_count = None
+        if local and local.pages is not None:
+            page_count = len(local.pages)
+        elif job.get("mime_type") == "application/pdf":
+            page_count = count_pdf_pages(local_path)
+        estimated_tokens = len(local.text) // CHARS_PER_TOKEN if local and local.text else None
+        
+        decision = choose_tier(analysis_type, job.get("mime_type"), page_count, estimated_tokens)
+        ai = self.tiers.client_for(decision.tier)
+        print(f"   🎚️  Model tier {decision.tier} ({decision.reason}): {ai.provider_name}/{ai.model}")
+        return decision, ai
+    
+    def _run_ai_tier(self, job: dict, local_path: str, analysis_type: str, local=None) -> AnalysisResult:
+        """Run the AI provider, reusing any PDF text layer the local tier extracted."""
+        decision, ai = self._select_tier(job, local_path, analysis_type, local)
+        print(f"   🔄 Running AI analysis ({ai.provider_name})...")
+        ai_start = time.time()
+        try:
+            with stage_timer("ai_call"):
+                result_obj = None
+                if is_media(job.get("mime_type")):
+                    # Sampled keyframes or chunked transcript: bounded payload at any length
+                    result_obj = analyze_media(ai, local_path, job["mime_type"], analysis_type)
+                elif job.get("mime_type") == "application/pdf":
+                    # Long text-layer PDFs: page-parallel map-reduce
+                    result_obj = analyze_pdf_chunked(
+                        ai, local_path, analysis_type, cache=get_redis(),
+                        pages=local.pages if local else None,
+                    )
+                if result_obj is None:
+                    result_obj = ai.analyze_document(
+                        file_path=local_path,
+                        analysis_type=analysis_type
+                    )
+        except Exception:
+            record_ai_request(ai.provider_name, ai.model, 0, time.time() - ai_start, success=False)
+            raise
+        return self._ai_tier_result(result_obj, analysis_type, local, ai_start, decision)
+    
+    async def _run_ai_tier_async(self, job: dict, local_path: str, analysis_type: str, local=None) -> AnalysisResult:
+        """_run_ai_tier() awaiting the provider instead of holding a thread."""
+        decision, ai = await asyncio.to_thread(self._select_tier, job, local_path, analysis_type, local)
+        print(f"   🔄 Running AI analysis ({ai.provider_name})...")
+        ai_start = time.time()
+        try:
+            with stage_timer("ai_call"):
+                result_obj = None
+                if is_media(job.get("mime_type")):
+                    # ffmpeg and transcription fan out on their own thread pools
+                    result_obj = await asyncio.to_thread(
+                        analyze_media, ai, local_path, job["mime_type"], analysis_type
+                    )
+                elif job.get("mime_type") == "application/pdf":
+                    # Chunked map-reduce fans out on its own thread pool
+                    result_obj = await asyncio.to_thread(
+                        analyze_pdf_chunked, ai, local_path, analysis_type, cache=get_redis(),
+                        pages=local.pages if local else None,
+                    )
+                if result_obj is None:
+                    result_obj = await ai.analyze_document_async(
+                        file_path=local_path,
+                        analysis_type=analysis_type
+                    )
+        except Exception:
+            record_ai_request(ai.provider_name, ai.model, 0, time.time() - ai_start, success=False)
+            raise
+        return self._ai_tier_result(result_obj, analysis_type, local, ai_start, decision)
+    
+    def _ai_tier_result(
+        self, result_obj: AnalysisResult, analysis_type: str, local, ai_start: float, decision: TierDecision
+    ) -> AnalysisResult:
+        """Record the call and flag the result's tier, model tier and prompt version."""
+        ai_seconds = time.time() - ai_start
+        record_ai_request(result_obj.provider, result_obj.model, result_obj.tokens_used, ai_seconds)
+        record_model_tier(decision.tier, analysis_type, ai_seconds)
+        
+        result_obj.quality_flags.append("tier:ai")
+        result_obj.quality_flags.append(f"model_tier:{decision.tier}")
+        result_obj.quality_flags.append(f"ai_latency_ms:{int(ai_seconds * 1000)}")
+        result_obj.quality_flags.append(f"prompt:{self._prompt_fp(analysis_type)}")
+        if local and local.result is not None:
+            result_obj.quality_flags.append(f"local_confidence:{local.confidence:.2f}")
+        return result_obj
+    
+    def _find_near_duplicate(self, job: dict, local_path: str, local=None):
+        """Fingerprint the file and look it up in the similarity index."""
+        with stage_timer("similarity"):
+            signature = compute_signature(
+                local_path, job.get("mime_type"), local.text if local else None
+            )
+            if signature is None:
+                return None, None
+            match = find_near_duplicate(get_redis(), signature, job["job_type"], str(job["file_id"]))
+        record_cache_lookup(bool(match and match.action == "reuse"), cache_name="near_duplicate")
+        return signature, match
+    
     def process_job(self, job: dict) -> bool:
         """
         Process a single job.
         Returns True if successful, False otherwise.
         """
+        ctx = self._begin_job(job)
+        if ctx is None or self._join_flight(ctx):
+            return True
+        
+        succeeded = False
+        try:
+            done, result_obj = self._prepare_job(ctx)
+            if done:
+                succeeded = True
+                return True
+            if result_obj is None:
+                # 5. Escalate to the AI tier
+                result_obj = self._run_ai_tier(job, ctx.local_path, ctx.analysis_type, ctx.local)
+            self._finish_job(ctx, result_obj)
+            succeeded = True
+            return True
+            
+        except Exception as e:
+            self._handle_job_error(ctx, e)
+            return False
+            
+        finally:
+            self._land_flight(ctx, succeeded)
+            # Cleanup downloaded file
+            if ctx.local_path:
+                self.storage.cleanup_file(ctx.local_path)
+    
+    async def process_job_async(self, job: dict) -> bool:
+        """
+        process_job() for the asyncio loop: the AI call is awaited on the
+        shared connection pool, blocking stages run in the default executor.
+        """
+        ctx = await asyncio.to_thread(self._begin_job, job)
+        if ctx is None or await self._join_flight_async(ctx):
+            return True
+        
+        succeeded = False
+        try:
+            done, result_obj = await asyncio.to_thread(self._prepare_job, ctx)
+            if done:
+                succeeded = True
+                return True
+            if result_obj is None:
+                result_obj = await self._run_ai_tier_async(job, ctx.local_path, ctx.analysis_type, ctx.local)
+            await asyncio.to_thread(self._finish_job, ctx, result_obj)
+            succeeded = True
+            return True
+            
+        except Exception as e:
+            await asyncio.to_thread(self._handle_job_error, ctx, e)
+            return False
+            
+        finally:
+            await asyncio.to_thread(self._land_flight, ctx, succeeded)
+            if ctx.local_path:
+                self.storage.cleanup_file(ctx.local_path)
+    
+    def _begin_job(self, job: dict) -> Optional[JobContext]:
+        """
+        Hash the file and try the cache and identical-file tiers.
+        Returns None when the job was completed from them.
+        """
         job_id = job["id"]
         file_id = job["file_id"]
         storage_key = job["storage_key"]
@@ -341,74 +839,243 @@ def process_job(self, job: dict) -> bool:
         print(f"   File: {job.get('original_filename')}")
         print(f"   Investment: {job.get('investment_name', 'N/A')}")
         
-        # === AI RESPONSE CACHING ===
-        # Check if file already analyzed (by hash)
+        # === CONTENT HASHING ===
+        # Presigned uploads above the API's inline cap arrive without a hash;
+        # hash with ranged reads so dedup and caching work before download.
+        if not file_hash:
+            try:
+                with stage_timer("hash"):
+                    file_hash = self.storage.compute_sha256(storage_key, job.get("file_size_bytes"))
+                _set_file_hash(str(file_id), file_hash)
+                print(f"   #️⃣  Content hash: {file_hash[:16]}...")
+            except Exception as e:
+                print(f"   ⚠️ Content hashing failed: {e}")
+        
+        analysis_type = self._determine_analysis_type(job)
+        ctx = JobContext(
+            job=job,
+            analysis_type=analysis_type,
+            prompt_fp=self._prompt_fp(analysis_type),
+            file_hash=file_hash,
+        )
+        
         if file_hash:
-            cached_result = _get_cached_analysis(file_hash)
-            if cached_result:
-                print(f"   ✅ Using cached analysis result")
-                try:
-                    # Save cached result as new analysis result
-                    result_id = self._save_analysis_result(job, cached_result)
-                    self._complete_job(job_id, result_id)
-                    print(f"   ✨ Job completed using cached result!")
-                    return True
-                except Exception as e:
-                    print(f"   ⚠️ Failed to use cached result: {e}")
-                    # Continue with normal processing
+            ctx.result_key = cache_key(file_hash, analysis_type, self.ai.provider_name, self.ai.model, ctx.prompt_fp)
+            if self._complete_from_cache(ctx):
+                return None
+        
+        ctx.start_time = time.time()
+        return ctx
+    
+    def _complete_from_cache(self, ctx: JobContext) -> bool:
+        """Complete the job from the result cache or an identical file's analysis."""
+        job = ctx.job
         
-        local_path = None
-        start_time = time.time()
+        # === AI RESPONSE CACHING ===
+        # Same file, analysis type, provider, model and prompt: Redis, then disk.
+        # Any model tier's answer counts (the tier choice is deterministic per file)
+        identities = self._cache_identities()
+        cached_result = None
+        with stage_timer("cache_lookup"):
+            for provider, model in identities:
+                cached_result = get_result_cache().get(
+                    cache_key(ctx.file_hash, ctx.analysis_type, provider, model, ctx.prompt_fp)
+                )
+                if cached_result:
+                    break
+        if cached_result:
+            print(f"   ✅ Using cached analysis result")
+            try:
+                # Save cached result as new analysis result
+                cached_result["quality_flags"] = list(cached_result.get("quality_flags") or []) + ["cache_hit"]
+                with stage_timer("db_save"):
+                    result_id = self._save_analysis_result(job, cached_result)
+                    self._complete_job(job["id"], result_id)
+                print(f"   ✨ Job completed using cached result!")
+                record_analysis_job(job["job_type"], 0.0, success=True)
+                return True
+            except Exception as e:
+                print(f"   ⚠️ Failed to use cached result: {e}")
+                # Continue with normal processing
         
+        # Postgres tier: identical file analyzed with the same key
         try:
-            # 1. Download file from storage
-            print("   📥 Downloading file...")
-            local_path = self.storage.download_file(storage_key, str(file_id))
-            print(f"   ✅ Downloaded to {local_path}")
-            
-            # 2. Determine analysis type
-            analysis_type = self._determine_analysis_type(job)
-            print(f"   🧠 Analysis type: {analysis_type}")
-            
-            # 3. Run AI analysis
-            print(f"   🔄 Running AI analysis ({self.ai.provider_name})...")
-            result_obj = self.ai.analyze_document(
-                file_path=local_path,
-                analysis_type=analysis_type
-            )
-            analysis_result = result_obj.to_dict()
-            
-            processing_time = int((time.time() - start_time) * 1000)
-            analysis_result["processing_time_ms"] = processing_time
-            
-            print(f"   ✅ Analysis complete ({processing_time}ms)")
-            
-            # 4. Save results
-            print("   💾 Saving results...")
-            result_id = self._save_analysis_result(job, analysis_result)
-            print(f"   ✅ Result saved: {result_id[:8]}")
-            
-            # 5. Cache the result for future use
-            if file_hash:
-                _cache_analysis(file_hash, analysis_result)
-            
-            # 6. Complete job
-            self._complete_job(job_id, result_id)
-            print(f"   ✨ Job completed successfully!")
-            
-            return True
-            
+            with stage_timer("db_save"):
+                result_id = None
+                for provider, model in identities:
+                    result_id = _link_existing_analysis(job, ctx.file_hash, provider, model, ctx.prompt_fp)
+                    if result_id:
+                        break
+                record_cache_lookup(bool(result_id), "ai_analysis_db")
+                if result_id:
+                    self._complete_job(job["id"], result_id)
+            if result_id:
+                print(f"   🔗 Linked to existing analysis of identical file")
+                record_analysis_job(job["job_type"], 0.0, success=True)
+                return True
         except Exception as e:
-            error_msg = f"{type(e).__name__}: {str(e)}"
-            print(f"   ❌ Job failed: {error_msg}")
-            traceback.print_exc()
-            self._fail_job(job_id, error_msg)
+            print(f"   ⚠️ Failed to link existing analysis: {e}")
+        return False
+    
+    def _join_flight(self, ctx: JobContext) -> bool:
+        """
+        Lead the single flight for this file and type, or wait for the job
+        leading it. True when the job was completed from the leader's result.
+        """
+        if not (SINGLE_FLIGHT_ENABLED and ctx.file_hash):
             return False
-            
+        ctx.flight_token = self.flights.acquire(ctx.file_hash, ctx.analysis_type)
+        if ctx.flight_token:
+            return False
+        print("   ⏳ Identical file already being analyzed, waiting for its result...")
+        with stage_timer("single_flight_wait"):
+            status = self.flights.wait(ctx.file_hash, ctx.analysis_type)
+        return self._after_flight(ctx, status)
+    
+    async def _join_flight_async(self, ctx: JobContext) -> bool:
+        """_join_flight() that waits on the event loop."""
+        if not (SINGLE_FLIGHT_ENABLED and ctx.file_hash):
+            return False
+        ctx.flight_token = await asyncio.to_thread(self.flights.acquire, ctx.file_hash, ctx.analysis_type)
+        if ctx.flight_token:
+            return False
+        print("   ⏳ Identical file already being analyzed, waiting for its result...")
+        with stage_timer("single_flight_wait"):
+            status = await self.flights.wait_async(ctx.file_hash, ctx.analysis_type)
+        return await asyncio.to_thread(self._after_flight, ctx, status)
+    
+    def _after_flight(self, ctx: JobContext, status: Optional[str]) -> bool:
+        """Reuse the leader's result, or take over when it left none."""
+        reused = self._complete_from_cache(ctx)
+        record_cache_lookup(reused, "single_flight")
+        if reused:
+            print("   🤝 Reused the result of the in-flight job")
+            return True
+        print(f"   ⚠️ In-flight job left no result ({status or 'timed out'}), analyzing")
+        # None if another follower took over first; run uncoordinated then
+        ctx.flight_token = self.flights.acquire(ctx.file_hash, ctx.analysis_type)
+        ctx.start_time = time.time()
+        return False
+    
+    def _land_flight(self, ctx: JobContext, succeeded: bool):
+        """Release the single-flight lock, after the result is cached and saved."""
+        if ctx.flight_token:
+            self.flights.release(ctx.file_hash, ctx.analysis_type, ctx.flight_token, DONE if succeeded else FAILED)
+            ctx.flight_token = None
+    
+    def _prepare_job(self, ctx: JobContext):
+        """
+        Download, run the local tier and check for near-duplicates.
+        Returns (done, result): done when a near-duplicate's analysis was
+        reused; result is the local tier's, or None if the AI tier is needed.
+        """
+        job = ctx.job
+        
+        # 1. Download file from storage
+        print("   📥 Downloading file...")
+        check_size(job.get("file_size_bytes"), job.get("mime_type"))
+        with stage_timer("download"):
+            ctx.local_path = self.storage.download_file(job["storage_key"], str(job["file_id"]), job.get("mime_type"))
+        print(f"   ✅ Downloaded to {ctx.local_path}")
+        
+        # 2. Analysis type (determined above, before the cache lookup)
+        print(f"   🧠 Analysis type: {ctx.analysis_type}")
+        
+        # 3. Local tier: text layer / CSV / regex extraction
+        if LOCAL_TIER_ENABLED:
+            with stage_timer("local_extract"):
+                ctx.local = run_local_tier(ctx.local_path, job.get("mime_type"), ctx.analysis_type)
+        
+        if ctx.local and ctx.local.accepted:
+            print(f"   ⚡ Served by local tier (confidence {ctx.local.confidence:.2f})")
+            return False, ctx.local.result
+        
+        # 4. Near-duplicate of an analyzed file: reuse it or flag for review
+        if SIMILARITY_ENABLED:
+            ctx.signature, ctx.near_dup = self._find_near_duplicate(job, ctx.local_path, ctx.local)
+        if ctx.near_dup and ctx.near_dup.action == "reuse":
+            with stage_timer("db_save"):
+                result_id = None
+                for provider, model in self._cache_identities():
+                    result_id = _link_near_duplicate(job, ctx.near_dup, provider, model, ctx.prompt_fp)
+                    if result_id:
+                        break
+                if result_id:
+                    self._complete_job(job["id"], result_id)
+            if result_id:
+                print(f"   🔗 Reused analysis of near-duplicate (similarity {ctx.near_dup.similarity:.2f})")
+                record_analysis_job(job["job_type"], time.time() - ctx.start_time, success=True)
+                return True, None
+        
+        if ctx.local:
+            print(f"   ⤴️  Escalating to AI ({', '.join(ctx.local.reasons) or f'confidence {ctx.local.confidence:.2f}'})")
+        return False, None
+    
+    def _finish_job(self, ctx: JobContext, result_obj: AnalysisResult):
+        """Save, cache and index the result, then complete the job."""
+        job = ctx.job
+        if ctx.near_dup and ctx.near_dup.action == "review":
+            result_obj.quality_flags.extend([
+                "near_duplicate_review",
+                f"near_duplicate_of_file:{ctx.near_dup.file_id}",
+                f"similarity:{ctx.near_dup.similarity:.2f}",
+            ])
+        analysis_result = result_obj.to_dict()
+        
+        processing_time = int((time.time() - ctx.start_time) * 1000)
+        analysis_result["processing_time_ms"] = processing_time
+        
+        print(f"   ✅ Analysis complete ({processing_time}ms)")
+        
+        # 6. Save results
+        print("   💾 Saving results...")
+        with stage_timer("db_save"):
+            result_id = self._save_analysis_result(job, analysis_result)
+        print(f"   ✅ Result saved: {result_id[:8]}")
+        
+        # 7. Cache AI-tier results for future use (local tier is cheaper than a lookup)
+        if ctx.result_key and "tier:ai" in result_obj.quality_flags:
+            # Keyed by the provider that answered (may be a failover)
+            result_key = cache_key(ctx.file_hash, ctx.analysis_type, result_obj.provider, result_obj.model, ctx.prompt_fp)
+            get_result_cache().set(result_key, analysis_result)
+            print(f"   💾 Cached analysis result (TTL: {AI_CACHE_TTL_DAYS} days)")
+        if ctx.signature:
+            index_signature(get_redis(), ctx.signature, job["job_type"], str(job["file_id"]))
+        
+        # 8. Complete job
+        self._complete_job(job["id"], result_id)
+        print(f"   ✨ Job completed successfully!")
+        record_analysis_job(job["job_type"], time.time() - ctx.start_time, success=True)
+    
+    def _handle_job_error(self, ctx: JobContext, e: Exception):
+        error_msg = f"{type(e).__name__}: {str(e)}"
+        print(f"   ❌ Job failed: {error_msg}")
+        traceback.print_exception(e)
+        self._fail_job(ctx.job["id"], error_msg, classify_error(e))
+        record_analysis_job(ctx.job["job_type"], time.time() - ctx.start_time, success=False)
+    
+    def _sample_queue_depth(self):
+        """Refresh queue depth gauges (ready, delayed by backoff, running)."""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT
+                        COUNT(*) FILTER (
+                            WHERE status = 'queued'
+                              AND (scheduled_at IS NULL OR scheduled_at <= NOW())
+                        ) AS ready,
+                        COUNT(*) FILTER (
+                            WHERE status = 'queued' AND scheduled_at > NOW()
+                        ) AS delayed,
+                        COUNT(*) FILTER (WHERE status = 'running') AS running
+                    FROM processing_jobs
+                    WHERE status IN ('queued', 'running')
+                """)
+                row = cur.fetchone()
+                set_queue_depth(row["ready"], row["delayed"], row["running"])
         finally:
-            # Cleanup downloaded file
-            if local_path:
-                self.storage.cleanup_file(local_path)
+            conn.close()
     
     def run(self):
         """Main worker loop."""
@@ -420,20 +1087,40 @@ def run(self):
 ║  Poll Interval: {POLL_INTERVAL}s{'':42} ║
 ║  Max Concurrent: {MAX_CONCURRENT}{'':42} ║
 ║  AI Cache TTL: {AI_CACHE_TTL_DAYS} days{'':40} ║
+║  Retry Base Delay: {RETRY_BASE_SECONDS:.0f}s{'':38} ║
+║  Fair Share: {FAIR_SHARE_KEY} (max {FAIR_SHARE_MAX_RUNNING} running){'':20} ║
 ╚══════════════════════════════════════════════════════════════╝
         """)
         
+        if start_metrics_server():
+            print(f"📈 Metrics available on :{WORKER_METRICS_PORT}/metrics")
+        self._publish_result_identities()
+        if self.scheduler:
+            self.scheduler.start()
+        
         consecutive_errors = 0
+        last_depth_sample = 0.0
         
         while self.running:
             try:
+                if time.time() - last_depth_sample >= QUEUE_DEPTH_INTERVAL:
+                    last_depth_sample = time.time()
+                    try:
+                        self._sample_queue_depth()
+                    except Exception as e:
+                        print(f"⚠️ Queue depth sample failed: {e}")
+                
                 # Claim a job
                 job = self._claim_job()
                 
                 if job:
                     consecutive_errors = 0
                     self.current_job = job
-                    self.process_job(job)
+                    WORKER_JOBS_IN_FLIGHT.inc()
+                    try:
+                        self.process_job(job)
+                    finally:
+                        WORKER_JOBS_IN_FLIGHT.dec()
                     self.current_job = None
                 else:
                     # No jobs available, wait before polling again
@@ -452,7 +1139,82 @@ def run(self):
                 else:
                     time.sleep(POLL_INTERVAL)
         
+        if self.scheduler:
+            self.scheduler.stop()
+        print("👋 Worker shutdown complete.")
+    
+    async def run_async(self):
+        """
+        Job loop on asyncio (WORKER_ASYNC=true): up to WORKER_ASYNC_CONCURRENCY
+        jobs in flight, AI calls awaited on one shared connection pool.
+        """
+        print(f"🤖 Async worker {WORKER_ID}: up to {WORKER_ASYNC_CONCURRENCY} jobs in flight")
+        if start_metrics_server():
+            print(f"📈 Metrics available on :{WORKER_METRICS_PORT}/metrics")
+        self._publish_result_identities()
+        if self.scheduler:
+            self.scheduler.start()
+        
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=WORKER_ASYNC_THREADS, thread_name_prefix="job-io")
+        )
+        slots = asyncio.Semaphore(WORKER_ASYNC_CONCURRENCY)
+        tasks = set()
+        consecutive_errors = 0
+        last_depth_sample = 0.0
+        
+        while self.running:
+            await slots.acquire()
+            if not self.running:
+                slots.release()  # Signalled while waiting for a free slot
+                break
+            try:
+                if time.time() - last_depth_sample >= QUEUE_DEPTH_INTERVAL:
+                    last_depth_sample = time.time()
+                    try:
+                        await asyncio.to_thread(self._sample_queue_depth)
+                    except Exception as e:
+                        print(f"⚠️ Queue depth sample failed: {e}")
+                
+                job = await asyncio.to_thread(self._claim_job)
+            except Exception as e:
+                slots.release()
+                consecutive_errors += 1
+                print(f"❌ Worker error: {e}")
+                await asyncio.sleep(
+                    min(60, POLL_INTERVAL * consecutive_errors) if consecutive_errors > 5 else POLL_INTERVAL
+                )
+                continue
+            
+            consecutive_errors = 0
+            if not job:
+                slots.release()
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            
+            task = asyncio.create_task(self._run_job_async(job, slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        if tasks:
+            print(f"⏳ Waiting for {len(tasks)} in-flight jobs...")
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self.scheduler:
+            await asyncio.to_thread(self.scheduler.stop)
+        await close_async_http_client()
         print("👋 Worker shutdown complete.")
+    
+    async def _run_job_async(self, job: dict, slots: asyncio.Semaphore):
+        self.active_jobs[job["id"]] = job
+        WORKER_JOBS_IN_FLIGHT.inc()
+        try:
+            await self.process_job_async(job)
+        except Exception as e:
+            print(f"❌ Worker error: {e}")
+        finally:
+            WORKER_JOBS_IN_FLIGHT.dec()
+            self.active_jobs.pop(job["id"], None)
+            slots.release()
 
 
 # =============================================================================
@@ -461,4 +1223,7 @@ def run(self):
 
 if __name__ == "__main__":
     worker = Worker()
-    worker.run()
+    if WORKER_ASYNC:
+        asyncio.run(worker.run_async())
+    else:
+        worker.run()
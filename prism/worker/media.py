@@ -0,0 +1,291 @@
+"""
+===============================================================================
+MEDIA - Bounded sampling of video and audio for the AI tier
+===============================================================================
+Vision models take images, not video, and a parcel walkthrough can run for
+an hour. Media is reduced to a fixed-size payload before any AI call:
+
+Video
+  1. Candidate keyframes (at most MEDIA_MAX_CANDIDATE_FRAMES):
+     - short clips: one frame per interval, plus scene cuts in between
+       (ffmpeg select filter, one decode pass)
+     - long videos: fast input seeks to evenly spaced timestamps, so the
+       cost depends on the frame count, not the duration
+  2. Near-identical frames dropped (dHash, as in similarity.py)
+  3. Up to MEDIA_MAX_FRAMES spread over the remaining ones, tiled into one
+     timestamped contact sheet and sent as a single image
+
+Audio
+  Mono 16 kHz chunks of AUDIO_CHUNK_SECONDS (first AUDIO_MAX_SECONDS only),
+  transcribed in parallel by the provider; the transcript is analyzed as
+  text.
+
+Requires ffmpeg/ffprobe on PATH.
+===============================================================================
+"""
+import math
+import os
+import re
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ai_client import AnalysisResult, BaseAIClient, MediaUnsupportedError
+from metrics import stage_timer
+from similarity import dhash
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+FFMPEG_TIMEOUT_SECONDS = int(os.getenv("FFMPEG_TIMEOUT_SECONDS", "300"))
+MEDIA_FFMPEG_CONCURRENCY = int(os.getenv("MEDIA_FFMPEG_CONCURRENCY", "4"))
+
+MEDIA_FRAME_INTERVAL_SECONDS = float(os.getenv("MEDIA_FRAME_INTERVAL_SECONDS", "5"))
+MEDIA_SCENE_THRESHOLD = float(os.getenv("MEDIA_SCENE_THRESHOLD", "0.3"))  # 0 = fixed rate only
+MEDIA_SCENE_MAX_SECONDS = float(os.getenv("MEDIA_SCENE_MAX_SECONDS", "300"))  # Longer videos seek instead
+MEDIA_MAX_CANDIDATE_FRAMES = int(os.getenv("MEDIA_MAX_CANDIDATE_FRAMES", "32"))
+MEDIA_MAX_FRAMES = int(os.getenv("MEDIA_MAX_FRAMES", "8"))
+MEDIA_FRAME_DEDUP_DISTANCE = int(os.getenv("MEDIA_FRAME_DEDUP_DISTANCE", "12"))  # dHash bits of 256
+MEDIA_FRAME_WIDTH = 640  # Candidate frames are decoded at this width
+MEDIA_SHEET_WIDTH = int(os.getenv("MEDIA_SHEET_WIDTH", "2048"))
+MEDIA_SHEET_QUALITY = 85
+
+AUDIO_CHUNK_SECONDS = int(os.getenv("AUDIO_CHUNK_SECONDS", "600"))  # ~3.6 MB per chunk at 48 kbps
+AUDIO_MAX_SECONDS = int(os.getenv("AUDIO_MAX_SECONDS", "3600"))
+AUDIO_TRANSCRIBE_CONCURRENCY = int(os.getenv("AUDIO_TRANSCRIBE_CONCURRENCY", "4"))
+
+_PTS_TIME = re.compile(r"pts_time:\s*([0-9.]+)")
+
+
+@dataclass
+class Frame:
+    path: str
+    time: float  # Seconds from the start
+
+
+def is_media(mime_type: Optional[str]) -> bool:
+    return (mime_type or "").startswith(("video/", "audio/"))
+
+
+# =============================================================================
+# FFMPEG
+# =============================================================================
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    try:
+        return subprocess.run(args, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT_SECONDS, check=True)
+    except FileNotFoundError:
+        raise MediaUnsupportedError(f"{args[0]} not installed; cannot process media")
+    except subprocess.CalledProcessError as e:
+        raise MediaUnsupportedError(f"{os.path.basename(args[0])} failed: {(e.stderr or '').strip()[-300:]}")
+
+
+def probe_duration(file_path: str) -> Optional[float]:
+    """Container duration in seconds; None if unknown (e.g. some streams)."""
+    result = _run([
+        FFPROBE_BIN, "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", file_path,
+    ])
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+# =============================================================================
+# VIDEO
+# =============================================================================
+
+def sample_interval(duration: float) -> float:
+    """
+    Seconds between candidate frames. Scene cuts add at most one frame per
+    half interval, so interval >= 2 * duration / cap keeps either mode
+    within MEDIA_MAX_CANDIDATE_FRAMES.
+    """
+    return max(MEDIA_FRAME_INTERVAL_SECONDS, 2 * duration / max(1, MEDIA_MAX_CANDIDATE_FRAMES))
+
+
+def scene_filter(interval: float, threshold: float = MEDIA_SCENE_THRESHOLD) -> str:
+    """ffmpeg filter: the first frame, every `interval` seconds, and scene cuts half an interval apart."""
+    since = "t-prev_selected_t"
+    select = f"isnan(prev_selected_t)+gte({since}\\,{interval:.3f})"
+    if threshold > 0:
+        select += f"+gt(scene\\,{threshold})*gte({since}\\,{interval / 2:.3f})"
+    return f"select='{select}',showinfo,scale={MEDIA_FRAME_WIDTH}:-2"
+
+
+def seek_times(duration: float) -> List[float]:
+    """Evenly spaced timestamps, each in the middle of its interval."""
+    interval = sample_interval(duration)
+    count = max(1, min(MEDIA_MAX_CANDIDATE_FRAMES, int(duration // interval)))
+    step = duration / count
+    return [round(step * (i + 0.5), 3) for i in range(count)]
+
+
+def _extract_scene_frames(file_path: str, out_dir: str, duration: float) -> List[Frame]:
+    pattern = os.path.join(out_dir, "scene_%04d.jpg")
+    result = _run([
+        FFMPEG_BIN, "-v", "info", "-nostdin", "-i", file_path, "-an",
+        "-vf", scene_filter(sample_interval(duration)),
+        "-fps_mode", "vfr", "-frames:v", str(MEDIA_MAX_CANDIDATE_FRAMES), "-q:v", "3", pattern,
+    ])
+    times = [float(t) for t in _PTS_TIME.findall(result.stderr)]
+    frames = []
+    for i, t in enumerate(times, start=1):
+        path = pattern % i
+        if os.path.exists(path):
+            frames.append(Frame(path, t))
+    return frames
+
+
+def _extract_frame_at(file_path: str, out_dir: str, index: int, t: float) -> Optional[Frame]:
+    path = os.path.join(out_dir, f"seek_{index:04d}.jpg")
+    # -ss before -i: seek on the container index instead of decoding up to t
+    _run([
+        FFMPEG_BIN, "-v", "error", "-nostdin", "-ss", str(t), "-i", file_path, "-an",
+        "-frames:v", "1", "-vf", f"scale={MEDIA_FRAME_WIDTH}:-2", "-q:v", "3", "-y", path,
+    ])
+    return Frame(path, t) if os.path.exists(path) else None
+
+
+def extract_frames(file_path: str, out_dir: str, duration: Optional[float] = None) -> List[Frame]:
+    """Candidate keyframes in time order."""
+    if duration is None:
+        duration = probe_duration(file_path) or 0.0
+    if duration <= MEDIA_SCENE_MAX_SECONDS:
+        return _extract_scene_frames(file_path, out_dir, max(duration, 1.0))
+    with ThreadPoolExecutor(max_workers=max(1, MEDIA_FFMPEG_CONCURRENCY)) as pool:
+        frames = pool.map(lambda it: _extract_frame_at(file_path, out_dir, *it), enumerate(seek_times(duration)))
+        return [f for f in frames if f is not None]
+
+
+def dedupe_frames(frames: List[Frame], max_distance: int = MEDIA_FRAME_DEDUP_DISTANCE) -> List[Frame]:
+    """Drop frames within max_distance dHash bits of any frame already kept."""
+    kept, hashes = [], []
+    for frame in frames:
+        try:
+            value = dhash(frame.path)
+        except Exception as e:
+            print(f"   ⚠️ Skipping unreadable frame at {frame.time:.1f}s: {e}")
+            continue
+        if all(bin(value ^ other).count("1") > max_distance for other in hashes):
+            kept.append(frame)
+            hashes.append(value)
+    return kept
+
+
+def select_evenly(items: List[Any], limit: int) -> List[Any]:
+    """Up to `limit` items spread over the whole list, first and last included."""
+    if len(items) <= limit:
+        return list(items)
+    if limit <= 1:
+        return items[:limit]
+    step = (len(items) - 1) / (limit - 1)
+    return [items[round(i * step)] for i in range(limit)]
+
+
+def _timestamp(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def contact_sheet(frames: List[Frame], out_path: str, width: int = MEDIA_SHEET_WIDTH) -> str:
+    """Tile frames left-to-right, top-to-bottom in time order, each labeled with its timestamp."""
+    from PIL import Image, ImageDraw
+
+    columns = math.ceil(math.sqrt(len(frames)))
+    rows = math.ceil(len(frames) / columns)
+    tile_w = width // columns
+    tiles = []
+    for frame in frames:
+        with Image.open(frame.path) as image:
+            image = image.convert("RGB")
+            tile_h = max(1, round(image.height * tile_w / image.width))
+            tiles.append(image.resize((tile_w, tile_h)))
+    tile_h = max(t.height for t in tiles)
+
+    sheet = Image.new("RGB", (tile_w * columns, tile_h * rows), "black")
+    draw = ImageDraw.Draw(sheet)
+    for i, (frame, tile) in enumerate(zip(frames, tiles)):
+        x, y = (i % columns) * tile_w, (i // columns) * tile_h
+        sheet.paste(tile, (x, y))
+        label = _timestamp(frame.time)
+        box = draw.textbbox((x + 8, y + 8), label)
+        draw.rectangle((box[0] - 4, box[1] - 4, box[2] + 4, box[3] + 4), fill="black")
+        draw.text((x + 8, y + 8), label, fill="white")
+    sheet.save(out_path, "JPEG", quality=MEDIA_SHEET_QUALITY)
+    return out_path
+
+
+# =============================================================================
+# AUDIO
+# =============================================================================
+
+def split_audio(file_path: str, out_dir: str) -> List[str]:
+    """Mono 16 kHz MP3 chunks of the first AUDIO_MAX_SECONDS, in order."""
+    pattern = os.path.join(out_dir, "chunk_%03d.mp3")
+    _run([
+        FFMPEG_BIN, "-v", "error", "-nostdin", "-i", file_path, "-vn", "-t", str(AUDIO_MAX_SECONDS),
+        "-ac", "1", "-ar", "16000", "-c:a", "libmp3lame", "-b:a", "48k",
+        "-f", "segment", "-segment_time", str(AUDIO_CHUNK_SECONDS), "-reset_timestamps", "1", pattern,
+    ])
+    return sorted(os.path.join(out_dir, name) for name in os.listdir(out_dir) if name.startswith("chunk_"))
+
+
+def transcribe_chunks(client: BaseAIClient, chunks: List[str]) -> List[str]:
+    if not client.supports_transcription:
+        raise MediaUnsupportedError(f"{client.provider_name} does not transcribe audio")
+    with ThreadPoolExecutor(max_workers=max(1, AUDIO_TRANSCRIBE_CONCURRENCY)) as pool:
+        return list(pool.map(client.transcribe_audio, chunks))
+
+
+# =============================================================================
+# ANALYSIS
+# =============================================================================
+
+def analyze_media(
+    client: BaseAIClient,
+    file_path: str,
+    mime_type: str,
+    analysis_type: str = "document_analysis",
+) -> AnalysisResult:
+    """Sample the media, then analyze the contact sheet or the transcript."""
+    start_time = time.time()
+    with tempfile.TemporaryDirectory(prefix="media_", dir=os.getenv("WORKER_TEMP_DIR")) as work_dir:
+        duration = probe_duration(file_path)
+        media: Dict[str, Any] = {"duration_seconds": duration}
+
+        if mime_type.startswith("video/"):
+            with stage_timer("media_frames"):
+                candidates = extract_frames(file_path, work_dir, duration)
+                frames = select_evenly(dedupe_frames(candidates), MEDIA_MAX_FRAMES)
+            if not frames:
+                raise MediaUnsupportedError("No frames could be extracted from the video")
+            print(f"   🎞️  {len(frames)} of {len(candidates)} candidate frames")
+            sheet = contact_sheet(frames, os.path.join(work_dir, "sheet.jpg"))
+            result = client.analyze_document(sheet, analysis_type)
+            media.update(candidate_frames=len(candidates), frame_times=[round(f.time, 1) for f in frames])
+            flags = ["media:video", f"media_frames:{len(frames)}"]
+        else:
+            with stage_timer("media_audio"):
+                chunks = split_audio(file_path, work_dir)
+                transcript = "\n".join(t.strip() for t in transcribe_chunks(client, chunks) if t)
+            if not transcript:
+                raise MediaUnsupportedError("Transcription returned no speech")
+            print(f"   🎙️  Transcribed {len(chunks)} chunk(s), {len(transcript)} chars")
+            result = client.analyze_text(transcript, analysis_type)
+            truncated = bool(duration and duration > AUDIO_MAX_SECONDS)
+            media.update(chunks=len(chunks), transcript=transcript, truncated=truncated)
+            flags = ["media:audio", f"media_chunks:{len(chunks)}"] + (["media_truncated"] if truncated else [])
+
+    result.structured_data["media"] = media
+    result.quality_flags.extend(flags)
+    result.processing_time_ms = int((time.time() - start_time) * 1000)
+    return result
@@ -0,0 +1,304 @@
+"""
+===============================================================================
+WORKER METRICS - Prometheus instrumentation for the job processor
+===============================================================================
+Serves /metrics from the worker process (WORKER_METRICS_PORT, 0 disables).
+
+Job and AI metrics reuse the names defined in api/metrics.py so dashboards
+can aggregate across processes; stage-level metrics are worker-specific:
+- Per-stage latency histograms (claim, hash, download, similarity, ai_call, parse, db_save, cache_lookup)
+- Queue depth and queue-wait time
+- AI cache hit ratio
+- In-flight job count
+- AI latency per model tier (p50/p95 for tuning model_tiers.py)
+- Periodic maintenance task runs, durations and missed intervals
+"""
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+# =============================================================================
+# JOB METRICS (shared names with api/metrics.py)
+# =============================================================================
+
+ANALYSIS_JOBS_TOTAL = Counter(
+    "analysis_jobs_total",
+    "Total number of analysis jobs processed",
+    ["job_type", "status"],
+)
+
+ANALYSIS_DURATION_SECONDS = Histogram(
+    "analysis_duration_seconds",
+    "Analysis job duration in seconds",
+    ["job_type"],
+    buckets=[1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0],
+)
+
+# =============================================================================
+# AI PROVIDER METRICS (shared names with api/metrics.py)
+# =============================================================================
+
+AI_REQUESTS_TOTAL = Counter(
+    "ai_requests_total",
+    "Total number of AI API requests",
+    ["provider", "model", "status"],
+)
+
+AI_REQUEST_DURATION_SECONDS = Histogram(
+    "ai_request_duration_seconds",
+    "AI API request duration in seconds",
+    ["provider", "model"],
+    buckets=[0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+)
+
+AI_TOKENS_USED_TOTAL = Counter(
+    "ai_tokens_used_total",
+    "Total number of tokens used",
+    ["provider", "model"],
+)
+
+# =============================================================================
+# WORKER PIPELINE METRICS
+# =============================================================================
+
+WORKER_STAGE_DURATION_SECONDS = Histogram(
+    "worker_stage_duration_seconds",
+    "Duration of each job pipeline stage in seconds (ai_call includes parse)",
+    ["stage"],
+    buckets=[0.001, 0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0],
+)
+
+WORKER_QUEUE_DEPTH = Gauge(
+    "worker_queue_depth",
+    "Jobs in the processing queue by state (ready, delayed, running)",
+    ["state"],
+)
+
+WORKER_QUEUE_WAIT_SECONDS = Histogram(
+    "worker_queue_wait_seconds",
+    "Time from job creation to claim in seconds",
+    ["job_type"],
+    buckets=[1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 900.0, 1800.0, 3600.0],
+)
+
+WORKER_JOBS_IN_FLIGHT = Gauge(
+    "worker_jobs_in_flight",
+    "Jobs currently being processed by this worker",
+)
+
+WORKER_CACHE_HITS_TOTAL = Counter(
+    "worker_cache_hits_total",
+    "AI result cache hits",
+    ["cache_name"],
+)
+
+WORKER_CACHE_MISSES_TOTAL = Counter(
+    "worker_cache_misses_total",
+    "AI result cache misses",
+    ["cache_name"],
+)
+
+WORKER_CACHE_HIT_RATIO = Gauge(
+    "worker_cache_hit_ratio",
+    "AI result cache hit ratio since worker start",
+    ["cache_name"],
+)
+
+IMAGE_PREPROCESS_TOTAL = Counter(
+    "worker_image_preprocess_total",
+    "Images run through preprocessing by outcome (resized, recompressed, original, cached)",
+    ["provider", "outcome"],
+)
+
+IMAGE_BYTES_SAVED_TOTAL = Counter(
+    "worker_image_bytes_saved_total",
+    "Bytes removed from vision payloads by image preprocessing",
+    ["provider"],
+)
+
+IMAGE_UPLOAD_SECONDS_SAVED_TOTAL = Counter(
+    "worker_image_upload_seconds_saved_total",
+    "Estimated upload latency saved by image preprocessing (bytes saved / IMAGE_UPLINK_BYTES_PER_SEC)",
+    ["provider"],
+)
+
+AI_PROVIDER_CIRCUIT_STATE = Gauge(
+    "ai_provider_circuit_state",
+    "Provider circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["provider"],
+)
+
+AI_PROVIDER_LATENCY_EWMA_SECONDS = Gauge(
+    "ai_provider_latency_ewma_seconds",
+    "Exponentially weighted moving average of provider call latency",
+    ["provider"],
+)
+
+AI_PROVIDER_FAILOVERS_TOTAL = Counter(
+    "ai_provider_failovers_total",
+    "Calls moved to the next provider after a failure",
+    ["from_provider", "to_provider"],
+)
+
+AI_HEDGED_REQUESTS_TOTAL = Counter(
+    "ai_hedged_requests_total",
+    "Hedged provider requests by outcome (fired, primary_won, hedge_won)",
+    ["outcome"],
+)
+
+WORKER_MODEL_TIER_DURATION_SECONDS = Histogram(
+    "worker_model_tier_duration_seconds",
+    "AI tier latency by chosen model tier and analysis type",
+    ["tier", "analysis_type"],
+    buckets=[1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0],
+)
+
+WORKER_PERIODIC_TASK_DURATION_SECONDS = Histogram(
+    "worker_periodic_task_duration_seconds",
+    "Periodic maintenance task run duration by outcome (success, failure)",
+    ["task", "status"],
+    buckets=[0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0],
+)
+
+WORKER_PERIODIC_TASK_MISSED_TOTAL = Counter(
+    "worker_periodic_task_missed_total",
+    "Scheduled intervals with no run (all workers down), folded into one catch-up run",
+    ["task"],
+)
+
+WORKER_PERIODIC_TASK_LAST_SUCCESS = Gauge(
+    "worker_periodic_task_last_success_timestamp_seconds",
+    "Unix time of the last successful run of a periodic task on this worker",
+    ["task"],
+)
+
+_CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+_cache_counts = {}
+
+# =============================================================================
+# METRIC HELPERS
+# =============================================================================
+
+def start_metrics_server(port: int = WORKER_METRICS_PORT) -> bool:
+    """Start the /metrics HTTP endpoint. Returns False if disabled or unavailable."""
+    if port <= 0:
+        return False
+    try:
+        start_http_server(port)
+        return True
+    except OSError as e:
+        print(f"⚠️  Metrics server failed to start on port {port}: {e}")
+        return False
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a pipeline stage: `with stage_timer("download"): ...`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        WORKER_STAGE_DURATION_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def timed_stage(stage: str):
+    """Decorator form of stage_timer."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(hit: bool, cache_name: str = "ai_analysis"):
+    """Record a cache hit/miss and refresh the hit-ratio gauge."""
+    hits, misses = _cache_counts.get(cache_name, (0, 0))
+    if hit:
+        hits += 1
+        WORKER_CACHE_HITS_TOTAL.labels(cache_name=cache_name).inc()
+    else:
+        misses += 1
+        WORKER_CACHE_MISSES_TOTAL.labels(cache_name=cache_name).inc()
+    _cache_counts[cache_name] = (hits, misses)
+    WORKER_CACHE_HIT_RATIO.labels(cache_name=cache_name).set(hits / (hits + misses))
+
+
+def record_queue_wait(job_type: str, wait_seconds: float):
+    """Record how long a job waited in the queue before being claimed."""
+    WORKER_QUEUE_WAIT_SECONDS.labels(job_type=job_type).observe(max(wait_seconds, 0.0))
+
+
+def set_queue_depth(ready: int, delayed: int, running: int):
+    """Update queue depth gauges."""
+    WORKER_QUEUE_DEPTH.labels(state="ready").set(ready)
+    WORKER_QUEUE_DEPTH.labels(state="delayed").set(delayed)
+    WORKER_QUEUE_DEPTH.labels(state="running").set(running)
+
+
+def record_image_preprocess(provider: str, outcome: str, bytes_saved: int, seconds_saved: float):
+    """Record the outcome of image preprocessing."""
+    IMAGE_PREPROCESS_TOTAL.labels(provider=provider, outcome=outcome).inc()
+    if bytes_saved > 0:
+        IMAGE_BYTES_SAVED_TOTAL.labels(provider=provider).inc(bytes_saved)
+        IMAGE_UPLOAD_SECONDS_SAVED_TOTAL.labels(provider=provider).inc(seconds_saved)
+
+
+def set_circuit_state(provider: str, state: str):
+    """Export a provider's circuit breaker state."""
+    AI_PROVIDER_CIRCUIT_STATE.labels(provider=provider).set(_CIRCUIT_STATE_VALUES.get(state, 0))
+
+
+def set_latency_ewma(provider: str, seconds: float):
+    """Export a provider's EWMA latency."""
+    AI_PROVIDER_LATENCY_EWMA_SECONDS.labels(provider=provider).set(seconds)
+
+
+def record_failover(from_provider: str, to_provider: str):
+    """Record a failover between providers."""
+    AI_PROVIDER_FAILOVERS_TOTAL.labels(from_provider=from_provider, to_provider=to_provider).inc()
+
+
+def record_hedge(outcome: str):
+    """Record a hedged request event."""
+    AI_HEDGED_REQUESTS_TOTAL.labels(outcome=outcome).inc()
+
+
+def record_model_tier(tier: str, analysis_type: str, duration_seconds: float):
+    """Record AI latency under the model tier the job was routed to."""
+    WORKER_MODEL_TIER_DURATION_SECONDS.labels(tier=tier, analysis_type=analysis_type).observe(duration_seconds)
+
+
+def record_periodic_run(task: str, status: str, duration_seconds: float):
+    """Record one run of a periodic maintenance task."""
+    WORKER_PERIODIC_TASK_DURATION_SECONDS.labels(task=task, status=status).observe(duration_seconds)
+    if status == "success":
+        WORKER_PERIODIC_TASK_LAST_SUCCESS.labels(task=task).set(time.time())
+
+
+def record_periodic_missed(task: str, missed: int):
+    """Record intervals a periodic task skipped while no worker was running."""
+    WORKER_PERIODIC_TASK_MISSED_TOTAL.labels(task=task).inc(missed)
+
+
+def record_analysis_job(job_type: str, duration_seconds: float, success: bool = True):
+    """Record analysis job completion."""
+    status = "success" if success else "failure"
+    ANALYSIS_JOBS_TOTAL.labels(job_type=job_type, status=status).inc()
+    ANALYSIS_DURATION_SECONDS.labels(job_type=job_type).observe(duration_seconds)
+
+
+def record_ai_request(provider: str, model: str, tokens: int, duration_seconds: float, success: bool = True):
+    """Record AI provider request."""
+    status = "success" if success else "failure"
+    model = model or "unknown"
+    AI_REQUESTS_TOTAL.labels(provider=provider, model=model, status=status).inc()
+    AI_REQUEST_DURATION_SECONDS.labels(provider=provider, model=model).observe(duration_seconds)
+    if tokens:
+        AI_TOKENS_USED_TOTAL.labels(provider=provider, model=model).inc(tokens)
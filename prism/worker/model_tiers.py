@@ -0,0 +1,153 @@
+"""
+===============================================================================
+MODEL TIERS - Pick the model per job from its type and size
+===============================================================================
+One model for every job means a two-line receipt photo waits as long as a
+60-page contract. Each AI-tier job is sorted into:
+
+- fast:     ocr / receipt_extraction on images and short PDFs
+- large:    contract_extraction / land_analysis, long or token-heavy files
+- standard: everything else (the AI_PROVIDER / AI_MODEL client)
+
+AI_MODEL_FAST / AI_MODEL_LARGE name a tier's model, optionally prefixed
+with its provider: "gpt-4o-mini" or "anthropic:claude-3-5-haiku-20241022".
+A tier without a model uses the standard client.
+
+With AI_PROVIDERS (a ProviderRouter), a tier is a router too, so it keeps
+failover, circuit breakers and hedging. The spec may then list one model
+per provider, "kimi:moonshot-v1-8k,anthropic:claude-3-5-haiku-20241022";
+a model without a provider applies to the first provider. Named providers
+lead the tier's order; the rest keep their standard model as failover.
+
+The chosen tier is stored on the result (model_tier:<tier>,
+ai_latency_ms:<ms>) and exported as worker_model_tier_duration_seconds,
+so the thresholds below can be tuned from real p50/p95.
+===============================================================================
+"""
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ai_client import PROVIDER_REGISTRY, BaseAIClient, create_ai_client
+from pdf_pool import get_pdf_pool
+from provider_router import ProviderRouter
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+AI_MODEL_FAST = os.getenv("AI_MODEL_FAST", "")
+AI_MODEL_LARGE = os.getenv("AI_MODEL_LARGE", "")
+TIER_FAST_MAX_PAGES = int(os.getenv("TIER_FAST_MAX_PAGES", "2"))
+TIER_LARGE_MIN_PAGES = int(os.getenv("TIER_LARGE_MIN_PAGES", "20"))
+TIER_LARGE_MIN_TOKENS = int(os.getenv("TIER_LARGE_MIN_TOKENS", "30000"))
+CHARS_PER_TOKEN = 4
+
+FAST, STANDARD, LARGE = "fast", "standard", "large"
+FAST_ANALYSIS_TYPES = {"ocr", "receipt_extraction"}
+LARGE_ANALYSIS_TYPES = {"contract_extraction", "land_analysis"}
+
+
+@dataclass(frozen=True)
+class TierDecision:
+    tier: str
+    reason: str
+
+
+def count_pdf_pages(file_path: str) -> Optional[int]:
+    """Page count from the parser pool (the text is cached for later stages); None if unreadable."""
+    try:
+        return len(get_pdf_pool().extract_pages(file_path))
+    except Exception:
+        return None
+
+
+def choose_tier(
+    analysis_type: str,
+    mime_type: Optional[str],
+    page_count: Optional[int] = None,
+    estimated_tokens: Optional[int] = None,
+) -> TierDecision:
+    """The routing policy. Pure, so it can be replayed against past jobs."""
+    mime_type = mime_type or ""
+    if analysis_type in LARGE_ANALYSIS_TYPES:
+        return TierDecision(LARGE, f"type:{analysis_type}")
+    if page_count and page_count >= TIER_LARGE_MIN_PAGES:
+        return TierDecision(LARGE, f"pages:{page_count}")
+    if estimated_tokens and estimated_tokens >= TIER_LARGE_MIN_TOKENS:
+        return TierDecision(LARGE, f"tokens:{estimated_tokens}")
+    if analysis_type in FAST_ANALYSIS_TYPES:
+        if mime_type.startswith("image/"):
+            return TierDecision(FAST, f"type:{analysis_type}")
+        if page_count is not None and page_count <= TIER_FAST_MAX_PAGES:
+            return TierDecision(FAST, f"pages:{page_count}")
+    return TierDecision(STANDARD, "default")
+
+
+def parse_model_spec(spec: str) -> Tuple[Optional[str], str]:
+    """"anthropic:claude-3-5-haiku" -> ("anthropic", ...); "llama3:8b" keeps its colon."""
+    provider, sep, model = spec.partition(":")
+    if sep and provider.lower() in PROVIDER_REGISTRY:
+        return provider.lower(), model
+    return None, spec
+
+
+class ModelTiers:
+    """Tier -> client, built lazily and sharing the standard client's caches."""
+
+    def __init__(
+        self,
+        default: BaseAIClient,
+        specs: Optional[Dict[str, str]] = None,
+        factory: Callable[..., BaseAIClient] = create_ai_client,
+    ):
+        self.default = default
+        self.specs = {FAST: AI_MODEL_FAST, LARGE: AI_MODEL_LARGE} if specs is None else specs
+        self.factory = factory
+        self._clients: Dict[str, BaseAIClient] = {STANDARD: default}
+
+    def client_for(self, tier: str) -> BaseAIClient:
+        if tier not in self._clients:
+            self._clients[tier] = self._build(tier)
+        return self._clients[tier]
+
+    def clients(self) -> List[BaseAIClient]:
+        """Every distinct (provider, model) client, standard first."""
+        seen, result = set(), []
+        for tier in (STANDARD, FAST, LARGE):
+            client = self.client_for(tier)
+            identity = (client.provider_name, client.model)
+            if identity not in seen:
+                seen.add(identity)
+                result.append(client)
+        return result
+
+    def _build(self, tier: str) -> BaseAIClient:
+        spec = self.specs.get(tier)
+        if not spec:
+            return self.default
+        overrides = [parse_model_spec(part.strip()) for part in spec.split(",") if part.strip()]
+        try:
+            if isinstance(self.default, ProviderRouter):
+                client = self._build_router(self.default, overrides)
+            else:
+                provider, model = overrides[0]
+                client = self.factory(provider=provider, model=model)
+        except Exception as e:
+            print(f"⚠️ Model tier {tier} ({spec}) unavailable, using {self.default.model}: {e}")
+            return self.default
+        client.file_cache = self.default.file_cache
+        client.rate_limiter = self.default.rate_limiter
+        return client
+
+    def _build_router(self, router: ProviderRouter, overrides: List[Tuple[Optional[str], str]]) -> ProviderRouter:
+        """The standard router with per-provider model overrides; overridden providers go first."""
+        models: Dict[str, str] = {}
+        for provider, model in overrides:
+            models.setdefault(provider or router.order[0], model)
+        order = list(models) + [name for name in router.order if name not in models]
+        clients = {
+            name: self.factory(provider=name, model=models[name]) if name in models else router.clients[name]
+            for name in order
+        }
+        return ProviderRouter(clients, hedge=router.hedge, hedge_min_delay=router.hedge_min_delay)
@@ -0,0 +1,306 @@
+"""
+===============================================================================
+PDF PIPELINE - Page-parallel map-reduce for long documents
+===============================================================================
+Long deeds and appraisals overflow the context window when sent as one
+prompt, and a single serial call takes minutes. For PDFs with a text layer:
+
+  map:    split pages into chunks under a token budget, analyze each chunk
+          concurrently (bounded fan-out), caching every chunk result
+  reduce: merge entities / dates_found / amounts_found / key_values
+          deterministically, in page order
+
+A retry re-reads cached chunks and only re-runs the chunks that failed.
+Scanned PDFs (no text layer) fall back to the provider's own PDF handling.
+===============================================================================
+"""
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ai_client import AnalysisResult, BaseAIClient
+from pdf_pool import get_pdf_pool
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+PDF_CHUNK_TOKEN_BUDGET = int(os.getenv("PDF_CHUNK_TOKEN_BUDGET", "12000"))  # Input tokens per chunk
+PDF_CHUNK_MAX_PAGES = int(os.getenv("PDF_CHUNK_MAX_PAGES", "10"))  # Pages per chunk
+PDF_MAP_REDUCE_MIN_PAGES = int(os.getenv("PDF_MAP_REDUCE_MIN_PAGES", "8"))  # Below this, single call
+PDF_CHUNK_CONCURRENCY = int(os.getenv("PDF_CHUNK_CONCURRENCY", "4"))  # Concurrent chunk calls
+PDF_CHUNK_CACHE_TTL = int(os.getenv("AI_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+PDF_MIN_TEXT_CHARS_PER_PAGE = 50  # Below this average, treat as scanned
+
+CHARS_PER_TOKEN = 4  # Rough estimate for Latin-script documents
+
+
+@dataclass
+class PageChunk:
+    """A contiguous run of pages analyzed in one call."""
+    index: int
+    start_page: int  # 1-based, inclusive
+    end_page: int    # 1-based, inclusive
+    text: str
+
+    @property
+    def label(self) -> str:
+        return f"pages {self.start_page}-{self.end_page}"
+
+
+# =============================================================================
+# SPLIT
+# =============================================================================
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for chunk budgeting."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def extract_pages(file_path: str) -> List[str]:
+    """Extract the text layer of each page (in the isolated parser pool, cached by hash)."""
+    return get_pdf_pool().extract_pages(file_path)
+
+
+def has_text_layer(pages: List[str]) -> bool:
+    """Whether the PDF has enough extractable text to skip provider OCR."""
+    if not pages:
+        return False
+    total = sum(len(p.strip()) for p in pages)
+    return total / len(pages) >= PDF_MIN_TEXT_CHARS_PER_PAGE
+
+
+def chunk_pages(
+    pages: List[str],
+    token_budget: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> List[PageChunk]:
+    """
+    Group consecutive pages into chunks under the token budget.
+    A single page larger than the budget becomes its own chunk.
+    """
+    token_budget = token_budget or PDF_CHUNK_TOKEN_BUDGET
+    max_pages = max_pages or PDF_CHUNK_MAX_PAGES
+    chunks: List[PageChunk] = []
+    current: List[str] = []
+    current_tokens = 0
+    start = 1
+
+    for page_no, text in enumerate(pages, start=1):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_pages):
+            chunks.append(PageChunk(len(chunks), start, page_no - 1, _join_pages(current, start)))
+            current, current_tokens, start = [], 0, page_no
+        current.append(text)
+        current_tokens += tokens
+
+    if current:
+        chunks.append(PageChunk(len(chunks), start, len(pages), _join_pages(current, start)))
+    return chunks
+
+
+def _join_pages(pages: List[str], first_page: int) -> str:
+    return "\n\n".join(f"--- Page {first_page + i} ---\n{text}" for i, text in enumerate(pages))
+
+
+# =============================================================================
+# REDUCE
+# =============================================================================
+
+def _unique(items: List[Any]) -> List[Any]:
+    """Order-preserving de-duplication (works for unhashable items)."""
+    seen = set()
+    result = []
+    for item in items:
+        key = json.dumps(item, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result
+
+
+def _chunk_entities(structured: Dict[str, Any]) -> Dict[str, Any]:
+    entities = structured.get("entities")
+    if entities is None and isinstance(structured.get("json_data"), dict):
+        entities = structured["json_data"].get("entities")
+    return entities if isinstance(entities, dict) else {}
+
+
+def merge_structured(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-chunk structured data, in page order.
+
+    - entities: per-key union (lists concatenated and de-duplicated)
+    - dates_found / amounts_found: order-preserving union
+    - key_values: first chunk to mention a key wins
+    """
+    entities: Dict[str, Any] = {}
+    dates: List[Any] = []
+    amounts: List[Any] = []
+    key_values: Dict[str, Any] = {}
+
+    for part in parts:
+        for key, value in _chunk_entities(part).items():
+            values = value if isinstance(value, list) else [value]
+            existing = entities.get(key, [])
+            entities[key] = _unique((existing if isinstance(existing, list) else [existing]) + values)
+        dates.extend(part.get("dates_found", []))
+        amounts.extend(part.get("amounts_found", []))
+        for key, value in (part.get("key_values") or {}).items():
+            key_values.setdefault(key, value)
+
+    merged: Dict[str, Any] = {
+        "extracted_text": "\n\n".join(p.get("extracted_text", "") for p in parts),
+    }
+    if entities:
+        merged["entities"] = entities
+    if dates:
+        merged["dates_found"] = _unique(dates)
+    if amounts:
+        merged["amounts_found"] = _unique(amounts)
+    if key_values:
+        merged["key_values"] = key_values
+    json_parts = [p["json_data"] for p in parts if "json_data" in p]
+    if json_parts:
+        merged["json_data"] = json_parts
+    return merged
+
+
+# =============================================================================
+# CHUNK CACHE
+# =============================================================================
+
+def chunk_cache_key(client: BaseAIClient, analysis_type: str, chunk: PageChunk) -> str:
+    """Content-addressed key: identical page text + prompt + model reuse results."""
+    digest = hashlib.sha256()
+    digest.update(client._static_prefix(analysis_type).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(chunk.text.encode("utf-8"))
+    return f"pdf_chunk:{client.provider_name}:{client.model}:{analysis_type}:{digest.hexdigest()}"
+
+
+def _cache_get(cache, key: str) -> Optional[Dict[str, Any]]:
+    if cache is None:
+        return None
+    try:
+        cached = cache.get(key)
+        return json.loads(cached) if cached else None
+    except Exception as e:
+        print(f"   ⚠️ Chunk cache read failed: {e}")
+        return None
+
+
+def _cache_set(cache, key: str, value: Dict[str, Any]):
+    if cache is None:
+        return
+    try:
+        cache.setex(key, PDF_CHUNK_CACHE_TTL, json.dumps(value, default=str))
+    except Exception as e:
+        print(f"   ⚠️ Chunk cache write failed: {e}")
+
+
+# =============================================================================
+# MAP-REDUCE
+# =============================================================================
+
+def _chunk_note(chunk: PageChunk, total: int, page_count: int) -> str:
+    # Sent with the chunk text, not in the prompt, so the static prompt prefix
+    # stays identical across chunks for provider prompt caching
+    return (
+        f"This is part {chunk.index + 1} of {total} ({chunk.label} of {page_count}). "
+        "Extract only information that appears in this part."
+    )
+
+
+def analyze_pdf_chunked(
+    client: BaseAIClient,
+    file_path: str,
+    analysis_type: str = "document_analysis",
+    cache=None,
+    pages: Optional[List[str]] = None,
+) -> Optional[AnalysisResult]:
+    """
+    Analyze a long PDF with page-parallel map-reduce.
+
+    Returns None when the PDF is short or has no text layer; the caller
+    should then use client.analyze_document. Raises the first chunk error
+    after all chunks have finished (successful chunks stay cached).
+    """
+    start_time = time.time()
+    if pages is None:
+        try:
+            pages = extract_pages(file_path)
+        except Exception as e:
+            print(f"   ⚠️ PDF text extraction failed, using provider PDF handling: {e}")
+            return None
+    if len(pages) < PDF_MAP_REDUCE_MIN_PAGES or not has_text_layer(pages):
+        return None
+
+    chunks = chunk_pages(pages)
+    print(f"   📚 Map-reduce: {len(pages)} pages in {len(chunks)} chunks")
+
+    def run_chunk(chunk: PageChunk) -> Dict[str, Any]:
+        key = chunk_cache_key(client, analysis_type, chunk)
+        cached = _cache_get(cache, key)
+        if cached:
+            return {**cached, "cached": True}
+        result = client.analyze_text(
+            _chunk_note(chunk, len(chunks), len(pages)) + "\n\n" + chunk.text,
+            analysis_type,
+        )
+        value = {
+            "raw_text": result.raw_text,
+            "structured_data": result.structured_data,
+            "provider": result.provider,  # May be a failover from the router
+            "model": result.model,
+            "tokens_used": result.tokens_used,
+            "input_tokens": result.input_tokens,
+            "cached_input_tokens": result.cached_input_tokens,
+        }
+        _cache_set(cache, key, value)
+        return {**value, "cached": False}
+
+    outcomes: List[Any] = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=max(1, PDF_CHUNK_CONCURRENCY)) as pool:
+        futures = [pool.submit(run_chunk, chunk) for chunk in chunks]
+        for i, future in enumerate(futures):
+            try:
+                outcomes[i] = future.result()
+            except Exception as e:
+                outcomes[i] = e
+
+    errors = [o for o in outcomes if isinstance(o, Exception)]
+    if errors:
+        print(f"   ⚠️ {len(errors)}/{len(chunks)} chunks failed; successful chunks cached")
+        raise errors[0]
+
+    # Chunks may be answered by different providers after a failover; the
+    # result reports the one that answered most of them
+    answered_by = [(o.get("provider") or client.provider_name, o.get("model") or client.model) for o in outcomes]
+    provider, model = Counter(answered_by).most_common(1)[0][0]
+
+    structured = merge_structured([o["structured_data"] for o in outcomes])
+    structured["chunks"] = [
+        {"pages": chunk.label, "cached": o["cached"], "tokens_used": o["tokens_used"],
+         "provider": chunk_provider, "model": chunk_model}
+        for chunk, o, (chunk_provider, chunk_model) in zip(chunks, outcomes, answered_by)
+    ]
+
+    fresh = [o for o in outcomes if not o["cached"]]
+    reported = [o for o in fresh if o.get("input_tokens") is not None]
+    return AnalysisResult(
+        raw_text="\n\n".join(f"## {chunk.label}\n{o['raw_text']}" for chunk, o in zip(chunks, outcomes)),
+        structured_data=structured,
+        tokens_used=sum(o["tokens_used"] or 0 for o in fresh),
+        model=model,
+        analysis_type=analysis_type,
+        provider=provider,
+        processing_time_ms=int((time.time() - start_time) * 1000),
+        input_tokens=sum(o["input_tokens"] for o in reported) if reported else None,
+        cached_input_tokens=sum(o["cached_input_tokens"] or 0 for o in reported) if reported else None,
+    )
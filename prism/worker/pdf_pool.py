@@ -0,0 +1,292 @@
+"""
+===============================================================================
+PDF POOL - Process-isolated PDF text extraction
+===============================================================================
+pypdf runs in pure Python: a malformed or huge PDF can loop for minutes or
+grow the worker's RSS by gigabytes, and memory freed by CPython is rarely
+returned to the OS. All text extraction therefore runs in a small pool of
+child processes:
+
+- per task wall-clock limit (PDF_PARSE_TIMEOUT_SECONDS): the child is
+  killed and replaced, the caller gets PdfParseTimeoutError
+- per child address-space limit (PDF_PARSE_MAX_MEMORY_MB, RLIMIT_AS): an
+  oversized parse fails with MemoryError inside the child only
+- children recycled after PDF_POOL_MAX_TASKS_PER_CHILD tasks
+- page texts cached by file hash (Redis, else in-process), failures too
+  (for PDF_PARSE_FAILURE_TTL_SECONDS), so the local tier, the map-reduce
+  pipeline and the AI client fallback parse each file at most once.
+  Timeouts depend on load as much as on the file and are only cached for
+  PDF_PARSE_TIMEOUT_TTL_SECONDS
+===============================================================================
+"""
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from result_cache import decode, encode
+from streaming import sha256_file
+
+try:
+    import resource
+except ImportError:  # Not on Windows
+    resource = None
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", "2"))
+PDF_PARSE_TIMEOUT_SECONDS = float(os.getenv("PDF_PARSE_TIMEOUT_SECONDS", "60"))
+PDF_PARSE_MAX_MEMORY_MB = int(os.getenv("PDF_PARSE_MAX_MEMORY_MB", "1024"))  # 0 = unlimited
+PDF_POOL_MAX_TASKS_PER_CHILD = int(os.getenv("PDF_POOL_MAX_TASKS_PER_CHILD", "50"))
+PDF_TEXT_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+PDF_PARSE_FAILURE_TTL_SECONDS = int(os.getenv("PDF_PARSE_FAILURE_TTL_SECONDS", "86400"))
+PDF_PARSE_TIMEOUT_TTL_SECONDS = int(os.getenv("PDF_PARSE_TIMEOUT_TTL_SECONDS", "300"))
+PDF_TEXT_MEMORY_ENTRIES = 8  # In-process fallback when Redis is unavailable
+
+
+class PdfParseError(ValueError):
+    """The PDF could not be parsed (corrupt, encrypted, over the memory limit)."""
+
+
+class PdfParseTimeoutError(PdfParseError, TimeoutError):
+    """Parsing exceeded PDF_PARSE_TIMEOUT_SECONDS; the child was killed."""
+
+
+# =============================================================================
+# CHILD PROCESS
+# =============================================================================
+
+def read_pages(file_path: str) -> List[str]:
+    """Text layer of each page. Runs inside a pool child."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def _serve(conn, max_memory_mb: int, parser: Callable[[str], List[str]]):
+    """Child loop: receive a path, send ("ok", pages), ("error", message) or ("fatal", message)."""
+    if resource is not None and max_memory_mb > 0:
+        limit = max_memory_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+    while True:
+        try:
+            file_path = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send(("ok", parser(file_path)))
+        except MemoryError:
+            conn.send(("fatal", f"MemoryError: over the {max_memory_mb} MB parse limit"))
+            return  # The heap is suspect; the pool replaces this child
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Child:
+    def __init__(self, context, max_memory_mb: int, parser: Callable[[str], List[str]]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn, max_memory_mb, parser), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def stop(self):
+        self.conn.close()
+        self.process.kill()
+        self.process.join(timeout=5)
+
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+class PdfParsePool:
+    """Fixed-size pool of parser processes, started on first use."""
+
+    def __init__(
+        self,
+        workers: int = PDF_POOL_WORKERS,
+        timeout_seconds: float = PDF_PARSE_TIMEOUT_SECONDS,
+        max_memory_mb: int = PDF_PARSE_MAX_MEMORY_MB,
+        max_tasks_per_child: int = PDF_POOL_MAX_TASKS_PER_CHILD,
+        redis=None,
+        parser: Callable[[str], List[str]] = read_pages,  # Module-level, so children can import it
+    ):
+        self.workers = max(1, workers)
+        self.timeout_seconds = timeout_seconds
+        self.max_memory_mb = max_memory_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.redis = redis  # Must return bytes (decode_responses=False)
+        self.parser = parser
+        # forkserver: children never inherit the worker's threads or sockets
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._idle: "queue.Queue[_Child]" = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()  # key -> (expires_at, value)
+
+    # -------------------------------------------------------------------------
+    # Public interface
+    # -------------------------------------------------------------------------
+
+    def extract_pages(self, file_path: str, file_hash: Optional[str] = None) -> List[str]:
+        """Page texts of a PDF; raises PdfParseError (or its timeout subclass)."""
+        file_hash = file_hash or sha256_file(file_path)
+        cached = self._cache_get(file_hash)
+        if cached is not None:
+            if "error" in cached:
+                raise (PdfParseTimeoutError if cached.get("timeout") else PdfParseError)(cached["error"])
+            return cached["pages"]
+
+        try:
+            pages = self._run(file_path)
+        except PdfParseError as e:
+            timeout = isinstance(e, TimeoutError)
+            self._cache_set(file_hash, {"error": str(e), "timeout": timeout},
+                            PDF_PARSE_TIMEOUT_TTL_SECONDS if timeout else PDF_PARSE_FAILURE_TTL_SECONDS)
+            raise
+        self._cache_set(file_hash, {"pages": pages}, PDF_TEXT_CACHE_TTL_SECONDS)
+        return pages
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+    # -------------------------------------------------------------------------
+    # Children
+    # -------------------------------------------------------------------------
+
+    def _checkout(self) -> _Child:
+        with self._lock:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                if self._started < self.workers:
+                    self._started += 1
+                    try:
+                        return _Child(self._context, self.max_memory_mb, self.parser)
+                    except Exception:
+                        self._started -= 1
+                        raise
+        return self._idle.get()
+
+    def _checkin(self, child: _Child, healthy: bool):
+        if healthy and child.tasks < self.max_tasks_per_child and child.process.is_alive():
+            self._idle.put(child)
+            return
+        child.stop()
+        with self._lock:
+            self._started -= 1
+        # Wake a caller blocked in _checkout() so it can start the replacement
+        try:
+            self._idle.put(_Child(self._context, self.max_memory_mb, self.parser))
+            with self._lock:
+                self._started += 1
+        except Exception as e:
+            print(f"   ⚠️ Could not restart PDF parser process: {e}")
+
+    def _run(self, file_path: str, attempts: int = 2) -> List[str]:
+        for _ in range(attempts):
+            child = self._checkout()
+            try:
+                child.conn.send(os.path.abspath(file_path))
+            except OSError:
+                # Child exited while idle; not this file's fault. Check it in
+                # first so its slot is freed for the replacement.
+                self._checkin(child, healthy=False)
+                continue
+            return self._collect(child)
+        raise RuntimeError("PDF parser process unavailable")
+
+    def _collect(self, child: _Child) -> List[str]:
+        healthy = False
+        try:
+            if not child.conn.poll(self.timeout_seconds):
+                raise PdfParseTimeoutError(f"PDF parsing exceeded {self.timeout_seconds:.0f}s")
+            try:
+                status, payload = child.conn.recv()
+            except EOFError:
+                raise PdfParseError("PDF parser process died (memory limit?)")
+            child.tasks += 1
+            healthy = status != "fatal"
+            if status != "ok":
+                raise PdfParseError(payload)
+            return payload
+        finally:
+            self._checkin(child, healthy)
+
+    # -------------------------------------------------------------------------
+    # Cache
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _key(file_hash: str) -> str:
+        return f"pdf_text:v1:{file_hash}"
+
+    def _cache_get(self, file_hash: str) -> Optional[dict]:
+        key = self._key(file_hash)
+        if self.redis is not None:
+            try:
+                blob = self.redis.get(key)
+                return decode(blob) if blob else None
+            except Exception as e:
+                print(f"   ⚠️ PDF text cache read failed: {e}")
+                return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry[1]
+
+    def _cache_set(self, file_hash: str, value: dict, ttl_seconds: int):
+        key = self._key(file_hash)
+        if self.redis is not None:
+            try:
+                self.redis.setex(key, ttl_seconds, encode(value))
+            except Exception as e:
+                print(f"   ⚠️ PDF text cache write failed: {e}")
+            return
+        with self._lock:
+            self._memory[key] = (time.monotonic() + ttl_seconds, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > PDF_TEXT_MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+
+# =============================================================================
+# SINGLETON
+# =============================================================================
+
+_pool: Optional[PdfParsePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_pool() -> PdfParsePool:
+    """Process-wide pool; the worker attaches its Redis client at startup."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PdfParsePool()
+            atexit.register(_pool.close)
+        return _pool
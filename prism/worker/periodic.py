@@ -0,0 +1,401 @@
+"""
+===============================================================================
+PERIODIC - Cluster-wide maintenance scheduler
+===============================================================================
+A small scheduler thread inside every worker process. Cluster tasks run on
+exactly one node per interval:
+
+- each run holds pg_try_advisory_lock on its own connection; a node that
+  loses the race skips the run
+- the lock holder re-reads periodic_task_runs and only runs the task if the
+  interval has passed since the last start (by the database clock), so two
+  nodes never run the same interval back to back
+- missed intervals (every worker down) collapse into one catch-up run on
+  the next tick, counted in worker_periodic_task_missed_total
+- wake-ups are jittered by up to PERIODIC_JITTER_RATIO of the interval so
+  nodes started together do not contend for the same lock every tick
+
+Node tasks (cluster=False, e.g. temp dir cleanup) skip the lock and the
+run log: every node cleans its own disk.
+===============================================================================
+"""
+import os
+import random
+import re
+import shutil
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from image_preprocess import expire_image_cache
+from metrics import record_periodic_missed, record_periodic_run
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+PERIODIC_ENABLED = os.getenv("PERIODIC_ENABLED", "true").lower() == "true"
+PERIODIC_TICK_SECONDS = float(os.getenv("PERIODIC_TICK_SECONDS", "15"))
+PERIODIC_JITTER_RATIO = float(os.getenv("PERIODIC_JITTER_RATIO", "0.1"))
+PERIODIC_RETRY_SECONDS = float(os.getenv("PERIODIC_RETRY_SECONDS", "60"))  # After the run log was unreachable
+
+# Built-in task intervals in seconds (0 disables a task)
+REAP_STALE_JOBS_INTERVAL = float(os.getenv("REAP_STALE_JOBS_INTERVAL", "300"))
+STALE_JOB_SECONDS = float(os.getenv("STALE_JOB_SECONDS", "3600"))  # Running longer than this = worker died
+TEMP_CLEANUP_INTERVAL = float(os.getenv("TEMP_CLEANUP_INTERVAL", "3600"))
+TEMP_FILE_MAX_AGE_SECONDS = float(os.getenv("TEMP_FILE_MAX_AGE_SECONDS", "21600"))
+ORPHAN_GC_INTERVAL = float(os.getenv("ORPHAN_GC_INTERVAL", "86400"))
+ORPHAN_GC_GRACE_SECONDS = float(os.getenv("ORPHAN_GC_GRACE_SECONDS", "604800"))
+ORPHAN_GC_PREFIX = os.getenv("ORPHAN_GC_PREFIX", "uploads/")
+ORPHAN_GC_DRY_RUN = os.getenv("ORPHAN_GC_DRY_RUN", "true").lower() == "true"  # Log only
+
+# First argument of the two-key advisory lock form, so task locks never
+# collide with other advisory locks on the same database
+ADVISORY_LOCK_NAMESPACE = 0x5052  # "PR"
+
+
+@dataclass
+class PeriodicTask:
+    """A function run every interval_seconds."""
+    name: str
+    interval_seconds: float
+    func: Callable[[], Any]
+    jitter_ratio: float = PERIODIC_JITTER_RATIO
+    cluster: bool = True  # One node per interval (advisory lock); False = every node
+
+
+def lock_id(name: str) -> int:
+    """Stable signed 32-bit advisory lock key for a task name."""
+    value = zlib.crc32(name.encode("utf-8"))
+    return value - (1 << 32) if value >= (1 << 31) else value
+
+
+# =============================================================================
+# RUN LOG
+# =============================================================================
+
+class PostgresRunLog:
+    """Advisory locks plus the periodic_task_runs table."""
+
+    def __init__(self, connect: Callable[[], Any], worker_id: Optional[str] = None):
+        self.connect = connect
+        self.worker_id = worker_id
+
+    @contextmanager
+    def lease(self, name: str) -> Iterator[Optional["_Lease"]]:
+        """Hold the task's advisory lock for the block; yields None if another node has it."""
+        conn = self.connect()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s, %s) AS locked",
+                            (ADVISORY_LOCK_NAMESPACE, lock_id(name)))
+                locked = cur.fetchone()["locked"]
+            if not locked:
+                yield None
+                return
+            try:
+                yield _Lease(conn, name, self.worker_id)
+            finally:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s, %s)", (ADVISORY_LOCK_NAMESPACE, lock_id(name)))
+        finally:
+            conn.close()  # Also drops the lock if the unlock failed
+
+
+class _Lease:
+    def __init__(self, conn, name: str, worker_id: Optional[str]):
+        self.conn = conn
+        self.name = name
+        self.worker_id = worker_id
+
+    def seconds_since_start(self) -> Optional[float]:
+        """Age of the last run by the database clock; None if it never ran."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT EXTRACT(EPOCH FROM NOW() - last_started_at) AS age
+                FROM periodic_task_runs
+                WHERE task_name = %s
+            """, (self.name,))
+            row = cur.fetchone()
+        return float(row["age"]) if row else None
+
+    def start(self):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO periodic_task_runs (task_name, last_started_at, last_status, last_worker_id)
+                VALUES (%s, NOW(), 'running', %s)
+                ON CONFLICT (task_name) DO UPDATE
+                SET last_started_at = NOW(),
+                    last_finished_at = NULL,
+                    last_status = 'running',
+                    last_error = NULL,
+                    last_worker_id = EXCLUDED.last_worker_id
+            """, (self.name, self.worker_id))
+
+    def finish(self, status: str, duration_seconds: float, error: Optional[str] = None):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE periodic_task_runs
+                SET last_finished_at = NOW(),
+                    last_status = %s,
+                    last_duration_ms = %s,
+                    last_error = %s
+                WHERE task_name = %s
+            """, (status, int(duration_seconds * 1000), error, self.name))
+
+
+# =============================================================================
+# SCHEDULER
+# =============================================================================
+
+class PeriodicScheduler:
+    """Runs due tasks from a daemon thread every tick_seconds."""
+
+    def __init__(
+        self,
+        tasks: List[PeriodicTask],
+        run_log: Optional[PostgresRunLog],
+        tick_seconds: float = PERIODIC_TICK_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tasks = [task for task in tasks if task.interval_seconds > 0]
+        self.run_log = run_log
+        self.tick_seconds = tick_seconds
+        self.clock = clock
+        # Spread the first checks over one tick; the run log decides catch-up
+        now = clock()
+        self._next_check: Dict[str, float] = {
+            task.name: now + random.uniform(0, tick_seconds) for task in self.tasks
+        }
+        self._node_last_start: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not self.tasks or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="periodic", daemon=True)
+        self._thread.start()
+        print(f"🗓️  Periodic tasks: {', '.join(task.name for task in self.tasks)}")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.tick_seconds):
+            self.run_pending()
+
+    def run_pending(self) -> Dict[str, str]:
+        """Check every task whose wake-up time has passed; returns {name: status} of the runs."""
+        ran = {}
+        for task in self.tasks:
+            if self._stop.is_set():
+                break
+            if self.clock() < self._next_check[task.name]:
+                continue
+            try:
+                status = self.run_task(task)
+            except Exception as e:
+                print(f"⚠️ Periodic task {task.name} not checked: {e}")
+                self._schedule(task, min(task.interval_seconds, PERIODIC_RETRY_SECONDS))
+                continue
+            if status is not None:
+                ran[task.name] = status
+        return ran
+
+    def run_task(self, task: PeriodicTask) -> Optional[str]:
+        """Run the task if it is due; returns "success"/"failure", or None if not run."""
+        if not task.cluster:
+            last_start = self._node_last_start.get(task.name)
+            age = None if last_start is None else self.clock() - last_start
+            if age is not None and age < task.interval_seconds:
+                self._schedule(task, task.interval_seconds - age)
+                return None
+            self._node_last_start[task.name] = self.clock()
+            return self._execute(task, None)
+
+        with self.run_log.lease(task.name) as lease:
+            if lease is None:
+                # Another node is running it; its run log entry decides our next check
+                self._schedule(task, task.interval_seconds)
+                return None
+            age = lease.seconds_since_start()
+            if age is not None and age < task.interval_seconds:
+                self._schedule(task, task.interval_seconds - age)
+                return None
+            if age is not None and age >= 2 * task.interval_seconds:
+                missed = int(age // task.interval_seconds) - 1
+                print(f"🗓️  {task.name}: catching up after {missed} missed run(s)")
+                record_periodic_missed(task.name, missed)
+            lease.start()
+            return self._execute(task, lease)
+
+    def _execute(self, task: PeriodicTask, lease: Optional[_Lease]) -> str:
+        start = time.perf_counter()
+        status, error = "success", None
+        try:
+            task.func()
+        except Exception as e:
+            status, error = "failure", f"{type(e).__name__}: {e}"
+            print(f"⚠️ Periodic task {task.name} failed: {error}")
+        duration = time.perf_counter() - start
+        record_periodic_run(task.name, status, duration)
+        if lease is not None:
+            lease.finish(status, duration, error)
+        self._schedule(task, task.interval_seconds)
+        return status
+
+    def _schedule(self, task: PeriodicTask, delay: float):
+        jitter = random.uniform(0, task.interval_seconds * task.jitter_ratio)
+        self._next_check[task.name] = self.clock() + delay + jitter
+
+
+# =============================================================================
+# BUILT-IN TASKS
+# =============================================================================
+
+REAP_STALE_JOBS_SQL = """
+    WITH stale AS (
+        -- Charge the dead run an extra attempt: a job that keeps taking its
+        -- worker down (OOM, segfault) fails sooner than one that raises
+        SELECT id, retry_count + 1 AS attempts
+        FROM processing_jobs
+        WHERE status = 'running'
+          AND started_at < NOW() - (%(stale_seconds)s * INTERVAL '1 second')
+        FOR UPDATE SKIP LOCKED
+    ),
+    reaped AS (
+        UPDATE processing_jobs p
+        SET retry_count = LEAST(stale.attempts, p.max_retries),
+            status = CASE WHEN stale.attempts <= p.max_retries THEN 'queued' ELSE 'failed' END,
+            completed_at = CASE WHEN stale.attempts <= p.max_retries THEN NULL ELSE NOW() END,
+            started_at = CASE WHEN stale.attempts <= p.max_retries THEN NULL ELSE p.started_at END,
+            scheduled_at = CASE WHEN stale.attempts <= p.max_retries THEN NOW() ELSE p.scheduled_at END,
+            worker_id = NULL,
+            error_message = '[stale] Worker ' || COALESCE(p.worker_id, 'unknown') || ' stopped responding'
+        FROM stale
+        WHERE p.id = stale.id
+        RETURNING p.status, p.file_id
+    ),
+    failed_files AS (
+        UPDATE file_registry f
+        SET status = 'failed'
+        FROM reaped
+        WHERE f.id = reaped.file_id AND reaped.status = 'failed'
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE status = 'queued') AS requeued,
+        COUNT(*) FILTER (WHERE status = 'failed') AS failed
+    FROM reaped
+"""
+
+
+def reap_stale_jobs(connect: Callable[[], Any], stale_seconds: float = STALE_JOB_SECONDS) -> int:
+    """Re-queue (or fail, once out of retries) jobs whose worker died mid-run."""
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(REAP_STALE_JOBS_SQL, {"stale_seconds": stale_seconds})
+            row = cur.fetchone()
+            conn.commit()
+    finally:
+        conn.close()
+    if row["requeued"] or row["failed"]:
+        print(f"🧹 Reaped stale jobs: {row['requeued']} re-queued, {row['failed']} failed")
+    return row["requeued"] + row["failed"]
+
+
+# Files the worker leaves in its temp dir: downloads ("<job file uuid>_<name>")
+# and media work dirs. Anything else may belong to another process.
+_TEMP_DOWNLOAD = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_")
+
+
+def clean_temp_dir(directory: str, max_age_seconds: float = TEMP_FILE_MAX_AGE_SECONDS, disk_cache=None) -> int:
+    """Remove downloads and media work dirs abandoned by crashed jobs; expire the disk cache."""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(directory):
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                continue
+            if entry.is_file(follow_symlinks=False) and _TEMP_DOWNLOAD.match(entry.name):
+                os.remove(entry.path)
+            elif entry.is_dir(follow_symlinks=False) and entry.name.startswith("media_"):
+                shutil.rmtree(entry.path)
+            else:
+                continue
+            removed += 1
+        except FileNotFoundError:
+            pass
+    if disk_cache is not None:
+        removed += disk_cache.expire()
+    if removed:
+        print(f"🧹 Removed {removed} stale temp files from {directory}")
+    return removed
+
+
+def gc_orphaned_objects(
+    connect: Callable[[], Any],
+    storage,
+    prefix: str = ORPHAN_GC_PREFIX,
+    grace_seconds: float = ORPHAN_GC_GRACE_SECONDS,
+    dry_run: bool = ORPHAN_GC_DRY_RUN,
+    batch_size: int = 1000,
+) -> List[str]:
+    """
+    Objects under prefix with no file_registry row, older than the grace
+    period (uploads register the row before the object is written, so a
+    fresh object is never an orphan). Deleted unless dry_run; returns the keys.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    orphans: List[str] = []
+    conn = connect()
+    try:
+        batch: List[str] = []
+
+        def check(keys: List[str]):
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT storage_key
+                    FROM file_registry
+                    WHERE storage_bucket = %s AND storage_key = ANY(%s)
+                """, (storage.bucket, keys))
+                known = {row["storage_key"] for row in cur.fetchall()}
+            orphans.extend(key for key in keys if key not in known)
+
+        for key, last_modified in storage.iter_objects(prefix):
+            if last_modified >= cutoff:
+                continue
+            batch.append(key)
+            if len(batch) >= batch_size:
+                check(batch)
+                batch = []
+        if batch:
+            check(batch)
+    finally:
+        conn.close()
+
+    if orphans and dry_run:
+        print(f"🧹 {len(orphans)} orphaned objects under {prefix!r} (ORPHAN_GC_DRY_RUN, not deleted)")
+    elif orphans:
+        deleted = storage.delete_objects(orphans)
+        print(f"🧹 Deleted {deleted} orphaned objects under {prefix!r}")
+    return orphans
+
+
+def maintenance_tasks(connect: Callable[[], Any], storage, disk_cache=None) -> List[PeriodicTask]:
+    """The worker's built-in maintenance tasks."""
+    return [
+        PeriodicTask("reap_stale_jobs", REAP_STALE_JOBS_INTERVAL, lambda: reap_stale_jobs(connect)),
+        PeriodicTask("clean_temp_dir", TEMP_CLEANUP_INTERVAL,
+                     lambda: clean_temp_dir(storage.temp_dir, disk_cache=disk_cache), cluster=False),
+        PeriodicTask("expire_image_cache", TEMP_CLEANUP_INTERVAL, expire_image_cache, cluster=False),
+        PeriodicTask("gc_orphaned_objects", ORPHAN_GC_INTERVAL, lambda: gc_orphaned_objects(connect, storage)),
+    ]
@@ -0,0 +1,82 @@
+"""
+===============================================================================
+PROVIDER FILE CACHE - Reuse provider-side uploads and extractions
+===============================================================================
+Kimi/OpenAI-compatible providers extract PDF text server-side
+(files.create(purpose="file-extract") + files.content). Both round-trips
+are repeated on every retry and reanalysis of the same file. This cache
+maps (provider endpoint, file hash) to the provider file ID and the
+extracted text, expiring with the provider's file retention.
+===============================================================================
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from metrics import record_cache_lookup
+from result_cache import decode, encode
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Keep in line with how long the provider retains uploaded files
+PROVIDER_FILE_TTL_SECONDS = int(os.getenv("PROVIDER_FILE_TTL_DAYS", "7")) * 24 * 60 * 60
+PROVIDER_FILE_MEMORY_ENTRIES = 128  # In-process fallback when Redis is unavailable
+
+
+def provider_scope(provider_name: str, api_url: Optional[str]) -> str:
+    """File IDs belong to an endpoint: "openai" may be Kimi, OpenAI or vLLM."""
+    host = urlparse(api_url or "").netloc or "default"
+    return f"{provider_name}:{host}"
+
+
+class ProviderFileCache:
+    """
+    (scope, file_hash) -> {"file_id": ..., "text": ...}
+
+    Stored compressed in Redis when available, else in a small in-process
+    LRU (still covers retries handled by the same worker).
+    """
+
+    def __init__(self, redis=None, ttl_seconds: int = PROVIDER_FILE_TTL_SECONDS):
+        self.redis = redis  # Must return bytes (decode_responses=False)
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @staticmethod
+    def _key(scope: str, file_hash: str) -> str:
+        return f"provider_file:{scope}:{file_hash}"
+
+    def get(self, scope: str, file_hash: str) -> Optional[Dict[str, Any]]:
+        key = self._key(scope, file_hash)
+        value = None
+        if self.redis is not None:
+            try:
+                blob = self.redis.get(key)
+                value = decode(blob) if blob else None
+            except Exception as e:
+                print(f"   ⚠️ Provider file cache read failed: {e}")
+        else:
+            entry = self._memory.get(key)
+            if entry and entry[0] > time.time():
+                self._memory.move_to_end(key)
+                value = entry[1]
+        record_cache_lookup(value is not None, "provider_file")
+        return value
+
+    def set(self, scope: str, file_hash: str, file_id: str, text: str):
+        key = self._key(scope, file_hash)
+        value = {"file_id": file_id, "text": text}
+        if self.redis is not None:
+            try:
+                self.redis.setex(key, self.ttl_seconds, encode(value))
+            except Exception as e:
+                print(f"   ⚠️ Provider file cache write failed: {e}")
+            return
+        self._memory[key] = (time.time() + self.ttl_seconds, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > PROVIDER_FILE_MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
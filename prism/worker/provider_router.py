@@ -0,0 +1,463 @@
+"""
+===============================================================================
+PROVIDER ROUTER - Failover, circuit breaking and hedging across AI providers
+===============================================================================
+With AI_PROVIDERS=kimi,anthropic,openai the worker routes every call through
+a ProviderRouter instead of a single client:
+
+- Circuit breaker per provider: after AI_CIRCUIT_FAILURES consecutive
+  failures the provider is skipped for AI_CIRCUIT_RESET_SECONDS, then a
+  single trial call decides whether it closes again (other calls skip the
+  provider while the trial is in flight)
+- EWMA latency per provider: providers slower than AI_ROUTER_SLOW_SECONDS
+  are tried after the healthy ones
+- Failover: an error moves on to the next provider in configured order
+- Hedging (AI_HEDGE_ENABLED): if the first provider hasn't answered after
+  its p95 latency, the second is started too and the first answer wins
+
+The *_async methods do the same on the event loop; a hedge race there
+cancels the losing call instead of leaving it to finish in a thread.
+
+Input errors (ValueError, e.g. unsupported or oversized files) are raised
+immediately: another provider won't do better and the breaker shouldn't trip.
+===============================================================================
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from ai_client import AnalysisResult, BaseAIClient, MediaUnsupportedError
+from metrics import record_failover, record_hedge, set_circuit_state, set_latency_ewma
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+AI_CIRCUIT_FAILURES = int(os.getenv("AI_CIRCUIT_FAILURES", "5"))  # Consecutive failures to open
+AI_CIRCUIT_RESET_SECONDS = float(os.getenv("AI_CIRCUIT_RESET_SECONDS", "60"))  # Open -> half-open
+AI_ROUTER_SLOW_SECONDS = float(os.getenv("AI_ROUTER_SLOW_SECONDS", "90"))  # EWMA above this is demoted
+AI_LATENCY_EWMA_ALPHA = 0.2
+AI_LATENCY_WINDOW = 100  # Samples kept for p95
+
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "false").lower() == "true"
+AI_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("AI_HEDGE_MIN_DELAY_SECONDS", "5"))
+AI_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("AI_HEDGE_DEFAULT_DELAY_SECONDS", "30"))  # Before p95 is known
+AI_HEDGE_MAX_WORKERS = int(os.getenv("AI_HEDGE_MAX_WORKERS", "8"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_NO_RESULT = object()
+
+
+class ProviderUnavailableError(RuntimeError):
+    """A provider's circuit is open or its half-open trial is in flight. Retryable."""
+
+
+class AllProvidersUnavailableError(ProviderUnavailableError):
+    """Every configured provider's circuit is open. Retryable."""
+
+
+# =============================================================================
+# HEALTH TRACKING
+# =============================================================================
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open trial."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = AI_CIRCUIT_FAILURES,
+        reset_seconds: float = AI_CIRCUIT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probing = False  # Half-open trial call in flight
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+            self._set_state(HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call could go through now, without claiming the trial."""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and not self._probing)
+
+    def acquire(self) -> bool:
+        """Claim a call: always when closed, only the one trial when half-open."""
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return state == CLOSED
+
+    def release(self):
+        """End a call that says nothing about the provider (bad input, lost hedge race)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._probing = False
+            self.failures = 0
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self.failures += 1
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            print(f"   🔌 Provider {self.name} circuit {self._state} -> {state}")
+        self._state = state
+        set_circuit_state(self.name, state)
+
+
+class LatencyTracker:
+    """EWMA plus a sliding window for percentiles."""
+
+    def __init__(self, alpha: float = AI_LATENCY_EWMA_ALPHA, window: int = AI_LATENCY_WINDOW):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+# =============================================================================
+# ROUTER
+# =============================================================================
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        _hedge_pool = ThreadPoolExecutor(max_workers=AI_HEDGE_MAX_WORKERS, thread_name_prefix="ai-hedge")
+    return _hedge_pool
+
+
+class ProviderRouter(BaseAIClient):
+    """
+    A BaseAIClient that spreads calls over several providers.
+
+    `clients` maps a label (e.g. "kimi") to a configured client, in
+    preference order. provider_name/model report the preferred provider;
+    each AnalysisResult records the provider that actually answered.
+    """
+
+    def __init__(
+        self,
+        clients: Dict[str, BaseAIClient],
+        hedge: Optional[bool] = None,
+        hedge_min_delay: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not clients:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self.clients = dict(clients)
+        self.order = list(self.clients)
+        self.hedge = AI_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_min_delay = AI_HEDGE_MIN_DELAY_SECONDS if hedge_min_delay is None else hedge_min_delay
+        self.breakers = {name: CircuitBreaker(name, clock=clock) for name in self.order}
+        self.latency = {name: LatencyTracker() for name in self.order}
+        self._file_cache = None
+        self._rate_limiter = None
+        super().__init__(model=self._primary.model)
+
+    @property
+    def _primary(self) -> BaseAIClient:
+        return self.clients[self.order[0]]
+
+    @property
+    def provider_name(self) -> str:
+        return self._primary.provider_name
+
+    @property
+    def file_cache(self):
+        return self._file_cache
+
+    @file_cache.setter
+    def file_cache(self, cache):
+        self._file_cache = cache
+        for client in self.clients.values():
+            client.file_cache = cache
+
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, limiter):
+        self._rate_limiter = limiter
+        for client in self.clients.values():
+            client.rate_limiter = limiter
+
+    def _default_model(self) -> str:
+        return self._primary.model
+
+    # -------------------------------------------------------------------------
+    # BaseAIClient interface
+    # -------------------------------------------------------------------------
+
+    def analyze_document(
+        self,
+        file_path: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        return self._call("analyze_document", file_path, analysis_type=analysis_type, prompt=prompt)
+
+    def analyze_text(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        return self._call("analyze_text", text, analysis_type=analysis_type, prompt=prompt)
+
+    def summarize_document(self, text: str, max_length: int = 500) -> str:
+        return self._call("summarize_document", text, max_length=max_length)
+
+    @property
+    def supports_transcription(self) -> bool:
+        return any(client.supports_transcription for client in self.clients.values())
+
+    def transcribe_audio(self, file_path: str) -> str:
+        """Sent to the first available provider that transcribes."""
+        capable = [name for name in self.order if self.clients[name].supports_transcription]
+        if not capable:
+            raise MediaUnsupportedError("No configured AI provider transcribes audio")
+        for name in self.candidates():
+            if name in capable:
+                return self._invoke(name, "transcribe_audio", (file_path,), {})
+        raise ProviderUnavailableError(
+            f"AI providers that transcribe are unavailable (circuits open: {', '.join(capable)})"
+        )
+
+    async def analyze_document_async(
+        self,
+        file_path: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        return await self._call_async("analyze_document_async", file_path, analysis_type=analysis_type, prompt=prompt)
+
+    async def analyze_text_async(
+        self,
+        text: str,
+        analysis_type: str = "document_analysis",
+        prompt: Optional[str] = None
+    ) -> AnalysisResult:
+        return await self._call_async("analyze_text_async", text, analysis_type=analysis_type, prompt=prompt)
+
+    # -------------------------------------------------------------------------
+    # Routing
+    # -------------------------------------------------------------------------
+
+    def candidates(self) -> List[str]:
+        """Providers to try, in order: healthy and fast, then slow; open circuits skipped."""
+        available = [name for name in self.order if self.breakers[name].allow()]
+        if not available:
+            raise AllProvidersUnavailableError(
+                f"All AI providers unavailable (circuits open: {', '.join(self.order)})"
+            )
+        fast = [n for n in available if (self.latency[n].ewma or 0.0) <= AI_ROUTER_SLOW_SECONDS]
+        slow = [n for n in available if n not in fast]
+        return fast + slow
+
+    def hedge_delay(self, name: str) -> float:
+        """How long to wait on `name` before hedging: its p95, floored."""
+        p95 = self.latency[name].percentile(0.95)
+        if p95 is None:
+            return max(AI_HEDGE_DEFAULT_DELAY_SECONDS, self.hedge_min_delay)
+        return max(p95, self.hedge_min_delay)
+
+    def _acquire(self, name: str) -> CircuitBreaker:
+        breaker = self.breakers[name]
+        if not breaker.acquire():
+            raise ProviderUnavailableError(f"AI provider {name} unavailable (circuit {breaker.state})")
+        return breaker
+
+    def _invoke(self, name: str, method: str, args, kwargs) -> Any:
+        breaker = self._acquire(name)
+        start = time.monotonic()
+        try:
+            result = getattr(self.clients[name], method)(*args, **kwargs)
+        except ValueError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        self.latency[name].observe(time.monotonic() - start)
+        set_latency_ewma(name, self.latency[name].ewma)
+        breaker.record_success()
+        return result
+
+    def _call(self, method: str, *args, **kwargs) -> Any:
+        order = self.candidates()
+        tried = 0
+        errors: List[Exception] = []
+
+        if self.hedge and len(order) > 1:
+            result, tried, errors = self._hedged(order[0], order[1], method, args, kwargs)
+            if result is not _NO_RESULT:
+                return result
+
+        for i in range(tried, len(order)):
+            name = order[i]
+            if i > 0:
+                record_failover(order[i - 1], name)
+                print(f"   ↪️  Failing over to {name}")
+            try:
+                return self._invoke(name, method, args, kwargs)
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"   ⚠️ Provider {name} failed: {type(e).__name__}: {e}")
+                errors.append(e)
+        raise errors[0]
+
+    def _hedged(self, primary: str, backup: str, method: str, args, kwargs):
+        """
+        Race primary against a delayed backup.
+        Returns (result or _NO_RESULT, providers tried, errors).
+        """
+        pool = _get_hedge_pool()
+        futures = {pool.submit(self._invoke, primary, method, args, kwargs): primary}
+        done, _ = wait(futures, timeout=self.hedge_delay(primary))
+        if not done:
+            record_hedge("fired")
+            print(f"   🏁 {primary} slower than p95, hedging with {backup}")
+            futures[pool.submit(self._invoke, backup, method, args, kwargs)] = backup
+
+        errors: List[Exception] = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except ValueError:
+                    raise
+                except Exception as e:
+                    print(f"   ⚠️ Provider {futures[future]} failed: {type(e).__name__}: {e}")
+                    errors.append(e)
+                    continue
+                if len(futures) > 1:
+                    record_hedge("primary_won" if futures[future] == primary else "hedge_won")
+                return result, len(futures), errors
+        return _NO_RESULT, len(futures), errors
+
+    # -------------------------------------------------------------------------
+    # Async routing
+    # -------------------------------------------------------------------------
+
+    async def _invoke_async(self, name: str, method: str, args, kwargs) -> Any:
+        breaker = self._acquire(name)
+        start = time.monotonic()
+        try:
+            result = await getattr(self.clients[name], method)(*args, **kwargs)
+        except ValueError:
+            breaker.release()
+            raise
+        except asyncio.CancelledError:
+            breaker.release()  # Lost a hedge race: not the provider's fault
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        self.latency[name].observe(time.monotonic() - start)
+        set_latency_ewma(name, self.latency[name].ewma)
+        breaker.record_success()
+        return result
+
+    async def _call_async(self, method: str, *args, **kwargs) -> Any:
+        order = self.candidates()
+        tried = 0
+        errors: List[Exception] = []
+
+        if self.hedge and len(order) > 1:
+            result, tried, errors = await self._hedged_async(order[0], order[1], method, args, kwargs)
+            if result is not _NO_RESULT:
+                return result
+
+        for i in range(tried, len(order)):
+            name = order[i]
+            if i > 0:
+                record_failover(order[i - 1], name)
+                print(f"   ↪️  Failing over to {name}")
+            try:
+                return await self._invoke_async(name, method, args, kwargs)
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"   ⚠️ Provider {name} failed: {type(e).__name__}: {e}")
+                errors.append(e)
+        raise errors[0]
+
+    async def _hedged_async(self, primary: str, backup: str, method: str, args, kwargs):
+        """_hedged() with tasks; the slower call is cancelled once one wins."""
+        tasks = {asyncio.ensure_future(self._invoke_async(primary, method, args, kwargs)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary))
+        if not done:
+            record_hedge("fired")
+            print(f"   🏁 {primary} slower than p95, hedging with {backup}")
+            tasks[asyncio.ensure_future(self._invoke_async(backup, method, args, kwargs))] = backup
+
+        errors: List[Exception] = []
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except ValueError:
+                        raise
+                    except Exception as e:
+                        print(f"   ⚠️ Provider {tasks[task]} failed: {type(e).__name__}: {e}")
+                        errors.append(e)
+                        continue
+                    if len(tasks) > 1:
+                        record_hedge("primary_won" if tasks[task] == primary else "hedge_won")
+                    return result, len(tasks), errors
+        finally:
+            for task in pending:
+                task.cancel()
+        return _NO_RESULT, len(tasks), errors
@@ -0,0 +1,246 @@
+"""
+===============================================================================
+RESULT CACHE - Versioned, compressed, multi-tier AI result cache
+===============================================================================
+Results are keyed by everything that determines the model output:
+
+    ai_analysis:v2:{analysis_type}:{provider}:{model}:{prompt_fp}:{file_hash}
+
+so editing a prompt in ANALYSIS_PROMPTS or switching provider/model misses
+instead of serving stale results. Values are zstd-compressed JSON (zlib when
+zstandard is not installed; the first byte records which).
+
+Tiers, checked in order:
+  1. Redis (shared by all workers)
+  2. Local disk on the worker node (survives Redis eviction and restarts)
+  3. Postgres analysis_results (handled by the worker: same hash, type,
+     provider, model and a "prompt:<fp>" quality flag)
+
+Workers publish the (provider, model, prompt_fp) identities they would
+accept per analysis type under RESULT_IDENTITIES_KEY, so the API can link
+an upload to an identical file's analysis with the same rule.
+===============================================================================
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import record_cache_lookup
+
+try:
+    import zstandard
+    _ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=int(os.getenv("AI_CACHE_ZSTD_LEVEL", "6")))
+    _ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+except ImportError:
+    zstandard = None
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+AI_DISK_CACHE_ENABLED = os.getenv("AI_DISK_CACHE_ENABLED", "true").lower() == "true"
+AI_DISK_CACHE_DIR = os.getenv(
+    "AI_DISK_CACHE_DIR",
+    os.path.join(os.getenv("WORKER_TEMP_DIR", tempfile.gettempdir()), "ai_cache"),
+)
+AI_DISK_CACHE_MAX_BYTES = int(os.getenv("AI_DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Bump when the cached payload shape changes
+CACHE_SCHEMA_VERSION = "v2"
+
+# Redis hash: analysis_type -> JSON list of [provider, model, prompt_fp]
+RESULT_IDENTITIES_KEY = "ai_analysis:identities"
+
+_CODEC_ZSTD = b"Z"
+_CODEC_ZLIB = b"z"
+
+
+# =============================================================================
+# KEYS
+# =============================================================================
+
+def prompt_fingerprint(prompt: str) -> str:
+    """Short, stable fingerprint of a prompt's text."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(file_hash: str, analysis_type: str, provider: str, model: str, prompt_fp: str) -> str:
+    """Cache key covering every input that determines the result."""
+    return f"ai_analysis:{CACHE_SCHEMA_VERSION}:{analysis_type}:{provider}:{model}:{prompt_fp}:{file_hash}"
+
+
+def publish_identities(redis, identities: Dict[str, List[Tuple[str, str, str]]]):
+    """Store the (provider, model, prompt_fp) triples a result may carry, per analysis type."""
+    redis.hset(RESULT_IDENTITIES_KEY, mapping={
+        analysis_type: json.dumps([list(identity) for identity in triples])
+        for analysis_type, triples in identities.items()
+    })
+
+
+# =============================================================================
+# COMPRESSION
+# =============================================================================
+
+def encode(value: Dict[str, Any]) -> bytes:
+    """Serialize and compress a result (codec byte + payload)."""
+    raw = json.dumps(value, default=str, separators=(",", ":")).encode("utf-8")
+    if zstandard is not None:
+        return _CODEC_ZSTD + _ZSTD_COMPRESSOR.compress(raw)
+    return _CODEC_ZLIB + zlib.compress(raw, 6)
+
+
+def decode(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode()."""
+    codec, payload = blob[:1], blob[1:]
+    if codec == _CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd-compressed cache entry but zstandard is not installed")
+        raw = _ZSTD_DECOMPRESSOR.decompress(payload)
+    elif codec == _CODEC_ZLIB:
+        raw = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown cache codec {codec!r}")
+    return json.loads(raw)
+
+
+# =============================================================================
+# DISK TIER
+# =============================================================================
+
+class DiskCache:
+    """
+    Per-node file cache. Entries expire by mtime; when the directory grows
+    past max_bytes the oldest entries are removed.
+    """
+
+    def __init__(self, directory: str = AI_DISK_CACHE_DIR, max_bytes: int = AI_DISK_CACHE_MAX_BYTES,
+                 ttl_seconds: int = AI_CACHE_TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".bin")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, blob: bytes):
+        path = self._path(key)
+        # Unique per call: threads of the async worker share one pid
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.prune()
+
+    def prune(self):
+        """Drop the oldest entries until the directory fits in max_bytes."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def expire(self) -> int:
+        """Remove entries past the TTL and abandoned temp files; returns the count."""
+        removed = 0
+        cutoff = time.time() - self.ttl_seconds
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".bin", ".tmp")) and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+# =============================================================================
+# TIERED CACHE
+# =============================================================================
+
+class ResultCache:
+    """Redis first, then local disk; disk hits are promoted back to Redis."""
+
+    def __init__(self, redis=None, disk: Optional[DiskCache] = None, ttl_seconds: int = AI_CACHE_TTL_SECONDS):
+        self.redis = redis  # Must return bytes (decode_responses=False)
+        self.disk = disk
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        blob = None
+        if self.redis is not None:
+            try:
+                blob = self.redis.get(key)
+            except Exception as e:
+                print(f"   ⚠️ Cache check failed: {e}")
+            record_cache_lookup(bool(blob), "ai_analysis")
+            if blob:
+                return self._decode(blob)
+
+        if self.disk is not None:
+            try:
+                blob = self.disk.get(key)
+            except OSError as e:
+                print(f"   ⚠️ Disk cache read failed: {e}")
+            record_cache_lookup(bool(blob), "ai_analysis_disk")
+            if blob:
+                self._redis_set(key, blob)
+                return self._decode(blob)
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        blob = encode(value)
+        self._redis_set(key, blob)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, blob)
+            except OSError as e:
+                print(f"   ⚠️ Disk cache write failed: {e}")
+
+    def _redis_set(self, key: str, blob: bytes):
+        if self.redis is None:
+            return
+        try:
+            self.redis.setex(key, self.ttl_seconds, blob)
+        except Exception as e:
+            print(f"   ⚠️ Cache write failed: {e}")
+
+    @staticmethod
+    def _decode(blob: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            return decode(blob)
+        except Exception as e:
+            print(f"   ⚠️ Discarding unreadable cache entry: {e}")
+            return None
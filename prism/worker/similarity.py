@@ -0,0 +1,249 @@
+"""
+===============================================================================
+SIMILARITY INDEX - Near-duplicate detection before AI analysis
+===============================================================================
+Several photos of the same page differ byte-for-byte, so the SHA-256 cache
+misses and each one costs a vision call. This module fingerprints content:
+
+- Images: 256-bit difference hash (dHash), compared by Hamming distance
+- Text (PDF text layer, text files): 128-permutation MinHash over word
+  shingles, compared by estimated Jaccard similarity
+
+Signatures are split into LSH bands and stored as Redis sets, so a lookup
+only compares against files sharing at least one band. All-flat image bands
+(blank paper) are not indexed and band sets stop growing at
+SIMILARITY_MAX_BAND_SIZE.
+
+Text matches above the reuse threshold reuse the earlier analysis (made
+with the same provider, model and prompt); weaker ones are analyzed
+normally but flagged for review. A dHash can't tell two text pages with
+the same layout apart, so image matches are only ever flagged for review.
+===============================================================================
+"""
+import hashlib
+import json
+import os
+import random
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+SIMILARITY_TTL = int(os.getenv("AI_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+SIMILARITY_MAX_BAND_SIZE = int(os.getenv("SIMILARITY_MAX_BAND_SIZE", "1000"))
+
+DHASH_SIZE = 16  # 16x16 gradient grid = 256-bit hash
+DHASH_BANDS = 16  # 16-bit bands: any pair within 15 bits shares a band
+DHASH_FLAT_THRESHOLD = 8  # Gradients this small read as flat (paper, sky), bit 0
+DHASH_MIN_BANDS = 4  # Fewer non-flat bands: too little detail to fingerprint
+DHASH_REVIEW_DISTANCE = int(os.getenv("DHASH_REVIEW_DISTANCE", "20"))
+
+MINHASH_NUM_PERM = 128
+MINHASH_BANDS = 16  # 8 rows per band: ~0.7 Jaccard LSH threshold
+MINHASH_SHINGLE_WORDS = 5
+MINHASH_MIN_SHINGLES = 20  # Too little text to fingerprint reliably
+MINHASH_REUSE_SIMILARITY = float(os.getenv("MINHASH_REUSE_SIMILARITY", "0.9"))
+MINHASH_REVIEW_SIMILARITY = float(os.getenv("MINHASH_REVIEW_SIMILARITY", "0.8"))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1)  # Fixed seed: signatures must be stable across workers
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_NUM_PERM)
+]
+
+IMAGE_KIND = "dhash"
+TEXT_KIND = "minhash"
+
+
+@dataclass
+class Signature:
+    """A content fingerprint: a dHash integer or a MinHash vector."""
+    kind: str
+    value: object  # int for dhash, List[int] for minhash
+
+    def bands(self) -> List[str]:
+        """LSH band keys; similar signatures share at least one. Flat image bands are skipped."""
+        if self.kind == IMAGE_KIND:
+            bits = DHASH_SIZE * DHASH_SIZE // DHASH_BANDS
+            mask = (1 << bits) - 1
+            values = [(self.value >> (i * bits)) & mask for i in range(DHASH_BANDS)]
+            return [f"{i}:{value:x}" for i, value in enumerate(values) if value]
+        rows = MINHASH_NUM_PERM // MINHASH_BANDS
+        return [
+            f"{i}:" + hashlib.blake2b(
+                ",".join(map(str, self.value[i * rows:(i + 1) * rows])).encode(), digest_size=8
+            ).hexdigest()
+            for i in range(MINHASH_BANDS)
+        ]
+
+    def similarity(self, other: "Signature") -> float:
+        """1 - normalized Hamming distance (dhash) or estimated Jaccard (minhash)."""
+        if self.kind == IMAGE_KIND:
+            return 1.0 - bin(self.value ^ other.value).count("1") / (DHASH_SIZE * DHASH_SIZE)
+        equal = sum(1 for a, b in zip(self.value, other.value) if a == b)
+        return equal / MINHASH_NUM_PERM
+
+    def serialize(self) -> str:
+        return json.dumps(self.value if self.kind == TEXT_KIND else f"{self.value:x}")
+
+    @classmethod
+    def deserialize(cls, kind: str, raw) -> "Signature":
+        data = json.loads(raw)
+        return cls(kind, data if kind == TEXT_KIND else int(data, 16))
+
+
+@dataclass
+class NearDuplicate:
+    """A previously analyzed file similar to the current one."""
+    file_id: str
+    similarity: float
+    action: str  # reuse or review
+
+
+# =============================================================================
+# FINGERPRINTS
+# =============================================================================
+
+def dhash(file_path: str, size: int = DHASH_SIZE) -> int:
+    """
+    Difference hash: sign of the horizontal gradient on a size x size grid.
+    Near-zero gradients count as flat, so blank paper doesn't flip bits
+    with sensor or JPEG noise.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(file_path) as image:
+        image.draft("L", (size * 8, size * 8))  # Fast JPEG decode at reduced scale
+        image = ImageOps.exif_transpose(image).convert("L").resize((size + 1, size), Image.LANCZOS)
+        pixels = image.tobytes()
+
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            gradient = pixels[offset + col] - pixels[offset + col + 1]
+            value = (value << 1) | (gradient > DHASH_FLAT_THRESHOLD)
+    return value
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    n = MINHASH_SHINGLE_WORDS
+    return {" ".join(words[i:i + n]) for i in range(max(len(words) - n + 1, 0))}
+
+
+def minhash(text: str) -> Optional[List[int]]:
+    """MinHash signature of word shingles, or None for very short text."""
+    shingles = _shingles(text)
+    if len(shingles) < MINHASH_MIN_SHINGLES:
+        return None
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") % _MERSENNE_PRIME
+        for s in shingles
+    ]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def compute_signature(file_path: str, mime_type: Optional[str], text: Optional[str] = None) -> Optional[Signature]:
+    """
+    Fingerprint a file: dHash for images, MinHash for extracted text.
+    Returns None when the file has neither (e.g. a scanned PDF) or is a
+    nearly blank image.
+    """
+    if (mime_type or "").startswith("image/"):
+        try:
+            signature = Signature(IMAGE_KIND, dhash(file_path))
+        except Exception as e:
+            print(f"   ⚠️ Image fingerprint failed: {e}")
+            return None
+        return signature if len(signature.bands()) >= DHASH_MIN_BANDS else None
+    if text:
+        signature = minhash(text)
+        if signature:
+            return Signature(TEXT_KIND, signature)
+    return None
+
+
+# =============================================================================
+# LSH INDEX
+# =============================================================================
+
+def _band_key(kind: str, analysis_type: str, band: str) -> str:
+    return f"simlsh:{kind}:{analysis_type}:{band}"
+
+
+def _signature_key(kind: str, file_id: str) -> str:
+    return f"simsig:{kind}:{file_id}"
+
+
+def classify_similarity(signature: Signature, similarity: float) -> Optional[str]:
+    """Map a similarity score to reuse / review / None (images: review at most)."""
+    if signature.kind == IMAGE_KIND:
+        bits = DHASH_SIZE * DHASH_SIZE
+        distance = round((1.0 - similarity) * bits)
+        if distance <= DHASH_REVIEW_DISTANCE:
+            return "review"
+        return None
+    if similarity >= MINHASH_REUSE_SIMILARITY:
+        return "reuse"
+    if similarity >= MINHASH_REVIEW_SIMILARITY:
+        return "review"
+    return None
+
+
+def find_near_duplicate(redis, signature: Signature, analysis_type: str, file_id: str) -> Optional[NearDuplicate]:
+    """Best indexed match for a signature, if any passes the review threshold."""
+    if redis is None:
+        return None
+    try:
+        candidates = redis.sunion([_band_key(signature.kind, analysis_type, b) for b in signature.bands()])
+        candidates = [c.decode() if isinstance(c, bytes) else c for c in candidates]
+        candidates = [c for c in candidates if c != file_id]
+        if not candidates:
+            return None
+        stored = redis.mget([_signature_key(signature.kind, c) for c in candidates])
+    except Exception as e:
+        print(f"   ⚠️ Similarity lookup failed: {e}")
+        return None
+
+    best = None
+    for candidate, raw in zip(candidates, stored):
+        if not raw:
+            continue  # Signature expired; its band entries are stale
+        score = signature.similarity(Signature.deserialize(signature.kind, raw))
+        if best is None or score > best.similarity:
+            best = NearDuplicate(candidate, score, "")
+    if best is None:
+        return None
+    action = classify_similarity(signature, best.similarity)
+    if action is None:
+        return None
+    best.action = action
+    return best
+
+
+def index_signature(redis, signature: Signature, analysis_type: str, file_id: str):
+    """Add a file's signature to the LSH index; full band sets are left as they are."""
+    if redis is None:
+        return
+    try:
+        keys = [_band_key(signature.kind, analysis_type, band) for band in signature.bands()]
+        pipe = redis.pipeline()
+        for key in keys:
+            pipe.scard(key)
+        sizes = pipe.execute()
+
+        pipe = redis.pipeline()
+        pipe.setex(_signature_key(signature.kind, file_id), SIMILARITY_TTL, signature.serialize())
+        for key, size in zip(keys, sizes):
+            if size < SIMILARITY_MAX_BAND_SIZE:
+                pipe.sadd(key, file_id)
+                pipe.expire(key, SIMILARITY_TTL)
+        pipe.execute()
+    except Exception as e:
+        print(f"   ⚠️ Similarity index write failed: {e}")
@@ -0,0 +1,166 @@
+"""
+===============================================================================
+SINGLE FLIGHT - One AI analysis per (file hash, analysis type) at a time
+===============================================================================
+A file confirmed twice, or reanalyzed repeatedly, can put several jobs with
+the same content hash in flight at once. Each misses the result cache and
+pays for its own AI call. Before the AI tier a job takes a Redis lock:
+
+    inflight:{analysis_type}:{file_hash}       SET NX PX, value = owner token
+    inflight:{analysis_type}:{file_hash}:done  completion channel
+
+The job holding the lock (the leader) runs normally and, once its result
+is cached and saved, deletes the lock and publishes on the channel. The
+others (followers) wait for that message, then retry the cache tiers and
+reuse the leader's result. If the leader fails, dies (the lock expires) or
+takes longer than SINGLE_FLIGHT_WAIT_SECONDS, a follower runs the job
+itself. Without Redis every job runs uncoordinated.
+===============================================================================
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Optional
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# Longer than a slow AI call; a crashed leader's lock expires after this
+SINGLE_FLIGHT_LOCK_TTL_SECONDS = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL_SECONDS", "900"))
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "900"))
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "1"))
+
+DONE = "done"
+FAILED = "failed"
+RELEASED = "released"  # Lock gone without a message seen
+
+# Delete the lock only if this job still owns it, then notify followers
+_LUA_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('DEL', KEYS[1])
+end
+redis.call('PUBLISH', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+def flight_key(file_hash: str, analysis_type: str) -> str:
+    return f"inflight:{analysis_type}:{file_hash}"
+
+
+class SingleFlight:
+    """Redis lock plus completion channel; `redis` must decode responses."""
+
+    def __init__(
+        self,
+        redis=None,
+        lock_ttl_seconds: int = SINGLE_FLIGHT_LOCK_TTL_SECONDS,
+        wait_seconds: float = SINGLE_FLIGHT_WAIT_SECONDS,
+        poll_seconds: float = SINGLE_FLIGHT_POLL_SECONDS,
+    ):
+        self.redis = redis
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        self._release_script = None
+
+    # -------------------------------------------------------------------------
+    # Leader
+    # -------------------------------------------------------------------------
+
+    def acquire(self, file_hash: str, analysis_type: str) -> Optional[str]:
+        """
+        Try to become the leader. Returns the owner token, or None while
+        another job holds the lock. Redis errors make every caller a leader.
+        """
+        token = uuid.uuid4().hex
+        if self.redis is None:
+            return token
+        try:
+            if self.redis.set(flight_key(file_hash, analysis_type), token,
+                              nx=True, px=self.lock_ttl_seconds * 1000):
+                return token
+            return None
+        except Exception as e:
+            print(f"   ⚠️ Single-flight lock unavailable, running uncoordinated: {e}")
+            return token
+
+    def release(self, file_hash: str, analysis_type: str, token: str, status: str = DONE):
+        """Drop the lock (if still ours) and wake the followers."""
+        if self.redis is None:
+            return
+        key = flight_key(file_hash, analysis_type)
+        try:
+            if self._release_script is None:
+                self._release_script = self.redis.register_script(_LUA_RELEASE)
+            self._release_script(keys=[key, f"{key}:done"], args=[token, status])
+        except Exception as e:
+            print(f"   ⚠️ Single-flight release failed (lock expires on its own): {e}")
+
+    # -------------------------------------------------------------------------
+    # Followers
+    # -------------------------------------------------------------------------
+
+    def wait(self, file_hash: str, analysis_type: str) -> Optional[str]:
+        """
+        Block until the leader finishes. Returns its status, RELEASED if its
+        lock vanished without a message, or None on timeout or Redis errors.
+        """
+        key = flight_key(file_hash, analysis_type)
+        try:
+            pubsub = self._subscribe(key)
+        except Exception as e:
+            print(f"   ⚠️ Single-flight channel unavailable: {e}")
+            return None
+        try:
+            deadline = time.monotonic() + self.wait_seconds
+            while time.monotonic() < deadline:
+                status = self._poll(pubsub, key, self.poll_seconds)
+                if status:
+                    return status
+            return None
+        except Exception as e:
+            print(f"   ⚠️ Single-flight wait interrupted: {e}")
+            return None
+        finally:
+            pubsub.close()
+
+    async def wait_async(self, file_hash: str, analysis_type: str) -> Optional[str]:
+        """wait() for event loops: polls without holding an executor thread."""
+        key = flight_key(file_hash, analysis_type)
+        try:
+            pubsub = await asyncio.to_thread(self._subscribe, key)
+        except Exception as e:
+            print(f"   ⚠️ Single-flight channel unavailable: {e}")
+            return None
+        try:
+            deadline = time.monotonic() + self.wait_seconds
+            while time.monotonic() < deadline:
+                status = await asyncio.to_thread(self._poll, pubsub, key, 0)
+                if status:
+                    return status
+                await asyncio.sleep(self.poll_seconds)
+            return None
+        except Exception as e:
+            print(f"   ⚠️ Single-flight wait interrupted: {e}")
+            return None
+        finally:
+            pubsub.close()
+
+    def _subscribe(self, key: str):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"{key}:done")
+        return pubsub
+
+    def _poll(self, pubsub, key: str, timeout: float) -> Optional[str]:
+        """The leader's status once it has published or its lock is gone."""
+        message = pubsub.get_message(timeout=timeout)
+        if message and message.get("type") == "message":
+            return message["data"]
+        # Subscribed after the leader published, or the leader died
+        if not self.redis.exists(key):
+            return RELEASED
+        return None
@@ -6,12 +6,21 @@
 import hashlib
 import os
 import tempfile
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from streaming import FileTooLargeError, check_size
+
+# Bound per-download memory: concurrency * chunksize is the worst-case
+# in-flight buffer for multipart downloads.
+DOWNLOAD_CONCURRENCY = int(os.getenv("WORKER_DOWNLOAD_CONCURRENCY", "2"))
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("WORKER_DOWNLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+HASH_RANGE_BYTES = int(os.getenv("WORKER_HASH_RANGE_BYTES", str(8 * 1024 * 1024)))
+
 
 class WorkerStorage:
     """Storage service for the worker to download files."""
@@ -48,24 +57,65 @@ def __init__(
             region_name=self.region,
             config=boto_config
         )
+        
+        self.transfer_config = TransferConfig(
+            multipart_threshold=DOWNLOAD_CHUNK_BYTES,
+            multipart_chunksize=DOWNLOAD_CHUNK_BYTES,
+            max_concurrency=DOWNLOAD_CONCURRENCY,
+            io_chunksize=256 * 1024,
+        )
     
-    def download_file(self, storage_key: str, file_id: str) -> str:
+    def download_file(self, storage_key: str, file_id: str, mime_type: Optional[str] = None) -> str:
         """
         Download a file to local temp directory.
         Returns the local file path.
+        
+        When mime_type is given, the per-type size cap is enforced on the
+        downloaded file (FileTooLargeError).
         """
         # Get original filename from storage key
         original_filename = storage_key.split("/")[-1]
         
-        # Create temp file path
-        local_path = os.path.join(self.temp_dir, f"{file_id}_{original_filename}")
+        # Unique per call: concurrent jobs can download the same file. The
+        # "<file_id>_" prefix is what clean_temp_dir() recognises.
+        fd, local_path = tempfile.mkstemp(dir=self.temp_dir, prefix=f"{file_id}_", suffix=f"_{original_filename}")
+        os.close(fd)
         
         try:
-            self.client.download_file(self.bucket, storage_key, local_path)
+            self.client.download_file(self.bucket, storage_key, local_path, Config=self.transfer_config)
+            if mime_type:
+                try:
+                    check_size(os.path.getsize(local_path), mime_type)
+                except FileTooLargeError:
+                    self.cleanup_file(local_path)
+                    raise
             return local_path
         except ClientError as e:
+            self.cleanup_file(local_path)
             raise Exception(f"Failed to download file {storage_key}: {e}")
     
+    def compute_sha256(self, storage_key: str, size: Optional[int] = None) -> str:
+        """
+        SHA-256 of a stored object without downloading it to disk.
+        
+        Reads the object in ranged GETs of HASH_RANGE_BYTES, so a dropped
+        connection only re-reads one range and memory stays bounded.
+        """
+        if size is None:
+            size = self.get_file_metadata(storage_key)['size']
+        digest = hashlib.sha256()
+        try:
+            for start in range(0, size, HASH_RANGE_BYTES):
+                end = min(start + HASH_RANGE_BYTES, size) - 1
+                response = self.client.get_object(
+                    Bucket=self.bucket, Key=storage_key, Range=f"bytes={start}-{end}"
+                )
+                for chunk in response['Body'].iter_chunks(1024 * 1024):
+                    digest.update(chunk)
+            return digest.hexdigest()
+        except ClientError as e:
+            raise Exception(f"Failed to hash file {storage_key}: {e}")
+    
     def cleanup_file(self, local_path: str):
         """Remove downloaded file from temp directory."""
         try:
@@ -86,6 +136,25 @@ def get_file_metadata(self, storage_key: str) -> dict:
         except ClientError as e:
             raise Exception(f"Failed to get file metadata: {e}")
 
+    def iter_objects(self, prefix: str = ""):
+        """Yield (storage_key, last_modified) for every object under prefix."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], obj['LastModified']
+
+    def delete_objects(self, storage_keys: List[str]) -> int:
+        """Delete objects in batches of 1000; returns the number deleted."""
+        deleted = 0
+        for start in range(0, len(storage_keys), 1000):
+            batch = storage_keys[start:start + 1000]
+            response = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+            deleted += len(batch) - len(response.get('Errors', []))
+        return deleted
+
 
 # Singleton instance
 _storage_instance: Optional[WorkerStorage] = None
@@ -0,0 +1,178 @@
+"""
+===============================================================================
+STREAMING PAYLOADS - Bounded-memory file handling for AI requests
+===============================================================================
+Large images and PDFs used to be read fully into memory, base64-encoded into
+a second string and copied again into the JSON body (~3.5x the file size per
+job). This module keeps the file on disk and streams it:
+
+- Per-type size caps (checked before download and after)
+- Chunked base64 encoding straight from disk
+- JSON request bodies assembled as a byte iterator with a known length,
+  so httpx can send them without ever materialising the full payload
+===============================================================================
+"""
+import base64
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterator, Optional
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MB = 1024 * 1024
+
+# Per-type size caps (bytes). Override with MAX_<TYPE>_BYTES env vars.
+FILE_SIZE_CAPS = {
+    "image": int(os.getenv("MAX_IMAGE_BYTES", str(20 * MB))),
+    "pdf": int(os.getenv("MAX_PDF_BYTES", str(32 * MB))),
+    "text": int(os.getenv("MAX_TEXT_BYTES", str(5 * MB))),
+    "video": int(os.getenv("MAX_VIDEO_BYTES", str(200 * MB))),
+    "audio": int(os.getenv("MAX_AUDIO_BYTES", str(50 * MB))),
+    "default": int(os.getenv("MAX_FILE_BYTES", str(25 * MB))),
+}
+
+# Files above this size are sent through the streaming request path
+STREAM_THRESHOLD_BYTES = int(os.getenv("STREAM_THRESHOLD_BYTES", str(4 * MB)))
+
+# Read size for base64 streaming. Must be a multiple of 3 so each chunk
+# encodes independently without padding.
+B64_READ_CHUNK = 3 * 64 * 1024
+
+_PLACEHOLDER = "__PRISM_STREAM_B64__"
+
+
+class FileTooLargeError(ValueError):
+    """File exceeds the configured size cap for its type. Not retryable."""
+
+    def __init__(self, size: int, cap: int, kind: str):
+        super().__init__(f"{kind} file is {size / MB:.1f} MB, exceeds cap of {cap / MB:.1f} MB")
+        self.size = size
+        self.cap = cap
+        self.kind = kind
+
+
+# =============================================================================
+# SIZE CAPS
+# =============================================================================
+
+def file_kind(mime_type: Optional[str]) -> str:
+    """Map a MIME type to a size-cap category."""
+    mime_type = (mime_type or "").lower()
+    if mime_type.startswith("image/"):
+        return "image"
+    if mime_type == "application/pdf":
+        return "pdf"
+    if mime_type.startswith("video/"):
+        return "video"
+    if mime_type.startswith("audio/"):
+        return "audio"
+    if mime_type.startswith("text/") or mime_type in ("application/json", "application/csv"):
+        return "text"
+    return "default"
+
+
+def get_size_cap(mime_type: Optional[str]) -> int:
+    """Size cap in bytes for a MIME type."""
+    return FILE_SIZE_CAPS[file_kind(mime_type)]
+
+
+def check_size(size: Optional[int], mime_type: Optional[str]):
+    """Raise FileTooLargeError if size exceeds the cap for mime_type."""
+    if size is None:
+        return
+    cap = get_size_cap(mime_type)
+    if size > cap:
+        raise FileTooLargeError(size, cap, file_kind(mime_type))
+
+
+# =============================================================================
+# STREAMING HASH
+# =============================================================================
+
+def sha256_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in bounded chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# =============================================================================
+# STREAMING BASE64
+# =============================================================================
+
+def base64_length(size: int) -> int:
+    """Length of the padded base64 encoding of `size` bytes."""
+    return 4 * ((size + 2) // 3)
+
+
+def iter_base64(file_path: str, chunk_size: int = B64_READ_CHUNK) -> Iterator[bytes]:
+    """Yield the base64 encoding of a file in bounded chunks."""
+    if chunk_size % 3:
+        raise ValueError("chunk_size must be a multiple of 3")
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield base64.b64encode(chunk)
+
+
+class StreamingJSONBody:
+    """
+    A JSON request body with one file embedded as base64, streamed from disk.
+
+    Build the payload as a normal dict and put `StreamingJSONBody.PLACEHOLDER`
+    where the base64 data goes (it may be embedded in a larger string, e.g.
+    a data URL). Iterating yields the serialized body; `len()` is exact, so
+    the request is sent with a Content-Length header.
+    """
+
+    PLACEHOLDER = _PLACEHOLDER
+
+    def __init__(self, payload: Dict[str, Any], file_path: str):
+        serialized = json.dumps(payload, ensure_ascii=False)
+        if serialized.count(_PLACEHOLDER) != 1:
+            raise ValueError("payload must contain exactly one streaming placeholder")
+        prefix, suffix = serialized.split(_PLACEHOLDER)
+        self._prefix = prefix.encode("utf-8")
+        self._suffix = suffix.encode("utf-8")
+        self.file_path = file_path
+        self._b64_len = base64_length(os.path.getsize(file_path))
+
+    def __len__(self) -> int:
+        return len(self._prefix) + self._b64_len + len(self._suffix)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._prefix
+        yield from iter_base64(self.file_path)
+        yield self._suffix
+
+
+def should_stream(file_path: str) -> bool:
+    """Whether a file is large enough to use the streaming request path."""
+    return os.path.getsize(file_path) > STREAM_THRESHOLD_BYTES
+
+
+def post_streaming_json(
+    url: str,
+    headers: Dict[str, str],
+    body: StreamingJSONBody,
+    timeout: float = 300.0,
+) -> Dict[str, Any]:
+    """POST a streamed JSON body and return the decoded JSON response."""
+    import httpx
+
+    request_headers = {
+        **headers,
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+    }
+    with httpx.Client(timeout=timeout) as client:
+        response = client.post(url, headers=request_headers, content=iter(body))
+        response.raise_for_status()
+        return response.json()
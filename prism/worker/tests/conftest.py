@@ -14,6 +14,7 @@
 sys.path.insert(0, '/home/hinoki/HinokiDEV/Investments/prism/worker')
 sys.path.insert(0, '/home/hinoki/HinokiDEV/Investments/prism/api')
 sys.path.insert(0, '/home/hinoki/HinokiDEV/Investments/prism/shared')
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
 
 
 # =============================================================================
@@ -0,0 +1,161 @@
+"""
+===============================================================================
+UNIT TESTS - Async AI Client
+===============================================================================
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import ai_client
+from ai_client import AnalysisResult, BaseAIClient, OpenAICompatibleClient, get_async_http_client
+from provider_router import ProviderRouter
+
+
+class FakeCompletions:
+    """Async chat.completions with a fixed latency."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"summary": "Deed"}'))],
+            usage=SimpleNamespace(total_tokens=42),
+        )
+
+
+def _openai_client(completions):
+    client = OpenAICompatibleClient(api_key="test", api_url="https://api.moonshot.cn/v1", model="k2")
+    sdk = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    client._get_async_client = lambda: sdk
+    return client
+
+
+class AsyncStub(BaseAIClient):
+    """Provider with native async methods and scripted latency/failures."""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.provider_name = name
+        self.delay = delay
+        self.fail = fail
+        self.cancelled = False
+        super().__init__(model=f"{name}-model")
+
+    def _default_model(self):
+        return "stub"
+
+    def analyze_document(self, file_path, analysis_type="document_analysis", prompt=None):
+        raise AssertionError("sync path used")
+
+    def analyze_text(self, text, analysis_type="document_analysis", prompt=None):
+        raise AssertionError("sync path used")
+
+    def summarize_document(self, text, max_length=500):
+        return ""
+
+    async def analyze_text_async(self, text, analysis_type="document_analysis", prompt=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise ConnectionError(f"{self.provider_name} down")
+        return AnalysisResult(
+            raw_text=self.provider_name, structured_data={}, tokens_used=1,
+            model=self.model, analysis_type=analysis_type, provider=self.provider_name,
+        )
+
+
+class TestHttpPool:
+    """Test cases for the shared connection pool."""
+
+    def test_one_pool_per_loop(self):
+        async def pools():
+            first, second = get_async_http_client(), get_async_http_client()
+            await ai_client.close_async_http_client()
+            return first, second
+
+        first, second = asyncio.run(pools())
+        assert first is second
+        assert first.is_closed
+        other, _ = asyncio.run(pools())
+        assert other is not first
+
+
+class TestOpenAIAsync:
+    """Test cases for the native async OpenAI-compatible path."""
+
+    def test_analyze_text_async(self):
+        client = _openai_client(FakeCompletions())
+        result = asyncio.run(client.analyze_text_async("Escritura pública"))
+        assert result.tokens_used == 42
+        assert result.raw_text == '{"summary": "Deed"}'
+
+    def test_calls_overlap_on_one_loop(self):
+        completions = FakeCompletions(delay=0.2)
+        client = _openai_client(completions)
+
+        async def many():
+            return await asyncio.gather(*(client.analyze_text_async(f"doc {i}") for i in range(25)))
+
+        start = time.monotonic()
+        results = asyncio.run(many())
+        assert len(results) == completions.calls == 25
+        assert time.monotonic() - start < 1.0
+
+    def test_analyze_document_async_text_file(self, tmp_path):
+        path = tmp_path / "notes.txt"
+        path.write_text("Lote 12, Ciudad de Panamá")
+        client = _openai_client(FakeCompletions())
+        result = asyncio.run(client.analyze_document_async(str(path)))
+        assert result.provider == "openai"
+
+
+class TestDefaultAsync:
+    """Test cases for providers without a native async path."""
+
+    def test_falls_back_to_thread(self):
+        class SyncOnly(AsyncStub):
+            analyze_text_async = BaseAIClient.analyze_text_async
+
+            def analyze_text(self, text, analysis_type="document_analysis", prompt=None):
+                return AnalysisResult(
+                    raw_text=text, structured_data={}, tokens_used=None,
+                    model=self.model, analysis_type=analysis_type, provider="sync",
+                )
+
+        result = asyncio.run(SyncOnly("google").analyze_text_async("text"))
+        assert result.provider == "sync"
+
+
+class TestRouterAsync:
+    """Test cases for async failover and hedging."""
+
+    def test_fails_over(self):
+        router = ProviderRouter(
+            {"kimi": AsyncStub("kimi", fail=True), "anthropic": AsyncStub("anthropic")}, hedge=False
+        )
+        result = asyncio.run(router.analyze_text_async("text"))
+        assert result.provider == "anthropic"
+        assert router.breakers["kimi"].failures == 1
+
+    def test_hedge_cancels_the_slow_call(self):
+        primary, backup = AsyncStub("kimi", delay=1.0), AsyncStub("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=True, hedge_min_delay=0.05)
+        router.latency["kimi"].observe(0.01)
+
+        async def run():
+            result = await router.analyze_text_async("text")
+            await asyncio.sleep(0)  # Let the cancellation land
+            return result
+
+        start = time.monotonic()
+        assert asyncio.run(run()).provider == "anthropic"
+        assert time.monotonic() - start < 0.5
+        assert primary.cancelled
+        assert router.breakers["kimi"].failures == 0
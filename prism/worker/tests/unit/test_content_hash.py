@@ -0,0 +1,65 @@
+"""
+===============================================================================
+UNIT TESTS - Content Hashing
+===============================================================================
+"""
+import hashlib
+import io
+import os
+
+import pytest
+
+import storage as storage_module
+from storage import WorkerStorage
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def iter_chunks(self, chunk_size):
+        return iter(lambda: self._stream.read(chunk_size), b"")
+
+
+class FakeS3:
+    """Serves ranged GETs from an in-memory object."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.ranges = []
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = (int(x) for x in Range.replace("bytes=", "").split("-"))
+        self.ranges.append((start, end))
+        return {"Body": FakeBody(self.data[start:end + 1])}
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.data), "LastModified": None}
+
+
+@pytest.fixture
+def worker_storage(tmp_path):
+    return WorkerStorage(bucket="test", temp_dir=str(tmp_path))
+
+
+class TestRangedHash:
+    """Test cases for WorkerStorage.compute_sha256."""
+
+    def test_matches_full_hash(self, worker_storage, monkeypatch):
+        data = os.urandom(2500)
+        monkeypatch.setattr(storage_module, "HASH_RANGE_BYTES", 1000)
+        worker_storage.client = FakeS3(data)
+
+        assert worker_storage.compute_sha256("uploads/a.jpg", len(data)) == hashlib.sha256(data).hexdigest()
+        assert worker_storage.client.ranges == [(0, 999), (1000, 1999), (2000, 2499)]
+
+    def test_size_from_metadata(self, worker_storage, monkeypatch):
+        data = os.urandom(300)
+        monkeypatch.setattr(storage_module, "HASH_RANGE_BYTES", 128)
+        worker_storage.client = FakeS3(data)
+
+        assert worker_storage.compute_sha256("uploads/a.pdf") == hashlib.sha256(data).hexdigest()
+
+    def test_empty_object(self, worker_storage):
+        worker_storage.client = FakeS3(b"")
+        assert worker_storage.compute_sha256("uploads/empty.txt", 0) == hashlib.sha256(b"").hexdigest()
@@ -0,0 +1,115 @@
+"""
+===============================================================================
+UNIT TESTS - Image Preprocessing
+===============================================================================
+"""
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from image_preprocess import expire_image_cache, get_max_dimension, preprocess_image
+
+
+@pytest.fixture
+def large_photo(tmp_path):
+    """A noisy 4000x3000 JPEG tagged with EXIF orientation 6 (rotate 90° CW)."""
+    path = tmp_path / "photo.jpg"
+    image = Image.effect_noise((4000, 3000), 64).convert("RGB")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image.save(path, "JPEG", quality=98, exif=exif)
+    return str(path)
+
+
+@pytest.fixture
+def small_png(tmp_path):
+    path = tmp_path / "icon.png"
+    Image.new("RGBA", (32, 32), (255, 0, 0, 128)).save(path, "PNG")
+    return str(path)
+
+
+class TestImagePreprocess:
+    """Test cases for vision image preprocessing."""
+
+    def test_downscales_and_orients(self, large_photo, tmp_path):
+        result = preprocess_image(large_photo, "image/jpeg", provider="anthropic", cache_dir=str(tmp_path / "cache"))
+
+        assert result.outcome == "resized"
+        assert result.mime_type == "image/jpeg"
+        assert result.output_bytes < result.original_bytes
+        with Image.open(result.path) as out:
+            # Orientation 6 swaps width and height; longest edge is capped
+            assert out.size == (1176, 1568)
+
+    def test_cached_by_hash(self, large_photo, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        first = preprocess_image(large_photo, "image/jpeg", provider="openai", cache_dir=cache_dir)
+        second = preprocess_image(large_photo, "image/jpeg", provider="openai", cache_dir=cache_dir)
+
+        assert second.outcome == "cached"
+        assert second.path == first.path
+        assert second.bytes_saved == first.bytes_saved
+
+    def test_keeps_small_original(self, small_png, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        result = preprocess_image(small_png, "image/png", provider="openai", cache_dir=cache_dir)
+        assert result.outcome == "original"
+        assert result.path == small_png
+
+
+    def test_keeps_original_when_not_smaller(self, tmp_path, monkeypatch):
+        import image_preprocess
+        monkeypatch.setattr(image_preprocess, "IMAGE_PREPROCESS_MIN_BYTES", 0)
+        # Already heavily compressed: re-encoding at q100 would grow it
+        path = tmp_path / "scan.jpg"
+        Image.effect_noise((256, 256), 64).convert("RGB").save(path, "JPEG", quality=20)
+        cache_dir = str(tmp_path / "cache")
+
+        result = preprocess_image(str(path), "image/jpeg", provider="openai", cache_dir=cache_dir, quality=100)
+        assert result.outcome == "original"
+        assert result.path == str(path)
+
+        # Decision is cached too
+        again = preprocess_image(str(path), "image/jpeg", provider="openai", cache_dir=cache_dir, quality=100)
+        assert again.path == str(path)
+
+    def test_provider_dimensions(self, monkeypatch):
+        assert get_max_dimension("anthropic") == 1568
+        assert get_max_dimension("unknown") == get_max_dimension(None)
+        monkeypatch.setenv("IMAGE_MAX_DIMENSION_OPENAI", "1024")
+        assert get_max_dimension("openai") == 1024
+
+
+class TestImageCacheExpiry:
+    """Test cases for bounding the on-disk image cache."""
+
+    def _entry(self, directory, name, size, age_seconds):
+        path = directory / name
+        path.write_bytes(b"x" * size)
+        mtime = time.time() - age_seconds
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_expires_by_age_and_abandoned_tmp(self, tmp_path):
+        self._entry(tmp_path, "old_2048_q85.jpg", 10, 8 * 24 * 3600)
+        self._entry(tmp_path, "fresh_2048_q85.jpg", 10, 60)
+        self._entry(tmp_path, "fresh_2048_q85.jpg.abc.tmp", 10, 2 * 3600)
+        assert expire_image_cache(str(tmp_path), ttl_seconds=7 * 24 * 3600) == 2
+        assert [p.name for p in tmp_path.iterdir()] == ["fresh_2048_q85.jpg"]
+
+    def test_evicts_least_recently_used_past_size_cap(self, tmp_path):
+        self._entry(tmp_path, "a.jpg", 100, 300)
+        self._entry(tmp_path, "b.jpg", 100, 200)
+        self._entry(tmp_path, "c.jpg", 100, 100)
+        assert expire_image_cache(str(tmp_path), max_bytes=200) == 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["b.jpg", "c.jpg"]
+
+    def test_cache_hit_refreshes_recency(self, large_photo, tmp_path):
+        cache_dir = tmp_path / "cache"
+        first = preprocess_image(large_photo, "image/jpeg", provider="anthropic", cache_dir=str(cache_dir))
+        os.utime(first.path, (0, 0))
+        preprocess_image(large_photo, "image/jpeg", provider="anthropic", cache_dir=str(cache_dir))
+        assert os.path.getmtime(first.path) > time.time() - 60
+        assert not [p for p in cache_dir.iterdir() if p.name.endswith(".tmp")]
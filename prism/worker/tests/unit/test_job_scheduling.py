@@ -0,0 +1,108 @@
+"""
+===============================================================================
+UNIT TESTS - Job Scheduling (priority aging + fair share)
+===============================================================================
+"""
+import re
+import sqlite3
+
+from main import WAIT_SECONDS_SQL, build_claim_query
+
+
+def _sqlite_claim_query(**kwargs) -> str:
+    """The claim query with its Postgres-only syntax mapped to SQLite."""
+    query = build_claim_query(**kwargs)
+    query = query.replace(
+        WAIT_SECONDS_SQL,
+        "((julianday('now') - julianday(COALESCE(pj.scheduled_at, pj.created_at))) * 86400)",
+    )
+    query = query.replace("FOR UPDATE OF pj SKIP LOCKED", "").replace("LIMIT 1", "")
+    query = query.replace("NOW()", "datetime('now')").replace("::text", "").replace("LEAST(", "MIN(")
+    return re.sub(r"%\((\w+)\)s", r":\1", query)
+
+
+def _claim_order(jobs, **kwargs):
+    """Job ids in claim order for (id, priority, created_ago_s, scheduled_ago_s or None, status) rows."""
+    db = sqlite3.connect(":memory:")
+    db.executescript("""
+        CREATE TABLE processing_jobs (
+            id TEXT, job_type TEXT, file_id TEXT, investment_id TEXT, priority INTEGER,
+            parameters TEXT, retry_count INTEGER, max_retries INTEGER, status TEXT,
+            created_at TEXT, scheduled_at TEXT
+        );
+        CREATE TABLE file_registry (
+            id TEXT, storage_key TEXT, storage_bucket TEXT, original_filename TEXT, mime_type TEXT,
+            file_hash TEXT, file_size_bytes INTEGER, uploaded_by TEXT
+        );
+        CREATE TABLE investments (id TEXT, name TEXT, category TEXT);
+    """)
+    ago = "datetime('now', (-?) || ' seconds')"
+    for job_id, priority, created_ago, scheduled_ago, status in jobs:
+        db.execute(
+            f"INSERT INTO processing_jobs VALUES (?, 'analysis', ?, NULL, ?, '{{}}', 0, 3, ?, {ago}, "
+            f"CASE WHEN ? IS NULL THEN NULL ELSE {ago} END)",
+            (job_id, job_id, priority, status, created_ago, scheduled_ago, scheduled_ago),
+        )
+        db.execute("INSERT INTO file_registry (id) VALUES (?)", (job_id,))
+    params = {"aging_seconds": 60, "max_boost": 5, "max_running": kwargs.get("max_running", 0)}
+    rows = db.execute(_sqlite_claim_query(**kwargs), params).fetchall()
+    return [row[0] for row in rows]
+
+
+class TestBuildClaimQuery:
+    """Test cases for the claim query builder."""
+
+    def test_orders_by_aged_priority(self):
+        query = build_claim_query(share_key="none", max_running=0)
+        assert "ORDER BY effective_priority ASC, pj.created_at ASC" in query
+        assert "%(aging_seconds)s" in query
+        assert "%(max_boost)s" in query
+
+    def test_respects_backoff_schedule(self):
+        query = build_claim_query(share_key="none", max_running=0)
+        assert "pj.scheduled_at <= NOW()" in query
+
+    def test_locks_only_job_rows(self):
+        # LEFT JOIN investments would make a plain FOR UPDATE fail on NULLs
+        query = build_claim_query(share_key="investment", max_running=2)
+        assert "FOR UPDATE OF pj SKIP LOCKED" in query
+
+    def test_fair_share_by_investment(self):
+        query = build_claim_query(share_key="investment", max_running=2)
+        assert "WITH running AS" in query
+        assert "COALESCE(pj.investment_id::text, pj.file_id::text)" in query
+        assert "COALESCE(r.running_count, 0) < %(max_running)s" in query
+
+    def test_fair_share_by_uploader(self):
+        query = build_claim_query(share_key="uploader", max_running=1)
+        assert "fr.uploaded_by" in query
+
+    def test_fair_share_disabled(self):
+        assert "running_count" not in build_claim_query(share_key="none", max_running=5)
+        assert "running_count" not in build_claim_query(share_key="investment", max_running=0)
+
+
+class TestClaimOrder:
+    """Claim order evaluated on fixture rows."""
+
+    def test_old_low_priority_overtakes_fresh_high_priority(self):
+        order = _claim_order([
+            ("fresh-urgent", 1, 0, None, "queued"),
+            ("old-background", 5, 600, None, "queued"),  # Fully aged: 5 - 5 = 0
+        ], share_key="none")
+        assert order == ["old-background", "fresh-urgent"]
+
+    def test_retry_backoff_does_not_count_as_waiting(self):
+        order = _claim_order([
+            ("retried", 5, 600, 1, "queued"),  # Created long ago, backoff just expired
+            ("waiting", 5, 120, None, "queued"),
+        ], share_key="none")
+        assert order == ["waiting", "retried"]
+
+    def test_future_and_running_jobs_are_skipped(self):
+        order = _claim_order([
+            ("backing-off", 1, 600, -30, "queued"),
+            ("running", 1, 600, None, "running"),
+            ("ready", 5, 0, None, "queued"),
+        ], share_key="none")
+        assert order == ["ready"]
@@ -0,0 +1,107 @@
+"""
+===============================================================================
+UNIT TESTS - Local Extraction Tier
+===============================================================================
+"""
+import pytest
+
+from local_extraction import find_dates, find_total, parse_amount, run_local_tier
+
+
+RECEIPT = """SUPERMERCADO CENTRAL LTDA
+CNPJ 12.345.678/0001-90
+Data: 14/03/2024 10:22
+Arroz 5kg            R$ 27,90
+Feijão 1kg           R$ 8,49
+Subtotal             R$ 36,39
+Desconto             R$ 1,00
+TOTAL A PAGAR        R$ 35,39
+"""
+
+
+@pytest.fixture
+def write(tmp_path):
+    def _write(name, content):
+        path = tmp_path / name
+        path.write_text(content, encoding="utf-8")
+        return str(path)
+    return _write
+
+
+class TestParsers:
+    """Test cases for regex helpers."""
+
+    @pytest.mark.parametrize("raw,expected", [
+        ("1.234,56", 1234.56),
+        ("1,234.56", 1234.56),
+        ("12.345", 12345.0),
+        ("35,39", 35.39),
+        ("100", 100.0),
+        ("1.250.000", 1250000.0),
+    ])
+    def test_parse_amount(self, raw, expected):
+        assert parse_amount(raw) == expected
+
+    def test_find_total_prefers_last_total(self):
+        total = find_total(RECEIPT)
+        assert total["amount"] == 35.39
+        assert total["currency"] == "BRL"
+
+    def test_find_dates(self):
+        assert find_dates("Vence 05/04/2024, emitido 2024-03-01 e 3 de março de 2024") == [
+            "05/04/2024", "2024-03-01", "3 de março de 2024",
+        ]
+
+
+class TestLocalTier:
+    """Test cases for tier selection."""
+
+    def test_receipt_served_locally(self, write):
+        outcome = run_local_tier(write("recibo.txt", RECEIPT), "text/plain", "receipt_extraction")
+
+        assert outcome.accepted
+        result = outcome.result
+        assert result.quality_flags == ["tier:local"]
+        assert result.provider == "local"
+        assert result.tokens_used == 0
+        assert result.structured_data["json_data"]["total"]["amount"] == 35.39
+        assert "14/03/2024" in result.structured_data["dates_found"]
+
+    def test_receipt_without_total_escalates(self, write):
+        outcome = run_local_tier(
+            write("nota.txt", "Some handwritten note without any amounts at all."),
+            "text/plain", "receipt_extraction",
+        )
+        assert not outcome.accepted
+        assert "no_total" in outcome.reasons
+
+    def test_csv_served_locally(self, write):
+        path = write("extrato.csv", "date;description;amount\n2024-01-02;Dividend;120.50\n2024-02-02;Dividend;121.00\n")
+        outcome = run_local_tier(path, "text/csv", "document_analysis")
+
+        assert outcome.accepted
+        data = outcome.result.structured_data["json_data"]
+        assert data["columns"] == ["date", "description", "amount"]
+        assert data["row_count"] == 2
+
+    def test_document_analysis_needs_model(self, write):
+        outcome = run_local_tier(write("memo.txt", "A long memo about the land purchase " * 5), "text/plain", "document_analysis")
+        assert not outcome.accepted
+        assert "needs_model:document_analysis" in outcome.reasons
+
+    def test_pdf_text_layer_for_ocr(self, tmp_path):
+        outcome = run_local_tier(str(tmp_path / "scan.pdf"), "application/pdf", "ocr", pages=["Matrícula 1234 " * 10] * 3)
+        assert outcome.accepted
+        assert outcome.pages is not None
+
+    def test_scanned_pdf_escalates(self, tmp_path):
+        outcome = run_local_tier(str(tmp_path / "scan.pdf"), "application/pdf", "ocr", pages=["", ""])
+        assert not outcome.accepted
+        assert "no_text_layer" in outcome.reasons
+
+    def test_images_escalate(self, tmp_path):
+        path = tmp_path / "photo.jpg"
+        path.write_bytes(b"\xff\xd8\xff")
+        outcome = run_local_tier(str(path), "image/jpeg", "receipt_extraction")
+        assert outcome.result is None
+        assert "binary_file" in outcome.reasons
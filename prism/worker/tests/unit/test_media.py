@@ -0,0 +1,142 @@
+"""
+===============================================================================
+UNIT TESTS - Media Sampling
+===============================================================================
+"""
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageDraw
+
+import media
+from ai_client import AnalysisResult
+from media import (
+    MEDIA_MAX_CANDIDATE_FRAMES,
+    Frame,
+    MediaUnsupportedError,
+    contact_sheet,
+    dedupe_frames,
+    sample_interval,
+    seek_times,
+    select_evenly,
+)
+
+
+def _frame(tmp_path, name, t, stripes):
+    """Synthetic frame: `stripes` vertical bars make distinct dHashes."""
+    image = Image.new("RGB", (320, 180), "white")
+    draw = ImageDraw.Draw(image)
+    for i in range(stripes):
+        draw.rectangle((i * 320 // stripes, 0, i * 320 // stripes + 320 // (2 * stripes), 180), fill="black")
+    path = str(tmp_path / name)
+    image.save(path)
+    return Frame(path, t)
+
+
+class FakeClient:
+    provider_name = "openai"
+    model = "gpt-4o"
+    supports_transcription = True
+
+    def __init__(self):
+        self.documents, self.texts = [], []
+
+    def _result(self, raw_text):
+        return AnalysisResult(raw_text=raw_text, structured_data={}, tokens_used=10,
+                              model=self.model, analysis_type="land_analysis", provider=self.provider_name)
+
+    def analyze_document(self, file_path, analysis_type="document_analysis", prompt=None):
+        with Image.open(file_path) as sheet:
+            self.documents.append(sheet.size)
+        return self._result("sheet")
+
+    def analyze_text(self, text, analysis_type="document_analysis", prompt=None):
+        self.texts.append(text)
+        return self._result("transcript")
+
+    def transcribe_audio(self, file_path):
+        return f"words from {file_path.rsplit('/', 1)[-1]}"
+
+
+class TestSampling:
+    """Test cases for bounded frame sampling."""
+
+    @pytest.mark.parametrize("duration", [10, 300, 3600, 36000])
+    def test_candidates_bounded_at_any_length(self, duration):
+        assert len(seek_times(duration)) <= MEDIA_MAX_CANDIDATE_FRAMES
+        # Interval frames plus scene cuts half an interval apart
+        assert 2 * duration / sample_interval(duration) <= MEDIA_MAX_CANDIDATE_FRAMES
+
+    def test_seek_times_cover_the_video(self):
+        times = seek_times(3600)
+        assert times[0] > 0 and times[-1] < 3600
+        assert times == sorted(times)
+
+    def test_select_evenly_keeps_ends(self):
+        assert select_evenly(list(range(10)), 4) == [0, 3, 6, 9]
+        assert select_evenly([1, 2], 8) == [1, 2]
+
+    def test_dedupe_drops_repeats(self, tmp_path):
+        frames = [
+            _frame(tmp_path, "a.jpg", 0, 2),
+            _frame(tmp_path, "b.jpg", 5, 2),  # Same view
+            _frame(tmp_path, "c.jpg", 10, 7),
+            _frame(tmp_path, "d.jpg", 15, 2),  # Back to the first view
+        ]
+        assert [f.time for f in dedupe_frames(frames)] == [0, 10]
+
+    def test_contact_sheet(self, tmp_path):
+        frames = [_frame(tmp_path, f"{i}.jpg", i * 65, i + 1) for i in range(5)]
+        out = contact_sheet(frames, str(tmp_path / "sheet.jpg"), width=900)
+        with Image.open(out) as sheet:
+            assert sheet.size == (900, 2 * round(180 * 300 / 320))
+
+
+class TestAnalyzeMedia:
+    """Test cases for the video and audio paths."""
+
+    def test_video_sends_one_sheet(self, tmp_path, monkeypatch):
+        frames = [_frame(tmp_path, f"{i}.jpg", i * 5.0, 1 + i % 3 * 3) for i in range(12)]
+        monkeypatch.setattr(media, "probe_duration", lambda path: 60.0)
+        monkeypatch.setattr(media, "extract_frames", lambda path, out_dir, duration: frames)
+        client = FakeClient()
+
+        result = media.analyze_media(client, "walkthrough.mp4", "video/mp4", "land_analysis")
+        assert len(client.documents) == 1
+        assert result.structured_data["media"]["candidate_frames"] == 12
+        assert result.structured_data["media"]["frame_times"] == [0.0, 5.0, 10.0]
+        assert "media:video" in result.quality_flags
+
+    def test_audio_transcribes_chunks_in_order(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(media, "probe_duration", lambda path: 7200.0)
+        monkeypatch.setattr(media, "split_audio", lambda path, out_dir: ["/t/chunk_000.mp3", "/t/chunk_001.mp3"])
+        client = FakeClient()
+
+        result = media.analyze_media(client, "call.m4a", "audio/mp4")
+        assert client.texts == ["words from chunk_000.mp3\nwords from chunk_001.mp3"]
+        assert result.structured_data["media"]["truncated"] is True
+        assert "media_truncated" in result.quality_flags
+
+    def test_audio_needs_transcription(self, monkeypatch):
+        monkeypatch.setattr(media, "probe_duration", lambda path: 30.0)
+        monkeypatch.setattr(media, "split_audio", lambda path, out_dir: ["/t/chunk_000.mp3"])
+        client = SimpleNamespace(provider_name="anthropic", supports_transcription=False)
+        with pytest.raises(MediaUnsupportedError):
+            media.analyze_media(client, "call.mp3", "audio/mpeg")
+
+    def test_transcription_is_opt_in_per_endpoint(self, monkeypatch):
+        import ai_client
+        from ai_client import OpenAICompatibleClient
+        from main import classify_error
+
+        client = OpenAICompatibleClient.__new__(OpenAICompatibleClient)
+        client.api_url = "https://api.openai.com/v1"
+        assert client.supports_transcription
+        client.api_url = "https://api.moonshot.ai/v1"
+        assert not client.supports_transcription
+        with pytest.raises(MediaUnsupportedError) as excinfo:
+            client.transcribe_audio("chunk.mp3")
+        assert classify_error(excinfo.value) == "permanent"
+
+        monkeypatch.setattr(ai_client, "AI_TRANSCRIPTION_ENABLED", "true")  # e.g. self-hosted Whisper
+        assert client.supports_transcription
@@ -0,0 +1,96 @@
+"""
+===============================================================================
+UNIT TESTS - Model Tiers
+===============================================================================
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from model_tiers import FAST, LARGE, STANDARD, ModelTiers, choose_tier, parse_model_spec
+from provider_router import ProviderRouter
+
+
+def _client(provider="openai", model="gpt-4o"):
+    return SimpleNamespace(provider_name=provider, model=model, file_cache="files", rate_limiter="limiter")
+
+
+class TestPolicy:
+    """Test cases for the routing policy."""
+
+    @pytest.mark.parametrize("analysis_type,mime_type,pages,tokens,tier", [
+        ("receipt_extraction", "image/jpeg", None, None, FAST),
+        ("ocr", "application/pdf", 1, None, FAST),
+        ("ocr", "application/pdf", 8, None, STANDARD),
+        ("ocr", "application/pdf", 60, None, LARGE),
+        ("contract_extraction", "image/png", None, None, LARGE),
+        ("land_analysis", "application/pdf", 1, None, LARGE),
+        ("document_analysis", "application/pdf", 5, 40000, LARGE),
+        ("document_analysis", "image/jpeg", None, None, STANDARD),
+    ])
+    def test_choose_tier(self, analysis_type, mime_type, pages, tokens, tier):
+        assert choose_tier(analysis_type, mime_type, pages, tokens).tier == tier
+
+    def test_unknown_page_count_is_not_fast(self):
+        assert choose_tier("receipt_extraction", "application/pdf").tier == STANDARD
+
+    def test_parse_model_spec(self):
+        assert parse_model_spec("anthropic:claude-3-5-haiku-20241022") == ("anthropic", "claude-3-5-haiku-20241022")
+        assert parse_model_spec("gpt-4o-mini") == (None, "gpt-4o-mini")
+        assert parse_model_spec("llama3:8b") == (None, "llama3:8b")
+
+
+class TestModelTiers:
+    """Test cases for per-tier clients."""
+
+    def test_unconfigured_tiers_use_default(self):
+        default = _client()
+        tiers = ModelTiers(default, specs={})
+        assert tiers.client_for(FAST) is default
+        assert tiers.clients() == [default]
+
+    def test_configured_tier_shares_caches(self):
+        built = []
+
+        def factory(provider, model):
+            client = SimpleNamespace(provider_name=provider or "openai", model=model,
+                                     file_cache=None, rate_limiter=None)
+            built.append(client)
+            return client
+
+        tiers = ModelTiers(_client(), specs={FAST: "gpt-4o-mini", LARGE: "anthropic:claude-3-5-sonnet"},
+                           factory=factory)
+        fast = tiers.client_for(FAST)
+        assert fast.model == "gpt-4o-mini"
+        assert fast.file_cache == "files" and fast.rate_limiter == "limiter"
+        assert tiers.client_for(FAST) is fast
+        assert [(c.provider_name, c.model) for c in tiers.clients()] == [
+            ("openai", "gpt-4o"), ("openai", "gpt-4o-mini"), ("anthropic", "claude-3-5-sonnet"),
+        ]
+        assert len(built) == 2
+
+    def test_unavailable_tier_falls_back(self):
+        def factory(provider, model):
+            raise ValueError("API key required")
+
+        default = _client()
+        assert ModelTiers(default, specs={LARGE: "anthropic:claude"}, factory=factory).client_for(LARGE) is default
+
+    def test_tier_of_router_keeps_failover(self):
+        def factory(provider, model):
+            return _client(provider, model)
+
+        kimi, anthropic = _client("kimi", "moonshot-v1-32k"), _client("anthropic", "claude-3-5-sonnet")
+        default = ProviderRouter({"kimi": kimi, "anthropic": anthropic}, hedge=True, hedge_min_delay=0.5)
+        specs = {FAST: "moonshot-v1-8k", LARGE: "openai:gpt-4o,anthropic:claude-3-opus"}
+        tiers = ModelTiers(default, specs=specs, factory=factory)
+
+        fast = tiers.client_for(FAST)
+        assert isinstance(fast, ProviderRouter) and fast.hedge and fast.hedge_min_delay == 0.5
+        assert fast.order == ["kimi", "anthropic"] and set(fast.breakers) == {"kimi", "anthropic"}
+        assert fast.clients["kimi"].model == "moonshot-v1-8k"
+        assert fast.clients["anthropic"] is anthropic
+
+        large = tiers.client_for(LARGE)
+        assert large.order == ["openai", "anthropic", "kimi"]
+        assert [c.model for c in large.clients.values()] == ["gpt-4o", "claude-3-opus", "moonshot-v1-32k"]
@@ -0,0 +1,159 @@
+"""
+===============================================================================
+UNIT TESTS - PDF Map-Reduce Pipeline
+===============================================================================
+"""
+import threading
+
+import pytest
+
+from ai_client import AnalysisResult, BaseAIClient
+from pdf_pipeline import analyze_pdf_chunked, chunk_pages, merge_structured
+
+
+class StubClient(BaseAIClient):
+    """Records analyze_text calls; fails chunks whose text contains a marker."""
+
+    provider_name = "stub"
+
+    def __init__(self, fail_marker=None):
+        super().__init__(model="stub-1")
+        self.calls = []
+        self.fail_marker = fail_marker
+        self._lock = threading.Lock()
+
+    def _default_model(self):
+        return "stub-1"
+
+    def analyze_document(self, file_path, analysis_type="document_analysis", prompt=None):
+        raise AssertionError("map-reduce should not call analyze_document")
+
+    def analyze_text(self, text, analysis_type="document_analysis", prompt=None):
+        with self._lock:
+            self.calls.append(text)
+        if self.fail_marker and self.fail_marker in text:
+            raise TimeoutError("chunk timed out")
+        first_page = text.split("--- Page ", 1)[1].split(" ", 1)[0]
+        return AnalysisResult(
+            raw_text=f"chunk starting at page {first_page}",
+            structured_data={
+                "entities": {"parties": [f"Party {first_page}", "Common Bank"]},
+                "dates_found": [f"0{first_page}/01/2024", "01/01/2020"],
+                "amounts_found": ["1.000"],
+            },
+            tokens_used=100,
+            model=self.model,
+            analysis_type=analysis_type,
+            provider=self.provider_name,
+        )
+
+    def summarize_document(self, text, max_length=500):
+        return text[:max_length]
+
+
+class DictCache:
+    """Minimal Redis stand-in (get/setex)."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+def make_pages(n, chars=400):
+    return [f"Page body {i} " + "x" * chars for i in range(1, n + 1)]
+
+
+class TestChunkPages:
+    """Test cases for page chunking."""
+
+    def test_respects_token_budget(self):
+        chunks = chunk_pages(make_pages(10, chars=4000), token_budget=2500, max_pages=50)
+        assert [(c.start_page, c.end_page) for c in chunks] == [(1, 2), (3, 4), (5, 6), (7, 8), (9, 10)]
+
+    def test_respects_max_pages(self):
+        chunks = chunk_pages(make_pages(7), token_budget=10 ** 6, max_pages=3)
+        assert [(c.start_page, c.end_page) for c in chunks] == [(1, 3), (4, 6), (7, 7)]
+
+    def test_oversized_page_is_own_chunk(self):
+        pages = ["short", "y" * 100000, "short"]
+        chunks = chunk_pages(pages, token_budget=1000, max_pages=10)
+        assert [(c.start_page, c.end_page) for c in chunks] == [(1, 1), (2, 2), (3, 3)]
+
+
+class TestMergeStructured:
+    """Test cases for the reduce step."""
+
+    def test_merges_in_order_without_duplicates(self):
+        merged = merge_structured([
+            {"entities": {"parties": ["A", "B"]}, "dates_found": ["d1"], "amounts_found": ["1"], "key_values": {"Price": "10"}},
+            {"json_data": {"entities": {"parties": ["B", "C"], "lots": "12"}}, "dates_found": ["d2", "d1"], "key_values": {"Price": "99"}},
+        ])
+        assert merged["entities"] == {"parties": ["A", "B", "C"], "lots": ["12"]}
+        assert merged["dates_found"] == ["d1", "d2"]
+        assert merged["amounts_found"] == ["1"]
+        assert merged["key_values"] == {"Price": "10"}
+
+
+class TestAnalyzePdfChunked:
+    """Test cases for the map-reduce driver."""
+
+    def test_short_pdf_is_not_chunked(self):
+        assert analyze_pdf_chunked(StubClient(), "unused.pdf", pages=make_pages(2)) is None
+
+    def test_scanned_pdf_is_not_chunked(self):
+        assert analyze_pdf_chunked(StubClient(), "unused.pdf", pages=[""] * 20) is None
+
+    def test_map_reduce(self, monkeypatch):
+        import pdf_pipeline
+        monkeypatch.setattr(pdf_pipeline, "PDF_CHUNK_MAX_PAGES", 5)
+        client = StubClient()
+
+        result = analyze_pdf_chunked(client, "unused.pdf", pages=make_pages(20))
+
+        assert len(client.calls) == 4
+        assert result.tokens_used == 400
+        assert result.structured_data["entities"]["parties"] == [
+            "Party 1", "Common Bank", "Party 6", "Party 11", "Party 16",
+        ]
+        assert result.structured_data["dates_found"][:2] == ["01/01/2024", "01/01/2020"]
+        assert [c["pages"] for c in result.structured_data["chunks"]] == [
+            "pages 1-5", "pages 6-10", "pages 11-15", "pages 16-20",
+        ]
+
+    def test_retry_only_reruns_failed_chunks(self, monkeypatch):
+        import pdf_pipeline
+        monkeypatch.setattr(pdf_pipeline, "PDF_CHUNK_MAX_PAGES", 5)
+        pages = make_pages(20)
+        cache = DictCache()
+
+        failing = StubClient(fail_marker="Page body 12 ")
+        with pytest.raises(TimeoutError):
+            analyze_pdf_chunked(failing, "unused.pdf", cache=cache, pages=pages)
+        assert len(cache.data) == 3
+
+        retry = StubClient()
+        result = analyze_pdf_chunked(retry, "unused.pdf", cache=cache, pages=pages)
+        assert len(retry.calls) == 1
+        assert "Page body 12 " in retry.calls[0]
+        assert [c["cached"] for c in result.structured_data["chunks"]] == [True, True, False, True]
+
+    def test_reports_provider_that_answered(self, monkeypatch):
+        import pdf_pipeline
+        monkeypatch.setattr(pdf_pipeline, "PDF_CHUNK_MAX_PAGES", 5)
+
+        class FailoverClient(StubClient):
+            """Primary is "stub"; answers come from the backup, as after a router failover."""
+
+            def analyze_text(self, text, analysis_type="document_analysis", prompt=None):
+                result = super().analyze_text(text, analysis_type, prompt)
+                result.provider, result.model = "backup", "backup-1"
+                return result
+
+        result = analyze_pdf_chunked(FailoverClient(), "unused.pdf", pages=make_pages(20))
+        assert (result.provider, result.model) == ("backup", "backup-1")
+        assert {c["provider"] for c in result.structured_data["chunks"]} == {"backup"}
@@ -0,0 +1,112 @@
+"""
+===============================================================================
+UNIT TESTS - PDF Parser Pool
+===============================================================================
+"""
+import os
+import time
+
+import pytest
+
+from pdf_pool import PdfParseError, PdfParsePool, PdfParseTimeoutError
+from streaming import sha256_file
+
+
+# Parsers run in the pool's child processes, so they live at module level
+def _pid_parser(file_path):
+    return [str(os.getpid()), open(file_path).read()]
+
+
+def _slow_parser(file_path):
+    if "slow" in file_path:
+        time.sleep(30)
+    return [file_path]
+
+
+def _greedy_parser(file_path):
+    return ["x" * (512 * 1024 * 1024)]
+
+
+def _broken_parser(file_path):
+    raise ValueError("EOF marker not found")
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(parser, **kwargs):
+        pool = PdfParsePool(parser=parser, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def _file(tmp_path, name, text="page"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+class TestPdfParsePool:
+    """Test cases for isolation, limits and caching."""
+
+    def test_parses_in_a_child_process(self, tmp_path, make_pool):
+        pool = make_pool(_pid_parser, workers=1)
+        pid, text = pool.extract_pages(_file(tmp_path, "a.pdf", "Escritura"))
+        assert int(pid) != os.getpid()
+        assert text == "Escritura"
+
+    def test_children_recycled_after_max_tasks(self, tmp_path, make_pool):
+        pool = make_pool(_pid_parser, workers=1, max_tasks_per_child=2)
+        pids = [pool.extract_pages(_file(tmp_path, f"{i}.pdf", str(i)))[0] for i in range(3)]
+        assert pids[0] == pids[1] != pids[2]
+
+    def test_timeout_kills_only_the_stuck_parse(self, tmp_path, make_pool):
+        pool = make_pool(_slow_parser, workers=1, timeout_seconds=1)
+        start = time.monotonic()
+        with pytest.raises(PdfParseTimeoutError):
+            pool.extract_pages(_file(tmp_path, "slow.pdf", "1"))
+        assert time.monotonic() - start < 10
+        # The replacement child serves the next file
+        fast = _file(tmp_path, "fast.pdf", "2")
+        assert pool.extract_pages(fast) == [fast]
+
+    def test_dead_idle_child_is_replaced(self, tmp_path, make_pool):
+        pool = make_pool(_pid_parser, workers=1)
+        first, _ = pool.extract_pages(_file(tmp_path, "a.pdf", "1"))
+        child = pool._idle.queue[0]
+        child.process.kill()
+        child.process.join(timeout=5)
+        child.conn.close()  # send() now raises OSError, as on a broken pipe
+        second, text = pool.extract_pages(_file(tmp_path, "b.pdf", "2"))
+        assert second != first and text == "2"
+        assert pool._started == 1
+
+    def test_memory_limit(self, tmp_path, make_pool):
+        pool = make_pool(_greedy_parser, workers=1, max_memory_mb=256)
+        with pytest.raises(PdfParseError, match="MemoryError"):
+            pool.extract_pages(_file(tmp_path, "huge.pdf"))
+
+    def test_results_and_failures_cached_by_hash(self, tmp_path, make_pool):
+        pool = make_pool(_broken_parser, workers=1)
+        path = _file(tmp_path, "bad.pdf")
+        with pytest.raises(PdfParseError, match="EOF marker"):
+            pool.extract_pages(path)
+        pool.parser = None  # A cache miss would now fail differently
+        with pytest.raises(PdfParseError, match="EOF marker"):
+            pool.extract_pages(path)
+
+        pool._cache_set("abc", {"pages": ["cached"]}, 60)
+        assert pool.extract_pages(path, file_hash="abc") == ["cached"]
+
+    def test_timeouts_cached_briefly(self, tmp_path, make_pool, monkeypatch):
+        monkeypatch.setattr("pdf_pool.PDF_PARSE_TIMEOUT_TTL_SECONDS", 0)
+        pool = make_pool(_slow_parser, workers=1, timeout_seconds=1)
+        path = _file(tmp_path, "slow.pdf")
+        with pytest.raises(PdfParseTimeoutError):
+            pool.extract_pages(path)
+        assert pool._cache_get(sha256_file(path)) is None  # Expired: retried next time
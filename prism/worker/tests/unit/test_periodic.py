@@ -0,0 +1,194 @@
+"""
+===============================================================================
+UNIT TESTS - Periodic Scheduler
+===============================================================================
+"""
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from prometheus_client import REGISTRY
+
+from periodic import PeriodicScheduler, PeriodicTask, clean_temp_dir, gc_orphaned_objects, lock_id
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRunLog:
+    """Shared by several schedulers, like the database is shared by nodes."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.locked = set()
+        self.started = {}
+        self.finished = {}
+
+    @contextmanager
+    def lease(self, name):
+        if name in self.locked:
+            yield None
+            return
+        self.locked.add(name)
+        try:
+            yield FakeLease(self, name)
+        finally:
+            self.locked.discard(name)
+
+
+class FakeLease:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    def seconds_since_start(self):
+        started = self.log.started.get(self.name)
+        return None if started is None else self.log.clock() - started
+
+    def start(self):
+        self.log.started[self.name] = self.log.clock()
+
+    def finish(self, status, duration_seconds, error=None):
+        self.log.finished[self.name] = (status, error)
+
+
+def _scheduler(tasks, run_log, clock):
+    return PeriodicScheduler(tasks, run_log, tick_seconds=0, clock=clock)
+
+
+class TestScheduler:
+    """Test cases for leader election and catch-up."""
+
+    def test_one_node_runs_each_interval(self):
+        clock = FakeClock()
+        log = FakeRunLog(clock)
+        calls = []
+        nodes = [_scheduler([PeriodicTask("reap", 60, lambda: calls.append(1), jitter_ratio=0)], log, clock)
+                 for _ in range(3)]
+
+        for _ in range(3):
+            for node in nodes:
+                node.run_pending()
+        assert len(calls) == 1
+
+        clock.now += 61
+        for node in nodes:
+            node.run_pending()
+        assert len(calls) == 2
+
+    def test_skips_while_another_node_holds_the_lock(self):
+        clock = FakeClock()
+        log = FakeRunLog(clock)
+        log.locked.add("reap")
+        calls = []
+        node = _scheduler([PeriodicTask("reap", 60, lambda: calls.append(1))], log, clock)
+        assert node.run_pending() == {}
+        assert calls == []
+
+    def test_missed_runs_collapse_into_one(self):
+        clock = FakeClock()
+        log = FakeRunLog(clock)
+        log.started["gc"] = clock.now - 10 * 60  # All workers were down for ten intervals
+        calls = []
+        node = _scheduler([PeriodicTask("gc", 60, lambda: calls.append(1), jitter_ratio=0)], log, clock)
+        before = REGISTRY.get_sample_value("worker_periodic_task_missed_total", {"task": "gc"}) or 0
+
+        node.run_pending()
+        node.run_pending()
+        assert calls == [1]
+        assert REGISTRY.get_sample_value("worker_periodic_task_missed_total", {"task": "gc"}) == before + 9
+
+    def test_failure_is_logged_and_rescheduled(self):
+        clock = FakeClock()
+        log = FakeRunLog(clock)
+
+        def broken():
+            raise RuntimeError("bucket unreachable")
+
+        node = _scheduler([PeriodicTask("gc", 60, broken, jitter_ratio=0)], log, clock)
+        assert node.run_pending() == {"gc": "failure"}
+        assert log.finished["gc"] == ("failure", "RuntimeError: bucket unreachable")
+        assert node.run_pending() == {}
+        clock.now += 60
+        assert node.run_pending() == {"gc": "failure"}
+
+    def test_node_tasks_run_everywhere_without_the_lock(self):
+        clock = FakeClock()
+        calls = []
+        task = PeriodicTask("clean_temp_dir", 60, lambda: calls.append(1), cluster=False)
+        nodes = [_scheduler([task], None, clock) for _ in range(2)]
+        for node in nodes:
+            node.run_pending()
+        assert len(calls) == 2
+
+    def test_lock_id_is_stable_int4(self):
+        assert lock_id("reap_stale_jobs") == lock_id("reap_stale_jobs")
+        assert all(-2**31 <= lock_id(name) < 2**31 for name in ("a", "gc_orphaned_objects", "x" * 100))
+
+
+class TestBuiltInTasks:
+    """Test cases for the maintenance tasks."""
+
+    def test_clean_temp_dir_only_touches_worker_files(self, tmp_path):
+        old = time.time() - 7 * 3600
+        download = tmp_path / "0b9f1a52-3c3e-4f51-9d0c-6a0e2f1b7c11_deed.pdf"
+        fresh = tmp_path / "1c9f1a52-3c3e-4f51-9d0c-6a0e2f1b7c11_photo.jpg"
+        media_dir = tmp_path / "media_abc123"
+        foreign = tmp_path / "someone-elses.log"
+        for path in (download, fresh, foreign):
+            path.write_text("x")
+        media_dir.mkdir()
+        (media_dir / "frame_0001.jpg").write_text("x")
+        for path in (download, media_dir, foreign):
+            os.utime(path, (old, old))
+
+        assert clean_temp_dir(str(tmp_path), max_age_seconds=6 * 3600) == 2
+        assert sorted(p.name for p in tmp_path.iterdir()) == [fresh.name, foreign.name]
+
+    def test_gc_orphaned_objects(self):
+        now = datetime.now(timezone.utc)
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params):
+                self.keys = params[1]
+
+            def fetchall(self):
+                return [{"storage_key": key} for key in self.keys if key.endswith("known.pdf")]
+
+        class Conn:
+            def cursor(self):
+                return Cursor()
+
+            def close(self):
+                pass
+
+        class Storage:
+            bucket = "investments"
+            deleted = []
+
+            def iter_objects(self, prefix):
+                yield "uploads/a-known.pdf", now - timedelta(days=30)
+                yield "uploads/b-orphan.pdf", now - timedelta(days=30)
+                yield "uploads/c-uploading.pdf", now  # Inside the grace period
+
+            def delete_objects(self, keys):
+                self.deleted.extend(keys)
+                return len(keys)
+
+        storage = Storage()
+        assert gc_orphaned_objects(Conn, storage, dry_run=True, batch_size=1) == ["uploads/b-orphan.pdf"]
+        assert storage.deleted == []
+        gc_orphaned_objects(Conn, storage, dry_run=False)
+        assert storage.deleted == ["uploads/b-orphan.pdf"]
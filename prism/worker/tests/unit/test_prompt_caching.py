@@ -0,0 +1,122 @@
+"""
+===============================================================================
+UNIT TESTS - Prompt Prefix Caching
+===============================================================================
+"""
+from types import SimpleNamespace
+
+from ai_client import (
+    ANALYST_SYSTEM_PROMPT,
+    AnthropicClient,
+    BaseAIClient,
+    GoogleClient,
+    OpenAICompatibleClient,
+    anthropic_usage,
+    openai_usage,
+)
+
+
+class RecordingCreate:
+    """Stub SDK create() that keeps every request and returns a fixed response."""
+
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def __call__(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.response
+
+
+def _openai(usage):
+    create = RecordingCreate(SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content='{"summary": "ok"}'))],
+        usage=usage,
+    ))
+    client = OpenAICompatibleClient(api_key="test", api_url="https://api.openai.com/v1", model="gpt-4o")
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return client, create
+
+
+def _anthropic(usage):
+    # The anthropic SDK is optional; only the base client state is needed
+    client = AnthropicClient.__new__(AnthropicClient)
+    BaseAIClient.__init__(client, model="claude-3-5-sonnet")
+    create = RecordingCreate(SimpleNamespace(content=[SimpleNamespace(text='{"summary": "ok"}')], usage=usage))
+    client.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    return client, create
+
+
+class TestOpenAILayout:
+    """Test cases for OpenAI-compatible request layout."""
+
+    def test_static_prefix_first_and_stable(self, tmp_path):
+        client, create = _openai(None)
+        client.analyze_text("Lote 12, Ciudad de Panamá", "land_analysis")
+        path = tmp_path / "deed.txt"
+        path.write_text("Escritura pública 4521")
+        client.analyze_document(str(path), "land_analysis")
+
+        first, second = (r["messages"] for r in create.requests)
+        assert first[0] == second[0]
+        assert first[0]["role"] == "system"
+        assert first[0]["content"].startswith(ANALYST_SYSTEM_PROMPT)
+        # Nothing static is left in the per-document message
+        assert first[1]["content"] == "Document content:\nLote 12, Ciudad de Panamá"
+        assert second[1]["content"] == [{"type": "text", "text": "Document content:\nEscritura pública 4521"}]
+
+    def test_cached_tokens_reported(self):
+        usage = SimpleNamespace(total_tokens=1500, prompt_tokens=1200,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+        client, _ = _openai(usage)
+        result = client.analyze_text("text")
+        assert (result.tokens_used, result.input_tokens, result.cached_input_tokens) == (1500, 1200, 1024)
+        assert result.to_dict()["cached_input_tokens"] == 1024
+
+    def test_moonshot_top_level_cached_tokens(self):
+        usage = {"total_tokens": 900, "prompt_tokens": 800, "cached_tokens": 600}
+        assert openai_usage(usage) == (900, 800, 600)
+
+
+class TestAnthropicLayout:
+    """Test cases for Anthropic cache breakpoints."""
+
+    def test_system_prefix_is_a_cache_breakpoint(self):
+        client, create = _anthropic(None)
+        client.analyze_text("first deed", "contract_extraction")
+        client.analyze_text("second deed", "contract_extraction")
+
+        first, second = create.requests
+        assert first["system"] == second["system"]
+        assert first["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert first["messages"][0]["content"] == [{"type": "text", "text": "Document content:\nfirst deed"}]
+
+    def test_cache_reads_count_as_input(self):
+        usage = SimpleNamespace(input_tokens=50, output_tokens=200,
+                                cache_read_input_tokens=1100, cache_creation_input_tokens=0)
+        client, _ = _anthropic(usage)
+        result = client.analyze_text("text")
+        assert (result.tokens_used, result.input_tokens, result.cached_input_tokens) == (1350, 1150, 1100)
+
+    def test_usage_without_cache_fields(self):
+        assert anthropic_usage({"input_tokens": 300, "output_tokens": 200}) == (500, 300, 0)
+
+
+class TestGeminiLayout:
+    """Test cases for Gemini prompt order and usage."""
+
+    def test_static_prefix_first_and_cached_tokens(self):
+        client = GoogleClient.__new__(GoogleClient)
+        BaseAIClient.__init__(client, model="gemini-1.5-flash")
+        requests = []
+        usage = SimpleNamespace(prompt_token_count=1400, cached_content_token_count=1024, total_token_count=1600)
+
+        def generate_content(content):
+            requests.append(content)
+            return SimpleNamespace(text='{"summary": "ok"}', usage_metadata=usage)
+
+        client._model_instance = SimpleNamespace(generate_content=generate_content)
+        result = client.analyze_text("first deed", "contract_extraction")
+        assert requests[0].startswith(ANALYST_SYSTEM_PROMPT)
+        assert requests[0].endswith("Document content:\nfirst deed")
+        assert (result.tokens_used, result.input_tokens, result.cached_input_tokens) == (1600, 1400, 1024)
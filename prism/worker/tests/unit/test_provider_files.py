@@ -0,0 +1,83 @@
+"""
+===============================================================================
+UNIT TESTS - Provider File Cache
+===============================================================================
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from ai_client import OpenAICompatibleClient
+from provider_files import ProviderFileCache, provider_scope
+
+
+class FakeFiles:
+    """Counts file-extract round-trips."""
+
+    def __init__(self):
+        self.uploads = 0
+        self.extractions = 0
+
+    def create(self, file, purpose):
+        self.uploads += 1
+        return SimpleNamespace(id=f"file-{self.uploads}")
+
+    def content(self, file_id):
+        self.extractions += 1
+        return SimpleNamespace(text=f"text of {file_id}")
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    path = tmp_path / "deed.pdf"
+    path.write_bytes(b"%PDF-1.4 fake deed")
+    return str(path)
+
+
+def _client(cache):
+    client = OpenAICompatibleClient(api_key="test", api_url="https://api.moonshot.cn/v1", model="kimi")
+    client.client = SimpleNamespace(files=FakeFiles())
+    client.file_cache = cache
+    return client
+
+
+class TestProviderFileCache:
+    """Test cases for reusing provider-side extractions."""
+
+    @pytest.mark.parametrize("redis", [None, FakeRedis()])
+    def test_rerun_skips_upload_and_extraction(self, pdf_file, redis):
+        client = _client(ProviderFileCache(redis))
+        first = client._extract_via_provider(pdf_file)
+        second = client._extract_via_provider(pdf_file)
+
+        assert first == second == "text of file-1"
+        assert client.client.files.uploads == 1
+        assert client.client.files.extractions == 1
+
+    def test_no_cache_always_uploads(self, pdf_file):
+        client = _client(None)
+        client._extract_via_provider(pdf_file)
+        client._extract_via_provider(pdf_file)
+        assert client.client.files.uploads == 2
+
+    def test_scope_separates_endpoints(self):
+        cache = ProviderFileCache()
+        cache.set(provider_scope("openai", "https://api.moonshot.cn/v1"), "abc", "file-1", "text")
+        assert cache.get(provider_scope("openai", "https://api.openai.com/v1"), "abc") is None
+        assert cache.get(provider_scope("openai", "https://api.moonshot.cn/v1"), "abc")["file_id"] == "file-1"
+
+    def test_memory_entries_expire(self):
+        cache = ProviderFileCache(ttl_seconds=-1)
+        cache.set("scope", "abc", "file-1", "text")
+        assert cache.get("scope", "abc") is None
@@ -0,0 +1,193 @@
+"""
+===============================================================================
+UNIT TESTS - Provider Router
+===============================================================================
+"""
+import time
+
+import pytest
+
+from ai_client import AnalysisResult, BaseAIClient, MediaUnsupportedError
+from provider_router import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AllProvidersUnavailableError,
+    CircuitBreaker,
+    LatencyTracker,
+    ProviderRouter,
+)
+
+
+class StubProvider(BaseAIClient):
+    """Local provider with scripted latency and failures."""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.provider_name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        super().__init__(model=f"{name}-model")
+
+    def _default_model(self):
+        return "stub"
+
+    def _answer(self, analysis_type):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.provider_name} down")
+        return AnalysisResult(
+            raw_text=self.provider_name, structured_data={}, tokens_used=1,
+            model=self.model, analysis_type=analysis_type, provider=self.provider_name,
+        )
+
+    def analyze_document(self, file_path, analysis_type="document_analysis", prompt=None):
+        if file_path.endswith(".exe"):
+            raise ValueError("Unsupported file type")
+        return self._answer(analysis_type)
+
+    def analyze_text(self, text, analysis_type="document_analysis", prompt=None):
+        return self._answer(analysis_type)
+
+    def summarize_document(self, text, max_length=500):
+        return self._answer("summary").raw_text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Test cases for the per-provider breaker."""
+
+    def test_opens_then_half_opens_then_closes(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("kimi", failure_threshold=2, reset_seconds=30, clock=clock)
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+        assert breaker.state == OPEN and not breaker.allow()
+
+        clock.now += 31
+        assert breaker.state == HALF_OPEN and breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+
+    def test_half_open_failure_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("kimi", failure_threshold=1, reset_seconds=30, clock=clock)
+        breaker.record_failure()
+        clock.now += 31
+        assert breaker.state == HALF_OPEN
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+    def test_half_open_allows_a_single_trial(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("kimi", failure_threshold=1, reset_seconds=30, clock=clock)
+        breaker.record_failure()
+        clock.now += 31
+        assert breaker.acquire()
+        assert not breaker.acquire() and not breaker.allow()  # Trial in flight
+        breaker.release()  # e.g. the trial was a bad input
+        assert breaker.acquire()
+        breaker.record_success()
+        assert breaker.acquire() and breaker.acquire()
+
+
+class TestLatencyTracker:
+    """Test cases for EWMA and percentile tracking."""
+
+    def test_ewma_and_p95(self):
+        tracker = LatencyTracker(alpha=0.5)
+        for seconds in [1.0, 3.0]:
+            tracker.observe(seconds)
+        assert tracker.ewma == pytest.approx(2.0)
+        for _ in range(98):
+            tracker.observe(1.0)
+        tracker.observe(10.0)
+        assert tracker.percentile(0.95) == 1.0
+        assert tracker.percentile(1.0) == 10.0
+
+
+class TestFailover:
+    """Test cases for sequential failover."""
+
+    def test_fails_over_to_next_provider(self):
+        primary, backup = StubProvider("kimi", fail=True), StubProvider("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=False)
+
+        result = router.analyze_document("deed.pdf")
+        assert result.provider == "anthropic"
+        assert router.provider_name == "kimi"  # Preferred provider is still reported
+
+    def test_transcription_without_capable_provider_is_permanent(self):
+        router = ProviderRouter({"kimi": StubProvider("kimi"), "anthropic": StubProvider("anthropic")}, hedge=False)
+        assert not router.supports_transcription
+        with pytest.raises(MediaUnsupportedError):
+            router.transcribe_audio("chunk.mp3")
+
+    def test_open_circuit_is_skipped(self):
+        primary, backup = StubProvider("kimi", fail=True), StubProvider("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=False)
+        router.breakers["kimi"].failure_threshold = 2
+
+        for _ in range(4):
+            router.analyze_text("text")
+        assert primary.calls == 2
+        assert backup.calls == 4
+
+    def test_all_open_raises_retryable(self):
+        router = ProviderRouter({"kimi": StubProvider("kimi", fail=True)}, hedge=False)
+        router.breakers["kimi"].failure_threshold = 1
+        with pytest.raises(ConnectionError):
+            router.analyze_text("text")
+        with pytest.raises(AllProvidersUnavailableError):
+            router.analyze_text("text")
+
+    def test_input_errors_do_not_fail_over(self):
+        primary, backup = StubProvider("kimi"), StubProvider("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=False)
+        with pytest.raises(ValueError):
+            router.analyze_document("setup.exe")
+        assert backup.calls == 0
+        assert router.breakers["kimi"].failures == 0
+
+    def test_file_cache_propagates(self):
+        primary, backup = StubProvider("kimi"), StubProvider("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=False)
+        router.file_cache = "cache"
+        assert primary.file_cache == backup.file_cache == "cache"
+
+
+class TestHedging:
+    """Test cases for hedged requests."""
+
+    def test_slow_primary_is_hedged(self):
+        primary, backup = StubProvider("kimi", delay=0.5), StubProvider("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=True, hedge_min_delay=0.05)
+        router.latency["kimi"].observe(0.01)  # p95 known and below the floor
+
+        start = time.monotonic()
+        result = router.analyze_text("text")
+        assert result.provider == "anthropic"
+        assert time.monotonic() - start < 0.4
+
+    def test_fast_primary_is_not_hedged(self):
+        primary, backup = StubProvider("kimi"), StubProvider("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=True, hedge_min_delay=0.2)
+
+        assert router.analyze_text("text").provider == "kimi"
+        assert backup.calls == 0
+
+    def test_fast_primary_failure_falls_back(self):
+        primary, backup = StubProvider("kimi", fail=True), StubProvider("anthropic")
+        router = ProviderRouter({"kimi": primary, "anthropic": backup}, hedge=True, hedge_min_delay=0.2)
+
+        assert router.analyze_text("text").provider == "anthropic"
+        assert backup.calls == 1
@@ -0,0 +1,166 @@
+"""
+===============================================================================
+UNIT TESTS - Shared AI Rate Limiter
+===============================================================================
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from ai_client import OpenAICompatibleClient
+from rate_limiter import (
+    Limit,
+    RateLimiter,
+    RateLimitTimeoutError,
+    bucket_provider,
+    estimate_tokens,
+    parse_limits,
+)
+
+
+class FakeClock:
+    """Clock whose sleep() advances time instead of blocking."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class BrokenRedis:
+    def register_script(self, script):
+        def run(keys, args):
+            raise ConnectionError("redis down")
+        return run
+
+
+def _limiter(limits, **kwargs):
+    clock = FakeClock()
+    return RateLimiter(limits=limits, clock=clock, sleep=clock.sleep, **kwargs), clock
+
+
+class TestConfig:
+    """Test cases for limit parsing and bucket naming."""
+
+    def test_parse_limits(self):
+        limits = parse_limits("kimi=60/1000000, anthropic:claude-3-5-sonnet=50/, openai=/30000")
+        assert limits["kimi"] == Limit(rpm=60, tpm=1000000)
+        assert limits["anthropic:claude-3-5-sonnet"] == Limit(rpm=50, tpm=0)
+        assert limits["openai"] == Limit(rpm=0, tpm=30000)
+
+    def test_model_entry_wins_over_provider(self):
+        limiter = RateLimiter(limits=parse_limits("openai=500/30000,openai:gpt-4o=10/1000"))
+        assert limiter.limit_for("openai", "gpt-4o") == ("openai:gpt-4o", Limit(10, 1000))
+        assert limiter.limit_for("openai", "gpt-4o-mini")[0] == "openai"
+        assert limiter.limit_for("google", "gemini") == (None, None)
+
+    def test_kimi_endpoint_shares_the_kimi_bucket(self):
+        assert bucket_provider("openai", "https://api.moonshot.cn/v1") == "kimi"
+        assert bucket_provider("openai", "http://localhost:11434/v1") == "openai"
+
+    def test_estimate(self):
+        assert estimate_tokens(4000, images=1, max_output_tokens=500) == 1000 + 1500 + 500
+
+
+class TestTokenBucket:
+    """Test cases for waiting and settling."""
+
+    def test_rpm_waits_for_refill(self):
+        limiter, clock = _limiter({"kimi": Limit(rpm=2)})
+        limiter.acquire("kimi", "k2", 0)
+        limiter.acquire("kimi", "k2", 0)
+        assert clock.slept == []
+
+        reservation = limiter.acquire("kimi", "k2", 0)
+        assert reservation.waited_seconds == pytest.approx(30.0)
+
+    def test_settle_refunds_unused_estimate(self):
+        limiter, clock = _limiter({"kimi": Limit(tpm=1200)})
+        reservation = limiter.acquire("kimi", "k2", 1000)
+        limiter.settle(reservation, 200)
+
+        assert limiter.acquire("kimi", "k2", 1000).waited_seconds == 0
+
+    def test_settle_charges_overrun(self):
+        limiter, clock = _limiter({"kimi": Limit(tpm=1200)})
+        reservation = limiter.acquire("kimi", "k2", 100)
+        limiter.settle(reservation, 1100)
+
+        # 100 tokens left; 900 more at 20 tokens/s
+        assert limiter.acquire("kimi", "k2", 1000).waited_seconds == pytest.approx(45.0)
+
+    def test_oversized_request_is_clamped_to_capacity(self):
+        limiter, clock = _limiter({"kimi": Limit(tpm=1000)})
+        limiter.acquire("kimi", "k2", 50000)
+        assert limiter.acquire("kimi", "k2", 50000).waited_seconds == pytest.approx(60.0)
+
+    def test_wait_beyond_max_raises(self):
+        limiter, clock = _limiter({"kimi": Limit(rpm=1)}, max_wait_seconds=10)
+        limiter.acquire("kimi", "k2", 0)
+        with pytest.raises(RateLimitTimeoutError):
+            limiter.acquire("kimi", "k2", 0)
+        assert clock.slept == []
+
+    def test_async_wait_beyond_max_raises(self):
+        limiter, _ = _limiter({"kimi": Limit(rpm=1)}, max_wait_seconds=0)
+
+        async def run():
+            await limiter.acquire_async("kimi", "k2", 0)
+            await limiter.acquire_async("kimi", "k2", 0)
+
+        with pytest.raises(RateLimitTimeoutError):
+            asyncio.run(run())
+
+    def test_unlisted_provider_is_not_limited(self):
+        limiter, clock = _limiter({})
+        for _ in range(100):
+            limiter.acquire("google", "gemini", 10**6)
+        assert clock.slept == []
+
+    def test_redis_outage_falls_back_to_local_buckets(self):
+        limiter, clock = _limiter({"kimi": Limit(rpm=1)}, redis=BrokenRedis())
+        limiter.acquire("kimi", "k2", 0)
+        assert limiter.acquire("kimi", "k2", 0).waited_seconds == pytest.approx(60.0)
+
+
+class TestClientIntegration:
+    """Test cases for reservations around provider calls."""
+
+    def test_call_is_settled_with_reported_usage(self):
+        limiter, clock = _limiter({"kimi": Limit(tpm=10000)})
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"summary": "ok"}'))],
+            usage=SimpleNamespace(total_tokens=300),
+        )
+        client = OpenAICompatibleClient(api_key="test", api_url="https://api.moonshot.cn/v1", model="k2")
+        client.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response))
+        )
+        client.rate_limiter = limiter
+
+        result = client.analyze_text("Escritura pública")
+        assert result.tokens_used == 300
+        level, _ = limiter._local["kimi:tpm"]
+        assert level == pytest.approx(10000 - 300)
+
+    def test_failed_call_gives_the_reservation_back(self):
+        limiter, clock = _limiter({"kimi": Limit(tpm=10000)})
+
+        def create(**kwargs):
+            raise ConnectionError("provider down")
+
+        client = OpenAICompatibleClient(api_key="test", api_url="https://api.moonshot.cn/v1", model="k2")
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        client.rate_limiter = limiter
+
+        with pytest.raises(ConnectionError):
+            client.analyze_text("Escritura pública")
+        level, _ = limiter._local["kimi:tpm"]
+        assert level == pytest.approx(10000)
@@ -0,0 +1,141 @@
+"""
+===============================================================================
+UNIT TESTS - Result Cache
+===============================================================================
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import result_cache
+from result_cache import (
+    RESULT_IDENTITIES_KEY,
+    DiskCache,
+    ResultCache,
+    cache_key,
+    decode,
+    encode,
+    prompt_fingerprint,
+    publish_identities,
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    def hset(self, key, mapping):
+        self.values.setdefault(key, {}).update(mapping)
+
+
+RESULT = {
+    "raw_text": "Escritura pública " * 200,
+    "structured_data": {"summary": "Deed", "entities": {"people": ["Ana"]}},
+    "model": "gpt-4o",
+    "provider": "openai",
+    "tokens_used": 1200,
+}
+
+
+class TestCacheKey:
+    """Test cases for versioned cache keys."""
+
+    def test_key_changes_with_every_input(self):
+        fp = prompt_fingerprint("Analyze this document")
+        base = cache_key("abc", "document_analysis", "openai", "gpt-4o", fp)
+        assert cache_key("abc", "ocr", "openai", "gpt-4o", fp) != base
+        assert cache_key("abc", "document_analysis", "anthropic", "gpt-4o", fp) != base
+        assert cache_key("abc", "document_analysis", "openai", "gpt-4o-mini", fp) != base
+        assert cache_key("abc", "document_analysis", "openai", "gpt-4o",
+                         prompt_fingerprint("Analyze this document.")) != base
+
+    def test_prompt_fingerprint_is_stable(self):
+        assert prompt_fingerprint("x") == prompt_fingerprint("x")
+
+    def test_published_identities(self):
+        redis = FakeRedis()
+        fp = prompt_fingerprint("Extract receipt information")
+        publish_identities(redis, {"receipt_extraction": [("openai", "gpt-4o", fp), ("openai", "gpt-4o-mini", fp)]})
+        assert json.loads(redis.values[RESULT_IDENTITIES_KEY]["receipt_extraction"]) == [
+            ["openai", "gpt-4o", fp], ["openai", "gpt-4o-mini", fp],
+        ]
+
+
+class TestCompression:
+    """Test cases for the compressed payload codec."""
+
+    def test_round_trip_is_smaller(self):
+        blob = encode(RESULT)
+        assert decode(blob) == RESULT
+        assert len(blob) < len(RESULT["raw_text"].encode("utf-8")) / 10
+
+    def test_zlib_fallback_and_cross_read(self, monkeypatch):
+        zstd_blob = encode(RESULT)
+        monkeypatch.setattr(result_cache, "zstandard", None)
+        zlib_blob = encode(RESULT)
+        assert zlib_blob[:1] == b"z"
+        assert decode(zlib_blob) == RESULT
+        if zstd_blob[:1] == b"Z":
+            with pytest.raises(ValueError):
+                decode(zstd_blob)
+
+
+class TestDiskCache:
+    """Test cases for the per-node disk tier."""
+
+    def test_expired_entries_are_dropped(self, tmp_path):
+        disk = DiskCache(str(tmp_path), ttl_seconds=60)
+        disk.set("k", b"value")
+        assert disk.get("k") == b"value"
+        old = time.time() - 120
+        os.utime(disk._path("k"), (old, old))
+        assert disk.get("k") is None
+
+    def test_prune_removes_oldest(self, tmp_path):
+        disk = DiskCache(str(tmp_path), max_bytes=250)
+        for i in range(3):
+            disk.set(f"k{i}", b"x" * 100)
+            stamp = time.time() - 100 + i
+            os.utime(disk._path(f"k{i}"), (stamp, stamp))
+        disk.prune()
+        assert disk.get("k0") is None
+        assert disk.get("k2") == b"x" * 100
+
+    def test_concurrent_writers_of_one_key(self, tmp_path):
+        disk = DiskCache(str(tmp_path))
+        blobs = [bytes([i]) * 50_000 for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda blob: disk.set("k", blob), blobs))
+        assert disk.get("k") in blobs
+        assert os.listdir(tmp_path) == [os.path.basename(disk._path("k"))]  # No leftover .tmp files
+
+
+class TestResultCache:
+    """Test cases for tier ordering."""
+
+    def test_disk_hit_is_promoted_to_redis(self, tmp_path):
+        disk = DiskCache(str(tmp_path))
+        ResultCache(None, disk).set("key", RESULT)
+
+        redis = FakeRedis()
+        cache = ResultCache(redis, disk)
+        assert cache.get("key") == RESULT
+        assert decode(redis.values["key"]) == RESULT
+
+    def test_miss_everywhere(self, tmp_path):
+        cache = ResultCache(FakeRedis(), DiskCache(str(tmp_path)))
+        assert cache.get("missing") is None
+
+    def test_corrupt_entry_is_a_miss(self):
+        redis = FakeRedis()
+        redis.values["key"] = b"?garbage"
+        assert ResultCache(redis).get("key") is None
@@ -0,0 +1,94 @@
+"""
+===============================================================================
+UNIT TESTS - Retry Backoff
+===============================================================================
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+
+import main
+from main import classify_error, compute_retry_delay
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TestClassifyError:
+    """Test cases for error classification."""
+
+    def test_rate_limit_by_status_code(self):
+        assert classify_error(_StatusError(429)) == "rate_limit"
+
+    def test_rate_limit_by_name(self):
+        class RateLimitError(Exception):
+            pass
+        assert classify_error(RateLimitError("slow down")) == "rate_limit"
+
+    def test_timeout(self):
+        assert classify_error(TimeoutError()) == "timeout"
+
+        class APITimeoutError(Exception):
+            pass
+        assert classify_error(APITimeoutError("request")) == "timeout"
+
+    def test_parse_errors(self):
+        with pytest.raises(json.JSONDecodeError) as exc_info:
+            json.loads("{not json")
+        assert classify_error(exc_info.value) == "parse"
+        assert classify_error(ValueError("Unsupported file type")) == "parse"
+
+    def test_transient_default(self):
+        assert classify_error(ConnectionError("reset by peer")) == "transient"
+        assert classify_error(_StatusError(503)) == "transient"
+
+
+class TestComputeRetryDelay:
+    """Test cases for backoff delay computation."""
+
+    @pytest.fixture(autouse=True)
+    def no_jitter(self):
+        with patch.object(main, "RETRY_JITTER_RATIO", 0.0), \
+             patch.object(main, "RETRY_BASE_SECONDS", 10.0), \
+             patch.object(main, "RETRY_MAX_DELAY_SECONDS", 3600.0):
+            yield
+
+    def test_exponential_growth(self):
+        delays = [compute_retry_delay(n, "transient") for n in range(4)]
+        assert delays == [10.0, 20.0, 40.0, 80.0]
+
+    def test_error_class_ordering(self):
+        rate_limit = compute_retry_delay(1, "rate_limit")
+        timeout = compute_retry_delay(1, "timeout")
+        parse = compute_retry_delay(1, "parse")
+        assert rate_limit > timeout > parse
+
+    def test_shutdown_requeues_immediately(self):
+        assert compute_retry_delay(3, "shutdown") == 0.0
+
+    def test_delay_is_capped(self):
+        assert compute_retry_delay(30, "rate_limit") == 3600.0
+
+    def test_jitter_bounds(self):
+        with patch.object(main, "RETRY_JITTER_RATIO", 0.5):
+            for _ in range(50):
+                delay = compute_retry_delay(2, "transient")
+                assert 40.0 <= delay <= 60.0
+
+
+class TestShutdownSignal:
+    """Test cases for draining on SIGTERM."""
+
+    def test_in_flight_jobs_are_not_requeued(self):
+        worker = main.Worker.__new__(main.Worker)
+        worker.running = True
+        worker.current_job = {"id": "job-1"}
+        worker.active_jobs = {"job-2": {"id": "job-2"}}
+        with patch.object(main.Worker, "_fail_job") as fail_job:
+            worker._signal_handler(15, None)
+        assert worker.running is False
+        fail_job.assert_not_called()
@@ -0,0 +1,170 @@
+"""
+===============================================================================
+UNIT TESTS - Similarity Index
+===============================================================================
+"""
+import random
+
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance
+
+import similarity
+from similarity import (
+    IMAGE_KIND,
+    TEXT_KIND,
+    Signature,
+    classify_similarity,
+    compute_signature,
+    find_near_duplicate,
+    index_signature,
+    minhash,
+)
+
+
+class FakeRedis:
+    """Just enough of redis-py for the LSH index."""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def scard(self, key):
+        return len(self.sets.get(key, ()))
+
+    def expire(self, key, ttl):
+        pass
+
+    def sunion(self, keys):
+        return set().union(*(self.sets.get(k, set()) for k in keys))
+
+    def mget(self, keys):
+        return [self.values.get(k) for k in keys]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues calls and runs them on execute(), returning their results."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((getattr(self.redis, name), args))
+
+    def execute(self):
+        return [method(*args) for method, args in self.calls]
+
+
+def _document_photo(path, seed, brightness=1.0):
+    rng = random.Random(seed)
+    image = Image.new("RGB", (800, 1000), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(0, 700), rng.randrange(0, 950)
+        draw.rectangle([x, y, x + rng.randrange(20, 100), y + 12], fill="black")
+    ImageEnhance.Brightness(image).enhance(brightness).save(path, "JPEG", quality=80)
+    return str(path)
+
+
+def _text(seed, words=400):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+class TestImageSignature:
+    """Test cases for dHash fingerprints."""
+
+    def test_retake_is_only_flagged_for_review(self, tmp_path):
+        a = compute_signature(_document_photo(tmp_path / "a.jpg", 1), "image/jpeg")
+        b = compute_signature(_document_photo(tmp_path / "b.jpg", 1, brightness=0.9), "image/jpeg")
+        assert a.kind == IMAGE_KIND
+        assert classify_similarity(a, a.similarity(b)) == "review"
+        assert classify_similarity(a, 1.0) == "review"  # Even an identical hash
+
+    def test_different_page_is_not_matched(self, tmp_path):
+        a = compute_signature(_document_photo(tmp_path / "a.jpg", 1), "image/jpeg")
+        b = compute_signature(_document_photo(tmp_path / "b.jpg", 2), "image/jpeg")
+        assert classify_similarity(a, a.similarity(b)) is None
+
+    def test_blank_page_has_no_signature(self, tmp_path):
+        path = tmp_path / "blank.jpg"
+        Image.new("RGB", (800, 1000), "white").save(path, "JPEG")
+        assert compute_signature(str(path), "image/jpeg") is None
+
+
+class TestTextSignature:
+    """Test cases for MinHash fingerprints."""
+
+    def test_small_edit_is_similar(self):
+        original = _text(1)
+        edited = original.replace("word1 ", "word9999 ", 1) + " appendix"
+        a, b = Signature(TEXT_KIND, minhash(original)), Signature(TEXT_KIND, minhash(edited))
+        assert a.similarity(b) >= 0.9
+
+    def test_unrelated_text_is_dissimilar(self):
+        a, b = Signature(TEXT_KIND, minhash(_text(1))), Signature(TEXT_KIND, minhash(_text(2)))
+        assert a.similarity(b) < 0.2
+
+    def test_short_text_has_no_signature(self):
+        assert minhash("Total R$ 10,00") is None
+        assert compute_signature("scan.pdf", "application/pdf", text="") is None
+
+    def test_serialization_round_trip(self):
+        signature = Signature(TEXT_KIND, minhash(_text(3)))
+        restored = Signature.deserialize(TEXT_KIND, signature.serialize())
+        assert restored.value == signature.value
+
+
+class TestLSHIndex:
+    """Test cases for the Redis-backed LSH lookup."""
+
+    def test_finds_indexed_near_duplicate(self):
+        redis = FakeRedis()
+        original = Signature(TEXT_KIND, minhash(_text(1)))
+        index_signature(redis, original, "document_analysis", "file-a")
+
+        query = Signature(TEXT_KIND, minhash(_text(1) + " signed"))
+        match = find_near_duplicate(redis, query, "document_analysis", "file-b")
+        assert match.file_id == "file-a"
+        assert match.action == "reuse"
+
+    def test_scoped_by_analysis_type_and_excludes_self(self):
+        redis = FakeRedis()
+        signature = Signature(TEXT_KIND, minhash(_text(1)))
+        index_signature(redis, signature, "document_analysis", "file-a")
+
+        assert find_near_duplicate(redis, signature, "ocr", "file-b") is None
+        assert find_near_duplicate(redis, signature, "document_analysis", "file-a") is None
+
+    def test_image_bands_share_key_within_distance(self):
+        a = Signature(IMAGE_KIND, random.Random(1).getrandbits(256))
+        b = Signature(IMAGE_KIND, a.value ^ 0b1011)  # 3 bits flipped
+        assert set(a.bands()) & set(b.bands())
+
+    def test_flat_image_bands_are_not_indexed(self):
+        signature = Signature(IMAGE_KIND, 0xBEEF << 16)  # One detailed band, the rest flat
+        assert signature.bands() == ["1:beef"]
+
+    def test_full_band_stops_growing(self, monkeypatch):
+        monkeypatch.setattr(similarity, "SIMILARITY_MAX_BAND_SIZE", 2)
+        redis = FakeRedis()
+        signature = Signature(TEXT_KIND, minhash(_text(1)))
+        for file_id in ("file-a", "file-b", "file-c"):
+            index_signature(redis, signature, "document_analysis", file_id)
+        assert all(members == {"file-a", "file-b"} for members in redis.sets.values())
+        assert "simsig:minhash:file-c" in redis.values
+
+    @pytest.mark.parametrize("redis", [None])
+    def test_no_redis(self, redis):
+        signature = Signature(TEXT_KIND, minhash(_text(1)))
+        assert find_near_duplicate(redis, signature, "document_analysis", "file-a") is None
@@ -0,0 +1,118 @@
+"""
+===============================================================================
+UNIT TESTS - Single Flight
+===============================================================================
+"""
+import asyncio
+import queue
+import threading
+import time
+
+from single_flight import DONE, FAILED, RELEASED, SingleFlight, flight_key
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel):
+        self.redis.subscribers.setdefault(channel, []).append(self)
+
+    def get_message(self, timeout=0):
+        try:
+            return self.messages.get(timeout=timeout) if timeout else self.messages.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        for subscribers in self.redis.subscribers.values():
+            if self in subscribers:
+                subscribers.remove(self)
+
+
+class FakeRedis:
+    """Just enough Redis for the lock, release script and channel."""
+
+    def __init__(self):
+        self.data = {}
+        self.subscribers = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    def register_script(self, script):
+        def release(keys, args):
+            if self.data.get(keys[0]) == args[0]:
+                del self.data[keys[0]]
+            for subscriber in list(self.subscribers.get(keys[1], [])):
+                subscriber.messages.put({"type": "message", "data": args[1]})
+        return release
+
+
+class TestLock:
+    """Test cases for leader election."""
+
+    def test_second_job_is_a_follower(self):
+        flights = SingleFlight(FakeRedis())
+        assert flights.acquire("abc", "ocr")
+        assert flights.acquire("abc", "ocr") is None
+        assert flights.acquire("abc", "document_analysis")  # Different type, own flight
+
+    def test_release_only_drops_own_lock(self):
+        redis = FakeRedis()
+        flights = SingleFlight(redis)
+        token = flights.acquire("abc", "ocr")
+        flights.release("abc", "ocr", "someone-else")
+        assert redis.exists(flight_key("abc", "ocr"))
+        flights.release("abc", "ocr", token)
+        assert not redis.exists(flight_key("abc", "ocr"))
+
+    def test_without_redis_everyone_leads(self):
+        flights = SingleFlight(None)
+        assert flights.acquire("abc", "ocr") and flights.acquire("abc", "ocr")
+
+
+class TestWait:
+    """Test cases for followers waiting on the leader."""
+
+    def test_follower_wakes_on_release(self):
+        flights = SingleFlight(FakeRedis(), wait_seconds=5, poll_seconds=0.05)
+        token = flights.acquire("abc", "ocr")
+
+        def leader():
+            time.sleep(0.2)
+            flights.release("abc", "ocr", token, FAILED)
+
+        threading.Thread(target=leader).start()
+        assert flights.wait("abc", "ocr") == FAILED
+
+    def test_leader_already_gone(self):
+        flights = SingleFlight(FakeRedis(), wait_seconds=5, poll_seconds=0.05)
+        assert flights.wait("abc", "ocr") == RELEASED
+
+    def test_times_out(self):
+        flights = SingleFlight(FakeRedis(), wait_seconds=0.2, poll_seconds=0.05)
+        flights.acquire("abc", "ocr")
+        assert flights.wait("abc", "ocr") is None
+
+    def test_async_follower(self):
+        flights = SingleFlight(FakeRedis(), wait_seconds=5, poll_seconds=0.05)
+        token = flights.acquire("abc", "ocr")
+
+        async def run():
+            follower = asyncio.create_task(flights.wait_async("abc", "ocr"))
+            await asyncio.sleep(0.1)
+            flights.release("abc", "ocr", token)
+            return await follower
+
+        assert asyncio.run(run()) == DONE
@@ -0,0 +1,95 @@
+"""
+===============================================================================
+UNIT TESTS - Streaming Payloads
+===============================================================================
+"""
+import base64
+import json
+import os
+
+import pytest
+
+from streaming import (
+    B64_READ_CHUNK,
+    FileTooLargeError,
+    StreamingJSONBody,
+    base64_length,
+    check_size,
+    file_kind,
+    iter_base64,
+)
+
+
+@pytest.fixture
+def binary_file(tmp_path):
+    path = tmp_path / "scan.jpg"
+    # Not a multiple of the read chunk, so the last chunk needs padding
+    path.write_bytes(os.urandom(B64_READ_CHUNK * 2 + 7))
+    return str(path)
+
+
+class TestStreamingBase64:
+    """Test cases for chunked base64 encoding."""
+
+    def test_matches_one_shot_encoding(self, binary_file):
+        with open(binary_file, "rb") as f:
+            expected = base64.b64encode(f.read())
+        assert b"".join(iter_base64(binary_file)) == expected
+
+    def test_chunks_are_bounded(self, binary_file):
+        assert max(len(c) for c in iter_base64(binary_file)) <= base64_length(B64_READ_CHUNK)
+
+    def test_rejects_unaligned_chunk_size(self, binary_file):
+        with pytest.raises(ValueError):
+            list(iter_base64(binary_file, chunk_size=1000))
+
+    def test_base64_length(self):
+        for size in range(10):
+            assert base64_length(size) == len(base64.b64encode(b"x" * size))
+
+
+class TestStreamingJSONBody:
+    """Test cases for streamed JSON request bodies."""
+
+    def test_body_is_valid_json_with_exact_length(self, binary_file):
+        payload = {
+            "model": "gpt-4o",
+            "messages": [{"role": "user", "content": [
+                {"type": "text", "text": "Análise"},
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{StreamingJSONBody.PLACEHOLDER}"}},
+            ]}],
+        }
+        body = StreamingJSONBody(payload, binary_file)
+        raw = b"".join(body)
+        assert len(raw) == len(body)
+
+        decoded = json.loads(raw)
+        url = decoded["messages"][0]["content"][1]["image_url"]["url"]
+        with open(binary_file, "rb") as f:
+            assert base64.b64decode(url.split(",", 1)[1]) == f.read()
+        assert decoded["messages"][0]["content"][0]["text"] == "Análise"
+
+    def test_requires_single_placeholder(self, binary_file):
+        with pytest.raises(ValueError):
+            StreamingJSONBody({"a": "no placeholder"}, binary_file)
+
+
+class TestSizeCaps:
+    """Test cases for per-type size caps."""
+
+    def test_file_kind(self):
+        assert file_kind("image/png") == "image"
+        assert file_kind("application/pdf") == "pdf"
+        assert file_kind("video/mp4") == "video"
+        assert file_kind("text/csv") == "text"
+        assert file_kind(None) == "default"
+
+    def test_check_size(self):
+        check_size(None, "image/png")
+        check_size(1024, "image/png")
+        with pytest.raises(FileTooLargeError):
+            check_size(10 ** 12, "application/pdf")
+
+    def test_too_large_is_not_retried(self):
+        from main import classify_error
+        assert classify_error(FileTooLargeError(10, 5, "pdf")) == "permanent"
@@ -0,0 +1,49 @@
+"""
+===============================================================================
+UNIT TESTS - Worker Metrics
+===============================================================================
+"""
+from prometheus_client import REGISTRY
+
+from metrics import record_cache_lookup, stage_timer, timed_stage
+
+
+def _sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestWorkerMetrics:
+    """Test cases for worker metric helpers."""
+
+    def test_stage_timer_observes_duration(self):
+        before = _sample("worker_stage_duration_seconds_count", {"stage": "download"})
+        with stage_timer("download"):
+            pass
+        after = _sample("worker_stage_duration_seconds_count", {"stage": "download"})
+        assert after == before + 1
+
+    def test_stage_timer_records_on_error(self):
+        before = _sample("worker_stage_duration_seconds_count", {"stage": "db_save"})
+        try:
+            with stage_timer("db_save"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        assert _sample("worker_stage_duration_seconds_count", {"stage": "db_save"}) == before + 1
+
+    def test_timed_stage_decorator(self):
+        @timed_stage("parse")
+        def parse(text):
+            return text.upper()
+
+        before = _sample("worker_stage_duration_seconds_count", {"stage": "parse"})
+        assert parse("abc") == "ABC"
+        assert _sample("worker_stage_duration_seconds_count", {"stage": "parse"}) == before + 1
+
+    def test_cache_hit_ratio(self):
+        record_cache_lookup(True, cache_name="test_ratio")
+        record_cache_lookup(False, cache_name="test_ratio")
+        record_cache_lookup(True, cache_name="test_ratio")
+        record_cache_lookup(True, cache_name="test_ratio")
+        assert _sample("worker_cache_hit_ratio", {"cache_name": "test_ratio"}) == 0.75
+        assert _sample("worker_cache_hits_total", {"cache_name": "test_ratio"}) == 3